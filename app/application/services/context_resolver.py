@@ -1,32 +1,110 @@
-from typing import List, Optional
-import requests
+from typing import Dict, List, Optional, Tuple
 from ...domain.models import ContextItem, MediaMatch
 from ...shared.text_utils import normalize
+from ...shared.ttl_cache import MISSING, TTLCache
 from ...core.settings import Settings
+from ...infrastructure.http_client import shared_http
+
+# Compiled matchers keyed by the (name, keywords_text) of each context, so the
+# repo cache, session.training_contexts and store round-trips all reuse one.
+_matcher_cache = TTLCache(maxsize=512, ttl_seconds=3600, name="context_matchers")
+# Fast path for the same list object (repo cache hit): skips hashing the fingerprint.
+# The list itself is kept in the entry, so its id() cannot be reused while cached.
+_matcher_by_list = TTLCache(maxsize=512, ttl_seconds=3600, name="context_matchers_by_list")
+
+
+def _context_patterns(c: ContextItem) -> List[str]:
+    """Every substring that makes ``c`` match (same rules as the old linear scan)."""
+    out: List[str] = []
+    name = normalize(c.name)
+    if name:
+        out.append(name)
+        out.extend(tok for tok in name.split("_") if tok)
+    kws = normalize(c.keywords_text or "")
+    if kws:
+        parts = [p.strip() for p in re_split(kws)]
+        # also split by whitespace to catch phrases like "quando usuario fala sobre chocolate"
+        for p in list(parts):
+            parts.extend(p.split())
+        out.extend(k for k in parts if len(k) >= 3)
+    return out
+
+
+class ContextMatcher:
+    """Aho-Corasick automaton over the trigger patterns of a context list.
+
+    Each node keeps the lowest context index among the patterns ending there
+    (failure links included), so one pass over the text yields the first
+    context, in list order, that has any pattern inside the text.
+    """
+
+    def __init__(self, contexts: List[ContextItem]):
+        self.names = [c.name for c in contexts]
+        goto: List[Dict[str, int]] = [{}]
+        best: List[int] = [len(contexts)]
+        for idx, c in enumerate(contexts):
+            for pat in _context_patterns(c):
+                node = 0
+                for ch in pat:
+                    nxt = goto[node].get(ch)
+                    if nxt is None:
+                        nxt = len(goto)
+                        goto[node][ch] = nxt
+                        goto.append({})
+                        best.append(len(contexts))
+                    node = nxt
+                if idx < best[node]:
+                    best[node] = idx
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        for node in queue:
+            for ch, nxt in goto[node].items():
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f][ch] if node and ch in goto[f] else 0
+                if best[fail[nxt]] < best[nxt]:
+                    best[nxt] = best[fail[nxt]]
+                queue.append(nxt)
+        self._goto = goto
+        self._fail = fail
+        self._best = best
+
+    def match(self, user_text: str) -> Optional[str]:
+        text = normalize(user_text)
+        if not text:
+            return None
+        goto, fail, best = self._goto, self._fail, self._best
+        found = len(self.names)
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if best[node] < found:
+                found = best[node]
+                if found == 0:
+                    break
+        return self.names[found] if found < len(self.names) else None
+
+
+def compile_context_matcher(contexts: List[ContextItem]) -> ContextMatcher:
+    entry = _matcher_by_list.get(id(contexts))
+    if entry is not MISSING and entry[0] is contexts and entry[1] == len(contexts):
+        return entry[2]
+    key: Tuple[Tuple[str, str], ...] = tuple((c.name, c.keywords_text or "") for c in contexts)
+    matcher = _matcher_cache.get(key)
+    if matcher is MISSING:
+        matcher = ContextMatcher(contexts)
+        _matcher_cache.set(key, matcher)
+    _matcher_by_list.set(id(contexts), (contexts, len(contexts), matcher))
+    return matcher
+
 
 def fast_match_context(user_text: str, contexts: List[ContextItem]) -> Optional[str]:
-    text = normalize(user_text)
-    if not text: return None
-    for c in contexts:
-        name = normalize(c.name)
-        if name and name in text:
-            return c.name
-        if name:
-            for tok in name.split("_"):
-                if tok and tok in text:
-                    return c.name
-        kws = normalize(c.keywords_text or "")
-        if kws:
-            parts = [p.strip() for p in re_split(kws)]
-            # also split by whitespace to catch phrases like "quando usuario fala sobre chocolate"
-            for p in list(parts):
-                parts.extend(p.split())
-            for k in parts:
-                if len(k) < 3:
-                    continue
-                if k and k in text:
-                    return c.name
-    return None
+    if not contexts:
+        return None
+    return compile_context_matcher(contexts).match(user_text)
 
 def re_split(kws: str) -> list[str]:
     import re
@@ -47,7 +125,7 @@ def resolve_with_gpt(settings: Settings, user_text: str, context_names: List[str
               "Se corresponder claramente a um dos contextos, responda APENAS com esse contexto (texto exato). "
               "Caso contrário, responda 'none'. Sem explicações.")
     user = "Fala: {}\nContextos:\n- {}".format(user_text, "\n- ".join(context_names))
-    r = requests.post(
+    r = shared_http(settings).post(
         "https://api.openai.com/v1/chat/completions",
         headers={"Authorization": f"Bearer {settings.openai_api_key}", "Content-Type": "application/json"},
         json={
@@ -1,7 +1,9 @@
 """Use-case for matching context triggers and returning media."""
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import time
+from typing import List, Optional
+from app.domain.models import ContextItem
 from app.domain.ports import IContextRepository
 from app.application.services.context_resolver import fast_match_context, resolve_with_gpt, resolve_media_for_match
 from app.core.settings import Settings
@@ -13,66 +15,67 @@ class ResolveInput:
     text: str
     client_id: str | None = None
 
-def execute(settings: Settings, repo: IContextRepository, args: ResolveInput) -> dict:
-    t0 = time.time()
+
+@dataclass
+class PrefetchedContexts:
+    """Everything that does not depend on the assistant text (Supabase lookups)."""
+    avatar_uuid: Optional[str] = None
+    contexts: List[ContextItem] = field(default_factory=list)
+    resolve_avatar_ms: int = 0
+    list_contexts_ms: int = 0
+
+
+def prefetch(repo: IContextRepository, avatar_identifier: str, client_id: str | None = None) -> PrefetchedContexts:
+    """Avatar resolution + context list; can run while the audio is still being transcribed."""
     step_t0 = time.time()
-    if args.client_id:
-        avatar_uuid = repo.resolve_avatar_uuid_for_client(args.avatar_identifier, args.client_id)
+    if client_id:
+        avatar_uuid = repo.resolve_avatar_uuid_for_client(avatar_identifier, client_id)
     else:
-        avatar_uuid = repo.resolve_avatar_uuid(args.avatar_identifier)
+        avatar_uuid = repo.resolve_avatar_uuid(avatar_identifier)
     resolve_avatar_ms = int((time.time() - step_t0) * 1000)
     # Diagnostic: confirm cache key stability
-    print(f"RAG_ID [{time.strftime('%Y-%m-%dT%H:%M:%S')}]: avatar_identifier={args.avatar_identifier} avatar_uuid={avatar_uuid}", flush=True)
+    print(f"RAG_ID [{time.strftime('%Y-%m-%dT%H:%M:%S')}]: avatar_identifier={avatar_identifier} avatar_uuid={avatar_uuid}", flush=True)
     if not avatar_uuid:
-        return {
-            "ok": True,
-            "match": "none",
-            "media": None,
-            "method": "none",
-            "latency_ms": int((time.time() - t0) * 1000),
-            "resolve_avatar_ms": resolve_avatar_ms,
-            "list_contexts_ms": 0,
-            "fast_match_ms": 0,
-        }
+        return PrefetchedContexts(resolve_avatar_ms=resolve_avatar_ms)
     step_t0 = time.time()
     contexts = repo.list_contexts_by_avatar(avatar_uuid)
     list_contexts_ms = int((time.time() - step_t0) * 1000)
-    # Limit context list size to reduce GPT latency on large accounts.
-    names = [c.name for c in contexts][:25]
-    if not names:
-        return {
-            "ok": True,
-            "match": "none",
-            "media": None,
-            "method": "none",
-            "latency_ms": int((time.time() - t0) * 1000),
-            "resolve_avatar_ms": resolve_avatar_ms,
-            "list_contexts_ms": list_contexts_ms,
-            "fast_match_ms": 0,
-        }
-    step_t0 = time.time()
-    fm = fast_match_context(args.text, contexts)
-    fast_match_ms = int((time.time() - step_t0) * 1000)
-    if fm:
-        media = resolve_media_for_match(contexts, fm)
-        return {
-            "ok": True,
-            "match": fm,
-            "media": media.__dict__ if media else None,
-            "method": "fast",
-            "latency_ms": int((time.time() - t0) * 1000),
-            "resolve_avatar_ms": resolve_avatar_ms,
-            "list_contexts_ms": list_contexts_ms,
-            "fast_match_ms": fast_match_ms,
-        }
-    # Temporariamente desativado: GPT fallback para medir impacto de latency.
-    return {
+    return PrefetchedContexts(
+        avatar_uuid=avatar_uuid,
+        contexts=contexts,
+        resolve_avatar_ms=resolve_avatar_ms,
+        list_contexts_ms=list_contexts_ms,
+    )
+
+
+def match(pre: PrefetchedContexts, text: str) -> dict:
+    """Pure matching step over prefetched contexts (no I/O)."""
+    t0 = time.time()
+    out = {
         "ok": True,
         "match": "none",
         "media": None,
         "method": "none",
-        "latency_ms": int((time.time() - t0) * 1000),
-        "resolve_avatar_ms": resolve_avatar_ms,
-        "list_contexts_ms": list_contexts_ms,
-        "fast_match_ms": fast_match_ms,
+        "resolve_avatar_ms": pre.resolve_avatar_ms,
+        "list_contexts_ms": pre.list_contexts_ms,
+        "fast_match_ms": 0,
     }
+    # Limit context list size to reduce GPT latency on large accounts.
+    names = [c.name for c in pre.contexts][:25]
+    if not pre.avatar_uuid or not names:
+        return out
+    fm = fast_match_context(text, pre.contexts)
+    out["fast_match_ms"] = int((time.time() - t0) * 1000)
+    if fm:
+        media = resolve_media_for_match(pre.contexts, fm)
+        out.update({"match": fm, "media": media.__dict__ if media else None, "method": "fast"})
+    # Temporariamente desativado: GPT fallback para medir impacto de latency.
+    return out
+
+
+def execute(settings: Settings, repo: IContextRepository, args: ResolveInput) -> dict:
+    t0 = time.time()
+    pre = prefetch(repo, args.avatar_identifier, args.client_id)
+    out = match(pre, args.text)
+    out["latency_ms"] = int((time.time() - t0) * 1000)
+    return out
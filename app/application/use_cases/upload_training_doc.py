@@ -4,12 +4,12 @@ from dataclasses import dataclass
 from datetime import datetime, timezone
 from app.core.settings import Settings
 from app.domain.ports import IStorage, IContextRepository
+from app.infrastructure.http_client import shared_http
 from app.infrastructure.supabase_rest import insert_json, get_json, patch_json
 from app.shared.text_utils import safe_filename
 
 import io
 import base64
-import requests
 from PyPDF2 import PdfReader
 
 
@@ -22,7 +22,15 @@ class UploadTrainingDocInput:
     title: str | None = None
 
 
-def execute(settings: Settings, storage: IStorage, repo: IContextRepository, args: UploadTrainingDocInput) -> tuple[dict, int]:
+def execute(
+    settings: Settings,
+    storage: IStorage,
+    repo: IContextRepository,
+    args: UploadTrainingDocInput,
+    credentials=None,
+    snippets=None,
+    writes=None,
+) -> tuple[dict, int]:
     avatar_uuid = repo.resolve_avatar_uuid(args.avatar_identifier)
     if not avatar_uuid:
         return {"ok": False, "error": "avatar_not_found"}, 404
@@ -32,6 +40,12 @@ def execute(settings: Settings, storage: IStorage, repo: IContextRepository, arg
 
     storage.upsert(settings.supabase_bucket, path, args.content_type, args.data)
     public_url = storage.public_url(settings.supabase_bucket, path)
+    # mesmo path => mesma URL: o snippet antigo não pode sobreviver ao re-upload
+    if snippets is not None:
+        try:
+            snippets.put_from_bytes(public_url, args.data, args.content_type)
+        except Exception:
+            pass
 
     created_at = datetime.now(timezone.utc).isoformat()
     url_cols = ["document_url", "url", "file_url", "path"]
@@ -47,7 +61,7 @@ def execute(settings: Settings, storage: IStorage, repo: IContextRepository, arg
                     insert_json(settings, "training_docs", [row])
                     doc_name = row[ncol]
                     _attach_training_to_backstory(settings, avatar_uuid, args, doc_name)
-                    _invalidate_avatar_context(settings, avatar_uuid)
+                    invalidate_avatar_context(settings, avatar_uuid, credentials, writes)
                     return {
                         "ok": True,
                         "avatar_id": avatar_uuid,
@@ -84,12 +98,27 @@ def _attach_training_to_backstory(settings: Settings, avatar_uuid: str, args: Up
         return
 
 
-def _invalidate_avatar_context(settings: Settings, avatar_uuid: str):
+def invalidate_avatar_context(settings: Settings, avatar_uuid: str, credentials=None, writes=None):
+    """Clears the avatar's LiveAvatar context so the next session recreates it."""
+    if writes is not None:
+        # pela fila: fica depois de um PATCH de context_id ainda pendente, que senão o sobrescreveria
+        if credentials is not None:
+            credentials.set_context_id(avatar_uuid, None)
+        try:
+            writes.patch("avatar_credentials", {"avatar_id": f"eq.{avatar_uuid}"}, {"context_id": None},
+                         meta={"context_id": None})
+        except Exception:
+            pass
+        return
     try:
         url = f"{settings.supabase_url}/rest/v1/avatar_credentials?avatar_id=eq.{avatar_uuid}"
         patch_json(settings, url, {"context_id": None})
     except Exception:
         return
+    finally:
+        # índice em memória (AvatarCredentialsIndex) não pode continuar servindo o context_id antigo
+        if credentials is not None:
+            credentials.invalidate(avatar_uuid)
 
 
 def _extract_text(args: UploadTrainingDocInput) -> str:
@@ -139,7 +168,7 @@ def _summarize_text(settings: Settings, text: str) -> str:
             ],
             "temperature": 0.2,
         }
-        r = requests.post(
+        r = shared_http(settings).post(
             "https://api.openai.com/v1/chat/completions",
             headers={"Authorization": f"Bearer {settings.openai_api_key}"},
             json=payload,
@@ -10,6 +10,16 @@ from app.infrastructure.context_repository import ContextRepository
 from app.infrastructure.heygen_livekit_client import HeygenLivekitClient
 from app.infrastructure.liveavatar_client import LiveAvatarClient
 from app.infrastructure.gemini_image_client import GeminiImageClient
+from app.infrastructure.http_client import HttpClient, shared_http
+from app.infrastructure.supabase_jwt import SupabaseJwtVerifier
+from app.infrastructure.avatar_credentials_index import AvatarCredentialsIndex
+from app.infrastructure.session_store import build_session_store
+from app.infrastructure.training_snippets import TrainingSnippetStore
+from app.infrastructure.usage_rollup import AvatarUsageRollup
+from app.infrastructure.write_behind import SupabaseWriteQueue, PendingWrite
+from app.domain.ports import ISessionStore
+from app.shared.ttl_cache import MISSING, TTLCache
+from app.shared.shared_version import SharedVersion
 
 @dataclass
 class Container:
@@ -17,43 +27,153 @@ class Container:
     session: LiveSession = field(default_factory=LiveSession)
     budget: BudgetLedger = field(default_factory=BudgetLedger)
 
-    # suporte multi-cliente básico (isolamento simples por client_id)
-    sessions: dict[str, LiveSession] = field(default_factory=dict)
-    budgets: dict[str, BudgetLedger] = field(default_factory=dict)
+    # sessão/orçamento por client_id (memory | sqlite | redis, ver SESSION_STORE)
+    session_store: ISessionStore = None
 
+    http: HttpClient = None
     heygen: HeygenClient = None
     stt: OpenAIWhisperClient | None = None
     image_gen: GeminiImageClient | None = None
     storage: SupabaseStorage = None
     ctx_repo: ContextRepository = None
+    credentials: AvatarCredentialsIndex = None
+    snippets: TrainingSnippetStore = None
+    # gravações analíticas fora do caminho da requisição (spool SQLite + flush em background)
+    writes: SupabaseWriteQueue = None
+    # uso por avatar para /credits, atualizado quando início/fim de sessão chegam ao Supabase
+    usage: AvatarUsageRollup = None
+
+    # auth: JWT verificado localmente e mapeamento user_id -> client_id (inclui negativos)
+    jwt_verifier: SupabaseJwtVerifier = None
+    user_clients: TTLCache = None
+    avatar_clients: TTLCache = None
+    # /credits: remaining_quota da HeyGen por hash da api_key
+    quota_cache: TTLCache = None
+    # quiz: (contador, experience_id) -> total exato, TTL curto + incremento otimista
+    quiz_counts: TTLCache = None
+    # quiz público: slug -> experiência e experience_id -> variáveis (versão compartilhada entre workers)
+    quiz_experiences: TTLCache = None
+    quiz_variables: TTLCache = None
+    quiz_config_version: SharedVersion = None
 
     def __post_init__(self):
-        self.heygen = HeygenClient(self.settings)
+        # um pool keep-alive por upstream, compartilhado por todos os adapters do processo
+        self.http = shared_http(self.settings)
+        self.session_store = build_session_store(self.settings)
+        self.heygen = HeygenClient(self.settings, self.http)
         
         # stt é opcional; só cria quando chave existir
         if self.settings.openai_api_key:
-            self.stt = OpenAIWhisperClient(self.settings)
+            self.stt = OpenAIWhisperClient(self.settings, self.http)
         # image generation is optional; only when Gemini key exists
         if self.settings.gemini_api_key:
-            self.image_gen = GeminiImageClient(self.settings)
-        self.storage = SupabaseStorage(self.settings)
+            self.image_gen = GeminiImageClient(self.settings, self.http)
+        self.storage = SupabaseStorage(self.settings, self.http)
         self.ctx_repo = ContextRepository(self.settings)
+        self.credentials = AvatarCredentialsIndex(self.settings, self.http)
+        self.snippets = TrainingSnippetStore(
+            self.settings.training_snippets_path,
+            self.settings.training_snippets_revalidate_seconds,
+        )
+        self.writes = SupabaseWriteQueue(
+            self.settings,
+            self.settings.write_behind_spool_path,
+            self.http,
+            enabled=self.settings.write_behind_enabled,
+            flush_interval_seconds=self.settings.write_behind_flush_interval_seconds,
+            batch_size=self.settings.write_behind_batch_size,
+            max_attempts=self.settings.write_behind_max_attempts,
+        )
+        self.writes.on_flushed(self._on_writes_flushed)
+        self.usage = AvatarUsageRollup(
+            self.settings,
+            self.settings.usage_rollup_path,
+            self.settings.usage_rollup_reconcile_seconds,
+        )
+        self.writes.on_flushed(self.usage.on_writes_flushed)
+        self.jwt_verifier = SupabaseJwtVerifier(self.settings, self.http)
+        self.user_clients = TTLCache(
+            maxsize=self.settings.auth_cache_max_entries,
+            ttl_seconds=self.settings.auth_cache_ttl_seconds,
+            negative_ttl_seconds=self.settings.auth_cache_negative_ttl_seconds,
+            name="user_clients",
+        )
+        self.avatar_clients = TTLCache(
+            maxsize=self.settings.auth_cache_max_entries,
+            ttl_seconds=self.settings.auth_cache_ttl_seconds,
+            negative_ttl_seconds=self.settings.auth_cache_negative_ttl_seconds,
+            name="avatar_clients",
+        )
+        self.quota_cache = TTLCache(
+            maxsize=1024,
+            ttl_seconds=self.settings.heygen_quota_cache_ttl_seconds,
+            stale_ttl_seconds=self.settings.heygen_quota_cache_stale_seconds,
+            name="heygen_quota",
+        )
+        self.quiz_counts = TTLCache(
+            maxsize=4096,
+            ttl_seconds=self.settings.quiz_count_cache_ttl_seconds,
+            name="quiz_counts",
+        )
+        self.quiz_experiences = TTLCache(
+            maxsize=1024,
+            ttl_seconds=self.settings.quiz_config_cache_ttl_seconds,
+            negative_ttl_seconds=min(5.0, self.settings.quiz_config_cache_ttl_seconds),
+            stale_ttl_seconds=self.settings.quiz_config_cache_stale_seconds,
+            name="quiz_experiences",
+        )
+        self.quiz_variables = TTLCache(
+            maxsize=1024,
+            ttl_seconds=self.settings.quiz_config_cache_ttl_seconds,
+            stale_ttl_seconds=self.settings.quiz_config_cache_stale_seconds,
+            name="quiz_variables",
+        )
+        self.quiz_config_version = SharedVersion(self.settings.quiz_config_version_path)
 
         if self.settings.avatar_provider == "liveavatar":
-            self.heygen = LiveAvatarClient(self.settings)
+            self.heygen = LiveAvatarClient(self.settings, self.http)
         elif self.settings.use_livekit:
-            self.heygen = HeygenLivekitClient(self.settings)
+            self.heygen = HeygenLivekitClient(self.settings, self.http)
         else:
-            self.heygen = HeygenClient(self.settings)
+            self.heygen = HeygenClient(self.settings, self.http)
 
       
 
+    def _on_writes_flushed(self, ops: list[PendingWrite]) -> None:
+        # context_id só muda no Supabase quando o PATCH enfileirado chega: até lá o índice serve o valor local
+        for op in ops:
+            if op.table == "avatar_credentials":
+                avatar_id = (op.params.get("avatar_id") or "").removeprefix("eq.")
+                if avatar_id:
+                    self.credentials.context_flushed(avatar_id, op.meta.get("context_id", MISSING))
+
+    def caches(self) -> dict[str, TTLCache]:
+        """Every in-process TTLCache, by name (métricas e invalidação explícita)."""
+        return {
+            "avatar_clients": self.avatar_clients,
+            "user_clients": self.user_clients,
+            "heygen_quota": self.quota_cache,
+            "quiz_counts": self.quiz_counts,
+            "quiz_experiences": self.quiz_experiences,
+            "quiz_variables": self.quiz_variables,
+            **self.ctx_repo.caches(),
+        }
+
+    # com backends compartilhados (sqlite/redis) get_* devolve uma cópia: quem altera grava de volta
     def get_session(self, client_id: str) -> LiveSession:
-        if client_id not in self.sessions:
-            self.sessions[client_id] = LiveSession()
-        return self.sessions[client_id]
+        return self.session_store.get_session(client_id)
+
+    def set_session(self, client_id: str, session: LiveSession) -> None:
+        self.session_store.set_session(client_id, session)
+
+    def update_session(self, client_id: str, fn) -> LiveSession:
+        return self.session_store.update_session(client_id, fn)
 
     def get_budget(self, client_id: str) -> BudgetLedger:
-        if client_id not in self.budgets:
-            self.budgets[client_id] = BudgetLedger()
-        return self.budgets[client_id]
+        return self.session_store.get_budget(client_id)
+
+    def set_budget(self, client_id: str, budget: BudgetLedger) -> None:
+        self.session_store.set_budget(client_id, budget)
+
+    def update_budget(self, client_id: str, fn) -> BudgetLedger:
+        return self.session_store.update_budget(client_id, fn)
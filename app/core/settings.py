@@ -2,7 +2,7 @@
 
 import os
 from urllib.parse import urlparse
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import List
 
 
@@ -41,6 +41,80 @@ class Settings:
 
     # provider (heygen|liveavatar)
     use_livekit: bool
+
+    # HTTP de saída (app/infrastructure/http_client.py)
+    http_pool_connections: int = 10
+    http_pool_maxsize: int = 20
+    http_pool_block: bool = False
+    http_connect_timeout: float = 5.0
+    http_timeouts: dict[str, float] = field(default_factory=dict)
+    http_pool_sizes: dict[str, int] = field(default_factory=dict)
+
+    # auth: verificação local do JWT + cache user_id -> client_id
+    supabase_jwt_secret: str | None = None
+    auth_cache_ttl_seconds: float = 300.0
+    auth_cache_negative_ttl_seconds: float = 30.0
+    auth_cache_max_entries: int = 4096
+
+    # índice em memória de avatar_credentials (refresh em background)
+    avatar_credentials_ttl_seconds: float = 60.0
+
+    # sessões/orçamento por cliente (memory | sqlite | redis)
+    session_store: str = "memory"
+    session_store_path: str = ""
+    session_store_url: str = ""
+    session_store_ttl_seconds: int = 21600
+
+    # caches do ContextRepository (TTL por namespace: avatar, contexts, client_owner, avatar_owner, avatar_client)
+    context_cache_ttl_seconds: float = 600.0
+    context_cache_ttls: dict[str, float] = field(default_factory=dict)
+    context_cache_max_entries: int = 4096
+    context_cache_stale_seconds: float = 300.0
+
+    # snippets extraídos dos training docs (SQLite local, revalidados por ETag/hash)
+    training_snippets_path: str = ""
+    training_snippets_revalidate_seconds: float = 86400.0
+    training_docs_deadline_seconds: float = 4.0
+    training_warmup_wait_seconds: float = 1.5
+
+    # /stt/stream: intervalo mínimo entre transcrições parciais e teto de áudio por turno
+    stt_stream_partial_interval_seconds: float = 0.8
+    stt_stream_max_bytes: int = 6 * 1024 * 1024
+    stt_stream_segment_bytes: int = 128 * 1024
+
+    # /credits: prazo total do fan-out na HeyGen e cache da quota por api_key (stale-while-revalidate)
+    credits_deadline_seconds: float = 8.0
+    heygen_quota_cache_ttl_seconds: float = 60.0
+    heygen_quota_cache_stale_seconds: float = 300.0
+
+    # contagens do quiz (leads, gerações concluídas) por experiência
+    quiz_count_cache_ttl_seconds: float = 5.0
+    # experiência por slug e variáveis por experiência (endpoints públicos), invalidadas via versão em arquivo
+    quiz_config_cache_ttl_seconds: float = 30.0
+    quiz_config_cache_stale_seconds: float = 120.0
+    quiz_config_version_path: str = ""
+    # foto de referência enviada ao Gemini: orientação EXIF, lado maior limitado e JPEG recomprimido
+    reference_photo_preprocess: bool = True
+    reference_photo_max_side: int = 1024
+    reference_photo_jpeg_quality: int = 85
+    # limite de requisições ao Gemini por api_key, compartilhado no processo (token bucket AIMD)
+    gemini_rate_initial_rps: float = 1.0
+    gemini_rate_min_rps: float = 0.05
+    gemini_rate_max_rps: float = 10.0
+    gemini_rate_burst: float = 3.0
+    gemini_rate_latency_target_ms: float = 60000.0
+    gemini_rate_max_wait_seconds: float = 120.0
+
+    # rollup local de uso por avatar (segundos/sessões), reconciliado com avatar_sessions
+    usage_rollup_path: str = ""
+    usage_rollup_reconcile_seconds: float = 3600.0
+
+    # gravações analíticas no Supabase (avatar_sessions etc.) via fila write-behind com spool SQLite
+    write_behind_enabled: bool = True
+    write_behind_spool_path: str = ""
+    write_behind_flush_interval_seconds: float = 0.5
+    write_behind_batch_size: int = 100
+    write_behind_max_attempts: int = 8
   
   
 
@@ -56,6 +130,19 @@ class Settings:
         def _split_env_list(val: str | None) -> list[str]:
             return [v.strip() for v in (val or "").split(",") if v.strip()]
 
+        def _split_env_map(val: str | None, cast) -> dict:
+            # "supabase=20,gemini=90" -> {"supabase": 20.0, "gemini": 90.0}
+            out = {}
+            for item in _split_env_list(val):
+                key, sep, raw = item.partition("=")
+                if not sep:
+                    continue
+                try:
+                    out[key.strip().lower()] = cast(raw.strip())
+                except ValueError:
+                    continue
+            return out
+
         app_debug_env = os.getenv("APP_DEBUG", "false").lower() == "true"
         
         use_livekit = os.getenv("HEYGEN_USE_LIVEKIT", "true").lower() == "true"
@@ -124,6 +211,66 @@ class Settings:
 
             # 🔥 AQUI ESTAVA O BUG
             use_livekit=use_livekit,
+
+            http_pool_connections=int(os.getenv("HTTP_POOL_CONNECTIONS", "10")),
+            http_pool_maxsize=int(os.getenv("HTTP_POOL_MAXSIZE", "20")),
+            http_pool_block=os.getenv("HTTP_POOL_BLOCK", "false").lower() == "true",
+            http_connect_timeout=float(os.getenv("HTTP_CONNECT_TIMEOUT", "5")),
+            http_timeouts=_split_env_map(os.getenv("HTTP_TIMEOUTS"), float),
+            http_pool_sizes=_split_env_map(os.getenv("HTTP_POOL_SIZES"), int),
+
+            supabase_jwt_secret=os.getenv("SUPABASE_JWT_SECRET") or None,
+            auth_cache_ttl_seconds=float(os.getenv("AUTH_CACHE_TTL_SECONDS", "300")),
+            auth_cache_negative_ttl_seconds=float(os.getenv("AUTH_CACHE_NEGATIVE_TTL_SECONDS", "30")),
+            auth_cache_max_entries=int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "4096")),
+
+            avatar_credentials_ttl_seconds=float(os.getenv("AVATAR_CREDENTIALS_TTL_SECONDS", "60")),
+
+            session_store=(os.getenv("SESSION_STORE", "memory") or "memory").strip().lower(),
+            session_store_path=os.getenv("SESSION_STORE_PATH") or os.path.join(root, "data", "sessions.sqlite3"),
+            session_store_url=os.getenv("SESSION_STORE_URL") or os.getenv("REDIS_URL") or "",
+            session_store_ttl_seconds=int(os.getenv("SESSION_STORE_TTL_SECONDS", "21600")),
+
+            context_cache_ttl_seconds=float(os.getenv("CONTEXT_CACHE_TTL_SECONDS", "600")),
+            context_cache_ttls=_split_env_map(os.getenv("CONTEXT_CACHE_TTLS"), float),
+            context_cache_max_entries=int(os.getenv("CONTEXT_CACHE_MAX_ENTRIES", "4096")),
+            context_cache_stale_seconds=float(os.getenv("CONTEXT_CACHE_STALE_SECONDS", "300")),
+
+            training_snippets_path=os.getenv("TRAINING_SNIPPETS_PATH") or os.path.join(root, "data", "training_snippets.sqlite3"),
+            training_snippets_revalidate_seconds=float(os.getenv("TRAINING_SNIPPETS_REVALIDATE_SECONDS", "86400")),
+            training_docs_deadline_seconds=float(os.getenv("TRAINING_DOCS_DEADLINE_SECONDS", "4")),
+            training_warmup_wait_seconds=float(os.getenv("TRAINING_WARMUP_WAIT_SECONDS", "1.5")),
+
+            stt_stream_partial_interval_seconds=float(os.getenv("STT_STREAM_PARTIAL_INTERVAL_SECONDS", "0.8")),
+            stt_stream_max_bytes=int(os.getenv("STT_STREAM_MAX_BYTES", str(6 * 1024 * 1024))),
+            stt_stream_segment_bytes=int(os.getenv("STT_STREAM_SEGMENT_BYTES", str(128 * 1024))),
+
+            credits_deadline_seconds=float(os.getenv("CREDITS_DEADLINE_SECONDS", "8")),
+            heygen_quota_cache_ttl_seconds=float(os.getenv("HEYGEN_QUOTA_CACHE_TTL_SECONDS", "60")),
+            heygen_quota_cache_stale_seconds=float(os.getenv("HEYGEN_QUOTA_CACHE_STALE_SECONDS", "300")),
+
+            quiz_count_cache_ttl_seconds=float(os.getenv("QUIZ_COUNT_CACHE_TTL_SECONDS", "5")),
+            quiz_config_cache_ttl_seconds=float(os.getenv("QUIZ_CONFIG_CACHE_TTL_SECONDS", "30")),
+            quiz_config_cache_stale_seconds=float(os.getenv("QUIZ_CONFIG_CACHE_STALE_SECONDS", "120")),
+            quiz_config_version_path=os.getenv("QUIZ_CONFIG_VERSION_PATH") or os.path.join(root, "data", "quiz_config.version"),
+            reference_photo_preprocess=os.getenv("REFERENCE_PHOTO_PREPROCESS", "true").lower() == "true",
+            reference_photo_max_side=int(os.getenv("REFERENCE_PHOTO_MAX_SIDE", "1024")),
+            reference_photo_jpeg_quality=int(os.getenv("REFERENCE_PHOTO_JPEG_QUALITY", "85")),
+            gemini_rate_initial_rps=float(os.getenv("GEMINI_RATE_INITIAL_RPS", "1")),
+            gemini_rate_min_rps=float(os.getenv("GEMINI_RATE_MIN_RPS", "0.05")),
+            gemini_rate_max_rps=float(os.getenv("GEMINI_RATE_MAX_RPS", "10")),
+            gemini_rate_burst=float(os.getenv("GEMINI_RATE_BURST", "3")),
+            gemini_rate_latency_target_ms=float(os.getenv("GEMINI_RATE_LATENCY_TARGET_MS", "60000")),
+            gemini_rate_max_wait_seconds=float(os.getenv("GEMINI_RATE_MAX_WAIT_SECONDS", "120")),
+
+            usage_rollup_path=os.getenv("USAGE_ROLLUP_PATH") or os.path.join(root, "data", "usage_rollup.sqlite3"),
+            usage_rollup_reconcile_seconds=float(os.getenv("USAGE_ROLLUP_RECONCILE_SECONDS", "3600")),
+
+            write_behind_enabled=os.getenv("WRITE_BEHIND_ENABLED", "true").lower() == "true",
+            write_behind_spool_path=os.getenv("WRITE_BEHIND_SPOOL_PATH") or os.path.join(root, "data", "write_spool.sqlite3"),
+            write_behind_flush_interval_seconds=float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL_SECONDS", "0.5")),
+            write_behind_batch_size=int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "100")),
+            write_behind_max_attempts=int(os.getenv("WRITE_BEHIND_MAX_ATTEMPTS", "8")),
             
 
            
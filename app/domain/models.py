@@ -19,6 +19,7 @@ class LiveSession:
     training_contexts: List["ContextItem"] = field(default_factory=list)
     training_docs: List["TrainingDoc"] = field(default_factory=list)
     training_summary: str = ""
+    training_ready: bool = False  # warm-up de treinamento concluído (mesmo que vazio)
 
 @dataclass
 class BudgetLedger:
@@ -1,7 +1,7 @@
 """Port interfaces for external service adapters."""
 
-from typing import List, Optional
-from .models import ContextItem
+from typing import Callable, List, Optional
+from .models import BudgetLedger, ContextItem, LiveSession
 
 class IHeygenClient:
     def create_token(self) -> str: ...
@@ -19,8 +19,17 @@ class IHeygenClient:
     def task_chat(self, session_id: str, text: str) -> dict: ...
     def interrupt(self, session_id: str) -> None: ...
 
+class ISTTStream:
+    def feed(self, chunk: bytes) -> None: ...
+    def partial(self) -> str:
+        """Best transcript of the audio received so far (may lag behind feed)."""
+    def finish(self) -> str:
+        """No more audio; returns the final transcript."""
+    def close(self) -> None: ...
+
 class ISTTClient:
     def transcribe(self, filename: str, stream, mimetype: str) -> str: ...
+    def open_stream(self, filename: str, mimetype: str) -> ISTTStream: ...
 
 class IImageGenerationClient:
     def generate_from_reference(self, prompt: str, image_bytes: bytes, mime_type: str) -> dict: ...
@@ -34,3 +43,13 @@ class IContextRepository:
 class IStorage:
     def upsert(self, bucket: str, path: str, content_type: str, data: bytes) -> None: ...
     def public_url(self, bucket: str, path: str) -> str: ...
+
+class ISessionStore:
+    def get_session(self, client_id: str) -> LiveSession: ...
+    def set_session(self, client_id: str, session: LiveSession) -> None: ...
+    def update_session(self, client_id: str, fn: Callable[[LiveSession], None]) -> LiveSession:
+        """Atomic read-modify-write; ``fn`` mutates the session in place."""
+    def get_budget(self, client_id: str) -> BudgetLedger: ...
+    def set_budget(self, client_id: str, budget: BudgetLedger) -> None: ...
+    def update_budget(self, client_id: str, fn: Callable[[BudgetLedger], None]) -> BudgetLedger:
+        """Atomic read-modify-write; ``fn`` mutates the ledger in place."""
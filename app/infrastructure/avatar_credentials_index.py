@@ -0,0 +1,291 @@
+"""In-memory index of decoded avatar credentials (Supabase avatar_credentials)."""
+
+from __future__ import annotations
+
+import base64
+import re
+import threading
+import time
+
+from ..core.settings import Settings
+from ..shared.setup_logger import LOGGER
+from ..shared.ttl_cache import MISSING, TTLCache
+from .http_client import HttpClient, shared_http
+
+logger = LOGGER.get_logger(__name__)
+
+_SELECT = "api_key,avatar_id,avatar_external_id,voice_id,context_id"
+_UNSAFE_ID_RE = re.compile(r'[",()\\]')
+_UUID_RE = re.compile(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$")
+
+
+def maybe_decode_api_key(val: str | None) -> str | None:
+    if not val:
+        return val
+    v = val.strip()
+    # se parecer base64, tenta decodificar
+    try:
+        if any(ch in v for ch in ("=", "/")) or v.isascii():
+            decoded = base64.b64decode(v).decode()
+            # se decodificou para algo plausível (tem hífen típico da HeyGen), usa
+            if decoded and any(c in decoded for c in "-_"):
+                return decoded
+    except Exception:
+        pass
+    return v
+
+
+def maybe_decode_value(val: str | None) -> str | None:
+    if not val:
+        return val
+    v = val.strip()
+    try:
+        decoded = base64.b64decode(v).decode()
+        if decoded:
+            return decoded
+    except Exception:
+        pass
+    return v
+
+
+def decode_credentials_row(row: dict) -> dict | None:
+    api_key = maybe_decode_api_key(row.get("api_key"))
+    avatar_external_id = maybe_decode_value(row.get("avatar_external_id"))
+    if not api_key or not avatar_external_id:
+        return None
+    return {
+        "api_key": api_key,
+        "avatar_id": row.get("avatar_id"),
+        "avatar_external_id": avatar_external_id,
+        "voice_id": maybe_decode_value(row.get("voice_id")),
+        "context_id": maybe_decode_value(row.get("context_id")),
+    }
+
+
+class AvatarCredentialsIndex:
+    """Decoded credential rows indexed by ``avatar_id`` and ``avatar_external_id``.
+
+    The table is loaded once and then refreshed in a background thread when the
+    TTL expires (lookups keep serving the previous snapshot meanwhile). Ids that
+    are not in the snapshot, or were invalidated after a context change, are
+    fetched individually, with misses remembered for a short time.
+    """
+
+    def __init__(self, settings: Settings, http: HttpClient | None = None):
+        self._s = settings
+        self._http = http or shared_http(settings)
+        self._ttl = float(settings.avatar_credentials_ttl_seconds)
+        self._lock = threading.Lock()
+        self._by_id: dict[str, dict] = {}
+        self._by_external: dict[str, dict] = {}
+        self._rows: list[dict] = []
+        self._loaded_at: float | None = None
+        self._refreshing = False
+        # chave -> instante da invalidação (descarta dados de um refresh iniciado antes)
+        self._dirty: dict[str, float] = {}
+        self._misses = TTLCache(maxsize=1024, ttl_seconds=30.0)
+        # context_id gravado localmente e ainda não confirmado no Supabase (write-behind)
+        self._pending_context: dict[str, str | None] = {}
+
+    # ---- leitura ----
+    def get(self, avatar_id: str | None) -> dict | None:
+        if not avatar_id:
+            return None
+        self._ensure_fresh()
+        with self._lock:
+            dirty = avatar_id in self._dirty
+            row = None if dirty else (self._by_id.get(avatar_id) or self._by_external.get(avatar_id))
+        if row is not None:
+            return row
+        if not dirty and self._misses.get(avatar_id) is not MISSING:
+            return None
+        return self._fetch_one(avatar_id)
+
+    def rows(self, avatar_ids: list | None = None) -> list[dict]:
+        self._ensure_fresh()
+        if not avatar_ids:
+            with self._lock:
+                return list(self._rows)
+        out = []
+        for avatar_id in avatar_ids:
+            row = self.get(avatar_id)
+            if row is not None and row.get("avatar_id") == avatar_id:
+                out.append(row)
+        return out
+
+    # ---- invalidação ----
+    def invalidate(self, avatar_id: str | None) -> None:
+        if not avatar_id:
+            return
+        now = time.monotonic()
+        with self._lock:
+            row = self._by_id.get(avatar_id) or self._by_external.get(avatar_id)
+            keys = {avatar_id}
+            if row:
+                keys.update(k for k in (row.get("avatar_id"), row.get("avatar_external_id")) if k)
+                # tira a linha antiga dos dois índices: nenhuma chave pode servi-la de novo
+                self._rows = [r for r in self._rows if r is not row]
+                for key in keys:
+                    if self._by_id.get(key) is row:
+                        del self._by_id[key]
+                    if self._by_external.get(key) is row:
+                        del self._by_external[key]
+            for key in keys:
+                self._dirty[key] = now
+        for key in keys:
+            self._misses.invalidate(key)
+
+    def set_context_id(self, avatar_id: str | None, context_id: str | None) -> None:
+        """Serves ``context_id`` for ``avatar_id`` until its write is flushed.
+
+        The PATCH to Supabase is queued; reloading the row before it lands
+        would bring back the previous context_id (a null one creates another
+        context, a stale one keeps serving an outdated backstory). ``None``
+        records a reset, e.g. after a training doc changed.
+        """
+        if not avatar_id:
+            return
+        with self._lock:
+            self._pending_context[avatar_id] = context_id
+            row = self._by_id.get(avatar_id) or self._by_external.get(avatar_id)
+            if row is not None:
+                self._upsert_locked({**row, "context_id": context_id})
+
+    def context_flushed(self, avatar_id: str | None, context_id=MISSING) -> None:
+        """The queued write of ``context_id`` reached Supabase: drop the override and reload.
+
+        A flushed value other than the pending one is an older write still
+        ahead in the queue; the override stays until the latest one lands.
+        """
+        if not avatar_id:
+            return
+        with self._lock:
+            pending = self._pending_context.get(avatar_id, MISSING)
+            if context_id is not MISSING and pending is not MISSING and pending != context_id:
+                return
+            self._pending_context.pop(avatar_id, None)
+        self.invalidate(avatar_id)
+
+    def _with_pending_locked(self, row: dict) -> dict:
+        avatar_id = row.get("avatar_id") or ""
+        if avatar_id not in self._pending_context:
+            return row
+        return {**row, "context_id": self._pending_context[avatar_id]}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._loaded_at = None
+            self._dirty.clear()
+        self._misses.clear()
+
+    # ---- carga ----
+    def _ensure_fresh(self) -> None:
+        with self._lock:
+            loaded_at = self._loaded_at
+            if loaded_at is not None and time.monotonic() - loaded_at < self._ttl:
+                return
+            start_background = loaded_at is not None and not self._refreshing
+            if start_background:
+                self._refreshing = True
+        if loaded_at is None:
+            # primeira carga é síncrona (não há snapshot para servir)
+            self._refresh()
+        elif start_background:
+            threading.Thread(target=self._refresh, name="avatar-credentials-refresh", daemon=True).start()
+
+    def _refresh(self) -> None:
+        started = time.monotonic()
+        try:
+            raw = self._request({})
+        except Exception as e:
+            logger.warning("avatar_credentials refresh failed: %s", str(e)[:200])
+            raw = None
+        with self._lock:
+            self._refreshing = False
+            if raw is None:
+                # mantém o snapshot anterior; tenta de novo só depois de outro TTL
+                self._loaded_at = time.monotonic() if self._loaded_at is not None else None
+                return
+            rows, by_id, by_external = [], {}, {}
+            for item in raw:
+                row = decode_credentials_row(item)
+                if row is None:
+                    continue
+                row = self._with_pending_locked(row)
+                rows.append(row)
+                if row.get("avatar_id"):
+                    by_id.setdefault(row["avatar_id"], row)
+                by_external.setdefault(row["avatar_external_id"], row)
+            self._rows, self._by_id, self._by_external = rows, by_id, by_external
+            self._loaded_at = time.monotonic()
+            # invalidações anteriores ao início deste refresh já estão refletidas
+            self._dirty = {k: t for k, t in self._dirty.items() if t >= started}
+        self._misses.clear()
+
+    def _fetch_one(self, avatar_id: str) -> dict | None:
+        if _UNSAFE_ID_RE.search(avatar_id):
+            # aspas/vírgulas/parênteses mudariam o filtro or=(...) do PostgREST
+            return None
+        encoded = base64.b64encode(avatar_id.encode()).decode()
+        filters = [f'avatar_external_id.eq."{avatar_id}"', f'avatar_external_id.eq."{encoded}"']
+        if _UUID_RE.match(avatar_id):
+            # external_id do LiveAvatar também é UUID
+            filters.insert(0, f"avatar_id.eq.{avatar_id}")
+        params = {"or": f"({','.join(filters)})"}
+        started = time.monotonic()
+        try:
+            raw = self._request({**params, "limit": "2"})
+        except Exception as e:
+            logger.warning("avatar_credentials fetch failed: %s", str(e)[:200])
+            return None
+        # só aceita a linha cujo id bate exatamente com o pedido
+        row = next(
+            (
+                r
+                for r in (decode_credentials_row(item) for item in raw)
+                if r is not None and avatar_id in (r.get("avatar_id"), r.get("avatar_external_id"))
+            ),
+            None,
+        )
+        with self._lock:
+            if row is not None:
+                row = self._with_pending_locked(row)
+            invalidated_at = self._dirty.get(avatar_id)
+            if invalidated_at is not None and invalidated_at >= started:
+                # invalidado durante a consulta: responde, mas não guarda
+                return row
+            self._dirty.pop(avatar_id, None)
+            if row is not None:
+                self._upsert_locked(row)
+        if row is None:
+            self._misses.set(avatar_id, None)
+        return row
+
+    def _upsert_locked(self, row: dict) -> None:
+        old = self._by_id.get(row.get("avatar_id") or "") or self._by_external.get(row["avatar_external_id"])
+        if old is not None:
+            self._rows = [r for r in self._rows if r is not old]
+            for key in (old.get("avatar_id"), old.get("avatar_external_id")):
+                self._dirty.pop(key, None)
+                if self._by_id.get(key) is old:
+                    del self._by_id[key]
+                if self._by_external.get(key) is old:
+                    del self._by_external[key]
+        for key in (row.get("avatar_id"), row.get("avatar_external_id")):
+            self._dirty.pop(key, None)
+        self._rows.append(row)
+        if row.get("avatar_id"):
+            self._by_id[row["avatar_id"]] = row
+        self._by_external[row["avatar_external_id"]] = row
+
+    def _request(self, params: dict) -> list:
+        key = self._s.supabase_service_role
+        r = self._http.get(
+            self._s.supabase_url.rstrip("/") + "/rest/v1/avatar_credentials",
+            params={"select": _SELECT, **params},
+            headers={"apikey": key, "Authorization": f"Bearer {key}"},
+            timeout=6,
+        )
+        if not r.ok:
+            raise RuntimeError(f"supabase_avatar_credentials_{r.status_code}: {r.text[:120]}")
+        return r.json() or []
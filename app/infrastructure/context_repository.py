@@ -1,35 +1,45 @@
 """Repository for context triggers and training documents."""
 
-from typing import Optional, List, Dict, Tuple
-import time
+from typing import Optional, List, Dict
 from app.core.settings import Settings
 from app.domain.models import ContextItem, TrainingDoc
 from app.domain.ports import IContextRepository
 from app.infrastructure.supabase_rest import get_json, insert_json
+from app.shared.ttl_cache import TTLCache
 
 class ContextRepository(IContextRepository):
     def __init__(self, settings: Settings):
         self._s = settings
-        # Simple in-memory TTL caches to reduce RAG latency.
-        self._avatar_cache: Dict[str, Tuple[float, Optional[str]]] = {}
-        self._contexts_cache: Dict[str, Tuple[float, List[ContextItem]]] = {}
-        self._client_owner_cache: Dict[str, Tuple[float, Optional[str]]] = {}
-        self._avatar_owner_cache: Dict[str, Tuple[float, Optional[str]]] = {}
-        self._avatar_client_cache: Dict[str, Tuple[float, Optional[str]]] = {}
-        self._cache_ttl_seconds = 600
-
-    def _cache_get(self, cache: Dict, key: str):
-        item = cache.get(key)
-        if not item:
-            return None
-        ts, value = item
-        if (time.time() - ts) > self._cache_ttl_seconds:
-            cache.pop(key, None)
-            return None
-        return value
+        # Bounded LRU+TTL caches per namespace (TTL por namespace via CONTEXT_CACHE_TTLS).
+        # Negativos (None) não são cacheados: avatar/contexto recém-criado aparece na hora.
+        ttls = settings.context_cache_ttls or {}
+
+        def _cache(name: str) -> TTLCache:
+            return TTLCache(
+                maxsize=settings.context_cache_max_entries,
+                ttl_seconds=ttls.get(name, settings.context_cache_ttl_seconds),
+                negative_ttl_seconds=0,
+                stale_ttl_seconds=settings.context_cache_stale_seconds,
+                name=f"context.{name}",
+            )
 
-    def _cache_set(self, cache: Dict, key: str, value):
-        cache[key] = (time.time(), value)
+        self._avatar_cache = _cache("avatar")
+        self._contexts_cache = _cache("contexts")
+        self._client_owner_cache = _cache("client_owner")
+        self._avatar_owner_cache = _cache("avatar_owner")
+        self._avatar_client_cache = _cache("avatar_client")
+
+    def caches(self) -> Dict[str, TTLCache]:
+        return {
+            c.name: c
+            for c in (
+                self._avatar_cache,
+                self._contexts_cache,
+                self._client_owner_cache,
+                self._avatar_owner_cache,
+                self._avatar_client_cache,
+            )
+        }
 
     def _ensure_avatar_exists(self, uuid_str: str, name: str) -> bool:
         from datetime import datetime, timezone
@@ -52,80 +62,77 @@ class ContextRepository(IContextRepository):
         return False
 
     def resolve_avatar_uuid(self, avatar_identifier: str) -> Optional[str]:
-        import uuid
         if not avatar_identifier: return None
         c = avatar_identifier.strip()
-        cached = self._cache_get(self._avatar_cache, c)
-        if cached is not None:
-            return cached
+        return self._avatar_cache.get_or_load(c, lambda: self._load_avatar_uuid(c))
+
+    def _load_avatar_uuid(self, c: str) -> Optional[str]:
+        import uuid
         try:
             _ = uuid.UUID(c)
-            self._cache_set(self._avatar_cache, c, c)
             return c
         except Exception:
             rows = get_json(self._s, "avatars", "id,name", {"name": f"eq.{c}"}, limit=1)
             if rows:
-                resolved = rows[0]["id"]
-                self._cache_set(self._avatar_cache, c, resolved)
-                return resolved
+                return rows[0]["id"]
             # fallback: gera UUID determinístico a partir do nome e garante a linha em avatars
             gen = str(uuid.uuid5(uuid.NAMESPACE_DNS, c.lower()))
             if self._ensure_avatar_exists(gen, c):
-                self._cache_set(self._avatar_cache, c, gen)
                 return gen
             return None
 
     def resolve_avatar_uuid_for_client(self, avatar_identifier: str, client_id: str) -> Optional[str]:
         """Resolve avatar only when it belongs to the provided client_id."""
         cache_key = f"{avatar_identifier}:{client_id}"
-        cached = self._cache_get(self._avatar_client_cache, cache_key)
-        if cached is not None:
-            return cached
+        return self._avatar_client_cache.get_or_load(
+            cache_key, lambda: self._load_avatar_uuid_for_client(avatar_identifier, client_id)
+        )
 
+    def _load_avatar_uuid_for_client(self, avatar_identifier: str, client_id: str) -> Optional[str]:
         avatar_uuid = self.resolve_avatar_uuid(avatar_identifier)
         if not avatar_uuid or not client_id:
             return None
 
         # Map client_id -> owner user_id
-        owner_user_id = self._cache_get(self._client_owner_cache, client_id)
-        if owner_user_id is None:
-            rows = get_json(
-                self._s,
-                "admin_clients",
-                "user_id",
-                {"id": f"eq.{client_id}"},
-                limit=1,
-            )
-            if not rows:
-                return None
-            owner_user_id = (rows[0].get("user_id") or "").strip()
-            self._cache_set(self._client_owner_cache, client_id, owner_user_id)
+        owner_user_id = self._client_owner_cache.get_or_load(client_id, lambda: self._load_client_owner(client_id))
         if not owner_user_id:
             return None
 
         # Ensure avatar belongs to that user
         owner_key = f"{avatar_uuid}:{owner_user_id}"
-        owner_cached = self._cache_get(self._avatar_owner_cache, owner_key)
-        if owner_cached is None:
-            avatar_rows = get_json(
-                self._s,
-                "avatars",
-                "id",
-                {"id": f"eq.{avatar_uuid}", "user_id": f"eq.{owner_user_id}"},
-                limit=1,
-            )
-            owner_cached = "ok" if avatar_rows else ""
-            self._cache_set(self._avatar_owner_cache, owner_key, owner_cached)
+        owner_cached = self._avatar_owner_cache.get_or_load(
+            owner_key, lambda: self._load_avatar_owner(avatar_uuid, owner_user_id)
+        )
         if not owner_cached:
-            self._cache_set(self._avatar_client_cache, cache_key, None)
             return None
-        self._cache_set(self._avatar_client_cache, cache_key, avatar_uuid)
         return avatar_uuid
 
+    def _load_client_owner(self, client_id: str) -> Optional[str]:
+        rows = get_json(
+            self._s,
+            "admin_clients",
+            "user_id",
+            {"id": f"eq.{client_id}"},
+            limit=1,
+        )
+        if not rows:
+            return None
+        return (rows[0].get("user_id") or "").strip()
+
+    def _load_avatar_owner(self, avatar_uuid: str, owner_user_id: str) -> str:
+        avatar_rows = get_json(
+            self._s,
+            "avatars",
+            "id",
+            {"id": f"eq.{avatar_uuid}", "user_id": f"eq.{owner_user_id}"},
+            limit=1,
+        )
+        return "ok" if avatar_rows else ""
+
     def list_contexts_by_avatar(self, avatar_uuid: str) -> List[ContextItem]:
-        cached = self._cache_get(self._contexts_cache, avatar_uuid)
-        if cached is not None:
-            return cached
+        return self._contexts_cache.get_or_load(avatar_uuid, lambda: self._load_contexts(avatar_uuid))
+
+    def _load_contexts(self, avatar_uuid: str) -> List[ContextItem]:
         rows = get_json(self._s, "contexts", "name,media_url,media_type,keywords_text,description,enabled", {"avatar_id": f"eq.{avatar_uuid}"})
         items: List[ContextItem] = []
         for r in rows:
@@ -141,9 +148,7 @@ class ContextRepository(IContextRepository):
                 media_type=(r.get("media_type") or "image").strip() or "image",
                 keywords_text=kws
             ))
-        filtered = [c for c in items if c.name]
-        self._cache_set(self._contexts_cache, avatar_uuid, filtered)
-        return filtered
+        return [c for c in items if c.name]
 
     def list_training_docs_by_avatar(self, avatar_uuid: str) -> List[TrainingDoc]:
         # select * evita erro quando coluna document_name não existe em alguns ambientes
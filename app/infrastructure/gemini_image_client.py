@@ -3,26 +3,74 @@
 from __future__ import annotations
 
 import base64
-import requests
+import hashlib
+import re
+import time
 
 from app.core.settings import Settings
 from app.domain.ports import IImageGenerationClient
+from app.infrastructure.http_client import HttpClient, shared_http
+from app.infrastructure.rate_limiter import gemini_limiter
+
+# sinais de "vá mais devagar": entram no limitador e a chamada espera na fila local
+_THROTTLE_STATUS = {429, 503}
+_RETRY_DELAY_RE = re.compile(r'"retryDelay"\s*:\s*"(\d+(?:\.\d+)?)s"')
 
 
 class GeminiImageClient(IImageGenerationClient):
-    def __init__(self, settings: Settings):
+    def __init__(self, settings: Settings, http: HttpClient | None = None):
         self._s = settings
+        self._http = http or shared_http(settings)
         if not self._s.gemini_api_key:
             raise RuntimeError("missing_GEMINI_API_KEY")
 
+    def _model(self) -> str:
+        return (self._s.gemini_image_model or "gemini-2.5-flash-image").strip()
+
+    def result_key(self, prompt: str, image_bytes: bytes = b"", scope: str = "") -> str:
+        """Content address of a generation: sha256 over (scope, model, prompt, reference bytes).
+
+        ``scope`` (the experience id) keeps one tenant's outputs from being
+        served to another that happens to send the same photo and prompt.
+        """
+        h = hashlib.sha256()
+        parts = ((scope or "").encode("utf-8"), self._model().encode("utf-8"), (prompt or "").encode("utf-8"), image_bytes or b"")
+        for part in parts:
+            # prefixo de tamanho: ("ab", "c") e ("a", "bc") não colidem
+            h.update(len(part).to_bytes(8, "big"))
+            h.update(part)
+        return h.hexdigest()
+
+    def _post_rate_limited(self, url: str, payload: dict, api_key: str):
+        """POST through the per-key limiter shared by every thread in the process.
+
+        A 429/503 slows the shared rate down and the call waits for its next
+        token instead of failing, up to ``gemini_rate_max_wait_seconds``;
+        after that the last throttled response is returned to the caller.
+        """
+        limiter = gemini_limiter(self._s, api_key)
+        deadline = time.monotonic() + max(0.0, float(self._s.gemini_rate_max_wait_seconds))
+        while True:
+            if not limiter.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                raise RuntimeError("gemini_http_429:local_rate_limit_wait_exceeded")
+            t0 = time.monotonic()
+            r = self._http.post(url, json=payload, headers={"Content-Type": "application/json"}, timeout=90)
+            if r.status_code not in _THROTTLE_STATUS:
+                if r.ok:
+                    limiter.on_success((time.monotonic() - t0) * 1000)
+                return r
+            limiter.on_throttle(_retry_after_seconds(r))
+            if time.monotonic() >= deadline:
+                return r
+
     def _request_generation(self, payload: dict) -> dict:
-        model = (self._s.gemini_image_model or "gemini-2.5-flash-image").strip()
+        model = self._model()
         api_key = (self._s.gemini_api_key or "").strip()
         url = (
             f"https://generativelanguage.googleapis.com/v1beta/models/"
             f"{model}:generateContent?key={api_key}"
         )
-        r = requests.post(url, json=payload, headers={"Content-Type": "application/json"}, timeout=90)
+        r = self._post_rate_limited(url, payload, api_key)
         if not r.ok:
             body = (r.text or "").replace("\n", " ").strip()
             body = body[:400] if body else ""
@@ -120,3 +168,14 @@ class GeminiImageClient(IImageGenerationClient):
             },
         }
         return self._request_generation(payload)
+
+
+def _retry_after_seconds(r) -> float | None:
+    value = (getattr(r, "headers", None) or {}).get("Retry-After")
+    try:
+        if value:
+            return float(value)
+    except (TypeError, ValueError):
+        pass
+    m = _RETRY_DELAY_RE.search(getattr(r, "text", "") or "")
+    return float(m.group(1)) if m else None
@@ -0,0 +1,187 @@
+"""Buffered, bulk-inserting sink for the quiz worker's ``generation_logs`` events."""
+
+from __future__ import annotations
+
+import atexit
+import json
+import threading
+from collections import deque
+
+from ..core.settings import Settings
+from .http_client import HttpClient, shared_http
+
+# eventos que encerram um job: disparam o envio do que estiver no buffer
+TERMINAL_EVENTS = frozenset({"job_done", "job_error"})
+
+
+class GenerationLogSink:
+    """In-memory buffer of generation log rows, sent as array inserts.
+
+    ``emit`` only appends and never blocks a worker slot on Supabase. A
+    background thread sends everything buffered in one POST when a job ends
+    (``job_done``/``job_error``), when ``batch_size`` rows pile up, and every
+    ``flush_interval_seconds``. At most ``max_buffered`` rows are kept: on
+    overflow, or if the send fails, the oldest rows go to stdout instead of
+    growing memory. A 404 (``generation_logs`` missing) switches the sink to
+    stdout for the rest of the process. Logs are best effort throughout.
+    """
+
+    def __init__(
+        self,
+        settings: Settings,
+        http: HttpClient | None = None,
+        flush_interval_seconds: float = 2.0,
+        batch_size: int = 200,
+        max_buffered: int = 5000,
+        max_send_attempts: int = 3,
+    ):
+        self._s = settings
+        self._http = http or shared_http(settings)
+        self._interval = max(0.05, float(flush_interval_seconds))
+        self._batch = max(1, int(batch_size))
+        self._max_buffered = max(self._batch, int(max_buffered))
+        self._max_attempts = max(1, int(max_send_attempts))
+        self._buf: deque[dict] = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._failures = 0
+        self._table_missing = False
+        self._stats = {"emitted": 0, "sent": 0, "requests": 0, "stdout": 0, "overflow": 0}
+
+    # ---- API ----
+    def emit(
+        self,
+        generation_id: str,
+        *,
+        level: str,
+        event: str,
+        message: str,
+        payload: dict | None = None,
+    ) -> None:
+        row = {
+            "generation_id": generation_id,
+            "level": level,
+            "event": event,
+            "message": message,
+            "payload_json": payload or {},
+        }
+        if self._table_missing:
+            self._to_stdout([row])
+            return
+        overflow: list[dict] = []
+        with self._lock:
+            self._buf.append(row)
+            self._stats["emitted"] += 1
+            while len(self._buf) > self._max_buffered:
+                overflow.append(self._buf.popleft())
+            size = len(self._buf)
+        if overflow:
+            self._stats["overflow"] += len(overflow)
+            self._to_stdout(overflow)
+        self._ensure_thread()
+        if event in TERMINAL_EVENTS or size >= self._batch:
+            self._wake.set()
+
+    def buffered(self) -> int:
+        with self._lock:
+            return len(self._buf)
+
+    def stats(self) -> dict:
+        return {**self._stats, "buffered": self.buffered(), "table_missing": self._table_missing}
+
+    def flush(self) -> None:
+        """Sends everything buffered now (caller's thread)."""
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    rows = [self._buf.popleft() for _ in range(min(self._batch, len(self._buf)))]
+                if not rows:
+                    return
+                if not self._send(rows):
+                    return
+
+    def close(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        t = self._thread
+        if t is not None and t.is_alive() and t is not threading.current_thread():
+            t.join(timeout)
+        self.flush()
+        # o que não foi enviado ainda aparece no log do processo
+        with self._lock:
+            rest = list(self._buf)
+            self._buf.clear()
+        if rest:
+            self._to_stdout(rest)
+
+    # ---- interno ----
+    def _ensure_thread(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="generation-log-sink", daemon=True)
+            self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self._interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[WORKER] generation_logs flush failed: {str(e)[:200]}", flush=True)
+
+    def _send(self, rows: list[dict]) -> bool:
+        if self._table_missing:
+            self._to_stdout(rows)
+            return True
+        key = self._s.supabase_service_role
+        headers = {
+            "apikey": key,
+            "Authorization": f"Bearer {key}",
+            "Content-Type": "application/json",
+            "Prefer": "return=minimal",
+        }
+        url = self._s.supabase_url.rstrip("/") + "/rest/v1/generation_logs"
+        status = None
+        try:
+            r = self._http.post(url, headers=headers, json=rows, timeout=10)
+            status = r.status_code
+        except Exception:
+            pass
+        self._stats["requests"] += 1
+        if status is not None and status < 400:
+            self._failures = 0
+            self._stats["sent"] += len(rows)
+            return True
+        if status == 404:
+            # tabela não existe neste ambiente: não insiste mais
+            self._table_missing = True
+            self._to_stdout(rows)
+            return True
+        self._failures += 1
+        if self._failures >= self._max_attempts or (status is not None and status < 500 and status != 429):
+            self._failures = 0
+            self._to_stdout(rows)
+            return True
+        # transitório: volta para a frente do buffer e tenta no próximo ciclo
+        overflow: list[dict] = []
+        with self._lock:
+            self._buf.extendleft(reversed(rows))
+            while len(self._buf) > self._max_buffered:
+                overflow.append(self._buf.pop())
+        if overflow:
+            self._stats["overflow"] += len(overflow)
+            self._to_stdout(overflow)
+        return False
+
+    def _to_stdout(self, rows: list[dict]) -> None:
+        self._stats["stdout"] += len(rows)
+        for row in rows:
+            print(f"[GENLOG] {json.dumps(row, ensure_ascii=False, default=str)}", flush=True)
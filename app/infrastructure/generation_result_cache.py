@@ -0,0 +1,95 @@
+"""Content-addressed index of finished image generations, kept in SQLite."""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+
+
+class GenerationResultIndex:
+    """Maps a generation key to the storage path of an output already produced.
+
+    The key is content-addressed (see ``GeminiImageClient.result_key``), so a
+    resubmission with the same model, prompt and reference bytes finds the
+    earlier output instead of paying for a new upstream call. Only the path
+    is stored; the image itself stays in Supabase Storage. The index keeps at
+    most ``max_entries`` rows, evicting the least recently used, and counts
+    hits/misses for the hit rate.
+    """
+
+    def __init__(self, path: str, max_entries: int = 20000):
+        self._path = path
+        self._max_entries = max(1, int(max_entries))
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stored": 0, "evictions": 0}
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS generation_results ("
+            " key TEXT PRIMARY KEY, output_path TEXT NOT NULL, mime_type TEXT NOT NULL,"
+            " model TEXT NOT NULL DEFAULT '', created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn().execute(
+            "CREATE INDEX IF NOT EXISTS generation_results_last_used ON generation_results (last_used)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        # conexões não atravessam fork: cada processo abre a sua
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self._path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key: str) -> dict | None:
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT output_path, mime_type, model FROM generation_results WHERE key = ?", (key,)
+        ).fetchone()
+        with self._lock:
+            self._stats["hits" if row else "misses"] += 1
+        if not row:
+            return None
+        conn.execute("UPDATE generation_results SET last_used = ? WHERE key = ?", (time.time(), key))
+        return {"output_path": row[0], "mime_type": row[1], "model": row[2]}
+
+    def put(self, key: str, output_path: str, mime_type: str, model: str | None = None) -> None:
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT INTO generation_results (key, output_path, mime_type, model, created_at, last_used)"
+            " VALUES (?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT(key) DO UPDATE SET output_path = excluded.output_path,"
+            " mime_type = excluded.mime_type, model = excluded.model, last_used = excluded.last_used",
+            (key, output_path, mime_type or "image/png", model or "", now, now),
+        )
+        excess = conn.execute("SELECT COUNT(*) FROM generation_results").fetchone()[0] - self._max_entries
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM generation_results WHERE key IN"
+                " (SELECT key FROM generation_results ORDER BY last_used ASC LIMIT ?)",
+                (excess,),
+            )
+        with self._lock:
+            self._stats["stored"] += 1
+            self._stats["evictions"] += max(0, excess)
+
+    def invalidate(self, key: str) -> None:
+        self._conn().execute("DELETE FROM generation_results WHERE key = ?", (key,))
+
+    def stats(self) -> dict:
+        entries = self._conn().execute("SELECT COUNT(*) FROM generation_results").fetchone()[0]
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": entries,
+                "max_entries": self._max_entries,
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+            }
@@ -4,6 +4,7 @@
 from __future__ import annotations
 import requests
 from app.infrastructure.utils import headers_json
+from app.infrastructure.http_client import HttpClient, shared_http
 from app.core.settings import Settings
 from app.domain.ports import IHeygenClient
 
@@ -15,11 +16,12 @@ URL_TOKEN      = "https://api.heygen.com/v1/streaming.create_token"
 URL_KEEPALIVE  = "https://api.heygen.com/v1/streaming.keep_alive"
 
 class HeygenClient(IHeygenClient):
-    def __init__(self, settings: Settings):
+    def __init__(self, settings: Settings, http: HttpClient | None = None):
         self._s = settings
+        self._http = http or shared_http(settings)
 
     def create_token(self) -> str:
-        r = requests.post(URL_TOKEN, headers={"X-Api-Key": self._s.heygen_api_key}, json={}, timeout=30)
+        r = self._http.post(URL_TOKEN, headers={"X-Api-Key": self._s.heygen_api_key}, json={}, timeout=30)
         r.raise_for_status()
         data = r.json().get("data", {})
         token = data.get("token")
@@ -49,18 +51,18 @@ class HeygenClient(IHeygenClient):
         }
         if voice_id:
             body["voice"] = {"voice_id": voice_id}
-        r = requests.post(URL_NEW, json=body, headers=headers_json(self._s.heygen_api_key), timeout=60)
+        r = self._http.post(URL_NEW, json=body, headers=headers_json(self._s.heygen_api_key), timeout=60)
         r.raise_for_status()
         data = r.json().get("data", {})
         return data.get("session_id"), data.get("url"), data.get("access_token")
 
     def start_session(self, session_id: str) -> None:
-        r = requests.post(URL_START, json={"session_id": session_id},
+        r = self._http.post(URL_START, json={"session_id": session_id},
                           headers=headers_json(self._s.heygen_api_key), timeout=60)
         r.raise_for_status()
 
     def task_chat(self, session_id: str, text: str) -> dict:
-        r = requests.post(
+        r = self._http.post(
             URL_TASK,
             json={"session_id": session_id, "task_type": "chat", "task_mode": "sync", "text": text},
             headers=headers_json(self._s.heygen_api_key),
@@ -70,7 +72,7 @@ class HeygenClient(IHeygenClient):
         return r.json()
 
     def interrupt(self, session_id: str) -> None:
-        r = requests.post(URL_INTERRUPT, json={"session_id": session_id},
+        r = self._http.post(URL_INTERRUPT, json={"session_id": session_id},
                           headers=headers_json(self._s.heygen_api_key), timeout=30)
         r.raise_for_status()
 
@@ -80,7 +82,7 @@ class HeygenClient(IHeygenClient):
         # algumas versões aceitam prolongar o idle timeout dinamicamente
         if activity_idle_timeout:
             payload["activity_idle_timeout"] = int(max(30, min(activity_idle_timeout, 3600)))
-        r = requests.post(URL_KEEPALIVE, json=payload, headers=headers_json(self._s.heygen_api_key), timeout=20)
+        r = self._http.post(URL_KEEPALIVE, json=payload, headers=headers_json(self._s.heygen_api_key), timeout=20)
         return r
 
 # util local
@@ -7,6 +7,7 @@ from typing import Tuple
 from app.core.settings import Settings
 from app.domain.ports import IHeygenClient
 from app.infrastructure.utils import headers_json
+from app.infrastructure.http_client import HttpClient, shared_http
 
 
 # === Endpoints NOVOS (Interactive Avatar + LiveKit) ===
@@ -26,12 +27,13 @@ class HeygenLivekitClient(IHeygenClient):
     - Compatível com a interface IHeygenClient atual
     """
 
-    def __init__(self, settings: Settings):
+    def __init__(self, settings: Settings, http: HttpClient | None = None):
         self._s = settings
+        self._http = http or shared_http(settings)
 
     
     def create_token(self) -> str:
-        r = requests.post(
+        r = self._http.post(
             URL_CREATE_TOKEN,
             headers={"X-Api-Key": self._s.heygen_api_key},
             json={},
@@ -79,7 +81,7 @@ class HeygenLivekitClient(IHeygenClient):
         if voice_id:
             payload["voice"] = {"voice_id": voice_id}
 
-        r = requests.post(
+        r = self._http.post(
             URL_NEW_SESSION,
             json=payload,
             headers=headers_json(self._s.heygen_api_key),
@@ -102,7 +104,7 @@ class HeygenLivekitClient(IHeygenClient):
     # START SESSION (obrigatório após new_session)
     # ==========================================================
     def start_session(self, session_id: str) -> None:
-        r = requests.post(
+        r = self._http.post(
             URL_START_SESSION,
             json={"session_id": session_id},
             headers=headers_json(self._s.heygen_api_key),
@@ -114,7 +116,7 @@ class HeygenLivekitClient(IHeygenClient):
     # CHAT / FALA DO AVATAR
     # ==========================================================
     def task_chat(self, session_id: str, text: str) -> dict:
-        r = requests.post(
+        r = self._http.post(
             URL_TASK,
             json={
                 "session_id": session_id,
@@ -132,7 +134,7 @@ class HeygenLivekitClient(IHeygenClient):
     # INTERRUPT (corta fala atual)
     # ==========================================================
     def interrupt(self, session_id: str) -> None:
-        r = requests.post(
+        r = self._http.post(
             URL_INTERRUPT,
             json={"session_id": session_id},
             headers=headers_json(self._s.heygen_api_key),
@@ -155,7 +157,7 @@ class HeygenLivekitClient(IHeygenClient):
                 max(30, min(activity_idle_timeout, 3600))
             )
 
-        r = requests.post(
+        r = self._http.post(
             URL_KEEPALIVE,
             json=payload,
             headers=headers_json(self._s.heygen_api_key),
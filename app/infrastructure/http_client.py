@@ -0,0 +1,256 @@
+"""Pooled, instrumented HTTP client shared by the outbound adapters."""
+
+from __future__ import annotations
+
+import http.cookiejar
+import os
+import threading
+import time
+from collections import deque
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from ..core.settings import Settings
+
+UPSTREAMS = ("supabase", "heygen", "liveavatar", "openai", "gemini", "default")
+
+_DEFAULT_TIMEOUTS = {
+    "supabase": 20.0,
+    "heygen": 60.0,
+    "liveavatar": 60.0,
+    "openai": 60.0,
+    "gemini": 90.0,
+    "default": 30.0,
+}
+
+_HOST_UPSTREAMS = {
+    "api.heygen.com": "heygen",
+    "api.liveavatar.com": "liveavatar",
+    "api.openai.com": "openai",
+    "generativelanguage.googleapis.com": "gemini",
+}
+
+# Preenchido pelas pools abaixo durante a chamada da thread atual.
+_conn_stats = threading.local()
+
+
+class _TimedPoolMixin:
+    """Measures time spent waiting for a pooled connection and new connections opened."""
+
+    def _get_conn(self, timeout=None):
+        t0 = time.perf_counter()
+        try:
+            return super()._get_conn(timeout=timeout)
+        finally:
+            _conn_stats.wait_s = getattr(_conn_stats, "wait_s", 0.0) + (time.perf_counter() - t0)
+
+    def _new_conn(self):
+        _conn_stats.new_conns = getattr(_conn_stats, "new_conns", 0) + 1
+        return super()._new_conn()
+
+
+class _TimedHTTPConnectionPool(_TimedPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class _TimedHTTPSConnectionPool(_TimedPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class _InstrumentedAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+class UpstreamMetrics:
+    """Per-upstream counters plus a window of recent latencies for percentiles."""
+
+    def __init__(self, window: int = 512):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.status_5xx = 0
+        self.status_4xx = 0
+        self.new_connections = 0
+        self.latency_ms_sum = 0.0
+        self.latency_ms_max = 0.0
+        self.pool_wait_ms_sum = 0.0
+        self.pool_wait_ms_max = 0.0
+        self._recent = deque(maxlen=window)
+
+    def record(self, latency_ms: float, pool_wait_ms: float, new_conns: int, status: int | None) -> None:
+        with self._lock:
+            self.calls += 1
+            if status is None:
+                self.errors += 1
+            elif status >= 500:
+                self.status_5xx += 1
+            elif status >= 400:
+                self.status_4xx += 1
+            self.new_connections += new_conns
+            self.latency_ms_sum += latency_ms
+            self.latency_ms_max = max(self.latency_ms_max, latency_ms)
+            self.pool_wait_ms_sum += pool_wait_ms
+            self.pool_wait_ms_max = max(self.pool_wait_ms_max, pool_wait_ms)
+            self._recent.append(latency_ms)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            recent = sorted(self._recent)
+            calls = self.calls
+
+            def pct(p: float) -> float:
+                if not recent:
+                    return 0.0
+                return round(recent[min(len(recent) - 1, int(p * (len(recent) - 1)))], 1)
+
+            return {
+                "calls": calls,
+                "errors": self.errors,
+                "status_4xx": self.status_4xx,
+                "status_5xx": self.status_5xx,
+                "new_connections": self.new_connections,
+                "latency_ms_avg": round(self.latency_ms_sum / calls, 1) if calls else 0.0,
+                "latency_ms_p50": pct(0.50),
+                "latency_ms_p95": pct(0.95),
+                "latency_ms_max": round(self.latency_ms_max, 1),
+                "pool_wait_ms_avg": round(self.pool_wait_ms_sum / calls, 3) if calls else 0.0,
+                "pool_wait_ms_max": round(self.pool_wait_ms_max, 3),
+            }
+
+
+class HttpClient:
+    """requests-compatible facade with one keep-alive session per upstream.
+
+    Each upstream (Supabase, HeyGen, LiveAvatar, OpenAI, Gemini, other) gets its own
+    ``requests.Session`` whose adapter keeps one connection pool per host, so TLS
+    handshakes are paid once per connection instead of once per call. Calls without
+    an explicit ``timeout`` use the upstream default.
+    """
+
+    def __init__(self, settings: Settings):
+        self._s = settings
+        self._supabase_host = (urlparse(settings.supabase_url or "").hostname or "").lower()
+        self._timeouts = {**_DEFAULT_TIMEOUTS, **(settings.http_timeouts or {})}
+        self._sessions: dict[str, requests.Session] = {}
+        self._sessions_lock = threading.Lock()
+        self.metrics = {name: UpstreamMetrics() for name in UPSTREAMS}
+
+    def upstream_for(self, url: str) -> str:
+        host = (urlparse(url).hostname or "").lower()
+        if host and (host == self._supabase_host or host.endswith(".supabase.co")):
+            return "supabase"
+        return _HOST_UPSTREAMS.get(host, "default")
+
+    def _session(self, upstream: str) -> requests.Session:
+        sess = self._sessions.get(upstream)
+        if sess is not None:
+            return sess
+        with self._sessions_lock:
+            sess = self._sessions.get(upstream)
+            if sess is None:
+                sizes = self._s.http_pool_sizes or {}
+                adapter = _InstrumentedAdapter(
+                    pool_connections=self._s.http_pool_connections,
+                    pool_maxsize=int(sizes.get(upstream, self._s.http_pool_maxsize)),
+                    pool_block=self._s.http_pool_block,
+                    max_retries=0,
+                )
+                sess = requests.Session()
+                # sessão compartilhada entre clientes/threads: nunca guarda cookie de upstream
+                sess.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+                sess.mount("https://", adapter)
+                sess.mount("http://", adapter)
+                self._sessions[upstream] = sess
+        return sess
+
+    def _timeout(self, upstream: str, timeout):
+        read = self._timeouts.get(upstream, _DEFAULT_TIMEOUTS["default"]) if timeout is None else timeout
+        if isinstance(read, (int, float)):
+            # conexão falha rápido mesmo quando a leitura pode demorar (ex.: Gemini 90s)
+            return (min(float(self._s.http_connect_timeout), float(read)), read)
+        return read
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        upstream = kwargs.pop("upstream", None) or self.upstream_for(url)
+        kwargs["timeout"] = self._timeout(upstream, kwargs.get("timeout"))
+        _conn_stats.wait_s = 0.0
+        _conn_stats.new_conns = 0
+        status = None
+        t0 = time.perf_counter()
+        try:
+            resp = self._session(upstream).request(method, url, **kwargs)
+            status = resp.status_code
+            return resp
+        finally:
+            self.metrics[upstream].record(
+                (time.perf_counter() - t0) * 1000.0,
+                getattr(_conn_stats, "wait_s", 0.0) * 1000.0,
+                getattr(_conn_stats, "new_conns", 0),
+                status,
+            )
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def head(self, url: str, **kwargs) -> requests.Response:
+        return self.request("HEAD", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url: str, **kwargs) -> requests.Response:
+        return self.request("PUT", url, **kwargs)
+
+    def patch(self, url: str, **kwargs) -> requests.Response:
+        return self.request("PATCH", url, **kwargs)
+
+    def delete(self, url: str, **kwargs) -> requests.Response:
+        return self.request("DELETE", url, **kwargs)
+
+    def metrics_snapshot(self) -> dict:
+        return {
+            "pool_connections": self._s.http_pool_connections,
+            "pool_maxsize": self._s.http_pool_maxsize,
+            "timeouts_s": dict(self._timeouts),
+            "upstreams": {name: m.snapshot() for name, m in self.metrics.items() if m.calls},
+        }
+
+    def close(self) -> None:
+        with self._sessions_lock:
+            for sess in self._sessions.values():
+                sess.close()
+            self._sessions.clear()
+
+
+_SHARED: HttpClient | None = None
+_SHARED_LOCK = threading.Lock()
+
+
+def shared_http(settings: Settings | None = None) -> HttpClient:
+    """Process-wide client; the first caller's settings configure the pools."""
+    global _SHARED
+    if _SHARED is not None:
+        return _SHARED
+    with _SHARED_LOCK:
+        if _SHARED is None:
+            _SHARED = HttpClient(settings or Settings.load())
+    return _SHARED
+
+
+def _reset_after_fork() -> None:
+    # pools abertos antes de um fork não podem ser reaproveitados pelo filho
+    global _SHARED, _SHARED_LOCK
+    _SHARED = None
+    _SHARED_LOCK = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,106 @@
+"""Reference-photo preprocessing before it is sent to the image model."""
+
+from __future__ import annotations
+
+import io
+import time
+from dataclasses import dataclass
+
+
+@dataclass
+class PreparedImage:
+    data: bytes
+    mime_type: str
+    original_bytes: int
+    final_bytes: int
+    width: int = 0
+    height: int = 0
+    elapsed_ms: int = 0
+    # "resized" | "reencoded" | "kept_original" | "disabled" | "pillow_missing" | "decode_failed"
+    outcome: str = "kept_original"
+
+    @property
+    def saved_bytes(self) -> int:
+        return self.original_bytes - self.final_bytes
+
+    def report(self) -> dict:
+        # base64 cresce 4/3: é o que de fato trafega no corpo JSON do Gemini
+        return {
+            "outcome": self.outcome,
+            "original_bytes": self.original_bytes,
+            "final_bytes": self.final_bytes,
+            "saved_bytes": self.saved_bytes,
+            "saved_request_bytes": (self.saved_bytes * 4) // 3,
+            "width": self.width,
+            "height": self.height,
+            "elapsed_ms": self.elapsed_ms,
+            "mime_type": self.mime_type,
+        }
+
+
+def prepare_reference_image(
+    data: bytes,
+    mime_type: str,
+    max_side: int = 1024,
+    jpeg_quality: int = 85,
+    enabled: bool = True,
+) -> PreparedImage:
+    """Upright, downsized JPEG of ``data`` for a model request.
+
+    Applies the EXIF orientation (phones store portrait shots rotated plus a
+    tag), shrinks the longest side to ``max_side`` and re-encodes as JPEG.
+    The original bytes are kept when Pillow is missing, the image cannot be
+    decoded, or the re-encoded result would not be smaller and the pixels
+    did not change (already small, upright JPEG).
+    """
+    t0 = time.perf_counter()
+    original = len(data or b"")
+
+    def _keep(outcome: str) -> PreparedImage:
+        return PreparedImage(
+            data, mime_type, original, original, elapsed_ms=int((time.perf_counter() - t0) * 1000), outcome=outcome
+        )
+
+    if not enabled or not data:
+        return _keep("disabled")
+    try:
+        from PIL import Image, ImageOps  # opcional; definido em requirements
+    except Exception:
+        return _keep("pillow_missing")
+
+    try:
+        img = Image.open(io.BytesIO(data))
+        orientation = img.getexif().get(0x0112, 1)
+        # JPEG: decodifica já reduzido (escala DCT) em vez de abrir 12 MP inteiros
+        img.draft("RGB", (max_side, max_side))
+        img = ImageOps.exif_transpose(img)
+        resized = max(img.size) > max_side
+        if resized:
+            img.thumbnail((max_side, max_side), Image.LANCZOS)
+        if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            background.paste(img.convert("RGBA"), mask=img.convert("RGBA").getchannel("A"))
+            img = background
+        elif img.mode != "RGB":
+            img = img.convert("RGB")
+        out = io.BytesIO()
+        img.save(out, format="JPEG", quality=int(jpeg_quality), optimize=True, progressive=True)
+        encoded = out.getvalue()
+    except Exception:
+        return _keep("decode_failed")
+
+    rotated = orientation not in (None, 1)
+    if not resized and not rotated and len(encoded) >= original:
+        prepared = _keep("kept_original")
+        prepared.width, prepared.height = img.size
+        return prepared
+    return PreparedImage(
+        encoded,
+        "image/jpeg",
+        original,
+        len(encoded),
+        width=img.size[0],
+        height=img.size[1],
+        elapsed_ms=int((time.perf_counter() - t0) * 1000),
+        outcome="resized" if resized else "reencoded",
+    )
@@ -5,6 +5,7 @@ from typing import Tuple
 
 from app.core.settings import Settings
 from app.domain.ports import IHeygenClient
+from app.infrastructure.http_client import HttpClient, shared_http
 
 
 URL_SESSION_TOKEN = "https://api.liveavatar.com/v1/sessions/token"
@@ -20,8 +21,9 @@ class LiveAvatarClient(IHeygenClient):
     - Keep alive e stop via API
     """
 
-    def __init__(self, settings: Settings):
+    def __init__(self, settings: Settings, http: HttpClient | None = None):
         self._s = settings
+        self._http = http or shared_http(settings)
     
     def _mask_key(self, key: str | None) -> str:
         if not key:
@@ -80,7 +82,7 @@ class LiveAvatarClient(IHeygenClient):
             payload["avatar_persona"]["prompt"] = backstory
 
         # LiveAvatar usa session token antes de iniciar
-        token_resp = requests.post(
+        token_resp = self._http.post(
             URL_SESSION_TOKEN,
             headers={
                 "X-API-KEY": self._s.liveavatar_api_key,
@@ -96,7 +98,7 @@ class LiveAvatarClient(IHeygenClient):
         if not token_resp.ok and backstory and not context_id:
             # Se a API não aceitar prompt, tenta novamente sem ele
             payload["avatar_persona"].pop("prompt", None)
-            token_resp = requests.post(
+            token_resp = self._http.post(
                 URL_SESSION_TOKEN,
                 headers={
                     "X-API-KEY": self._s.liveavatar_api_key,
@@ -129,7 +131,7 @@ class LiveAvatarClient(IHeygenClient):
         if session_id:
             start_payload["session_id"] = session_id
 
-        start_resp = requests.post(
+        start_resp = self._http.post(
             URL_SESSION_START,
             headers={
                 "Authorization": f"Bearer {session_token}",
@@ -177,7 +179,7 @@ class LiveAvatarClient(IHeygenClient):
 
     def interrupt(self, session_id: str) -> None:
         # LiveAvatar usa stop para encerrar a sessao
-        requests.post(
+        self._http.post(
             URL_SESSION_STOP,
             headers={"Content-Type": "application/json"},
             json={"session_id": session_id},
@@ -188,7 +190,7 @@ class LiveAvatarClient(IHeygenClient):
         payload = {"session_id": session_id}
         if activity_idle_timeout:
             payload["activity_idle_timeout"] = int(activity_idle_timeout)
-        return requests.post(
+        return self._http.post(
             URL_SESSION_KEEPALIVE,
             headers={"Content-Type": "application/json"},
             json=payload,
@@ -1,12 +1,14 @@
 """OpenAI speech-to-text adapter."""
 
-import requests
 from app.core.settings import Settings
 from app.domain.ports import ISTTClient
+from app.infrastructure.http_client import HttpClient, shared_http
+from app.infrastructure.stt_stream import IncrementalSTTStream
 
 class OpenAIWhisperClient(ISTTClient):
-    def __init__(self, settings: Settings):
+    def __init__(self, settings: Settings, http: HttpClient | None = None):
         self._s = settings
+        self._http = http or shared_http(settings)
         if not self._s.openai_api_key:
             raise RuntimeError("missing_OPENAI_API_KEY")
 
@@ -22,7 +24,7 @@ class OpenAIWhisperClient(ISTTClient):
                 "language": "pt",
             }
             try:
-                r = requests.post(
+                r = self._http.post(
                     "https://api.openai.com/v1/audio/transcriptions",
                     headers={"Authorization": f"Bearer {self._s.openai_api_key}"},
                     data=data,
@@ -40,3 +42,12 @@ class OpenAIWhisperClient(ISTTClient):
                     pass
                 continue
         raise last_error if last_error else RuntimeError("stt_transcription_failed")
+
+    def open_stream(self, filename: str, mimetype: str) -> IncrementalSTTStream:
+        return IncrementalSTTStream(
+            self.transcribe,
+            filename or "audio.webm",
+            mimetype or "audio/webm",
+            partial_interval_seconds=self._s.stt_stream_partial_interval_seconds,
+            segment_bytes=self._s.stt_stream_segment_bytes,
+        )
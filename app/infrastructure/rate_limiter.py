@@ -0,0 +1,166 @@
+"""Process-wide adaptive (AIMD) token-bucket limiter per upstream API key."""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+
+from ..core.settings import Settings
+
+
+class AdaptiveRateLimiter:
+    """Token bucket whose refill rate follows AIMD.
+
+    Every caller takes a token before hitting the upstream, so all threads
+    share one request rate instead of each backing off on its own. A success
+    adds ``increase_rps`` to the rate (up to ``max_rps``). A throttle (429/503)
+    multiplies it by ``decrease_factor``, empties the bucket and pauses it
+    for the upstream's ``Retry-After`` when given. A success slower than
+    ``latency_target_ms`` is treated as mild congestion (``latency_decrease_factor``).
+    Decreases are applied at most once per cooldown, so a burst of 429s from
+    requests already in flight counts as one signal.
+    """
+
+    def __init__(
+        self,
+        initial_rps: float = 1.0,
+        min_rps: float = 0.05,
+        max_rps: float = 10.0,
+        burst: float = 3.0,
+        increase_rps: float = 0.05,
+        decrease_factor: float = 0.5,
+        latency_target_ms: float = 0.0,
+        latency_decrease_factor: float = 0.8,
+        name: str = "",
+    ):
+        self.name = name
+        self._min = max(0.001, float(min_rps))
+        self._max = max(self._min, float(max_rps))
+        self._rate = min(self._max, max(self._min, float(initial_rps)))
+        self._burst = max(1.0, float(burst))
+        self._increase = max(0.0, float(increase_rps))
+        self._decrease = min(1.0, max(0.01, float(decrease_factor)))
+        self._latency_target_ms = max(0.0, float(latency_target_ms))
+        self._latency_decrease = min(1.0, max(0.01, float(latency_decrease_factor)))
+        self._tokens = self._burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._next_decrease_at = 0.0
+        self._cond = threading.Condition()
+        self._waiting = 0
+        self._stats = {"acquired": 0, "timeouts": 0, "throttles": 0, "decreases": 0, "slow": 0, "wait_ms_total": 0.0}
+
+    # ---- API ----
+    def acquire(self, timeout: float | None = None) -> bool:
+        """Blocks until a token is available; False if ``timeout`` runs out first."""
+        t0 = time.monotonic()
+        deadline = None if timeout is None else t0 + max(0.0, timeout)
+        with self._cond:
+            self._waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if now >= self._paused_until and self._tokens >= 1.0:
+                        self._tokens -= 1.0
+                        self._stats["acquired"] += 1
+                        self._stats["wait_ms_total"] += (now - t0) * 1000
+                        return True
+                    wait = max(self._paused_until - now, (1.0 - self._tokens) / self._rate, 0.001)
+                    if deadline is not None:
+                        if now >= deadline:
+                            self._stats["timeouts"] += 1
+                            return False
+                        wait = min(wait, deadline - now)
+                    self._cond.wait(wait)
+            finally:
+                self._waiting -= 1
+
+    def on_success(self, latency_ms: float | None = None) -> None:
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            if self._latency_target_ms and latency_ms is not None and latency_ms > self._latency_target_ms:
+                self._stats["slow"] += 1
+                self._decrease_rate(now, self._latency_decrease)
+            else:
+                self._rate = min(self._max, self._rate + self._increase)
+            self._cond.notify_all()
+
+    def on_throttle(self, retry_after_seconds: float | None = None) -> None:
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            self._stats["throttles"] += 1
+            self._decrease_rate(now, self._decrease)
+            self._tokens = 0.0
+            pause = retry_after_seconds if retry_after_seconds and retry_after_seconds > 0 else 1.0 / self._rate
+            self._paused_until = max(self._paused_until, now + pause)
+
+    @property
+    def rate(self) -> float:
+        with self._cond:
+            return self._rate
+
+    def stats(self) -> dict:
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            return {
+                **self._stats,
+                "rate_rps": round(self._rate, 4),
+                "tokens": round(self._tokens, 3),
+                "waiting": self._waiting,
+                "paused_for_s": round(max(0.0, self._paused_until - now), 3),
+            }
+
+    # ---- interno (chamado com self._cond) ----
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._updated = now
+        if elapsed > 0 and now >= self._paused_until:
+            self._tokens = min(self._burst, self._tokens + elapsed * self._rate)
+
+    def _decrease_rate(self, now: float, factor: float) -> None:
+        if now < self._next_decrease_at:
+            return
+        self._rate = max(self._min, self._rate * factor)
+        self._stats["decreases"] += 1
+        # um sinal por "ida e volta": 429s de requisições que já estavam no ar não somam
+        self._next_decrease_at = now + max(1.0, 1.0 / self._rate)
+
+
+_limiters: dict[str, AdaptiveRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def _key_id(api_key: str) -> str:
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+
+
+def gemini_limiter(settings: Settings, api_key: str) -> AdaptiveRateLimiter:
+    """The limiter shared by every Gemini caller in this process for ``api_key``."""
+    key_id = _key_id(api_key)
+    limiter = _limiters.get(key_id)
+    if limiter is not None:
+        return limiter
+    with _limiters_lock:
+        limiter = _limiters.get(key_id)
+        if limiter is None:
+            limiter = AdaptiveRateLimiter(
+                initial_rps=settings.gemini_rate_initial_rps,
+                min_rps=settings.gemini_rate_min_rps,
+                max_rps=settings.gemini_rate_max_rps,
+                burst=settings.gemini_rate_burst,
+                latency_target_ms=settings.gemini_rate_latency_target_ms,
+                name=f"gemini:{key_id}",
+            )
+            _limiters[key_id] = limiter
+        return limiter
+
+
+def limiter_stats() -> dict:
+    with _limiters_lock:
+        items = list(_limiters.items())
+    return {key_id: limiter.stats() for key_id, limiter in items}
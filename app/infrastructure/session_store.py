@@ -0,0 +1,385 @@
+"""Per-client LiveSession/BudgetLedger storage (memory, SQLite/WAL or Redis)."""
+
+from __future__ import annotations
+
+import json
+import os
+from abc import ABC, abstractmethod
+import random
+import socket
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, fields
+from datetime import date, datetime
+from typing import Callable
+from urllib.parse import unquote, urlparse
+
+from ..core.settings import Settings
+from ..domain.models import BudgetLedger, ContextItem, LiveSession, TrainingDoc
+from ..domain.ports import ISessionStore
+
+# api_key nunca vai para o SQLite/Redis: é relida do índice de credenciais pelo avatar_id
+_SESSION_NOT_PERSISTED = {"api_key"}
+_SESSION_DEFAULTS = asdict(LiveSession())
+_BUDGET_DEFAULTS = asdict(BudgetLedger())
+_SESSION_FIELDS = {f.name for f in fields(LiveSession)}
+_BUDGET_FIELDS = {f.name for f in fields(BudgetLedger)}
+
+
+# ---- serialização compacta (JSON sem campos em default) ----
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"not_serializable: {type(value).__name__}")
+
+
+def _dump(data: dict, defaults: dict) -> bytes:
+    compact = {k: v for k, v in data.items() if v != defaults.get(k)}
+    return json.dumps(compact, separators=(",", ":"), ensure_ascii=False, default=_json_default).encode("utf-8")
+
+
+def encode_session(session: LiveSession) -> bytes:
+    data = {k: v for k, v in asdict(session).items() if k not in _SESSION_NOT_PERSISTED}
+    return _dump(data, _SESSION_DEFAULTS)
+
+
+def decode_session(raw: bytes | str | None) -> LiveSession:
+    if not raw:
+        return LiveSession()
+    data = {k: v for k, v in json.loads(raw).items() if k in _SESSION_FIELDS and k not in _SESSION_NOT_PERSISTED}
+    data["training_contexts"] = [ContextItem(**d) for d in data.get("training_contexts") or []]
+    data["training_docs"] = [TrainingDoc(**d) for d in data.get("training_docs") or []]
+    return LiveSession(**data)
+
+
+def encode_budget(budget: BudgetLedger) -> bytes:
+    return _dump(asdict(budget), _BUDGET_DEFAULTS)
+
+
+def decode_budget(raw: bytes | str | None) -> BudgetLedger:
+    if not raw:
+        return BudgetLedger()
+    data = {k: v for k, v in json.loads(raw).items() if k in _BUDGET_FIELDS}
+    return BudgetLedger(**data)
+
+
+class MemorySessionStore(ISessionStore):
+    """Process-local store (single worker). Objects are kept as-is, without copies."""
+
+    name = "memory"
+
+    def __init__(self):
+        self._sessions: dict[str, LiveSession] = {}
+        self._budgets: dict[str, BudgetLedger] = {}
+        self._lock = threading.Lock()
+
+    def get_session(self, client_id: str) -> LiveSession:
+        session = self._sessions.get(client_id)
+        if session is None:
+            session = self._sessions.setdefault(client_id, LiveSession())
+        return session
+
+    def set_session(self, client_id: str, session: LiveSession) -> None:
+        self._sessions[client_id] = session
+
+    def update_session(self, client_id: str, fn: Callable[[LiveSession], None]) -> LiveSession:
+        with self._lock:
+            session = self.get_session(client_id)
+            fn(session)
+            return session
+
+    def get_budget(self, client_id: str) -> BudgetLedger:
+        budget = self._budgets.get(client_id)
+        if budget is None:
+            budget = self._budgets.setdefault(client_id, BudgetLedger())
+        return budget
+
+    def set_budget(self, client_id: str, budget: BudgetLedger) -> None:
+        self._budgets[client_id] = budget
+
+    def update_budget(self, client_id: str, fn: Callable[[BudgetLedger], None]) -> BudgetLedger:
+        with self._lock:
+            budget = self.get_budget(client_id)
+            fn(budget)
+            return budget
+
+
+class _SerializedSessionStore(ISessionStore, ABC):
+    """Shared backends: every read returns a fresh copy, so callers must write back."""
+
+    name = "serialized"
+
+    def __init__(self, ttl_seconds: int):
+        self._ttl = max(1, int(ttl_seconds))
+
+    # backends implementam estes três
+    @abstractmethod
+    def _get(self, key: str) -> bytes | None: ...
+
+    @abstractmethod
+    def _set(self, key: str, value: bytes) -> None: ...
+
+    @abstractmethod
+    def _update(self, key: str, fn: Callable[[bytes | None], bytes]) -> None: ...
+
+    def get_session(self, client_id: str) -> LiveSession:
+        return decode_session(self._get(f"session:{client_id}"))
+
+    def set_session(self, client_id: str, session: LiveSession) -> None:
+        self._set(f"session:{client_id}", encode_session(session))
+
+    def update_session(self, client_id: str, fn: Callable[[LiveSession], None]) -> LiveSession:
+        result: list[LiveSession] = []
+
+        def apply(raw: bytes | None) -> bytes:
+            session = decode_session(raw)
+            fn(session)
+            # em retry (conflito), só a última aplicação vale
+            result[:] = [session]
+            return encode_session(session)
+
+        self._update(f"session:{client_id}", apply)
+        return result[0]
+
+    def get_budget(self, client_id: str) -> BudgetLedger:
+        return decode_budget(self._get(f"budget:{client_id}"))
+
+    def set_budget(self, client_id: str, budget: BudgetLedger) -> None:
+        self._set(f"budget:{client_id}", encode_budget(budget))
+
+    def update_budget(self, client_id: str, fn: Callable[[BudgetLedger], None]) -> BudgetLedger:
+        result: list[BudgetLedger] = []
+
+        def apply(raw: bytes | None) -> bytes:
+            budget = decode_budget(raw)
+            fn(budget)
+            result[:] = [budget]
+            return encode_budget(budget)
+
+        self._update(f"budget:{client_id}", apply)
+        return result[0]
+
+
+class SqliteSessionStore(_SerializedSessionStore):
+    """Single-host store shared by gunicorn workers (SQLite in WAL mode)."""
+
+    name = "sqlite"
+    _PURGE_EVERY = 256
+
+    def __init__(self, path: str, ttl_seconds: int):
+        super().__init__(ttl_seconds)
+        self._path = path
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+        self._local = threading.local()
+        self._writes = 0
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS session_kv ("
+            " key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        # conexões não atravessam fork: cada worker abre a sua
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self._path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _get(self, key: str) -> bytes | None:
+        row = self._conn().execute(
+            "SELECT value FROM session_kv WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def _write(self, conn: sqlite3.Connection, key: str, value: bytes) -> None:
+        conn.execute(
+            "INSERT INTO session_kv (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+            (key, value, time.time() + self._ttl),
+        )
+        self._writes += 1
+        if self._writes % self._PURGE_EVERY == 0:
+            conn.execute("DELETE FROM session_kv WHERE expires_at <= ?", (time.time(),))
+
+    def _set(self, key: str, value: bytes) -> None:
+        self._write(self._conn(), key, value)
+
+    def _update(self, key: str, fn: Callable[[bytes | None], bytes]) -> None:
+        conn = self._conn()
+        # IMMEDIATE pega o lock de escrita antes da leitura: read-modify-write atômico entre processos
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT value FROM session_kv WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+            self._write(conn, key, fn(row[0] if row else None))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+
+class RespError(Exception):
+    """Error reply (``-ERR ...``) from a Redis-protocol server."""
+
+
+class _RespConnection:
+    """Minimal RESP2 client: just what the session store needs."""
+
+    def __init__(self, host: str, port: int, timeout: float):
+        self._sock = socket.create_connection((host, port), timeout=timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._rfile = self._sock.makefile("rb")
+        self.pid = os.getpid()
+
+    @staticmethod
+    def _encode(args) -> bytes:
+        out = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode("utf-8")
+            out.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(out)
+
+    def _read(self):
+        line = self._rfile.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("resp_connection_closed")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode("utf-8")
+        if kind == b"-":
+            raise RespError(rest.decode("utf-8", "replace"))
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            size = int(rest)
+            if size < 0:
+                return None
+            data = self._rfile.read(size + 2)
+            if len(data) != size + 2:
+                raise ConnectionError("resp_connection_closed")
+            return data[:-2]
+        if kind == b"*":
+            size = int(rest)
+            if size < 0:
+                return None
+            return [self._read() for _ in range(size)]
+        raise RespError(f"resp_protocol_error: {line[:40]!r}")
+
+    def execute(self, *args):
+        self._sock.sendall(self._encode(args))
+        return self._read()
+
+    def pipeline(self, *commands) -> list:
+        """Sends all commands in one write and reads every reply (one round trip)."""
+        self._sock.sendall(b"".join(self._encode(cmd) for cmd in commands))
+        replies, error = [], None
+        for _ in commands:
+            try:
+                replies.append(self._read())
+            except RespError as e:
+                error = error or e
+                replies.append(e)
+        if error is not None:
+            raise error
+        return replies
+
+    def close(self) -> None:
+        try:
+            self._rfile.close()
+            self._sock.close()
+        except OSError:
+            pass
+
+
+class RedisSessionStore(_SerializedSessionStore):
+    """Multi-host store on any Redis-protocol server (Redis, Valkey, KeyDB...)."""
+
+    name = "redis"
+    _MAX_CONFLICT_RETRIES = 16
+
+    def __init__(self, url: str, ttl_seconds: int, prefix: str = "euvatar:", timeout: float = 2.0):
+        super().__init__(ttl_seconds)
+        parsed = urlparse(url)
+        if parsed.scheme not in ("redis", "tcp"):
+            raise ValueError(f"unsupported_session_store_url: {parsed.scheme}")
+        self._host = parsed.hostname or "127.0.0.1"
+        self._port = parsed.port or 6379
+        self._username = unquote(parsed.username) if parsed.username else None
+        self._password = unquote(parsed.password) if parsed.password else None
+        self._db = int((parsed.path or "/0").strip("/") or 0)
+        self._prefix = prefix
+        self._timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self) -> _RespConnection:
+        conn = _RespConnection(self._host, self._port, self._timeout)
+        if self._password:
+            if self._username:
+                conn.execute("AUTH", self._username, self._password)
+            else:
+                conn.execute("AUTH", self._password)
+        if self._db:
+            conn.execute("SELECT", self._db)
+        return conn
+
+    def _call(self, fn):
+        """Runs ``fn(conn)`` on this thread's connection, reconnecting once if it dropped."""
+        for attempt in (1, 2):
+            conn = getattr(self._local, "conn", None)
+            if conn is None or conn.pid != os.getpid():
+                conn = self._local.conn = self._connect()
+            try:
+                return fn(conn)
+            except (ConnectionError, OSError):
+                conn.close()
+                self._local.conn = None
+                if attempt == 2:
+                    raise
+
+    def _get(self, key: str) -> bytes | None:
+        return self._call(lambda conn: conn.execute("GET", self._prefix + key))
+
+    def _set(self, key: str, value: bytes) -> None:
+        self._call(lambda conn: conn.execute("SET", self._prefix + key, value, "EX", self._ttl))
+
+    def _update(self, key: str, fn: Callable[[bytes | None], bytes]) -> None:
+        full_key = self._prefix + key
+
+        def transaction(conn: _RespConnection) -> bool:
+            conn.execute("WATCH", full_key)
+            try:
+                value = fn(conn.execute("GET", full_key))
+            except BaseException:
+                conn.execute("UNWATCH")
+                raise
+            replies = conn.pipeline(("MULTI",), ("SET", full_key, value, "EX", self._ttl), ("EXEC",))
+            # EXEC nulo: outra escrita tocou a chave depois do WATCH
+            return replies[-1] is not None
+
+        for attempt in range(self._MAX_CONFLICT_RETRIES):
+            if self._call(transaction):
+                return
+            # backoff curto com jitter: escritores concorrentes na mesma chave se desencontram
+            time.sleep(random.uniform(0, 0.002 * (attempt + 1)))
+        raise RuntimeError(f"session_store_conflict: {key}")
+
+
+def build_session_store(settings: Settings) -> ISessionStore:
+    backend = (settings.session_store or "memory").lower()
+    if backend == "memory":
+        return MemorySessionStore()
+    if backend == "sqlite":
+        return SqliteSessionStore(settings.session_store_path, settings.session_store_ttl_seconds)
+    if backend == "redis":
+        if not settings.session_store_url:
+            raise ValueError("SESSION_STORE=redis requer SESSION_STORE_URL (redis://host:6379/0)")
+        return RedisSessionStore(settings.session_store_url, settings.session_store_ttl_seconds)
+    raise ValueError(f"unknown_session_store: {backend}")
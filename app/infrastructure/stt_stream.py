@@ -0,0 +1,206 @@
+"""Incremental speech-to-text over a growing audio buffer."""
+
+from __future__ import annotations
+
+import io
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+
+from ..domain.ports import ISTTStream
+
+# transcribe(filename, stream, mimetype) -> text, i.e. ISTTClient.transcribe
+TranscribeFn = Callable[[str, object, str], str]
+
+# Partials for all open streams share this pool; one request per stream at a time.
+_partial_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="stt-partial")
+
+_WEBM_CLUSTER_ID = b"\x1f\x43\xb6\x75"
+_OGG_PAGE = b"OggS"
+
+
+def _split_points(buf: bytes | bytearray) -> tuple[int, list[int]] | None:
+    """(header length, offsets where a self-contained unit starts) for WebM/Ogg.
+
+    WebM: everything before the first Cluster is the header (EBML, Segment
+    info, Tracks) and every Cluster can follow it. Ogg/Opus: the first two
+    pages (OpusHead, OpusTags) are the header and every later page can
+    follow it. Other containers return None and are always sent whole.
+    """
+    data = bytes(buf)
+    if data.startswith(b"\x1a\x45\xdf\xa3"):
+        marker, first = _WEBM_CLUSTER_ID, 0
+    elif data.startswith(_OGG_PAGE):
+        # a página em 0 (OpusHead) não entra na busca; a seguinte é OpusTags
+        marker, first = _OGG_PAGE, 1
+    else:
+        return None
+    points = []
+    i = data.find(marker, 1)
+    while i != -1:
+        points.append(i)
+        i = data.find(marker, i + 1)
+    if len(points) <= first:
+        return None
+    return points[first], points[first:]
+
+
+class IncrementalSTTStream(ISTTStream):
+    """Transcribes the audio received so far while frames keep arriving.
+
+    MediaRecorder/ogg/webm chunks concatenate into a decodable prefix. For
+    WebM and Ogg the buffer is cut into segments at Cluster/page boundaries:
+    once the open segment reaches ``segment_bytes`` its transcript is
+    committed and later partials only send the container header plus the
+    audio after it, so the bytes sent per utterance grow linearly instead of
+    quadratically. Other formats fall back to re-sending the whole buffer.
+
+    At most one partial is in flight and a new one starts no sooner than
+    ``partial_interval_seconds`` after the previous one. ``finish`` reuses the
+    last (or in-flight) partial when it already covers every byte; otherwise
+    it only transcribes the open segment and appends it to the committed text.
+    """
+
+    def __init__(
+        self,
+        transcribe: TranscribeFn,
+        filename: str,
+        mimetype: str,
+        partial_interval_seconds: float = 0.8,
+        min_partial_bytes: int = 4096,
+        segment_bytes: int = 128 * 1024,
+    ):
+        self._transcribe = transcribe
+        self._filename = filename
+        self._mimetype = mimetype
+        self._interval = max(0.0, float(partial_interval_seconds))
+        self._min_bytes = max(0, int(min_partial_bytes))
+        self._segment_bytes = max(1, int(segment_bytes))
+        self._lock = threading.Lock()
+        self._buf = bytearray()
+        # segmentos já fechados: texto deles + onde começa o segmento aberto
+        self._committed_text = ""
+        self._seg_start = 0
+        self._header_len = 0
+        self._window_text = ""
+        self._partial_covers = 0
+        self._inflight: Future | None = None
+        self._inflight_covers = 0
+        self._inflight_commits = False
+        self._last_started = 0.0
+        self._closed = False
+        self._stats = {"transcribe_calls": 0, "bytes_sent": 0, "segments": 0}
+
+    def feed(self, chunk: bytes) -> None:
+        if not chunk:
+            return
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("stt_stream_closed")
+            self._buf.extend(chunk)
+            self._maybe_start_partial()
+
+    def partial(self) -> str:
+        with self._lock:
+            return self._join(self._committed_text, self._window_text)
+
+    def finish(self) -> str:
+        with self._lock:
+            self._closed = True
+            total = len(self._buf)
+            if total == 0:
+                return ""
+            if self._partial_covers == total:
+                return self._join(self._committed_text, self._window_text)
+            inflight_covers = self._inflight_covers
+            useful = inflight_covers == total or self._inflight_commits
+            inflight = self._inflight if useful and self._inflight is not None and not self._inflight.done() else None
+        if inflight is not None:
+            # já foi pago: cobre tudo ou fecha um segmento que o final não precisa reenviar
+            try:
+                inflight.result()
+            except Exception:
+                pass
+            if inflight_covers == total:
+                with self._lock:
+                    if self._partial_covers == total:
+                        return self._join(self._committed_text, self._window_text)
+        with self._lock:
+            committed, start = self._committed_text, self._seg_start
+            data = self._segment_bytes_locked(start, total)
+        return self._join(committed, self._run(data))
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            self._buf = bytearray()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "buffered_bytes": len(self._buf)}
+
+    @staticmethod
+    def _join(*parts: str) -> str:
+        return " ".join(p for p in parts if p)
+
+    def _segment_bytes_locked(self, start: int, end: int) -> bytes:
+        # chamado com self._lock
+        if start == 0:
+            return bytes(self._buf[:end])
+        return bytes(self._buf[: self._header_len]) + bytes(self._buf[start:end])
+
+    def _maybe_start_partial(self) -> None:
+        # chamado com self._lock
+        if self._inflight is not None and not self._inflight.done():
+            return
+        total = len(self._buf)
+        if total < self._min_bytes or total == self._partial_covers:
+            return
+        now = time.monotonic()
+        if now - self._last_started < self._interval:
+            return
+        start, end, commit = self._seg_start, total, False
+        if total - start >= self._segment_bytes:
+            split = _split_points(self._buf)
+            if split is not None:
+                self._header_len = split[0]
+                # fecha o segmento na última fronteira de Cluster/página já recebida
+                cut = max((p for p in split[1] if start < p <= total), default=0)
+                if cut > max(start, self._header_len):
+                    end, commit = cut, True
+        if commit and self._partial_covers == end:
+            # a última parcial já cobre exatamente o segmento: fecha sem reenviar
+            self._commit_locked(self._window_text, end)
+            start, end, commit = end, total, False
+        self._last_started = now
+        self._inflight_covers = end
+        self._inflight_commits = commit
+        self._inflight = _partial_pool.submit(
+            self._partial_job, self._segment_bytes_locked(start, end), start, end, commit
+        )
+
+    def _partial_job(self, snapshot: bytes, start: int, covers: int, commit: bool) -> str:
+        text = self._run(snapshot)
+        with self._lock:
+            if start != self._seg_start:
+                return text
+            if commit:
+                self._commit_locked(text, covers)
+            elif covers > self._partial_covers:
+                self._window_text = text
+                self._partial_covers = covers
+        return text
+
+    def _commit_locked(self, text: str, end: int) -> None:
+        self._committed_text = self._join(self._committed_text, text)
+        self._seg_start = end
+        self._window_text = ""
+        self._partial_covers = end
+        self._stats["segments"] += 1
+
+    def _run(self, data: bytes) -> str:
+        with self._lock:
+            self._stats["transcribe_calls"] += 1
+            self._stats["bytes_sent"] += len(data)
+        return (self._transcribe(self._filename, io.BytesIO(data), self._mimetype) or "").strip()
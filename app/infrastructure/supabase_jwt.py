@@ -0,0 +1,142 @@
+"""Local verification of Supabase access tokens (JWT secret or JWKS)."""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import hmac
+import json
+import threading
+import time
+
+from ..core.settings import Settings
+from .http_client import HttpClient, shared_http
+
+# Resultado da verificação local.
+VALID = "valid"
+INVALID = "invalid"
+UNDECIDED = "undecided"
+
+_HMAC_ALGS = {"HS256": hashlib.sha256, "HS384": hashlib.sha384, "HS512": hashlib.sha512}
+_ASYMMETRIC_ALGS = {"RS256", "ES256"}
+_LEEWAY_SECONDS = 30
+_JWKS_TTL_SECONDS = 600
+
+
+def _b64url_decode(part: str) -> bytes:
+    return base64.urlsafe_b64decode(part + "=" * (-len(part) % 4))
+
+
+class SupabaseJwtVerifier:
+    """Verifies Supabase access tokens without calling ``/auth/v1/user``.
+
+    Returns ``(VALID, claims)`` for a token signed by the project, ``(INVALID, None)``
+    when the token is malformed, forged or expired, and ``(UNDECIDED, None)`` when
+    this process cannot check the signature (no secret configured, unknown key id,
+    PyJWT missing for asymmetric keys, JWKS unreachable). Callers fall back to the
+    remote lookup only in the last case.
+    """
+
+    def __init__(self, settings: Settings, http: HttpClient | None = None):
+        self._s = settings
+        self._http = http or shared_http(settings)
+        self._issuer = f"{(settings.supabase_url or '').rstrip('/')}/auth/v1"
+        self._jwks: dict[str, dict] = {}
+        self._jwks_fetched_at = float("-inf")
+        self._jwks_lock = threading.Lock()
+
+    def verify(self, token: str) -> tuple[str, dict | None]:
+        try:
+            header_b64, payload_b64, signature_b64 = token.split(".")
+            header = json.loads(_b64url_decode(header_b64))
+            claims = json.loads(_b64url_decode(payload_b64))
+            signature = _b64url_decode(signature_b64)
+        except Exception:
+            return INVALID, None
+        if not isinstance(header, dict) or not isinstance(claims, dict):
+            return INVALID, None
+
+        alg = header.get("alg")
+        if alg in _HMAC_ALGS:
+            secret = self._s.supabase_jwt_secret
+            if not secret:
+                return UNDECIDED, None
+            signing_input = f"{header_b64}.{payload_b64}".encode("ascii")
+            expected = hmac.new(secret.encode("utf-8"), signing_input, _HMAC_ALGS[alg]).digest()
+            if not hmac.compare_digest(expected, signature):
+                return INVALID, None
+        elif alg in _ASYMMETRIC_ALGS:
+            status = self._verify_with_jwks(token, header, alg)
+            if status != VALID:
+                return status, None
+        else:
+            return INVALID, None
+
+        if not self._claims_ok(claims):
+            return INVALID, None
+        return VALID, claims
+
+    def _claims_ok(self, claims: dict) -> bool:
+        now = time.time()
+        exp = claims.get("exp")
+        if not isinstance(exp, (int, float)) or exp + _LEEWAY_SECONDS < now:
+            return False
+        nbf = claims.get("nbf")
+        if isinstance(nbf, (int, float)) and nbf - _LEEWAY_SECONDS > now:
+            return False
+        # anon/service_role keys também são JWTs do projeto, mas não identificam usuário
+        if not claims.get("sub") or claims.get("role") not in (None, "authenticated"):
+            return False
+        aud = claims.get("aud")
+        auds = aud if isinstance(aud, list) else [aud]
+        if "authenticated" not in auds:
+            return False
+        iss = claims.get("iss")
+        if iss and iss.rstrip("/") != self._issuer:
+            return False
+        return True
+
+    def _verify_with_jwks(self, token: str, header: dict, alg: str) -> str:
+        try:
+            import jwt  # PyJWT[crypto], opcional
+        except Exception:
+            return UNDECIDED
+        jwk = self._jwk_for(header.get("kid"))
+        if jwk is None:
+            return UNDECIDED
+        try:
+            key = jwt.PyJWK(jwk, algorithm=alg).key
+            # claims conferidos em _claims_ok (mesmas regras do HS256)
+            jwt.decode(token, key=key, algorithms=[alg], options={"verify_exp": False, "verify_aud": False})
+        except jwt.InvalidSignatureError:
+            return INVALID
+        except Exception:
+            return UNDECIDED
+        return VALID
+
+    def _jwk_for(self, kid: str | None) -> dict | None:
+        if not kid:
+            return None
+        if kid in self._jwks and time.monotonic() - self._jwks_fetched_at < _JWKS_TTL_SECONDS:
+            return self._jwks[kid]
+        with self._jwks_lock:
+            age = time.monotonic() - self._jwks_fetched_at
+            # kid desconhecido (rotação de chave) refaz o fetch, no máximo a cada 30s
+            if age >= _JWKS_TTL_SECONDS or (kid not in self._jwks and age >= 30):
+                self._refresh_jwks()
+            return self._jwks.get(kid)
+
+    def _refresh_jwks(self) -> None:
+        self._jwks_fetched_at = time.monotonic()
+        try:
+            r = self._http.get(
+                f"{self._issuer}/.well-known/jwks.json",
+                headers={"apikey": self._s.supabase_service_role},
+                timeout=5,
+            )
+            if not r.ok:
+                return
+            keys = (r.json() or {}).get("keys") or []
+        except Exception:
+            return
+        self._jwks = {k["kid"]: k for k in keys if isinstance(k, dict) and k.get("kid")}
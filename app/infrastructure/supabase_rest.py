@@ -1,7 +1,7 @@
 """Supabase REST adapter for database operations."""
 
-import requests
 from ..core.settings import Settings
+from .http_client import shared_http
 
 def rest_headers(settings: Settings) -> dict:
     return {
@@ -13,7 +13,7 @@ def get_json(settings: Settings, table: str, select: str, params: dict, limit: i
     url = f"{settings.supabase_url}/rest/v1/{table}"
     q = {"select": select, **params}
     if limit: q["limit"] = str(limit)
-    r = requests.get(url, headers=rest_headers(settings), params=q, timeout=20)
+    r = shared_http(settings).get(url, headers=rest_headers(settings), params=q, timeout=20)
     if not r.ok:
         msg = r.text[:200]
         if r.status_code == 403 and "row-level security" in msg.lower():
@@ -21,8 +21,22 @@ def get_json(settings: Settings, table: str, select: str, params: dict, limit: i
         raise RuntimeError(f"supabase_{table}_{r.status_code}: {msg}")
     return r.json() or []
 
+def count_rows(settings: Settings, table: str, params: dict) -> int:
+    """Exact row count via HEAD + ``Prefer: count=exact`` (no rows are transferred)."""
+    url = f"{settings.supabase_url}/rest/v1/{table}"
+    headers = {**rest_headers(settings), "Prefer": "count=exact", "Range-Unit": "items", "Range": "0-0"}
+    r = shared_http(settings).head(url, headers=headers, params={"select": "id", **params}, timeout=20)
+    # 416 (range fora do total) ainda traz o total no Content-Range
+    if not r.ok and r.status_code != 416:
+        raise RuntimeError(f"supabase_{table}_count_{r.status_code}")
+    # Content-Range: "0-0/5000" ou "*/0"
+    total = (r.headers.get("content-range") or "").rsplit("/", 1)[-1]
+    if not total.isdigit():
+        raise RuntimeError(f"supabase_{table}_count_missing")
+    return int(total)
+
 def patch_json(settings: Settings, table_url: str, body: dict) -> None:
-    r = requests.patch(table_url, headers={**rest_headers(settings), "Content-Type":"application/json"}, json=body, timeout=30)
+    r = shared_http(settings).patch(table_url, headers={**rest_headers(settings), "Content-Type":"application/json"}, json=body, timeout=30)
     if not r.ok:
         msg = r.text[:300]
         if r.status_code == 403: msg += " | DICA: 403 no REST indica RLS; com Service Role isso não deve ocorrer."
@@ -30,7 +44,7 @@ def patch_json(settings: Settings, table_url: str, body: dict) -> None:
 
 def insert_json(settings: Settings, table: str, rows: list[dict]) -> None:
     url = f"{settings.supabase_url}/rest/v1/{table}"
-    r = requests.post(url, headers={**rest_headers(settings), "Content-Type":"application/json", "Prefer":"return=representation"}, json=rows, timeout=30)
+    r = shared_http(settings).post(url, headers={**rest_headers(settings), "Content-Type":"application/json", "Prefer":"return=representation"}, json=rows, timeout=30)
     if not r.ok:
         msg = r.text[:300]
         if r.status_code == 403: msg += " | DICA: 403 no REST indica RLS; com Service Role isso não deve ocorrer."
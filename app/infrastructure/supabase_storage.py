@@ -1,16 +1,17 @@
 """Supabase Storage adapter for media assets."""
 
-import requests
 from ..core.settings import Settings
 from ..domain.ports import IStorage
+from .http_client import HttpClient, shared_http
 
 class SupabaseStorage(IStorage):
-    def __init__(self, settings: Settings):
+    def __init__(self, settings: Settings, http: HttpClient | None = None):
         self._s = settings
+        self._http = http or shared_http(settings)
 
     def upsert(self, bucket: str, path: str, content_type: str, data: bytes) -> None:
         up_url = f"{self._s.supabase_url}/storage/v1/object/{bucket}/{path}"
-        r = requests.post(up_url, headers={
+        r = self._http.post(up_url, headers={
             "Authorization": f"Bearer {self._s.supabase_service_role}",
             "apikey": self._s.supabase_service_role,
             "x-upsert": "true",
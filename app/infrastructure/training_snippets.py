@@ -0,0 +1,134 @@
+"""On-disk store of extracted training-document snippets (SQLite/WAL)."""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data or b"").hexdigest()
+
+
+def _extract_pdf_text(data: bytes, max_pages: int = 3) -> str:
+    try:
+        import PyPDF2  # opcional; definido em requirements
+    except Exception:
+        return ""
+    try:
+        reader = PyPDF2.PdfReader(io.BytesIO(data))
+        texts = []
+        for page in reader.pages[:max_pages]:
+            try:
+                t = page.extract_text() or ""
+                if t: texts.append(t)
+            except Exception:
+                continue
+        return "\n".join(texts)
+    except Exception:
+        return ""
+
+
+def extract_snippet(data: bytes, content_type: str, url: str = "", max_chars: int = 1500) -> str:
+    """Plain text / first PDF pages / JSON of a training doc, truncated to ``max_chars``."""
+    ct = (content_type or "").lower()
+    txt = ""
+    try:
+        if "text/plain" in ct:
+            txt = data.decode("utf-8", errors="ignore")
+        elif "pdf" in ct or (url or "").lower().endswith(".pdf"):
+            txt = _extract_pdf_text(data)
+        elif "json" in ct:
+            txt = json.dumps(json.loads(data), ensure_ascii=False)
+    except Exception:
+        return ""
+    txt = (txt or "").strip()
+    if len(txt) > max_chars:
+        return txt[:max_chars] + "..."
+    return txt
+
+
+@dataclass
+class SnippetEntry:
+    url: str
+    snippet: str
+    content_hash: str
+    etag: str = ""
+    last_modified: str = ""
+    checked_at: float = 0.0
+
+
+class TrainingSnippetStore:
+    """Snippets keyed by document URL, validated by content hash / ETag.
+
+    Entries checked less than ``revalidate_seconds`` ago are served without any
+    HTTP; older ones are revalidated with a conditional GET by the caller and
+    only re-parsed when the content hash changed. Uploads and deletes through
+    ``training_bp`` overwrite or invalidate the URL explicitly. The file is
+    shared by all gunicorn workers, so an invalidation is seen everywhere.
+    """
+
+    def __init__(self, path: str, revalidate_seconds: float = 86400.0):
+        self._path = path
+        self._revalidate = max(0.0, float(revalidate_seconds))
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS training_snippets ("
+            " url TEXT PRIMARY KEY, snippet TEXT NOT NULL, content_hash TEXT NOT NULL,"
+            " etag TEXT NOT NULL DEFAULT '', last_modified TEXT NOT NULL DEFAULT '', checked_at REAL NOT NULL)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        # conexões não atravessam fork: cada worker abre a sua
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self._path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, url: str) -> SnippetEntry | None:
+        if not url:
+            return None
+        row = self._conn().execute(
+            "SELECT url, snippet, content_hash, etag, last_modified, checked_at FROM training_snippets WHERE url = ?",
+            (url,),
+        ).fetchone()
+        return SnippetEntry(*row) if row else None
+
+    def is_fresh(self, entry: SnippetEntry) -> bool:
+        return (time.time() - entry.checked_at) < self._revalidate
+
+    def put(self, url: str, snippet: str, digest: str, etag: str = "", last_modified: str = "") -> None:
+        if not url:
+            return
+        self._conn().execute(
+            "INSERT INTO training_snippets (url, snippet, content_hash, etag, last_modified, checked_at) "
+            "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(url) DO UPDATE SET snippet = excluded.snippet, "
+            "content_hash = excluded.content_hash, etag = excluded.etag, "
+            "last_modified = excluded.last_modified, checked_at = excluded.checked_at",
+            (url, snippet or "", digest, etag or "", last_modified or "", time.time()),
+        )
+
+    def put_from_bytes(self, url: str, data: bytes, content_type: str) -> str:
+        """Precompute the snippet from bytes already in hand (upload path)."""
+        snippet = extract_snippet(data, content_type, url)
+        self.put(url, snippet, content_hash(data))
+        return snippet
+
+    def touch(self, url: str) -> None:
+        self._conn().execute("UPDATE training_snippets SET checked_at = ? WHERE url = ?", (time.time(), url))
+
+    def invalidate(self, url: str) -> None:
+        if url:
+            self._conn().execute("DELETE FROM training_snippets WHERE url = ?", (url,))
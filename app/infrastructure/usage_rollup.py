@@ -0,0 +1,302 @@
+"""Per-avatar usage rollup (total seconds / session count) kept in SQLite."""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Iterable
+
+import numpy as np
+
+from ..core.settings import Settings
+from ..shared.setup_logger import LOGGER
+from .supabase_rest import get_json
+
+logger = LOGGER.get_logger(__name__)
+
+# sessão sem ended_at/duration conta o tempo decorrido, até este teto (mesma regra do /credits antigo)
+OPEN_SESSION_MAX_SECONDS = 15 * 60
+
+
+def _epoch(value) -> float | None:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except Exception:
+        return None
+
+
+def aggregate_sessions(rows: list[dict]) -> tuple[dict[str, tuple[float, int]], list[tuple[str, str, float]]]:
+    """Vectorized rollup of raw ``avatar_sessions`` rows.
+
+    Returns ``({avatar_id: (closed_seconds, closed_count)}, open_sessions)``: rows
+    with ``duration_seconds`` > 0 are summed per avatar with ``np.bincount``;
+    rows still open (no duration, no ``ended_at``) come back as
+    ``(session_id, avatar_id, started_epoch)`` because their duration depends on
+    when usage is read.
+    """
+    if not rows:
+        return {}, []
+    avatar = np.array([str(r.get("avatar_id") or "") for r in rows], dtype=object)
+    dur = np.array([_float(r.get("duration_seconds")) for r in rows], dtype=np.float64)
+    closed = dur > 0
+    has_avatar = avatar != ""
+
+    out: dict[str, tuple[float, int]] = {}
+    mask = closed & has_avatar
+    if mask.any():
+        ids, inv = np.unique(avatar[mask], return_inverse=True)
+        seconds = np.bincount(inv, weights=dur[mask])
+        counts = np.bincount(inv)
+        out = {str(a): (float(sec), int(n)) for a, sec, n in zip(ids, seconds, counts)}
+
+    open_sessions = []
+    for i in np.flatnonzero(~closed & has_avatar):
+        row = rows[int(i)]
+        if row.get("ended_at"):
+            continue
+        started = _epoch(row.get("started_at"))
+        if started is not None:
+            open_sessions.append((str(row.get("session_id") or ""), str(avatar[i]), started))
+    return out, open_sessions
+
+
+def _float(value) -> float:
+    try:
+        return float(value or 0)
+    except Exception:
+        return 0.0
+
+
+def load_session_rows(settings: Settings, avatar_ids: list[str], page_size: int = 1000) -> Iterable[dict]:
+    """Every ``avatar_sessions`` row of ``avatar_ids``, paginated (no 1000-row cap)."""
+    offset = 0
+    while True:
+        page = get_json(
+            settings,
+            "avatar_sessions",
+            "avatar_id,session_id,duration_seconds,started_at,ended_at",
+            {
+                "avatar_id": f"in.({','.join(avatar_ids)})",
+                "order": "session_id.asc",
+                "offset": str(offset),
+            },
+            limit=page_size,
+        )
+        yield from page
+        if len(page) < page_size:
+            return
+        offset += page_size
+
+
+class AvatarUsageRollup:
+    """Lifetime usage per avatar, maintained incrementally and reconciled.
+
+    ``record_start``/``record_end`` are fed by the write-behind queue once the
+    corresponding ``avatar_sessions`` write is confirmed, so the rollup follows
+    what Supabase holds. ``usage()`` answers in O(avatars + open sessions).
+    Avatars never seen (or reconciled more than ``reconcile_seconds`` ago) are
+    recomputed from all their rows with ``aggregate_sessions``: synchronously
+    the first time, in the background afterwards. A reconcile leaves alone the
+    avatars whose start/end was recorded after it began loading rows (their
+    ``changed_at`` is newer), so a background pass never overwrites an end it
+    did not see; they are picked up by the next one. The SQLite file is shared
+    by all gunicorn workers.
+    """
+
+    def __init__(self, settings: Settings, path: str, reconcile_seconds: float = 3600.0):
+        self._s = settings
+        self._path = path
+        self._reconcile = max(0.0, float(reconcile_seconds))
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        self._inflight: set[str] = set()
+        self._inflight_lock = threading.Lock()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS avatar_usage ("
+            " avatar_id TEXT PRIMARY KEY, seconds REAL NOT NULL DEFAULT 0, sessions INTEGER NOT NULL DEFAULT 0,"
+            " reconciled_at REAL NOT NULL DEFAULT 0, changed_at REAL NOT NULL DEFAULT 0)"
+        )
+        if "changed_at" not in {r[1] for r in conn.execute("PRAGMA table_info(avatar_usage)")}:
+            try:
+                conn.execute("ALTER TABLE avatar_usage ADD COLUMN changed_at REAL NOT NULL DEFAULT 0")
+            except sqlite3.OperationalError:
+                pass  # outro worker migrou primeiro
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS open_sessions ("
+            " session_id TEXT PRIMARY KEY, avatar_id TEXT NOT NULL, started_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS open_sessions_avatar ON open_sessions (avatar_id)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        # conexões não atravessam fork: cada worker abre a sua
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self._path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    # ---- incremental ----
+    def record_start(self, session_id: str, avatar_id: str, started_at: float) -> None:
+        if not (session_id and avatar_id):
+            return
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR IGNORE INTO open_sessions (session_id, avatar_id, started_at) VALUES (?, ?, ?)",
+                (session_id, avatar_id, float(started_at)),
+            )
+            conn.execute(
+                "INSERT INTO avatar_usage (avatar_id, changed_at) VALUES (?, ?) "
+                "ON CONFLICT(avatar_id) DO UPDATE SET changed_at = excluded.changed_at",
+                (avatar_id, time.time()),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def record_end(self, session_id: str, duration_seconds: float) -> None:
+        """Moves an open session into the avatar totals (once: a repeated end is a no-op)."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "DELETE FROM open_sessions WHERE session_id = ? RETURNING avatar_id", (session_id,)
+            ).fetchone()
+            duration = float(duration_seconds or 0)
+            if row and duration > 0:
+                conn.execute(
+                    "INSERT INTO avatar_usage (avatar_id, seconds, sessions, changed_at) VALUES (?, ?, 1, ?) "
+                    "ON CONFLICT(avatar_id) DO UPDATE SET seconds = seconds + excluded.seconds,"
+                    " sessions = sessions + 1, changed_at = excluded.changed_at",
+                    (row[0], duration, time.time()),
+                )
+            elif row:
+                conn.execute("UPDATE avatar_usage SET changed_at = ? WHERE avatar_id = ?", (time.time(), row[0]))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def on_writes_flushed(self, ops) -> None:
+        """Listener for ``SupabaseWriteQueue.on_flushed`` (avatar_sessions start/end)."""
+        for op in ops:
+            if op.table != "avatar_sessions":
+                continue
+            try:
+                if op.method == "POST":
+                    self.record_start(op.body.get("session_id"), op.body.get("avatar_id"), _epoch(op.body.get("started_at")) or time.time())
+                elif "duration_seconds" in op.body:
+                    session_id = (op.params.get("session_id") or "").removeprefix("eq.")
+                    self.record_end(session_id, op.body.get("duration_seconds"))
+            except Exception as e:
+                logger.warning("usage rollup update failed: %s", str(e)[:200])
+
+    # ---- reconciliação ----
+    def reconcile(self, avatar_ids: list[str]) -> list[str]:
+        """Full recompute of ``avatar_ids`` from every row in ``avatar_sessions``.
+
+        Avatars with a start/end recorded after the rows started loading are
+        skipped; returns the avatars actually reconciled.
+        """
+        if not avatar_ids:
+            return []
+        started = time.time()
+        closed, open_rows = aggregate_sessions(list(load_session_rows(self._s, avatar_ids)))
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            marks = ",".join("?" * len(avatar_ids))
+            # o que mudou durante a leitura pode não estar nas linhas carregadas: fica para a próxima
+            changed = {
+                r[0]
+                for r in conn.execute(
+                    f"SELECT avatar_id FROM avatar_usage WHERE avatar_id IN ({marks}) AND changed_at >= ?",
+                    [*avatar_ids, started],
+                )
+            }
+            done = [a for a in avatar_ids if a not in changed]
+            if done:
+                marks = ",".join("?" * len(done))
+                conn.execute(f"DELETE FROM open_sessions WHERE avatar_id IN ({marks})", done)
+                conn.executemany(
+                    "INSERT OR REPLACE INTO open_sessions (session_id, avatar_id, started_at) VALUES (?, ?, ?)",
+                    [row for row in open_rows if row[0] and row[1] not in changed],
+                )
+                conn.executemany(
+                    "INSERT INTO avatar_usage (avatar_id, seconds, sessions, reconciled_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(avatar_id) DO UPDATE SET seconds = excluded.seconds,"
+                    " sessions = excluded.sessions, reconciled_at = excluded.reconciled_at",
+                    [(a, *closed.get(a, (0.0, 0)), now) for a in done],
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if changed:
+            logger.info("usage rollup reconcile skipped %d avatar(s) changed meanwhile", len(changed))
+        return done
+
+    def _reconcile_background(self, avatar_ids: list[str]) -> None:
+        with self._inflight_lock:
+            todo = [a for a in avatar_ids if a not in self._inflight]
+            self._inflight.update(todo)
+        if not todo:
+            return
+
+        def run():
+            try:
+                self.reconcile(todo)
+            except Exception as e:
+                logger.warning("usage rollup reconcile failed: %s", str(e)[:200])
+            finally:
+                with self._inflight_lock:
+                    self._inflight.difference_update(todo)
+
+        threading.Thread(target=run, name="usage-rollup-reconcile", daemon=True).start()
+
+    # ---- leitura ----
+    def usage(
+        self, avatar_ids: list[str], now: float | None = None, _reconciled: bool = False
+    ) -> dict[str, tuple[float, int]]:
+        """``{avatar_id: (total_seconds, session_count)}`` for avatars with any usage."""
+        ids = [a for a in dict.fromkeys(avatar_ids or []) if a]
+        if not ids:
+            return {}
+        conn = self._conn()
+        marks = ",".join("?" * len(ids))
+        rows = conn.execute(
+            f"SELECT avatar_id, seconds, sessions, reconciled_at FROM avatar_usage WHERE avatar_id IN ({marks})", ids
+        ).fetchall()
+        now = time.time() if now is None else now
+        # depois de uma reconciliação síncrona vale o incremental de quem mudou durante ela
+        seen = {r[0]: r for r in rows if r[3] > 0 or _reconciled}
+        missing = [a for a in ids if a not in seen]
+        if missing:
+            self.reconcile(missing)
+            return self.usage(ids, now, _reconciled=True)
+        stale = [a for a, r in seen.items() if now - r[3] > self._reconcile]
+        if stale:
+            self._reconcile_background(stale)
+
+        out = {a: (float(r[1]), int(r[2])) for a, r in seen.items()}
+        for avatar_id, started_at in conn.execute(
+            f"SELECT avatar_id, started_at FROM open_sessions WHERE avatar_id IN ({marks})", ids
+        ).fetchall():
+            elapsed = min(max(0.0, now - started_at), OPEN_SESSION_MAX_SECONDS)
+            if elapsed > 0:
+                sec, n = out.get(avatar_id, (0.0, 0))
+                out[avatar_id] = (sec + elapsed, n + 1)
+        return {a: v for a, v in out.items() if v[1] > 0}
@@ -0,0 +1,353 @@
+"""Write-behind queue for Supabase analytics writes, spooled to SQLite."""
+
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable
+
+from ..core.settings import Settings
+from ..shared.setup_logger import LOGGER
+from .http_client import HttpClient, shared_http
+
+logger = LOGGER.get_logger(__name__)
+
+# 408/429 e 5xx são transitórios; demais 4xx nunca vão passar (payload/filtro inválido)
+_RETRYABLE_STATUS = {408, 425, 429}
+
+
+@dataclass
+class PendingWrite:
+    method: str  # "POST" (insert/upsert) | "PATCH"
+    table: str
+    body: dict
+    params: dict = field(default_factory=dict)
+    prefer: str = ""
+    meta: dict = field(default_factory=dict)
+    seq: int = 0
+    attempts: int = 0
+    solo: bool = False
+
+    def batch_key(self) -> tuple | None:
+        # POSTs consecutivos para a mesma tabela/colunas viram um único insert em lote
+        # (exceto os de um lote que já falhou: esses vão um a um)
+        if self.method != "POST" or self.solo:
+            return None
+        return (self.table, json.dumps(self.params, sort_keys=True), self.prefer, tuple(sorted(self.body)))
+
+
+class _Retry(Exception):
+    pass
+
+
+class SupabaseWriteQueue:
+    """Durable, ordered, batched POST/PATCH queue for PostgREST.
+
+    ``post``/``patch`` only append to a local SQLite spool and wake the flusher
+    thread, so requests never wait for Supabase. The flusher sends writes in
+    enqueue order, merging consecutive compatible POSTs into one bulk request.
+    On a transient failure it stops at that write and retries it with
+    exponential backoff (later writes wait, so a PATCH never overtakes the
+    upsert it depends on). A batch that exhausts its attempts, or is rejected
+    outright, is split and its writes are retried one by one, so a single bad
+    row only costs itself. Pending writes survive a crash and are picked up by
+    the next process using the same spool; a lease keeps a single flusher
+    active across gunicorn workers. ``close()`` (atexit / gunicorn
+    ``worker_exit``) drains what it can before the process exits.
+    """
+
+    def __init__(
+        self,
+        settings: Settings,
+        spool_path: str,
+        http: HttpClient | None = None,
+        enabled: bool = True,
+        flush_interval_seconds: float = 0.5,
+        batch_size: int = 100,
+        max_attempts: int = 8,
+        backoff_base_seconds: float = 0.5,
+        backoff_max_seconds: float = 60.0,
+        lease_seconds: float = 30.0,
+    ):
+        self._s = settings
+        self._http = http or shared_http(settings)
+        self._path = spool_path
+        self._enabled = enabled
+        self._interval = max(0.05, float(flush_interval_seconds))
+        self._batch = max(1, int(batch_size))
+        self._max_attempts = max(1, int(max_attempts))
+        self._backoff_base = float(backoff_base_seconds)
+        self._backoff_max = float(backoff_max_seconds)
+        self._lease = float(lease_seconds)
+        self._owner = f"{os.getpid()}:{id(self)}"
+        os.makedirs(os.path.dirname(os.path.abspath(self._path)), exist_ok=True)
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._thread_pid = 0
+        self._atexit = False
+        self._thread_lock = threading.Lock()
+        self._listeners: list[Callable[[list[PendingWrite]], None]] = []
+        self._stats = {"enqueued": 0, "sent": 0, "requests": 0, "retries": 0, "dropped": 0, "split": 0}
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS write_spool ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT, op TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,"
+            " next_at REAL NOT NULL DEFAULT 0, owner TEXT NOT NULL DEFAULT '', lease_until REAL NOT NULL DEFAULT 0,"
+            " solo INTEGER NOT NULL DEFAULT 0)"
+        )
+        if "solo" not in {r[1] for r in conn.execute("PRAGMA table_info(write_spool)")}:
+            try:
+                conn.execute("ALTER TABLE write_spool ADD COLUMN solo INTEGER NOT NULL DEFAULT 0")
+            except sqlite3.OperationalError:
+                pass  # outro worker migrou primeiro
+        # spool deixado por um processo que caiu: drena sem esperar a próxima gravação
+        # (o primeiro envio só sai depois de um intervalo, quando on_flushed já foi registrado)
+        if self._enabled and self.pending() > 0:
+            self._ensure_thread()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        # conexões não atravessam fork: cada worker abre a sua
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self._path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    # ---- API ----
+    def post(self, table: str, body: dict, params: dict | None = None, prefer: str = "", meta: dict | None = None) -> None:
+        self._enqueue(PendingWrite("POST", table, body, params or {}, prefer, meta or {}))
+
+    def patch(self, table: str, params: dict, body: dict, meta: dict | None = None) -> None:
+        self._enqueue(PendingWrite("PATCH", table, body, params, "", meta or {}))
+
+    def on_flushed(self, fn: Callable[[list[PendingWrite]], None]) -> None:
+        """``fn`` receives the writes confirmed by Supabase (e.g. to invalidate caches)."""
+        self._listeners.append(fn)
+
+    def pending(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM write_spool").fetchone()[0]
+
+    def stats(self) -> dict:
+        with self._thread_lock:
+            stats = dict(self._stats)
+        return {**stats, "pending": self.pending()}
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Sends everything that is due now; True when the spool ended empty."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while deadline is None or time.monotonic() < deadline:
+            sent = self._flush_once()
+            if not sent:
+                break
+        return self.pending() == 0
+
+    def close(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        t = self._thread
+        if t is not None and t.is_alive() and t is not threading.current_thread():
+            t.join(timeout)
+        try:
+            if not self.flush(timeout):
+                logger.warning("write-behind: %s writes ficaram no spool %s", self.pending(), self._path)
+        except Exception as e:
+            logger.warning("write-behind close failed: %s", str(e)[:200])
+
+    # ---- interno ----
+    def _enqueue(self, op: PendingWrite) -> None:
+        data = json.dumps(
+            {"method": op.method, "table": op.table, "body": op.body, "params": op.params,
+             "prefer": op.prefer, "meta": op.meta},
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+        self._conn().execute("INSERT INTO write_spool (op) VALUES (?)", (data,))
+        self._count("enqueued")
+        if not self._enabled:
+            self.flush()
+            return
+        self._ensure_thread()
+        self._wake.set()
+
+    def _ensure_thread(self) -> None:
+        with self._thread_lock:
+            if self._thread is not None and self._thread.is_alive() and self._thread_pid == os.getpid():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="supabase-write-behind", daemon=True)
+            self._thread_pid = os.getpid()
+            self._thread.start()
+            if not self._atexit:
+                atexit.register(self.close)
+                self._atexit = True
+
+    def _count(self, name: str, n: int = 1) -> None:
+        # chamado pela thread de flush e por quem enfileira
+        with self._thread_lock:
+            self._stats[name] += n
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self._interval)
+            self._wake.clear()
+            try:
+                while self._flush_once():
+                    pass
+            except Exception as e:
+                logger.warning("write-behind flush failed: %s", str(e)[:200])
+
+    def _claim(self) -> list[PendingWrite]:
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            busy = conn.execute(
+                "SELECT 1 FROM write_spool WHERE lease_until > ? AND owner != ? LIMIT 1", (now, self._owner)
+            ).fetchone()
+            head = conn.execute("SELECT next_at FROM write_spool ORDER BY seq LIMIT 1").fetchone()
+            if busy or not head or head[0] > now:
+                conn.execute("COMMIT")
+                return []
+            rows = conn.execute(
+                "SELECT seq, op, attempts, solo FROM write_spool ORDER BY seq LIMIT ?", (self._batch,)
+            ).fetchall()
+            conn.execute(
+                "UPDATE write_spool SET owner = ?, lease_until = ? WHERE seq <= ?",
+                (self._owner, now + self._lease, rows[-1][0]),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        out = []
+        for seq, raw, attempts, solo in rows:
+            d = json.loads(raw)
+            out.append(PendingWrite(d["method"], d["table"], d.get("body") or {}, d.get("params") or {},
+                                    d.get("prefer") or "", d.get("meta") or {}, seq, attempts, bool(solo)))
+        return out
+
+    def _flush_once(self) -> int:
+        with self._flush_lock:
+            ops = self._claim()
+            if not ops:
+                return 0
+            done: list[PendingWrite] = []
+            confirmed: list[PendingWrite] = []
+            failed: list[PendingWrite] = []
+            split: list[PendingWrite] = []
+            i = 0
+            while i < len(ops):
+                group = [ops[i]]
+                key = ops[i].batch_key()
+                while key is not None and i + len(group) < len(ops) and ops[i + len(group)].batch_key() == key:
+                    group.append(ops[i + len(group)])
+                try:
+                    self._send(group)
+                    done.extend(group)
+                    confirmed.extend(group)
+                except _Retry:
+                    failed = group
+                    break
+                except Exception as e:
+                    if len(group) > 1:
+                        # o lote foi recusado por alguma linha: reenvia uma a uma, sem passar na frente
+                        split = group
+                        break
+                    # não-retentável: descarta para não travar a fila
+                    self._count("dropped", len(group))
+                    logger.warning("write-behind dropped %s %s x%s: %s", group[0].method, group[0].table,
+                                   len(group), str(e)[:200])
+                    done.extend(group)
+                i += len(group)
+            self._settle(done, failed, split, ops)
+            if confirmed:
+                for fn in self._listeners:
+                    try:
+                        fn(confirmed)
+                    except Exception:
+                        pass
+            return len(done) + len(split)
+
+    def _settle(
+        self,
+        done: list[PendingWrite],
+        failed: list[PendingWrite],
+        split: list[PendingWrite],
+        claimed: list[PendingWrite],
+    ) -> None:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if done:
+                conn.executemany("DELETE FROM write_spool WHERE seq = ?", [(op.seq,) for op in done])
+            if failed:
+                head = failed[0]
+                attempts = max(op.attempts for op in failed) + 1
+                if attempts >= self._max_attempts and len(failed) > 1:
+                    # lote esgotado: pode ser uma linha só; cada uma recomeça sozinha
+                    split = failed
+                elif attempts >= self._max_attempts:
+                    self._count("dropped")
+                    logger.warning("write-behind gave up on %s %s after %s attempts", head.method, head.table, attempts)
+                    conn.execute("DELETE FROM write_spool WHERE seq = ?", (head.seq,))
+                else:
+                    self._count("retries")
+                    delay = min(self._backoff_max, self._backoff_base * (2 ** (attempts - 1)))
+                    delay *= 0.5 + random.random() / 2
+                    marks = ",".join("?" * len(failed))
+                    conn.execute(
+                        f"UPDATE write_spool SET attempts = attempts + 1, next_at = ? WHERE seq IN ({marks})",
+                        (time.time() + delay, *(op.seq for op in failed)),
+                    )
+            if split:
+                self._count("split")
+                logger.warning("write-behind splitting %s %s x%s", split[0].method, split[0].table, len(split))
+                marks = ",".join("?" * len(split))
+                conn.execute(
+                    f"UPDATE write_spool SET solo = 1, attempts = 0, next_at = 0 WHERE seq IN ({marks})",
+                    [op.seq for op in split],
+                )
+            conn.execute(
+                "UPDATE write_spool SET owner = '', lease_until = 0 WHERE seq <= ? AND owner = ?",
+                (claimed[-1].seq, self._owner),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _send(self, group: list[PendingWrite]) -> None:
+        head = group[0]
+        key = self._s.supabase_service_role
+        headers = {"apikey": key, "Authorization": f"Bearer {key}", "Content-Type": "application/json"}
+        if head.prefer:
+            headers["Prefer"] = head.prefer
+        url = self._s.supabase_url.rstrip("/") + f"/rest/v1/{head.table}"
+        try:
+            if head.method == "POST":
+                body = [op.body for op in group] if len(group) > 1 else head.body
+                r = self._http.post(url, params=head.params or None, headers=headers, json=body, timeout=6)
+            else:
+                r = self._http.patch(url, params=head.params or None, headers=headers, json=head.body, timeout=6)
+        except Exception as e:
+            raise _Retry(str(e)) from e
+        self._count("requests")
+        if r.ok:
+            self._count("sent", len(group))
+            return
+        if r.status_code >= 500 or r.status_code in _RETRYABLE_STATUS:
+            raise _Retry(f"{r.status_code}")
+        raise RuntimeError(f"supabase_{head.table}_{r.status_code}: {(r.text or '')[:120]}")
@@ -1,9 +1,19 @@
 """Authentication helpers and request guards."""
 
+import hmac
+import time
 from functools import wraps
 from typing import Tuple
 import requests
 from flask import request, jsonify, current_app, abort, g
+from app.infrastructure.http_client import HttpClient
+from app.infrastructure.supabase_jwt import VALID, INVALID
+from app.shared.ttl_cache import MISSING
+
+
+def _http() -> HttpClient:
+    # pool keep-alive compartilhado (Container.http)
+    return current_app.container.http
 
 def _is_public_path_allowed(path: str) -> bool:
     static_allowed = {
@@ -34,14 +44,34 @@ def _get_user_from_supabase(token: str) -> dict | None:
         "apikey": settings.supabase_service_role,
     }
     try:
-        resp = requests.get(url, headers=headers, timeout=10)
+        resp = _http().get(url, headers=headers, timeout=10)
     except requests.RequestException:
         return None
     if resp.status_code != 200:
         return None
     return resp.json()
 
+def _resolve_user_id(token: str) -> str | None:
+    # JWT verificado localmente (segredo/JWKS do projeto); /auth/v1/user só quando não dá para decidir
+    status, claims = current_app.container.jwt_verifier.verify(token)
+    if status == VALID:
+        return claims.get("sub")
+    if status == INVALID:
+        return None
+    user = _get_user_from_supabase(token)
+    if not user:
+        return None
+    return user.get("id")
+
 def _get_client_id_for_user(user_id: str) -> str | None:
+    return _lookup_client_id_for_user(user_id)[1]
+
+def _lookup_client_id_for_user(user_id: str) -> tuple[bool, str | None]:
+    """Returns ``(decided, client_id)``; ``decided`` is False on transport/HTTP errors."""
+    cache = current_app.container.user_clients
+    cached = cache.get(user_id)
+    if cached is not MISSING:
+        return True, cached
     settings = current_app.container.settings
     url = f"{settings.supabase_url}/rest/v1/admin_clients"
     headers = {
@@ -54,44 +84,109 @@ def _get_client_id_for_user(user_id: str) -> str | None:
         "limit": "1",
     }
     try:
-        resp = requests.get(url, headers=headers, params=params, timeout=10)
+        resp = _http().get(url, headers=headers, params=params, timeout=10)
     except requests.RequestException:
-        return None
+        return False, None
     if resp.status_code != 200:
-        return None
+        return False, None
     rows = resp.json() or []
-    if not rows:
-        return None
-    return rows[0].get("id")
+    # negativo também entra no cache (TTL menor): usuário sem admin_client não repete a consulta
+    client_id = rows[0].get("id") if rows else None
+    cache.set(user_id, client_id)
+    return True, client_id
+
+# 400 no embed avatars -> admin_clients: usa o caminho em duas etapas até este instante (monotonic)
+_embed_unsupported_until = 0.0
 
 def _get_client_id_for_avatar(avatar_id: str) -> str | None:
+    # cache por avatar (inclui negativos): quiosques mandam X-Public-Avatar-Id em toda requisição
+    cache = current_app.container.avatar_clients
+    cached = cache.get(avatar_id)
+    if cached is not MISSING:
+        return cached
+    found, client_id = _fetch_client_id_for_avatar(avatar_id)
+    if found:
+        cache.set(avatar_id, client_id)
+    return client_id
+
+def _fetch_client_id_for_avatar(avatar_id: str) -> tuple[bool, str | None]:
+    """Returns ``(decided, client_id)``; ``decided`` is False on transport/HTTP errors."""
+    global _embed_unsupported_until
     settings = current_app.container.settings
     headers = {
         "Authorization": f"Bearer {settings.supabase_service_role}",
         "apikey": settings.supabase_service_role,
     }
+    if time.monotonic() >= _embed_unsupported_until:
+        # avatar -> dono -> admin_client numa única chamada (embedded resource do PostgREST)
+        try:
+            resp = _http().get(
+                f"{settings.supabase_url}/rest/v1/avatars",
+                headers=headers,
+                params={
+                    "select": "id,user_id,admin_clients(id)",
+                    "id": f"eq.{avatar_id}",
+                    "limit": "1",
+                },
+                timeout=10,
+            )
+        except requests.RequestException:
+            return False, None
+        if resp.status_code == 200:
+            rows = resp.json() or []
+            if not rows or not rows[0].get("user_id"):
+                return True, None
+            owners = rows[0].get("admin_clients") or []
+            if isinstance(owners, dict):
+                owners = [owners]
+            return True, (owners[0].get("id") if owners else None)
+        if resp.status_code != 400:
+            return False, None
+        # 400 = relacionamento avatars -> admin_clients não exposto no schema; volta ao caminho em duas etapas
+        _embed_unsupported_until = time.monotonic() + 3600
+
     # 1) get avatar owner (user_id)
     try:
-        avatar_resp = requests.get(
+        avatar_resp = _http().get(
             f"{settings.supabase_url}/rest/v1/avatars",
             headers=headers,
             params={"select": "id,user_id", "id": f"eq.{avatar_id}", "limit": "1"},
             timeout=10,
         )
     except requests.RequestException:
-        return None
+        return False, None
     if avatar_resp.status_code != 200:
-        return None
+        return False, None
     avatar_rows = avatar_resp.json() or []
     if not avatar_rows:
-        return None
+        return True, None
     user_id = avatar_rows[0].get("user_id")
     if not user_id:
-        return None
-    return _get_client_id_for_user(user_id)
+        return True, None
+    return _lookup_client_id_for_user(user_id)
+
+# rotas operacionais: só o APP_API_TOKEN (principal "app"), nunca o JWT de um cliente
+APP_PRINCIPAL = "app"
+_APP_TOKEN_PATHS = {"/cache/invalidate", "/quiz/config/invalidate"}
+
+
+def _is_app_token(token: str | None) -> bool:
+    expected = current_app.container.settings.api_token or ""
+    return bool(token and expected) and hmac.compare_digest(token.encode(), expected.encode())
+
+
+def _forbidden():
+    resp = jsonify({"ok": False, "error": "forbidden"})
+    resp.status_code = 403
+    abort(resp)
+
 
 def _authenticate() -> Tuple[str, str]:
     token = _extract_token()
+    if request.path in _APP_TOKEN_PATHS:
+        if not _is_app_token(token):
+            _forbidden()
+        return APP_PRINCIPAL, APP_PRINCIPAL
     if not token:
         if _is_public_path_allowed(request.path):
             return "public", "public"
@@ -105,21 +200,20 @@ def _authenticate() -> Tuple[str, str]:
             "/context/resolve",
             "/liveavatar/voices",
         }
-        if public_avatar_id:
+        if public_avatar_id and request.path in avatar_public_paths:
             client_id = _get_client_id_for_avatar(public_avatar_id)
-            if client_id and request.path in avatar_public_paths:
+            if client_id:
                 return "public", client_id
         resp = jsonify({"ok": False, "error": "unauthorized"})
         resp.status_code = 401
         abort(resp)
 
-    user = _get_user_from_supabase(token)
-    if not user or not user.get("id"):
+    user_id = _resolve_user_id(token)
+    if not user_id:
         resp = jsonify({"ok": False, "error": "unauthorized"})
         resp.status_code = 401
         abort(resp)
 
-    user_id = user["id"]
     client_id = _get_client_id_for_user(user_id)
     if not client_id:
         resp = jsonify({"ok": False, "error": "missing_client_mapping"})
@@ -132,6 +226,15 @@ def require_auth():
     g.user_id = user_id
     g.client_id = client_id
 
+def app_token_required(fn):
+    """Guard for operational endpoints: the bearer must be APP_API_TOKEN."""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not _is_app_token(_extract_token()):
+            _forbidden()
+        return fn(*args, **kwargs)
+    return wrapper
+
 def protected(fn):
     @wraps(fn)
     def wrapper(*args, **kwargs):
@@ -2,6 +2,9 @@
 
 from flask import Blueprint, jsonify, current_app, request, g
 
+from app.infrastructure.rate_limiter import limiter_stats
+from app.presentation.http.auth import app_token_required
+
 bp = Blueprint("health", __name__)
 
 @bp.get("/health")
@@ -25,3 +28,47 @@ def health():
             "sessions": len(budget.sessions)
         }
     })
+
+
+@bp.get("/metrics/http")
+def http_metrics():
+    """Latency, pool-wait and connection counters per outbound upstream."""
+    return jsonify({"ok": True, "http": current_app.container.http.metrics_snapshot()})
+
+
+@bp.get("/metrics/writes")
+def write_metrics():
+    """Write-behind queue counters (enqueued/sent/retries/dropped) and spool backlog."""
+    return jsonify({"ok": True, "writes": current_app.container.writes.stats()})
+
+
+@bp.get("/metrics/gemini")
+def gemini_metrics():
+    """Shared Gemini limiter per api_key hash: current rate, queue and 429 counters."""
+    return jsonify({"ok": True, "limiters": limiter_stats()})
+
+
+@bp.get("/metrics/cache")
+def cache_metrics():
+    """Size and hit/miss/stale/eviction counters for each in-process cache."""
+    caches = current_app.container.caches()
+    return jsonify({"ok": True, "caches": {name: cache.stats() for name, cache in caches.items()}})
+
+
+@bp.post("/cache/invalidate")
+@app_token_required
+def cache_invalidate():
+    """Explicit invalidation after ownership/mapping changes made outside this backend."""
+    c = current_app.container
+    payload = request.get_json(silent=True) or {}
+    name = (payload.get("cache") or "").strip()
+    key = (payload.get("key") or "").strip() or None
+    caches = c.caches()
+    cache = caches.get(name)
+    if cache is None:
+        return jsonify({"ok": False, "error": "unknown_cache", "caches": sorted(caches)}), 400
+    if key:
+        cache.invalidate(key)
+    else:
+        cache.clear()
+    return jsonify({"ok": True, "cache": name, "key": key})
@@ -13,6 +13,7 @@ from app.application.use_cases.generate_editorial_image import (
     GenerateEditorialImageInput,
     execute as generate_editorial_image_uc,
 )
+from app.infrastructure.image_preprocess import prepare_reference_image
 
 bp = Blueprint("image_gen", __name__)
 
@@ -42,13 +43,20 @@ def image_generate_route():
         if not imghdr.what(None, data):
             return jsonify({"ok": False, "error": "invalid_image_format"}), 400
 
+        prepared = prepare_reference_image(
+            data,
+            f.mimetype or "image/jpeg",
+            max_side=c.settings.reference_photo_max_side,
+            jpeg_quality=c.settings.reference_photo_jpeg_quality,
+            enabled=c.settings.reference_photo_preprocess,
+        )
         out, status = generate_editorial_image_uc(
             c.image_gen,
             GenerateEditorialImageInput(
                 gender=gender,
                 hair_color=hair_color,
-                reference_image_bytes=data,
-                reference_mime_type=(f.mimetype or "image/jpeg"),
+                reference_image_bytes=prepared.data,
+                reference_mime_type=prepared.mime_type,
             ),
         )
         if status != 200:
@@ -77,6 +85,7 @@ def image_generate_route():
                 "image_url": f"/uploads/{filename}",
                 "usage_metadata": out.get("usage_metadata"),
                 "prompt_applied": out.get("prompt_applied"),
+                "reference_preprocess": prepared.report(),
             }
         ), 200
     except Exception as exc:
@@ -8,19 +8,29 @@ import re
 from datetime import datetime, timezone
 from flask import Blueprint, current_app, jsonify, request
 
-from app.infrastructure.supabase_rest import get_json, rest_headers
+from app.infrastructure.supabase_rest import count_rows, get_json, rest_headers
+from app.infrastructure.http_client import HttpClient
+from app.presentation.http.auth import app_token_required
 from app.shared.setup_logger import LOGGER
+from app.shared.ttl_cache import MISSING
 import requests
 
 bp = Blueprint("quiz_phase1", __name__)
 logger = LOGGER.get_logger(__name__)
 
+
+def _http() -> HttpClient:
+    # pool keep-alive compartilhado (Container.http)
+    return current_app.container.http
+
 _ALLOWED_MODES = {"mobile", "totem", "auto"}
 _ALLOWED_UPLOAD_TYPES = {"user_photo", "video", "asset"}
 _ALLOWED_GENERATION_KINDS = {"credential_card", "quiz_result", "photo_with"}
 _ALLOWED_VARIABLE_FIELD_TYPES = {"text", "email", "phone", "number", "select"}
 _MAX_LEAD_VALUE_LENGTH = 300
 _MAX_LEAD_FIELD_COUNT = 30
+# folga até max_generations abaixo da qual o limite é conferido sem cache
+_LIMIT_RECHECK_HEADROOM = 25
 _MAX_UPLOAD_SIZE_BYTES_BY_TYPE = {
     "user_photo": int(os.getenv("QUIZ_MAX_USER_PHOTO_MB", "20"))
     * 1024
@@ -52,7 +62,7 @@ def _validate_gemini_key_against_model(
     # Lightweight validation endpoint: checks both key validity and model access.
     url = f"https://generativelanguage.googleapis.com/v1beta/models/{mdl}"
     try:
-        r = requests.get(url, params={"key": key}, timeout=15)
+        r = _http().get(url, params={"key": key}, timeout=15)
     except requests.RequestException:
         return False, "gemini_unreachable"
 
@@ -67,10 +77,18 @@ def _validate_gemini_key_against_model(
     return False, f"gemini_http_{r.status_code}"
 
 
-def _load_active_experience_by_slug(slug: str) -> dict | None:
+def _quiz_config_caches():
+    # outro worker recebeu /quiz/config/invalidate: descarta a config em memória deste processo
     c = current_app.container
+    if c.quiz_config_version.changed():
+        c.quiz_experiences.clear()
+        c.quiz_variables.clear()
+    return c.quiz_experiences, c.quiz_variables
+
+
+def _fetch_active_experience_by_slug(settings, slug: str) -> dict | None:
     rows = get_json(
-        c.settings,
+        settings,
         "experiences",
         "id,type,status,config_json",
         {"slug": f"eq.{slug}", "status": "in.(active,published)"},
@@ -79,6 +97,25 @@ def _load_active_experience_by_slug(slug: str) -> dict | None:
     return rows[0] if rows else None
 
 
+def _load_active_experience_by_slug(slug: str, allow_stale: bool = True) -> dict | None:
+    """Active experience for ``slug``.
+
+    Write paths (leads) pass ``allow_stale=False``: an expired entry is
+    reloaded instead of being served during the stale grace, so a
+    deactivated experience stops accepting writes within the cache TTL.
+    """
+    settings = current_app.container.settings
+    experiences, _ = _quiz_config_caches()
+    if allow_stale:
+        return experiences.get_or_load(slug, lambda: _fetch_active_experience_by_slug(settings, slug))
+    cached = experiences.get(slug)
+    if cached is not MISSING:
+        return cached
+    exp = _fetch_active_experience_by_slug(settings, slug)
+    experiences.set(slug, exp)
+    return exp
+
+
 def _load_active_experience_by_id(experience_id: str) -> dict | None:
     c = current_app.container
     rows = get_json(
@@ -103,10 +140,9 @@ def _load_experience_by_id(experience_id: str) -> dict | None:
     return rows[0] if rows else None
 
 
-def _load_experience_variables(experience_id: str) -> list[dict]:
-    c = current_app.container
+def _fetch_experience_variables(settings, experience_id: str) -> list[dict]:
     rows = get_json(
-        c.settings,
+        settings,
         "experience_variables",
         "variable_key,label,field_type,required,sort_order,options",
         {"experience_id": f"eq.{experience_id}", "order": "sort_order.asc"},
@@ -114,6 +150,12 @@ def _load_experience_variables(experience_id: str) -> list[dict]:
     return rows or []
 
 
+def _load_experience_variables(experience_id: str) -> list[dict]:
+    settings = current_app.container.settings
+    _, variables = _quiz_config_caches()
+    return variables.get_or_load(experience_id, lambda: _fetch_experience_variables(settings, experience_id))
+
+
 def _normalize_variable_key(value: str) -> str:
     key = (value or "").strip().lower()
     return re.sub(r"[^a-z0-9_]", "_", key)
@@ -198,7 +240,7 @@ def _insert_credential_row(
             "mode_used": mode_used,
         }
     ]
-    r = requests.post(
+    r = _http().post(
         url,
         headers={
             **rest_headers(c.settings),
@@ -223,7 +265,7 @@ def _insert_lead_row(
     c = current_app.container
     lead_payload = {"experience_id": experience_id, "quiz_answers": data}
     url = f"{c.settings.supabase_url}/rest/v1/leads"
-    r = requests.post(
+    r = _http().post(
         url,
         headers={
             **rest_headers(c.settings),
@@ -249,7 +291,7 @@ def _complete_lead_row(
         f"{c.settings.supabase_url}/rest/v1/leads"
         f"?id=eq.{lead_id}&experience_id=eq.{experience_id}"
     )
-    r = requests.patch(
+    r = _http().patch(
         url,
         headers={
             **rest_headers(c.settings),
@@ -281,26 +323,41 @@ def _load_credential_for_experience(
     return rows[0] if rows else None
 
 
-def _count_done_generations(experience_id: str) -> int:
+def _cached_count(name: str, experience_id: str, table: str, params: dict, fresh: bool = False) -> int:
+    # contagem exata sem trafegar linhas (HEAD + count=exact), com TTL curto por experiência
     c = current_app.container
-    rows = get_json(
-        c.settings,
+    key = (name, experience_id)
+    if not fresh:
+        cached = c.quiz_counts.get(key)
+        if cached is not MISSING:
+            return cached
+    total = count_rows(c.settings, table, params)
+    c.quiz_counts.set(key, total)
+    return total
+
+
+def _count_done_generations(experience_id: str, fresh: bool = False) -> int:
+    return _cached_count(
+        "done_generations",
+        experience_id,
         "generations",
-        "id",
         {"experience_id": f"eq.{experience_id}", "status": "eq.done"},
+        fresh=fresh,
     )
-    return len(rows)
 
 
 def _count_started_leads(experience_id: str) -> int:
-    c = current_app.container
-    rows = get_json(
-        c.settings,
-        "leads",
-        "id",
-        {"experience_id": f"eq.{experience_id}"},
-    )
-    return len(rows)
+    return _cached_count("leads", experience_id, "leads", {"experience_id": f"eq.{experience_id}"})
+
+
+def _generation_limit_reached(experience_id: str, max_generations: int) -> bool:
+    if max_generations <= 0:
+        return False
+    done = _count_done_generations(experience_id)
+    if max_generations - done > _LIMIT_RECHECK_HEADROOM:
+        return False
+    # perto do limite o valor em cache pode estar atrasado: confirma com contagem fresca
+    return _count_done_generations(experience_id, fresh=True) >= max_generations
 
 
 def _kind_from_experience_type(experience_type: str) -> str:
@@ -332,7 +389,7 @@ def _find_reusable_generation(credential_id: str, kind: str) -> dict | None:
 def _insert_generation(experience_id: str, credential_id: str, kind: str) -> str:
     c = current_app.container
     url = f"{c.settings.supabase_url}/rest/v1/generations"
-    r = requests.post(
+    r = _http().post(
         url,
         headers={
             **rest_headers(c.settings),
@@ -388,7 +445,7 @@ def _build_signed_download_url(storage_path: str, expires_in: int = 600) -> str
     sign_url = (
         f"{c.settings.supabase_url}/storage/v1/object/sign/{bucket}/{storage_path}"
     )
-    r = requests.post(
+    r = _http().post(
         sign_url,
         headers={**rest_headers(c.settings), "Content-Type": "application/json"},
         json={"expiresIn": max(60, int(expires_in))},
@@ -443,6 +500,17 @@ def public_experience(slug: str):
         )
 
 
+@bp.post("/quiz/config/invalidate")
+@app_token_required
+def invalidate_quiz_config():
+    """Drops cached experience/variables in every worker after an admin edit."""
+    c = current_app.container
+    version = c.quiz_config_version.bump()
+    _quiz_config_caches()
+    logger.info("[quiz] config_invalidated version=%s", version)
+    return jsonify({"ok": True, "version": version}), 200
+
+
 @bp.post("/gemini/validate-key")
 def validate_gemini_key():
     try:
@@ -552,7 +620,7 @@ def create_signed_upload_url():
         bucket = c.settings.supabase_bucket
 
         sign_url = f"{c.settings.supabase_url}/storage/v1/object/upload/sign/{bucket}/{storage_path}"
-        r = requests.post(
+        r = _http().post(
             sign_url,
             headers={**rest_headers(c.settings), "Content-Type": "application/json"},
             json={"expiresIn": 600},
@@ -633,7 +701,7 @@ def confirm_upload():
             return jsonify({"ok": False, "error": "invalid_storage_path_scope"}), 400
 
         uploads_url = f"{c.settings.supabase_url}/rest/v1/uploads"
-        up_resp = requests.post(
+        up_resp = _http().post(
             uploads_url,
             headers={**rest_headers(c.settings), "Content-Type": "application/json"},
             json=[
@@ -662,7 +730,7 @@ def confirm_upload():
             cred_patch_url = (
                 f"{c.settings.supabase_url}/rest/v1/credentials?id=eq.{credential_id}"
             )
-            patch_resp = requests.patch(
+            patch_resp = _http().patch(
                 cred_patch_url,
                 headers={
                     **rest_headers(c.settings),
@@ -690,11 +758,7 @@ def confirm_upload():
                         "published",
                     }:
                         max_generations = int(exp.get("max_generations") or 0)
-                        if (
-                            max_generations > 0
-                            and _count_done_generations(experience_id)
-                            >= max_generations
-                        ):
+                        if _generation_limit_reached(experience_id, max_generations):
                             logger.warning(
                                 "[quiz] eager_generation_skipped_limit experience_id=%s credential_id=%s",
                                 experience_id,
@@ -756,10 +820,7 @@ def create_generation():
             )
 
         max_generations = int(exp.get("max_generations") or 0)
-        if (
-            max_generations > 0
-            and _count_done_generations(experience_id) >= max_generations
-        ):
+        if _generation_limit_reached(experience_id, max_generations):
             return jsonify({"ok": False, "error": "generation_limit_exceeded"}), 429
 
         kind = kind_in or _kind_from_experience_type(str(exp.get("type") or ""))
@@ -972,7 +1033,7 @@ def create_public_lead(slug: str):
         if mode_used not in _ALLOWED_MODES:
             return jsonify({"ok": False, "error": "invalid_mode_used"}), 400
 
-        exp = _load_active_experience_by_slug(s)
+        exp = _load_active_experience_by_slug(s, allow_stale=False)
         if not exp:
             return (
                 jsonify({"ok": False, "error": "experience_not_found_or_inactive"}),
@@ -1004,6 +1065,9 @@ def create_public_lead(slug: str):
                 )
 
         lead_inserted, lead_error, lead_id = _insert_lead_row(experience_id, clean_data)
+        if lead_inserted:
+            # otimista: o contador em cache já reflete o lead novo
+            current_app.container.quiz_counts.incr(("leads", experience_id))
         if not lead_inserted:
             logger.warning(
                 "[quiz] lead_insert_warning experience_id=%s credential_id=%s error=%s",
@@ -1058,7 +1122,7 @@ def complete_public_lead(slug: str, lead_id: str):
         if not archetype_result_id:
             return jsonify({"ok": False, "error": "missing_archetype_result_id"}), 400
 
-        exp = _load_active_experience_by_slug(s)
+        exp = _load_active_experience_by_slug(s, allow_stale=False)
         if not exp:
             return (
                 jsonify({"ok": False, "error": "experience_not_found_or_inactive"}),
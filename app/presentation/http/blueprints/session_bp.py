@@ -2,13 +2,15 @@
 
 import json
 import base64
+import hashlib
 import time
 from datetime import datetime
 import os
-import requests
 import io
+import threading
 import uuid
-from dataclasses import replace
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import fields, replace
 from datetime import datetime, timezone
 from math import floor
 from urllib.parse import urlparse
@@ -33,8 +35,28 @@ from app.application.use_cases.interrupt_session import (
 from app.application.use_cases.metrics import build_metrics
 from app.infrastructure.heygen_client import HeygenClient
 from app.infrastructure.liveavatar_client import LiveAvatarClient
+from app.infrastructure.avatar_credentials_index import (
+    maybe_decode_api_key as _maybe_decode_api_key,
+    maybe_decode_value as _maybe_decode_external_id,
+)
+from app.infrastructure.http_client import HttpClient
+from app.infrastructure.training_snippets import content_hash, extract_snippet
+from app.infrastructure.usage_rollup import OPEN_SESSION_MAX_SECONDS
 
 bp = Blueprint("session", __name__)
+# fetch/parse dos training docs em paralelo (ver _fetch_doc_snippets)
+_doc_fetch_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="training-docs")
+# warm-up do cache de treinamento depois do /new (pool separado: ele espera o _doc_fetch_pool)
+_training_warmup_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="training-warmup")
+# /credits: quota e streaming.list de todas as api_keys em paralelo, sob um prazo total
+_heygen_credits_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="heygen-credits")
+_training_warmups: dict = {}  # session_id -> Future[(contexts, docs, summary)]
+_training_warmups_lock = threading.Lock()
+
+
+def _http() -> HttpClient:
+    # pool keep-alive compartilhado (Container.http)
+    return current_app.container.http
 
 URL_KEEPALIVE = "https://api.heygen.com/v1/streaming.keep_alive"
 URL_LIVEAVATAR_CONTEXTS = "https://api.liveavatar.com/v1/contexts"
@@ -81,17 +103,11 @@ def _client_id():
 
 
 # compat: alguns deploys podem não ter métodos get_session/get_budget no container (instâncias antigas)
+# Com SESSION_STORE=sqlite/redis o objeto devolvido é uma cópia: alterações precisam de _set_*/_update_session.
+# Erros do store propagam (não caímos para uma sessão compartilhada entre clientes).
 def _get_session(container, client_id: str) -> LiveSession:
     if hasattr(container, "get_session"):
-        try:
-            return container.get_session(client_id)
-        except Exception:
-            pass
-    sessions = getattr(container, "sessions", None)
-    if isinstance(sessions, dict):
-        if client_id not in sessions:
-            sessions[client_id] = LiveSession()
-        return sessions[client_id]
+        return container.get_session(client_id)
     sess = getattr(container, "session", None)
     if sess is None:
         sess = LiveSession()
@@ -103,31 +119,27 @@ def _get_session(container, client_id: str) -> LiveSession:
 
 
 def _set_session(container, client_id: str, session_obj: LiveSession):
-    try:
-        if hasattr(container, "sessions"):
-            sessions = getattr(container, "sessions")
-            if isinstance(sessions, dict):
-                sessions[client_id] = session_obj
-                return
-    except Exception:
-        pass
+    if hasattr(container, "set_session"):
+        container.set_session(client_id, session_obj)
+        return
     try:
         setattr(container, "session", session_obj)
     except Exception:
         pass
 
 
+def _update_session(container, client_id: str, fn) -> LiveSession:
+    """Atomic read-modify-write (e.g. ends_at_epoch) that does not clobber concurrent writes."""
+    if hasattr(container, "update_session"):
+        return container.update_session(client_id, fn)
+    session = _get_session(container, client_id)
+    fn(session)
+    return session
+
+
 def _get_budget(container, client_id: str) -> BudgetLedger:
     if hasattr(container, "get_budget"):
-        try:
-            return container.get_budget(client_id)
-        except Exception:
-            pass
-    budgets = getattr(container, "budgets", None)
-    if isinstance(budgets, dict):
-        if client_id not in budgets:
-            budgets[client_id] = BudgetLedger()
-        return budgets[client_id]
+        return container.get_budget(client_id)
     b = getattr(container, "budget", None)
     if b is None:
         b = BudgetLedger()
@@ -138,19 +150,50 @@ def _get_budget(container, client_id: str) -> BudgetLedger:
     return b
 
 
-def _set_budget(container, client_id: str, budget_obj: BudgetLedger):
-    try:
-        if hasattr(container, "budgets"):
-            budgets = getattr(container, "budgets")
-            if isinstance(budgets, dict):
-                budgets[client_id] = budget_obj
-                return
-    except Exception:
-        pass
-    try:
-        setattr(container, "budget", budget_obj)
-    except Exception:
-        pass
+def _update_budget(container, client_id: str, fn) -> BudgetLedger:
+    """Atomic read-modify-write of the ledger (two /new at once must both be debited)."""
+    if hasattr(container, "update_budget"):
+        return container.update_budget(client_id, fn)
+    budget = _get_budget(container, client_id)
+    fn(budget)
+    return budget
+
+
+def _debit_ledger(container, client_id: str) -> BudgetLedger:
+    # o caso de uso debita neste rascunho; _apply_debit soma o débito ao ledger gravado
+    return BudgetLedger(credits_per_session=_get_budget(container, client_id).credits_per_session)
+
+
+def _apply_debit(container, client_id: str, debit: BudgetLedger) -> None:
+    def apply(b: BudgetLedger):
+        b.total_credits_spent += debit.total_credits_spent
+        b.sessions.extend(debit.sessions)
+
+    _update_budget(container, client_id, apply)
+
+
+def _install_session(new: LiveSession):
+    """update_session fn that stores ``new`` without clobbering a concurrent /keepalive.
+
+    When the stored session is the same HeyGen session (resume), a later
+    ``ends_at_epoch`` and an already finished training warm-up are kept.
+    """
+    def apply(s: LiveSession):
+        same = bool(s.session_id) and s.session_id == new.session_id
+        ends_at = s.ends_at_epoch if same else None
+        training = (
+            (s.training_contexts, s.training_docs, s.training_summary)
+            if same and s.training_ready and not new.training_ready else None
+        )
+        for f in fields(LiveSession):
+            setattr(s, f.name, getattr(new, f.name))
+        if ends_at and (not s.ends_at_epoch or ends_at > s.ends_at_epoch):
+            s.ends_at_epoch = ends_at
+        if training is not None:
+            s.training_contexts, s.training_docs, s.training_summary = training
+            s.training_ready = True
+
+    return apply
 
 def _is_allowed_fetch(url: str, settings: Settings) -> bool:
     parsed = urlparse(url)
@@ -171,60 +214,102 @@ def _build_training_summary(contexts, docs) -> str:
         parts.append(f"Docs: {doc_txt}")
     return " | ".join(parts)
 
-def _extract_pdf_text(data: bytes, max_pages: int = 3) -> str:
-    try:
-        import PyPDF2  # opcional; definido em requirements
-    except Exception:
+def _extract_doc_snippet(
+    c,
+    url: str,
+    timeout: float = 8,
+    max_chars: int = 1500,
+    deadline: float | None = None,
+    cancelled: threading.Event | None = None,
+) -> str:
+    settings: Settings = c.settings
+    if not _is_allowed_fetch(url, settings):
         return ""
+    store = c.snippets
+    entry = None
     try:
-        reader = PyPDF2.PdfReader(io.BytesIO(data))
-        texts = []
-        for page in reader.pages[:max_pages]:
-            try:
-                t = page.extract_text() or ""
-                if t: texts.append(t)
-            except Exception:
-                continue
-        return "\n".join(texts)
+        entry = store.get(url)
+        if entry and store.is_fresh(entry):
+            return entry.snippet
     except Exception:
-        return ""
-
-def _extract_doc_snippet(url: str, timeout: int = 8, max_chars: int = 1500) -> str:
-    settings: Settings = current_app.container.settings
-    if not _is_allowed_fetch(url, settings):
-        return ""
+        entry = None
     try:
-        r = requests.get(url, timeout=timeout, stream=True)
-        if not r.ok:
-            return ""
-        ct = (r.headers.get("content-type") or "").lower()
-        max_bytes = max(1024, settings.doc_fetch_max_bytes)
-        data = b""
-        for chunk in r.iter_content(2048):
-            data += chunk
-            if len(data) > max_bytes:
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.monotonic())
+            if timeout <= 0:
                 return ""
-        txt = ""
-        if "text/plain" in ct:
-            txt = data.decode("utf-8", errors="ignore")
-        elif "pdf" in ct or (url or "").lower().endswith(".pdf"):
-            txt = _extract_pdf_text(data)
-        elif "json" in ct:
-            txt = json.dumps(r.json(), ensure_ascii=False)
-        txt = (txt or "").strip()
-        if not txt:
-            return ""
-        if len(txt) > max_chars:
-            return txt[:max_chars] + "..."
+        headers = {}
+        if entry and entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry and entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        r = c.http.get(url, timeout=timeout, stream=True, headers=headers or None)
+        try:
+            if entry and r.status_code == 304:
+                store.touch(url)
+                return entry.snippet
+            if not r.ok:
+                return ""
+            ct = (r.headers.get("content-type") or "").lower()
+            max_bytes = max(1024, settings.doc_fetch_max_bytes)
+            try:
+                size_hint = int(r.headers.get("content-length") or 0)
+            except ValueError:
+                size_hint = 0
+            if size_hint > max_bytes:
+                return ""
+            # buffer pré-alocado pelo Content-Length (sem o data += chunk quadrático)
+            buf = bytearray(size_hint)
+            n = 0
+            for chunk in r.iter_content(16384):
+                if (cancelled is not None and cancelled.is_set()) or (deadline is not None and time.monotonic() > deadline):
+                    return ""
+                end = n + len(chunk)
+                if end > max_bytes:
+                    return ""
+                buf[n:end] = chunk
+                n = end
+            data = bytes(memoryview(buf)[:n])
+            etag = r.headers.get("etag") or ""
+            last_modified = r.headers.get("last-modified") or ""
+        finally:
+            # stream=True: sem close a conexão não volta ao pool (304, erro, corpo grande demais)
+            r.close()
+        digest = content_hash(data)
+        if entry and entry.content_hash == digest:
+            # mesmo conteúdo (ex.: servidor sem ETag): não re-extrai o PDF
+            store.put(url, entry.snippet, digest, etag, last_modified)
+            return entry.snippet
+        txt = extract_snippet(data, ct, url, max_chars)
+        store.put(url, txt, digest, etag, last_modified)
         return txt
     except Exception:
         return ""
 
-def _build_training_details(contexts, docs) -> tuple[str, list]:
+def _fetch_doc_snippets(c, docs) -> list[str]:
+    """Fetch/parse docs concurrently under one deadline; stragglers are dropped."""
+    if not docs:
+        return []
+    deadline = time.monotonic() + max(0.1, c.settings.training_docs_deadline_seconds)
+    cancelled = threading.Event()
+    futures = [
+        _doc_fetch_pool.submit(_extract_doc_snippet, c, getattr(d, "url", ""), deadline=deadline, cancelled=cancelled)
+        for d in docs
+    ]
+    done, pending = wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+    if pending:
+        cancelled.set()
+        for f in pending:
+            f.cancel()
+        _log("TRAIN", "doc_fetch_deadline", {"pending": len(pending), "done": len(done)})
+    return [f.result() if f in done else "" for f in futures]
+
+def _build_training_details(container, contexts, docs) -> tuple[str, list]:
     summary = _build_training_summary(contexts, docs)
     doc_snippets = []
-    for d in docs[:3]:
-        snippet = _extract_doc_snippet(getattr(d, "url", ""))
+    docs = docs[:3]
+    snippets = _fetch_doc_snippets(container, docs)
+    for d, snippet in zip(docs, snippets):
         if snippet:
             doc_snippets.append(f"{getattr(d,'name','doc')}: {snippet}")
     # limita tamanho total do prompt extra
@@ -240,12 +325,80 @@ def _load_training_cache(container, avatar_id: str):
             return [], [], ""
         contexts = container.ctx_repo.list_contexts_by_avatar(avatar_uuid)
         docs = container.ctx_repo.list_training_docs_by_avatar(avatar_uuid)
-        summary, _ = _build_training_details(contexts, docs)
+        summary, _ = _build_training_details(container, contexts, docs)
         return contexts, docs, summary
     except Exception as e:
         _log("TRAIN", "cache_load_err", {"err": str(e)[:200]})
         return [], [], ""
 
+def _apply_training(session_id: str, ctxs, docs, summary):
+    def apply(s):
+        # a sessão pode ter sido trocada (novo /new) enquanto o warm-up rodava
+        if getattr(s, "session_id", None) != session_id:
+            return
+        s.training_contexts = ctxs
+        s.training_docs = docs
+        s.training_summary = summary
+        s.training_ready = True
+
+    return apply
+
+def _start_training_warmup(container, client_id: str, session_id: str, avatar_id: str):
+    """Loads contexts/docs/snippets after the session was returned and attaches them to it."""
+    if not session_id or not avatar_id:
+        return None
+    app = current_app._get_current_object()
+
+    def job():
+        with app.app_context():
+            t0 = time.time()
+            try:
+                # Prewarm caches for /stt (client + public paths)
+                try:
+                    container.ctx_repo.resolve_avatar_uuid(avatar_id)
+                    if client_id:
+                        container.ctx_repo.resolve_avatar_uuid_for_client(avatar_id, client_id)
+                except Exception:
+                    pass
+                ctxs, docs, summary = _load_training_cache(container, avatar_id)
+                _update_session(container, client_id, _apply_training(session_id, ctxs, docs, summary))
+                _log("TRAIN", "warmup_ok", {"ms": int((time.time() - t0) * 1000), "session": session_id})
+                return ctxs, docs, summary
+            finally:
+                with _training_warmups_lock:
+                    _training_warmups.pop(session_id, None)
+
+    with _training_warmups_lock:
+        fut = _training_warmups.get(session_id)
+        if fut is None:
+            fut = _training_warmup_pool.submit(job)
+            _training_warmups[session_id] = fut
+    return fut
+
+def _await_training(container, client_id: str, session: LiveSession, avatar_id: str) -> str:
+    """Training summary for /say: waits briefly for the warm-up, otherwise proceeds without it."""
+    if getattr(session, "training_ready", False) or getattr(session, "training_summary", ""):
+        return getattr(session, "training_summary", "")
+    session_id = getattr(session, "session_id", None)
+    with _training_warmups_lock:
+        fut = _training_warmups.get(session_id)
+    if fut is None:
+        # terminou entre a leitura da sessão e agora, ou rodou em outro worker
+        fresh = _get_session(container, client_id)
+        if getattr(fresh, "session_id", None) == session_id and getattr(fresh, "training_ready", False):
+            _apply_training(session_id, fresh.training_contexts, fresh.training_docs, fresh.training_summary)(session)
+            return session.training_summary
+        fut = _start_training_warmup(container, client_id, session_id, avatar_id or getattr(session, "avatar_id", None))
+        if fut is None:
+            return ""
+    try:
+        ctxs, docs, summary = fut.result(timeout=container.settings.training_warmup_wait_seconds)
+    except Exception:
+        _log("TRAIN", "warmup_not_ready", {"session": session_id})
+        return ""
+    _apply_training(session_id, ctxs, docs, summary)(session)
+    return summary
+
 @bp.get("/heygen-sdk.umd.js")
 def serve_heygen_sdk():
     s = current_app.container.settings
@@ -275,7 +428,7 @@ def _fetch_avatar_credentials(s: Settings):
     main = None
     mapping = []
     try:
-        r = requests.get(
+        r = _http().get(
             base,
             params={"select": "api_key,avatar_id,avatar_external_id", "limit": 1},
             headers=headers,
@@ -289,7 +442,7 @@ def _fetch_avatar_credentials(s: Settings):
         _log("SUPA", "cred_fetch_exc", {"err": str(e)[:120]})
 
     try:
-        rmap = requests.get(
+        rmap = _http().get(
             base,
             params={"select": "avatar_id,avatar_external_id"},
             headers=headers,
@@ -307,54 +460,17 @@ def _fetch_avatar_credentials(s: Settings):
 
 def _fetch_avatar_credentials_rows(s: Settings, avatar_ids: list | None = None) -> list:
     """
-    Busca todas as credenciais de avatar e já decodifica api_key e avatar_external_id.
+    Credenciais de avatar já decodificadas (api_key, avatar_external_id, voice_id, context_id),
+    servidas pelo índice em memória do Container.
     """
-    base = s.supabase_url.rstrip("/") + "/rest/v1/avatar_credentials"
-    headers = _supabase_headers(s)
-    rows = []
-    try:
-        params = {"select": "api_key,avatar_id,avatar_external_id,voice_id,context_id"}
-        if avatar_ids:
-            params["avatar_id"] = f"in.({','.join(avatar_ids)})"
-        r = requests.get(
-            base,
-            params=params,
-            headers=headers,
-            timeout=6,
-        )
-        if r.ok:
-            rows = r.json() or []
-        else:
-            _log("SUPA", "cred_rows_fetch_err", {"status": r.status_code, "body": r.text[:120]})
-    except Exception as e:
-        _log("SUPA", "cred_rows_fetch_exc", {"err": str(e)[:120]})
-
-    decoded = []
-    for row in rows:
-        api_key = _maybe_decode_api_key(row.get("api_key"))
-        avatar_external_id = _maybe_decode_external_id(row.get("avatar_external_id"))
-        voice_id = _maybe_decode_value(row.get("voice_id"))
-        context_id = _maybe_decode_value(row.get("context_id"))
-        if not api_key or not avatar_external_id:
-            continue
-        decoded.append({
-            "api_key": api_key,
-            "avatar_id": row.get("avatar_id"),
-            "avatar_external_id": avatar_external_id,
-            "voice_id": voice_id,
-            "context_id": context_id,
-        })
-    return decoded
+    return current_app.container.credentials.rows(avatar_ids)
 
 
 def _resolve_avatar_credentials(settings: Settings, avatar_id: str | None) -> dict | None:
     if not avatar_id:
         return None
-    rows = _fetch_avatar_credentials_rows(settings)
-    for row in rows:
-        if avatar_id == row.get("avatar_id") or avatar_id == row.get("avatar_external_id"):
-            return row
-    return None
+    # busca indexada por avatar_id ou avatar_external_id (sem baixar a tabela inteira)
+    return current_app.container.credentials.get(avatar_id)
 
 
 def _resolve_avatar_api_key(settings: Settings, avatar_id: str | None) -> str | None:
@@ -385,48 +501,6 @@ def _require_api_key(settings: Settings, avatar_id: str | None, session: LiveSes
     return api_key, creds, None
 
 
-def _maybe_decode_api_key(val: str | None) -> str | None:
-    if not val:
-        return val
-    v = val.strip()
-    # se parecer base64, tenta decodificar
-    try:
-        if any(ch in v for ch in ("=", "/")) or v.isascii():
-            decoded = base64.b64decode(v).decode()
-            # se decodificou para algo plausível (tem hífen típico da HeyGen), usa
-            if decoded and any(c in decoded for c in "-_"):
-                return decoded
-    except Exception:
-        pass
-    return v
-
-
-def _maybe_decode_external_id(val: str | None) -> str | None:
-    if not val:
-        return val
-    v = val.strip()
-    try:
-        decoded = base64.b64decode(v).decode()
-        if decoded:
-            return decoded
-    except Exception:
-        pass
-    return v
-
-
-def _maybe_decode_value(val: str | None) -> str | None:
-    if not val:
-        return val
-    v = val.strip()
-    try:
-        decoded = base64.b64decode(v).decode()
-        if decoded:
-            return decoded
-    except Exception:
-        pass
-    return v
-
-
 def _encode_cred_value(val: str) -> str:
     return base64.b64encode(val.encode()).decode()
 
@@ -434,16 +508,12 @@ def _encode_cred_value(val: str) -> str:
 def _update_avatar_context_id(settings: Settings, avatar_id: str, context_id: str) -> None:
     if not avatar_id or not context_id:
         return
+    # o índice já serve o context_id novo; só recarrega do Supabase quando o PATCH enfileirado for confirmado
+    current_app.container.credentials.set_context_id(avatar_id, context_id)
     try:
-        url = settings.supabase_url.rstrip("/") + "/rest/v1/avatar_credentials"
-        headers = _supabase_headers(settings)
         payload = {"context_id": _encode_cred_value(context_id), "updated_at": datetime.now(timezone.utc).isoformat()}
-        requests.patch(
-            url,
-            params={"avatar_id": f"eq.{avatar_id}"},
-            headers=headers,
-            json=payload,
-            timeout=6,
+        current_app.container.writes.patch(
+            "avatar_credentials", {"avatar_id": f"eq.{avatar_id}"}, payload, meta={"context_id": context_id}
         )
     except Exception as e:
         _log("SUPA", "context_update_err", {"err": str(e)[:120]})
@@ -467,7 +537,7 @@ def _create_liveavatar_context(
         "opening_text": opening_text,
     }
     try:
-        res = requests.post(
+        res = _http().post(
             URL_LIVEAVATAR_CONTEXTS,
             headers={
                 "X-API-KEY": api_key,
@@ -483,7 +553,7 @@ def _create_liveavatar_context(
             if res.status_code == 400 and "name" in body and "already exists" in body:
                 unique_name = f"{base_name}-{int(time.time())}"
                 payload["name"] = unique_name
-                res = requests.post(
+                res = _http().post(
                     URL_LIVEAVATAR_CONTEXTS,
                     headers={
                         "X-API-KEY": api_key,
@@ -510,9 +580,6 @@ def _log_avatar_session_start(s: Settings, avatar_id: str, session_id: str, star
     if not avatar_id or not session_id:
         return
     try:
-        url = s.supabase_url.rstrip("/") + "/rest/v1/avatar_sessions"
-        headers = _supabase_headers(s)
-        headers["Prefer"] = "resolution=merge-duplicates"
         payload = {
             "avatar_id": avatar_id,
             "session_id": session_id,
@@ -520,12 +587,12 @@ def _log_avatar_session_start(s: Settings, avatar_id: str, session_id: str, star
             "platform": "web",
             "metadata": {"source": "backend"},
         }
-        requests.post(
-            url,
+        # só grava no spool local; o flush (em lote, com retry) roda fora da requisição
+        current_app.container.writes.post(
+            "avatar_sessions",
+            payload,
             params={"on_conflict": "session_id"},
-            headers=headers,
-            json=payload,
-            timeout=6,
+            prefer="resolution=merge-duplicates",
         )
     except Exception as e:
         _log("SUPA", "session_start_log_err", {"err": str(e)[:120]})
@@ -535,26 +602,15 @@ def _log_avatar_session_end(s: Settings, session_id: str, duration_seconds: floa
     if not session_id:
         return
     try:
-        url = s.supabase_url.rstrip("/") + "/rest/v1/avatar_sessions"
-        headers = _supabase_headers(s)
         payload = {
             "ended_at": datetime.now(timezone.utc).isoformat(),
             "duration_seconds": max(0, int(duration_seconds or 0)),
         }
-        requests.patch(
-            url,
-            params={"session_id": f"eq.{session_id}"},
-            headers=headers,
-            json=payload,
-            timeout=6,
-        )
+        current_app.container.writes.patch("avatar_sessions", {"session_id": f"eq.{session_id}"}, payload)
     except Exception as e:
         _log("SUPA", "session_end_log_err", {"err": str(e)[:120]})
 
 
-OPEN_SESSION_MAX_SECONDS = 15 * 60
-
-
 def _build_avatar_usage_from_supa(rows: list) -> list:
     usage_by_avatar = {}
     for row in rows or []:
@@ -577,27 +633,34 @@ def _build_avatar_usage_from_supa(rows: list) -> list:
                     duration = 0
         if not avatar_id or duration <= 0:
             continue
-        agg = usage_by_avatar.get(avatar_id, {"seconds": 0, "count": 0})
-        agg["seconds"] += duration
-        agg["count"] += 1
-        usage_by_avatar[avatar_id] = agg
+        seconds, count = usage_by_avatar.get(avatar_id, (0, 0))
+        usage_by_avatar[avatar_id] = (seconds + duration, count + 1)
+    return _format_avatar_usage(usage_by_avatar)
+
 
+def _format_avatar_usage(usage_by_avatar: dict) -> list:
     avatar_usage = []
-    for avatar_id, val in usage_by_avatar.items():
-        total_minutes = floor(val["seconds"] / 60)
+    for avatar_id, (seconds, count) in usage_by_avatar.items():
+        total_minutes = floor(seconds / 60)
         avatar_usage.append({
             "avatarId": avatar_id,
             "heygenAvatarId": None,
-            "totalSeconds": val["seconds"],
+            "totalSeconds": seconds,
             "totalMinutes": total_minutes,
             "heygenCredits": total_minutes,
             "euvatarCredits": total_minutes * 4,
-            "sessionCount": val["count"],
+            "sessionCount": count,
         })
     return avatar_usage
 
 
 def _fetch_avatar_sessions_usage(s: Settings, avatar_ids: list | None = None) -> list:
+    if avatar_ids:
+        # uso de toda a vida do avatar, via rollup incremental (sem varrer avatar_sessions)
+        try:
+            return _format_avatar_usage(current_app.container.usage.usage(list(avatar_ids)))
+        except Exception as e:
+            _log("SUPA", "usage_rollup_exc", {"err": str(e)[:120]})
     try:
         url = s.supabase_url.rstrip("/") + "/rest/v1/avatar_sessions"
         headers = _supabase_headers(s)
@@ -609,7 +672,7 @@ def _fetch_avatar_sessions_usage(s: Settings, avatar_ids: list | None = None) ->
         }
         if avatar_ids:
             params["avatar_id"] = f"in.({','.join(avatar_ids)})"
-        r = requests.get(
+        r = _http().get(
             url,
             params=params,
             headers=headers,
@@ -639,7 +702,7 @@ def _resolve_avatar_external_id(settings: Settings, avatar_id: str) -> str:
             "apikey": settings.supabase_service_role,
             "Authorization": f"Bearer {settings.supabase_service_role}",
         }
-        r = requests.get(
+        r = _http().get(
             url,
             params={"select": "avatar_external_id", "avatar_id": f"eq.{avatar_id}", "limit": 1},
             headers=headers,
@@ -664,7 +727,7 @@ def _fetch_avatar_voice_model(settings: Settings, avatar_id: str) -> str | None:
     try:
         url = settings.supabase_url.rstrip("/") + "/rest/v1/avatars"
         headers = _supabase_headers(settings)
-        r = requests.get(
+        r = _http().get(
             url,
             params={"select": "voice_model", "id": f"eq.{avatar_id}", "limit": 1},
             headers=headers,
@@ -737,7 +800,7 @@ def _fetch_client_plan(settings: Settings, user_id: str) -> dict:
     try:
         url = settings.supabase_url.rstrip("/") + "/rest/v1/admin_clients"
         headers = _supabase_headers(settings)
-        r = requests.get(
+        r = _http().get(
             url,
             params={
                 "select": "credits_balance,credits_used_this_month,current_plan",
@@ -818,6 +881,105 @@ def _build_avatar_usage(sessions: list, mapping_rows: list) -> list:
     return avatar_usage
 
 
+def _heygen_key_hash(api_key: str) -> str:
+    # chave de cache sem guardar a api_key em claro
+    return hashlib.sha256(api_key.encode()).hexdigest()[:32]
+
+
+def _fetch_heygen_quota(http: HttpClient, api_key: str, timeout: float) -> dict:
+    """Remaining quota of one key: ``{"status": "ok"|"unauthorized", "remaining": seconds}``.
+
+    Network errors and other non-2xx statuses raise, so they are never cached.
+    """
+    headers = {"X-Api-Key": api_key, "Content-Type": "application/json"}
+    # Primeiro tenta o endpoint novo; se 404 ou 401, tenta o antigo.
+    resp = http.get("https://api.heygen.com/v2/get_remaining_quota", headers=headers, timeout=timeout)
+    if resp.status_code in (401, 404):
+        _log("HEYGEN", "quota_fallback", {"status": resp.status_code, "body": resp.text[:200]})
+        resp = http.get("https://api.heygen.com/v2/user/remaining_quota", headers=headers, timeout=timeout)
+    if resp.status_code == 401:
+        _log("HEYGEN", "quota_401_body", {"body": resp.text[:200]})
+        return {"status": "unauthorized", "remaining": 0.0}
+    if not resp.ok:
+        _log("HEYGEN", "quota_err", {"status": resp.status_code, "body": resp.text[:200]})
+        raise RuntimeError(f"heygen_quota_{resp.status_code}")
+    data = resp.json() if resp.text else {}
+    remaining = (data.get("data") or {}).get("remaining_quota") or data.get("remaining_quota") or 0
+    return {"status": "ok", "remaining": float(remaining or 0)}
+
+
+def _in_app_context(fn):
+    app = current_app._get_current_object()
+
+    def run(*args, **kwargs):
+        with app.app_context():
+            return fn(*args, **kwargs)
+
+    return run
+
+
+def _fetch_heygen_quotas(c, keys: list[str], deadline: float) -> list[dict | None]:
+    """Quota per key, fetched concurrently through ``c.quota_cache`` (stale-while-revalidate).
+
+    Keys that fail or miss the shared ``deadline`` come back as ``None``; their
+    in-flight request keeps running and fills the cache for the next refresh.
+    """
+    timeout = max(0.5, min(15.0, deadline - time.monotonic()))
+
+    def load(key):
+        return c.quota_cache.get_or_load(
+            _heygen_key_hash(key),
+            _in_app_context(lambda: _fetch_heygen_quota(c.http, key, timeout)),
+        )
+
+    futures = [_heygen_credits_pool.submit(_in_app_context(load), key) for key in keys]
+    wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+    out = []
+    for fut in futures:
+        if not fut.done():
+            fut.cancel()
+            _log("HEYGEN", "quota_deadline", {"deadline_s": c.settings.credits_deadline_seconds})
+            out.append(None)
+            continue
+        try:
+            out.append(fut.result())
+        except Exception as e:
+            _log("HEYGEN", "quota_exc", {"err": str(e)[:200]})
+            out.append(None)
+    return out
+
+
+def _fetch_heygen_sessions(c, keys: list[str], deadline: float) -> list:
+    """``streaming.list`` of every key in parallel; whatever misses ``deadline`` is left out."""
+    timeout = max(0.5, min(20.0, deadline - time.monotonic()))
+
+    def fetch(key):
+        resp = c.http.get(
+            "https://api.heygen.com/v2/streaming.list",
+            params={"page_size": 100},
+            headers={"X-Api-Key": key, "Content-Type": "application/json"},
+            timeout=timeout,
+        )
+        if not resp.ok:
+            _log("HEYGEN", "sessions_err", {"status": resp.status_code, "body": resp.text[:200]})
+            return []
+        return (resp.json().get("data", {}) or {}).get("data", []) or []
+
+    futures = [_heygen_credits_pool.submit(_in_app_context(fetch), key) for key in keys]
+    wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+    sessions = []
+    for fut in futures:
+        if not fut.done():
+            fut.cancel()
+            _log("HEYGEN", "sessions_deadline", {"deadline_s": c.settings.credits_deadline_seconds})
+            continue
+        try:
+            sessions.extend(fut.result())
+        except Exception as e:
+            _log("HEYGEN", "sessions_exc", {"err": str(e)[:200]})
+    return sessions
+
+
 @bp.get("/credits")
 def credits():
     """
@@ -878,49 +1040,24 @@ def credits():
 
     mapping = [{"avatar_id": row.get("avatar_id"), "avatar_external_id": row.get("avatar_external_id")} for row in cred_rows]
 
-    # Primeiro tenta o endpoint novo; se 404 ou 401, tenta o antigo.
-    def _fetch_quota(url: str, key: str):
-        return requests.get(
-            url,
-            headers={"X-Api-Key": key, "Content-Type": "application/json"},
-            timeout=15,
-        )
-
     if not keys:
         return jsonify({"error": "missing_api_key_for_client", "avatarUsage": []}), 400
 
+    c = current_app.container
+    deadline = time.monotonic() + max(0.5, float(s.credits_deadline_seconds))
+    # uso via Supabase corre junto com a quota; streaming.list só entra se ele vier vazio
+    usage_future = _heygen_credits_pool.submit(_in_app_context(_fetch_avatar_sessions_usage), s, avatar_ids)
     remaining_quota_total = 0.0
     quota_ok = False
     quota_any_401 = False
 
-    for key in keys:
-        try:
-            quota_resp = _fetch_quota("https://api.heygen.com/v2/get_remaining_quota", key)
-            if quota_resp.status_code in (401, 404):
-                _log("HEYGEN", "quota_fallback", {"status": quota_resp.status_code, "body": quota_resp.text[:200]})
-                quota_resp = _fetch_quota("https://api.heygen.com/v2/user/remaining_quota", key)
-        except Exception as e:
-            _log("HEYGEN", "quota_exc", {"err": str(e)[:200]})
+    for quota in _fetch_heygen_quotas(c, keys, deadline):
+        if quota is None:
             continue
-
-        if quota_resp is None:
-            continue
-
-        if quota_resp.status_code == 401:
+        if quota["status"] == "unauthorized":
             quota_any_401 = True
-            try:
-                _log("HEYGEN", "quota_401_body", {"body": quota_resp.text[:200]})
-            except Exception:
-                pass
             continue
-
-        if not quota_resp.ok:
-            _log("HEYGEN", "quota_err", {"status": quota_resp.status_code, "body": quota_resp.text[:200]})
-            continue
-
-        data = quota_resp.json() if quota_resp.text else {}
-        remaining_quota = (data.get("data") or {}).get("remaining_quota") or data.get("remaining_quota") or 0
-        remaining_quota_total += float(remaining_quota or 0)
+        remaining_quota_total += quota["remaining"]
         quota_ok = True
 
     if not credits_configured:
@@ -956,22 +1093,14 @@ def credits():
             "percentageRemaining": 0,
         }
 
-    avatar_usage = _fetch_avatar_sessions_usage(s, avatar_ids)
-    if not avatar_usage:    
+    try:
+        avatar_usage = usage_future.result()
+    except Exception as e:
+        _log("SUPA", "avatar_usage_exc", {"err": str(e)[:200]})
+        avatar_usage = []
+    if not avatar_usage:
         try:
-            sessions = []
-            for key in keys:
-                sessions_resp = requests.get(
-                    "https://api.heygen.com/v2/streaming.list",
-                    params={"page_size": 100},
-                    headers={"X-Api-Key": key, "Content-Type": "application/json"},
-                    timeout=20,
-                )
-                if sessions_resp.ok:
-                    sessions_data = sessions_resp.json().get("data", {})
-                    sessions.extend(sessions_data.get("data", []) or [])
-                else:
-                    _log("HEYGEN", "sessions_err", {"status": sessions_resp.status_code, "body": sessions_resp.text[:200]})
+            sessions = _fetch_heygen_sessions(c, keys, deadline)
             avatar_usage = _build_avatar_usage(sessions, mapping)
         except Exception as e:
             _log("HEYGEN", "sessions_exc", {"err": str(e)[:200]})
@@ -1005,7 +1134,7 @@ def list_heygen_avatars():
     if s.avatar_provider == "liveavatar":
         return list_liveavatar_avatars()
     try:
-        resp = requests.get(
+        resp = _http().get(
             "https://api.heygen.com/v2/avatars",
             headers={"X-Api-Key": api_key, "Content-Type": "application/json"},
             timeout=15,
@@ -1042,7 +1171,7 @@ def list_liveavatar_avatars():
         return jsonify({"error": "missing_api_key_for_client"}), 400
 
     def _fetch(url: str):
-        return requests.get(
+        return _http().get(
             url,
             headers={"X-API-KEY": api_key, "Content-Type": "application/json"},
             timeout=15,
@@ -1102,7 +1231,7 @@ def liveavatar_voices():
         if err:
             return err
 
-        res = requests.get(
+        res = _http().get(
             URL_LIVEAVATAR_VOICES,
             headers={
                 "X-API-KEY": api_key,
@@ -1132,7 +1261,7 @@ def new_session():
         c = current_app.container
         client_id = _client_id()
         session = _get_session(c, client_id)
-        budget = _get_budget(c, client_id)
+        budget = _debit_ledger(c, client_id)
         language = request.args.get("language", "pt-BR")
         persona  = request.args.get("persona", "default")
         quality  = request.args.get("quality", "low")
@@ -1205,7 +1334,7 @@ def new_session():
 
             out.session.avatar_id = avatar_id
             out.session.api_key = api_key
-            _set_session(c, client_id, out.session)
+            _apply_debit(c, client_id, budget)
             now_epoch = int(time.time())
             out.session.started_at_epoch = now_epoch
             if not getattr(out.session, "ends_at_epoch", None):
@@ -1215,18 +1344,9 @@ def new_session():
             except Exception:
                 pass
 
-            # carrega cache de treinamento (contextos + docs) uma vez
-            # Prewarm caches for /stt (client + public paths)
-            try:
-                c.ctx_repo.resolve_avatar_uuid(avatar_id)
-                if client_id:
-                    c.ctx_repo.resolve_avatar_uuid_for_client(avatar_id, client_id)
-            except Exception:
-                pass
-            ctxs, docs, summary = _load_training_cache(c, avatar_id)
-            out.session.training_contexts = ctxs
-            out.session.training_docs = docs
-            out.session.training_summary = summary
+            # grava já; contextos + docs (treinamento) chegam em background via _start_training_warmup
+            _update_session(c, client_id, _install_session(out.session))
+            _start_training_warmup(c, client_id, out.session.session_id, avatar_id)
 
             resp = {"ok": True, "session_id": out.session.session_id, "livekit_url": out.session.url, "access_token": out.session.token}
             _log("RESUME", "ok(/new)", {"ms": int((time.time()-t0)*1000), "session": out.session.session_id})
@@ -1283,7 +1403,7 @@ def new_session():
 
         out.session.avatar_id = avatar_id_in
         out.session.api_key = api_key
-        _set_session(c, client_id, out.session)
+        _apply_debit(c, client_id, budget)
         now_epoch = int(time.time())
         out.session.started_at_epoch = now_epoch
         out.session.ends_at_epoch = int(now_epoch + minutes * 60)
@@ -1292,18 +1412,9 @@ def new_session():
         except Exception:
             pass
 
-        # carrega cache de treinamento (contextos + docs) uma vez
-        # Prewarm caches for /stt (client + public paths)
-        try:
-            c.ctx_repo.resolve_avatar_uuid(avatar_id_in)
-            if client_id:
-                c.ctx_repo.resolve_avatar_uuid_for_client(avatar_id_in, client_id)
-        except Exception:
-            pass
-        ctxs, docs, summary = _load_training_cache(c, avatar_id_in)
-        out.session.training_contexts = ctxs
-        out.session.training_docs = docs
-        out.session.training_summary = summary
+        # responde sem esperar o treinamento: o warm-up anexa contextos/docs à sessão quando terminar
+        _update_session(c, client_id, _install_session(out.session))
+        _start_training_warmup(c, client_id, out.session.session_id, avatar_id_in)
 
         resp = {"ok": True, "session_id": out.session.session_id, "livekit_url": out.session.url, "access_token": out.session.token}
         _log("NEW", "ok", {"ms": int((time.time()-t0)*1000), "session": out.session.session_id})
@@ -1378,17 +1489,11 @@ def say():
                 _log("SAY", "expired", {"now": int(time.time()), "ends": int(session.ends_at_epoch)})
                 return jsonify({"ok": False, "error": "session_expired", "error_code": "session_inactive"}), 410
 
-        training = getattr(session, "training_summary", "")
-        if not training and avatar_id:
-            try:
-                ctxs, docs, summary = _load_training_cache(c, avatar_id)
-                if summary:
-                    session.training_contexts = ctxs
-                    session.training_docs = docs
-                    session.training_summary = summary
-                    training = summary
-            except Exception:
-                pass
+        training = ""
+        try:
+            training = _await_training(c, client_id, session, avatar_id)
+        except Exception:
+            pass
         sys = data.get("system") or system_prompt(
             getattr(session, "backstory", "") or "",
             getattr(session, "language", "pt-BR") or "pt-BR",
@@ -1473,7 +1578,14 @@ def keepalive():
         except Exception:
             extend_minutes = 0.0
         if extend_minutes > 0:
-            session.ends_at_epoch = int(time.time() + max(0.5, extend_minutes) * 60)
+            ends_at = int(time.time() + max(0.5, extend_minutes) * 60)
+
+            def _extend(s):
+                # só estende a mesma sessão (um /new concorrente pode ter trocado a sessão)
+                if s.session_id == sid:
+                    s.ends_at_epoch = ends_at
+
+            _update_session(c, client_id, _extend)
 
         current_app.logger.info("[PING] keepalive %s | heygen=%s | extend=%.2f", sid, r.status_code, extend_minutes)
         return jsonify({
@@ -1502,7 +1614,7 @@ def resume_livekit():
         c = current_app.container
         client_id = _client_id()
         session = _get_session(c, client_id)
-        budget = _get_budget(c, client_id)
+        budget = _debit_ledger(c, client_id)
         data = request.get_json(force=True) or {}
         sid = data.get("session_id") or getattr(session, "session_id", None)
         if not sid:
@@ -1542,7 +1654,8 @@ def resume_livekit():
 
         out.session.avatar_id = avatar_id
         out.session.api_key = api_key
-        _set_session(c, client_id, out.session)
+        _update_session(c, client_id, _install_session(out.session))
+        _apply_debit(c, client_id, budget)
 
         resp = {
             "ok": True,
@@ -1628,7 +1741,7 @@ def _get_client_user_id(settings: Settings, client_id: str | None) -> str | None
     try:
         url = settings.supabase_url.rstrip("/") + "/rest/v1/admin_clients"
         headers = _supabase_headers(settings)
-        r = requests.get(
+        r = _http().get(
             url,
             params={"select": "id,user_id", "id": f"eq.{client_id}", "limit": 1},
             headers=headers,
@@ -1649,7 +1762,7 @@ def _get_avatar_ids_for_user(settings: Settings, user_id: str | None) -> list:
     try:
         url = settings.supabase_url.rstrip("/") + "/rest/v1/avatars"
         headers = _supabase_headers(settings)
-        r = requests.get(
+        r = _http().get(
             url,
             params={"select": "id", "user_id": f"eq.{user_id}", "limit": 1000},
             headers=headers,
@@ -1,23 +1,37 @@
 """Speech-to-text endpoints for audio transcription.
 
 IMPORTANT:
-This endpoint only transcribes and prepares assistant text. It does not resolve
-or return media triggers. Trigger resolution is executed in `/say`, after the
-final assistant response is produced.
+`/stt` (and its streaming variant `/stt/stream`) transcribes, prepares assistant text and matches media triggers
+against it. The avatar/context lookup is prefetched in a worker thread while
+Whisper and the LLM run, so only the in-memory matching step is left once the
+assistant text arrives.
 """
 
 from __future__ import annotations
 
-import requests
+import json
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from flask import Blueprint, request, jsonify, current_app, g
+from flask import Blueprint, Response, request, jsonify, current_app, g, stream_with_context
 
 from app.application.use_cases.speech_to_text import execute, STTInput
-from app.application.use_cases.resolve_context import execute as resolve_context_uc, ResolveInput
+from app.application.use_cases.resolve_context import prefetch as prefetch_contexts, match as match_context
+from app.infrastructure.http_client import HttpClient
 
 bp = Blueprint("stt", __name__)
 MAX_AUDIO_BYTES = 3 * 1024 * 1024  # 3 MB to keep STT latency low
+STREAM_READ_BYTES = 1024  # gunicorn returns what one HTTP chunk delivered, up to this
+# Upper bound for waiting on the Supabase prefetch once the LLM text is ready.
+PREFETCH_WAIT_SECONDS = 5
+
+# Avatar/context lookups run here while Whisper + LLM are in flight.
+_prefetch_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="stt-prefetch")
+
+
+def _http() -> HttpClient:
+    # pool keep-alive compartilhado (Container.http)
+    return current_app.container.http
 
 
 def _generate_response_text(system_prompt: str, user_text: str) -> str:
@@ -41,7 +55,7 @@ def _generate_response_text(system_prompt: str, user_text: str) -> str:
             # Keep response very short to hit ~2s end-to-end target.
             "max_tokens": 24,
         }
-        resp = requests.post(
+        resp = _http().post(
             "https://api.openai.com/v1/chat/completions",
             headers={
                 "Authorization": f"Bearer {settings.openai_api_key}",
@@ -59,6 +73,82 @@ def _generate_response_text(system_prompt: str, user_text: str) -> str:
         return ""
 
 
+def _start_turn(c, avatar_id: str, backstory: str, client_id: str | None) -> tuple[str, Future | None]:
+    """Work that does not depend on the transcript; runs before/while audio is transcribed."""
+    # Supabase lookups do not depend on the transcript: start them before Whisper.
+    prefetch_future = None
+    if avatar_id:
+        prefetch_future = _prefetch_pool.submit(prefetch_contexts, c.ctx_repo, avatar_id, client_id)
+
+    # Keep prompt short to reduce LLM latency.
+    trimmed_backstory = backstory[:150] if backstory else ""
+    system_prompt = trimmed_backstory or (
+        "Você é a Assistente Euvatar: educada, direta e prática. "
+        "Responda em até 1-2 frases."
+    )
+    return system_prompt, prefetch_future
+
+
+def _complete_turn(system_prompt: str, prefetch_future: Future | None, user_text: str, client_id: str | None) -> dict:
+    """LLM reply + media match over the prefetched contexts."""
+    llm_ms = 0
+    if user_text:
+        llm_t0 = time.time()
+        response_text = _generate_response_text(system_prompt, user_text)
+        llm_ms = int((time.time() - llm_t0) * 1000)
+        print(f"LLM_MS [{datetime.utcnow().isoformat(timespec='milliseconds')}Z]: {llm_ms}", flush=True)
+    else:
+        response_text = ""
+
+    media = None
+    context_method = "none"
+    prefetch_wait_ms = 0
+    rag_ms = 0
+    resolved = {}
+    if prefetch_future is not None and response_text:
+        try:
+            wait_t0 = time.time()
+            pre = prefetch_future.result(timeout=PREFETCH_WAIT_SECONDS)
+            prefetch_wait_ms = int((time.time() - wait_t0) * 1000)
+            rag_t0 = time.time()
+            resolved = match_context(pre, response_text)
+            rag_ms = int((time.time() - rag_t0) * 1000)
+            ts = datetime.utcnow().isoformat(timespec='milliseconds') + "Z"
+            print(f"RAG_CLIENT [{ts}]: client_id={client_id}", flush=True)
+            print(f"RAG_MS [{ts}]: {rag_ms} (prefetch_wait_ms={prefetch_wait_ms})", flush=True)
+            # Detailed breakdown for diagnostics
+            print(
+                f"RAG_DETAIL [{ts}]: "
+                f"resolve_avatar_ms={resolved.get('resolve_avatar_ms')} "
+                f"list_contexts_ms={resolved.get('list_contexts_ms')} "
+                f"fast_match_ms={resolved.get('fast_match_ms')}",
+                flush=True,
+            )
+            media = resolved.get("media")
+            context_method = resolved.get("method") or "none"
+        except Exception:
+            media = None
+            context_method = "none"
+
+    # Diagnostic log required by delay/repeat investigation.
+    resolved_ts = datetime.utcnow().isoformat(timespec="milliseconds") + "Z"
+    print(f"MEDIA RESOLVIDA [{resolved_ts}] :", media, flush=True)
+
+    return {
+        "response_text": response_text,
+        "media": media,
+        "context_method": context_method,
+        "timings": {
+            "llm_ms": llm_ms,
+            # Supabase lookups overlapped with STT/LLM; wait is what was left on the critical path
+            "resolve_avatar_ms": resolved.get("resolve_avatar_ms", 0),
+            "list_contexts_ms": resolved.get("list_contexts_ms", 0),
+            "prefetch_wait_ms": prefetch_wait_ms,
+            "match_ms": rag_ms,
+        },
+    }
+
+
 @bp.post("/stt")
 def stt_route():
     c = current_app.container
@@ -72,6 +162,14 @@ def stt_route():
         f = request.files["audio"]
         if f.content_length and f.content_length > MAX_AUDIO_BYTES:
             return jsonify({"ok": False, "error": "audio_too_large"}), 413
+        req_t0 = time.time()
+        avatar_id = (request.form.get("avatar_id") or "").strip()
+        backstory = (request.form.get("backstory") or "").strip()
+        # Prefer auth client_id, fallback to form (public mode).
+        form_client_id = (request.form.get("client_id") or "").strip() or None
+        resolved_client_id = getattr(g, "client_id", None) or form_client_id
+        system_prompt, prefetch_future = _start_turn(c, avatar_id, backstory, resolved_client_id)
+
         stt_t0 = time.time()
         stt_out = execute(c.stt, STTInput(filename=f.filename, stream=f.stream, mimetype=f.mimetype))
         stt_ms = int((time.time() - stt_t0) * 1000)
@@ -80,72 +178,80 @@ def stt_route():
             return jsonify(stt_out), 500
 
         user_text = (stt_out.get("text") or "").strip()
-        avatar_id = (request.form.get("avatar_id") or "").strip()
-        backstory = (request.form.get("backstory") or "").strip()
-        # Keep prompt short to reduce LLM latency.
-        trimmed_backstory = backstory[:150] if backstory else ""
-        system_prompt = trimmed_backstory or (
-            "Você é a Assistente Euvatar: educada, direta e prática. "
-            "Responda em até 1-2 frases."
-        )
-
-        llm_ms = 0
-        if user_text:
-            llm_t0 = time.time()
-            response_text = _generate_response_text(system_prompt, user_text)
-            llm_ms = int((time.time() - llm_t0) * 1000)
-            print(f"LLM_MS [{datetime.utcnow().isoformat(timespec='milliseconds')}Z]: {llm_ms}", flush=True)
-        else:
-            response_text = ""
-
-        media = None
-        context_method = "none"
-        rag_ms = 0
-        # Prefer auth client_id, fallback to form (public mode).
-        form_client_id = (request.form.get("client_id") or "").strip() or None
-        resolved_client_id = getattr(g, "client_id", None) or form_client_id
-        if avatar_id and response_text:
-            try:
-                rag_t0 = time.time()
-                resolved = resolve_context_uc(
-                    c.settings,
-                    c.ctx_repo,
-                    ResolveInput(
-                        avatar_identifier=avatar_id,
-                        text=response_text,
-                        client_id=resolved_client_id,
-                    ),
-                )
-                rag_ms = int((time.time() - rag_t0) * 1000)
-                ts = datetime.utcnow().isoformat(timespec='milliseconds') + "Z"
-                print(f"RAG_CLIENT [{ts}]: client_id={resolved_client_id}", flush=True)
-                print(f"RAG_MS [{ts}]: {rag_ms}", flush=True)
-                # Detailed breakdown for diagnostics
-                print(
-                    f"RAG_DETAIL [{ts}]: "
-                    f"resolve_avatar_ms={resolved.get('resolve_avatar_ms')} "
-                    f"list_contexts_ms={resolved.get('list_contexts_ms')} "
-                    f"fast_match_ms={resolved.get('fast_match_ms')}",
-                    flush=True,
-                )
-                media = resolved.get("media")
-                context_method = resolved.get("method") or "none"
-            except Exception:
-                media = None
-                context_method = "none"
-
-        # Diagnostic log required by delay/repeat investigation.
-        resolved_ts = datetime.utcnow().isoformat(timespec="milliseconds") + "Z"
-        print(f"MEDIA RESOLVIDA [{resolved_ts}] :", media, flush=True)
-
-        return jsonify(
-            {
-                "ok": True,
-                "text": user_text,
-                "response_text": response_text,
-                "media": media,
-                "context_method": context_method,
-            }
-        )
+        turn = _complete_turn(system_prompt, prefetch_future, user_text, resolved_client_id)
+        turn["timings"] = {"stt_ms": stt_ms, **turn["timings"], "total_ms": int((time.time() - req_t0) * 1000)}
+        return jsonify({"ok": True, "text": user_text, **turn})
     except Exception as e:
         return jsonify({"ok": False, "error": f"stt_exception: {e}"}), 500
+
+
+def _ndjson(event: dict) -> str:
+    return json.dumps(event, ensure_ascii=False) + "\n"
+
+
+@bp.post("/stt/stream")
+def stt_stream_route():
+    """
+    Streaming variant of `/stt`: the body is raw audio sent with chunked
+    transfer-encoding while the user is speaking (avatar_id, backstory and
+    client_id go in the query string). The response is NDJSON: `partial`
+    events as the transcript grows, then one `final` event shaped like `/stt`.
+    """
+    c = current_app.container
+    if not c.stt:
+        return jsonify({"ok": False, "error": "missing_OPENAI_API_KEY"}), 500
+    max_bytes = c.settings.stt_stream_max_bytes
+    if request.content_length and request.content_length > max_bytes:
+        return jsonify({"ok": False, "error": "audio_too_large"}), 413
+
+    req_t0 = time.time()
+    avatar_id = (request.args.get("avatar_id") or "").strip()
+    backstory = (request.args.get("backstory") or "").strip()
+    form_client_id = (request.args.get("client_id") or "").strip() or None
+    resolved_client_id = getattr(g, "client_id", None) or form_client_id
+    mimetype = (request.mimetype or "").strip() or "audio/webm"
+    ext = mimetype.split("/")[-1].split(";")[0] or "webm"
+    system_prompt, prefetch_future = _start_turn(c, avatar_id, backstory, resolved_client_id)
+    stt_stream = c.stt.open_stream(f"audio.{ext}", mimetype)
+    body = request.stream
+
+    def generate():
+        last_partial = ""
+        received = 0
+        try:
+            while True:
+                chunk = body.read(STREAM_READ_BYTES)
+                if not chunk:
+                    break
+                received += len(chunk)
+                if received > max_bytes:
+                    yield _ndjson({"type": "error", "ok": False, "error": "audio_too_large"})
+                    return
+                stt_stream.feed(chunk)
+                text = stt_stream.partial()
+                if text and text != last_partial:
+                    last_partial = text
+                    yield _ndjson({"type": "partial", "text": text})
+
+            # end-of-speech: only the audio not covered by the last partial is left
+            finalize_t0 = time.time()
+            user_text = stt_stream.finish()
+            finalize_ms = int((time.time() - finalize_t0) * 1000)
+            print(f"STT_FINALIZE_MS [{datetime.utcnow().isoformat(timespec='milliseconds')}Z]: {finalize_ms}", flush=True)
+            turn = _complete_turn(system_prompt, prefetch_future, user_text, resolved_client_id)
+            turn["timings"] = {
+                "stt_finalize_ms": finalize_ms,
+                **turn["timings"],
+                "total_ms": int((time.time() - req_t0) * 1000),
+            }
+            yield _ndjson({"type": "final", "ok": True, "text": user_text, **turn})
+        except Exception as e:
+            yield _ndjson({"type": "error", "ok": False, "error": f"stt_exception: {e}"})
+        finally:
+            stt_stream.close()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,17 +1,23 @@
 """Training document upload/listing endpoints."""
 
 from flask import Blueprint, request, jsonify, current_app
-import requests
 import re
 from app.application.use_cases.upload_training_doc import (
     execute as upload_training_uc,
+    invalidate_avatar_context,
     UploadTrainingDocInput,
 )
 from app.infrastructure.supabase_rest import get_json, patch_json
+from app.infrastructure.http_client import HttpClient
 
 bp = Blueprint("training", __name__)
 
 
+def _http() -> HttpClient:
+    # pool keep-alive compartilhado (Container.http)
+    return current_app.container.http
+
+
 @bp.post("/training/upload")
 def training_upload():
     c = current_app.container
@@ -40,6 +46,9 @@ def training_upload():
                 data=data,
                 title=title,
             ),
+            credentials=c.credentials,
+            snippets=c.snippets,
+            writes=c.writes,
         )
         return jsonify(out), status
     except Exception as e:
@@ -104,7 +113,7 @@ def training_delete():
                 after = doc_url.split(marker, 1)[1]
                 bucket, path = after.split("/", 1)
                 del_url = f"{c.settings.supabase_url}/storage/v1/object/{bucket}/{path}"
-                requests.delete(
+                _http().delete(
                     del_url,
                     headers={
                         "Authorization": f"Bearer {c.settings.supabase_service_role}",
@@ -117,7 +126,7 @@ def training_delete():
 
         # delete row from training_docs
         del_row_url = f"{c.settings.supabase_url}/rest/v1/training_docs"
-        resp = requests.delete(
+        resp = _http().delete(
             del_row_url,
             headers={
                 "Authorization": f"Bearer {c.settings.supabase_service_role}",
@@ -129,15 +138,29 @@ def training_delete():
         if not resp.ok:
             return jsonify({"ok": False, "error": "delete_failed", "details": resp.text[:200]}), 502
 
+        _invalidate_snippets(c.snippets, doc_url, doc_row)
+
         # remove training block from avatar backstory (best effort)
-        _remove_training_from_backstory(c.settings, doc_row)
+        _remove_training_from_backstory(c.settings, doc_row, c.credentials, c.writes)
 
         return jsonify({"ok": True}), 200
     except Exception as e:
         return jsonify({"ok": False, "error": f"training_delete_exception:{e}"}), 500
 
 
-def _remove_training_from_backstory(settings, doc_row):
+def _invalidate_snippets(snippets, doc_url, doc_row):
+    urls = {doc_url}
+    for col in ("document_url", "url", "file_url", "path"):
+        if doc_row and doc_row.get(col):
+            urls.add(str(doc_row[col]).strip())
+    for url in urls:
+        try:
+            snippets.invalidate(url)
+        except Exception:
+            continue
+
+
+def _remove_training_from_backstory(settings, doc_row, credentials=None, writes=None):
     try:
         if not doc_row:
             return
@@ -166,6 +189,6 @@ def _remove_training_from_backstory(settings, doc_row):
         patch_json(settings, f"{settings.supabase_url}/rest/v1/avatars?id=eq.{avatar_id}", {"backstory": new_backstory})
 
         # invalidate context so it gets recreated without the training block
-        patch_json(settings, f"{settings.supabase_url}/rest/v1/avatar_credentials?avatar_id=eq.{avatar_id}", {"context_id": None})
+        invalidate_avatar_context(settings, avatar_id, credentials, writes)
     except Exception:
         return
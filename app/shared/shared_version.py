@@ -0,0 +1,49 @@
+"""Cross-process version counter backed by a file's mtime."""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+
+
+class SharedVersion:
+    """Version token shared by every process that points at ``path``.
+
+    ``bump()`` rewrites the file; ``changed()`` is a single ``stat`` and tells
+    this process (once) that another worker bumped it, so in-memory caches
+    can be dropped everywhere from one invalidation request.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._seen = self.current()
+
+    def current(self) -> int:
+        try:
+            return os.stat(self._path).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def bump(self) -> int:
+        tmp = f"{self._path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(str(time.time_ns()))
+        os.replace(tmp, self._path)
+        # mtime com resolução grosseira (alguns FS): garante valor novo
+        version = self.current()
+        with self._lock:
+            if version == self._seen:
+                os.utime(self._path, ns=(version + 1, version + 1))
+                version += 1
+        return version
+
+    def changed(self) -> bool:
+        version = self.current()
+        with self._lock:
+            if version == self._seen:
+                return False
+            self._seen = version
+            return True
@@ -0,0 +1,186 @@
+"""Thread-safe bounded TTL cache with negative entries."""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+# Sentinela para "não está no cache" (None é um valor válido: resultado negativo).
+MISSING = object()
+
+
+class TTLCache:
+    """LRU-bounded mapping whose entries expire after a TTL.
+
+    ``None`` values are negative results ("looked up, does not exist") and use
+    ``negative_ttl_seconds`` so a missing row is retried sooner than a hit.
+    A ``ttl_seconds`` of 0 disables the cache.
+
+    With ``stale_ttl_seconds`` > 0, expired entries are kept for that long and
+    ``get_or_load`` serves them while a background thread reloads the key; if
+    the reload fails the stale value keeps being served until the grace ends.
+    Plain ``get`` never returns stale values.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl_seconds: float = 300.0,
+        negative_ttl_seconds: float | None = None,
+        stale_ttl_seconds: float = 0.0,
+        name: str = "",
+    ):
+        self.name = name
+        self.maxsize = max(1, int(maxsize))
+        self.ttl_seconds = float(ttl_seconds)
+        self.negative_ttl_seconds = (
+            float(negative_ttl_seconds) if negative_ttl_seconds is not None else self.ttl_seconds
+        )
+        self.stale_ttl_seconds = max(0.0, float(stale_ttl_seconds))
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._refreshing: set[Hashable] = set()
+        self._next_sweep = 0.0
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "stale_hits": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "refreshes": 0,
+            "refresh_errors": 0,
+            "load_errors": 0,
+        }
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self._stats["misses"] += 1
+                return default
+            expires_at, value = item
+            if expires_at <= now:
+                if expires_at + self.stale_ttl_seconds <= now:
+                    del self._data[key]
+                    self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return default
+            self._data.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any], ttl_seconds: float | None = None) -> Any:
+        """Cached value for ``key``, calling ``loader()`` on a miss.
+
+        Stale entries are returned immediately and refreshed in the background.
+        Loader errors on a cold miss propagate to the caller.
+        """
+        now = time.monotonic()
+        stale = False
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                expires_at, value = item
+                if expires_at > now:
+                    self._data.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return value
+                if expires_at + self.stale_ttl_seconds > now:
+                    stale = True
+                    self._stats["stale_hits"] += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        threading.Thread(
+                            target=self._refresh,
+                            args=(key, loader, ttl_seconds),
+                            name=f"cache-refresh-{self.name or 'ttl'}",
+                            daemon=True,
+                        ).start()
+                else:
+                    del self._data[key]
+                    self._stats["expirations"] += 1
+            if not stale:
+                self._stats["misses"] += 1
+        if stale:
+            return value
+        try:
+            value = loader()
+        except Exception:
+            with self._lock:
+                self._stats["load_errors"] += 1
+            raise
+        self.set(key, value, ttl_seconds)
+        return value
+
+    def _refresh(self, key: Hashable, loader: Callable[[], Any], ttl_seconds: float | None) -> None:
+        try:
+            value = loader()
+        except Exception:
+            # upstream fora: mantém o valor stale até o fim da janela de graça
+            with self._lock:
+                self._stats["refresh_errors"] += 1
+                self._refreshing.discard(key)
+            return
+        with self._lock:
+            self._stats["refreshes"] += 1
+            self._refreshing.discard(key)
+        self.set(key, value, ttl_seconds)
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: float | None = None) -> None:
+        if ttl_seconds is None:
+            ttl_seconds = self.negative_ttl_seconds if value is None else self.ttl_seconds
+        if ttl_seconds <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._data[key] = (now + ttl_seconds, value)
+            self._data.move_to_end(key)
+            if now >= self._next_sweep:
+                self._sweep(now)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def incr(self, key: Hashable, delta: int = 1) -> bool:
+        """Adds ``delta`` to a live numeric entry keeping its expiry; False if absent/expired."""
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= now or not isinstance(item[1], (int, float)):
+                return False
+            self._data[key] = (item[0], item[1] + delta)
+            return True
+
+    def _sweep(self, now: float) -> None:
+        # chamado com self._lock; remove entradas que nunca mais serão lidas
+        grace = self.stale_ttl_seconds
+        dead = [k for k, (expires_at, _) in self._data.items() if expires_at + grace <= now]
+        for k in dead:
+            del self._data[k]
+        self._stats["expirations"] += len(dead)
+        self._next_sweep = now + max(1.0, min(self.ttl_seconds, 60.0))
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl_seconds,
+                "stale_ttl_seconds": self.stale_ttl_seconds,
+                **self._stats,
+            }
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
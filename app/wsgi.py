@@ -0,0 +1,10 @@
+"""WSGI entrypoint for production servers (gunicorn)."""
+
+from __future__ import annotations
+from dotenv import load_dotenv
+from app.presentation.http.server import create_app
+
+# Importado uma vez por worker (preload_app=False): cada processo monta o
+# próprio Container, sem herdar conexões abertas pelo master.
+load_dotenv(override=True)
+app = create_app()
@@ -0,0 +1,76 @@
+"""Gunicorn configuration for the production HTTP server."""
+
+import os
+
+
+def _int_env(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+# Mesmas variáveis do servidor de desenvolvimento (app.main).
+bind = os.getenv("GUNICORN_BIND") or f"{os.getenv('APP_HOST', '127.0.0.1')}:{os.getenv('APP_PORT', '5001')}"
+
+# gthread: cada worker atende N requisições em paralelo. O backend passa a
+# maior parte do tempo esperando HeyGen/LiveAvatar/OpenAI/Gemini/Supabase,
+# então threads escalam bem sem multiplicar a memória.
+worker_class = "gthread"
+workers = max(1, _int_env("WEB_CONCURRENCY", 1))
+threads = max(1, _int_env("WEB_THREADS", 8))
+
+# Com SESSION_STORE=memory as sessões/orçamentos vivem na memória de cada
+# processo: com mais de um worker, /new e /say do mesmo cliente poderiam cair
+# em processos diferentes. Nesse caso mantemos um único worker (a concorrência
+# vem das threads) a menos que o operador assuma o risco explicitamente
+# (ex.: balanceador com afinidade por cliente). sqlite (mesmo host) e redis
+# compartilham o estado entre workers e liberam WEB_CONCURRENCY.
+_session_store = (os.getenv("SESSION_STORE", "memory") or "memory").strip().lower()
+_allow_multi_worker = (
+    _session_store in ("sqlite", "redis")
+    or os.getenv("WEB_ALLOW_MULTI_WORKER", "false").lower() == "true"
+)
+_requested_workers = workers
+if workers > 1 and not _allow_multi_worker:
+    workers = 1
+
+# A app é criada dentro de cada worker (create_app por processo), sem
+# compartilhar sockets/pools abertos antes do fork.
+preload_app = False
+wsgi_app = "app.wsgi:app"
+
+# /image/generate e chamadas ao Gemini podem levar ~90s.
+timeout = _int_env("GUNICORN_TIMEOUT", 120)
+graceful_timeout = _int_env("GUNICORN_GRACEFUL_TIMEOUT", 30)
+keepalive = _int_env("GUNICORN_KEEPALIVE", 5)
+
+# Recicla workers periodicamente (0 desliga).
+max_requests = _int_env("GUNICORN_MAX_REQUESTS", 0)
+max_requests_jitter = _int_env("GUNICORN_MAX_REQUESTS_JITTER", 0)
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG") or None
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+
+def on_starting(server):
+    if _requested_workers != workers:
+        server.log.warning(
+            "WEB_CONCURRENCY=%s ignorado: SESSION_STORE=memory é local ao processo; usando 1 worker x %s threads "
+            "(use SESSION_STORE=sqlite|redis, ou WEB_ALLOW_MULTI_WORKER=true com afinidade por cliente)",
+            _requested_workers,
+            threads,
+        )
+
+
+def post_fork(server, worker):
+    server.log.info("worker pronto pid=%s threads=%s", worker.pid, threads)
+
+
+def worker_exit(server, worker):
+    # drena a fila write-behind (analytics no Supabase) antes do processo sair
+    try:
+        worker.wsgi.container.writes.close(timeout=5)
+    except Exception as e:
+        server.log.warning("write-behind não drenado no worker_exit: %s", e)
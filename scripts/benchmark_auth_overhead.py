@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""Auth overhead per request: remote Supabase lookups (before) vs local JWT + cache (after)."""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+# Valores fictícios: nenhuma chamada sai da máquina (Supabase é simulado).
+for _k, _v in {
+    "HEYGEN_API_KEY": "bench-key",
+    "SUPABASE_URL": "https://example.supabase.co",
+    "SUPABASE_SERVICE_ROLE": "service-role",
+    "APP_API_TOKEN": "bench-token",
+    "CORS_ORIGINS": "http://localhost:8080",
+    "APP_DEBUG": "false",
+}.items():
+    os.environ.setdefault(_k, _v)
+
+JWT_SECRET = "bench-jwt-secret"
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument("--requests", type=int, default=200, help="requisições autenticadas por cenário")
+    p.add_argument("--users", type=int, default=5, help="usuários distintos (tokens) no tráfego")
+    p.add_argument("--supabase-latency-ms", type=float, default=60.0, help="latência simulada do Supabase")
+    p.add_argument("--report-out", default="", help="arquivo markdown de saída")
+    return p.parse_args()
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def make_token(sub: str) -> str:
+    header = _b64(json.dumps({"alg": "HS256", "typ": "JWT"}).encode())
+    payload = _b64(json.dumps({
+        "sub": sub,
+        "aud": "authenticated",
+        "role": "authenticated",
+        "exp": int(time.time()) + 3600,
+        "iss": os.environ["SUPABASE_URL"].rstrip("/") + "/auth/v1",
+    }).encode())
+    sig = hmac.new(JWT_SECRET.encode(), f"{header}.{payload}".encode(), hashlib.sha256).digest()
+    return f"{header}.{payload}.{_b64(sig)}"
+
+
+def run_scenario(local: bool, args: argparse.Namespace) -> dict:
+    from app.presentation.http.server import create_app
+
+    if local:
+        os.environ["SUPABASE_JWT_SECRET"] = JWT_SECRET
+        os.environ.pop("AUTH_CACHE_TTL_SECONDS", None)
+    else:
+        # comportamento anterior: /auth/v1/user + admin_clients a cada requisição
+        os.environ.pop("SUPABASE_JWT_SECRET", None)
+        os.environ["AUTH_CACHE_TTL_SECONDS"] = "0"
+    app = create_app()
+    logging.disable(logging.INFO)
+    client = app.test_client()
+    calls = {"n": 0}
+
+    def fake_get(url, **kwargs):
+        calls["n"] += 1
+        time.sleep(args.supabase_latency_ms / 1000.0)
+        r = Mock()
+        r.status_code = 200
+        r.ok = True
+        if "/auth/v1/user" in url:
+            token = kwargs["headers"]["Authorization"].split(" ", 1)[1]
+            sub = json.loads(base64.urlsafe_b64decode(token.split(".")[1] + "=="))["sub"]
+            r.json.return_value = {"id": sub}
+        else:
+            r.json.return_value = [{"id": "client-" + kwargs["params"]["user_id"][3:]}]
+        return r
+
+    tokens = [make_token(f"user-{i}") for i in range(max(1, args.users))]
+    latencies = []
+    with patch("app.presentation.http.auth.HttpClient.get", side_effect=fake_get):
+        for i in range(args.requests):
+            t0 = time.perf_counter()
+            resp = client.get("/health", headers={"Authorization": f"Bearer {tokens[i % len(tokens)]}"})
+            latencies.append((time.perf_counter() - t0) * 1000.0)
+            if resp.status_code != 200:
+                raise RuntimeError(f"unexpected_status {resp.status_code}")
+    os.environ.pop("SUPABASE_JWT_SECRET", None)
+    os.environ.pop("AUTH_CACHE_TTL_SECONDS", None)
+
+    lat = sorted(latencies)
+    return {
+        "mean": statistics.fmean(lat),
+        "p50": lat[len(lat) // 2],
+        "p95": lat[min(len(lat) - 1, int(0.95 * (len(lat) - 1)))],
+        "calls_per_request": calls["n"] / args.requests,
+        "upstream_calls": calls["n"],
+    }
+
+
+def render_report(args: argparse.Namespace, before: dict, after: dict) -> str:
+    lines = [
+        "# Benchmark de overhead de autenticação",
+        "",
+        "- modo: `mock` (Supabase simulado)",
+        f"- requisições por cenário: **{args.requests}**",
+        f"- usuários distintos: **{args.users}**",
+        f"- latência simulada do Supabase: **{args.supabase_latency_ms:.0f} ms**",
+        "",
+        "| cenário | média ms | p50 ms | p95 ms | chamadas Supabase/req |",
+        "|---|---|---|---|---|",
+    ]
+    for label, r in (("antes (remoto a cada requisição)", before), ("depois (JWT local + cache)", after)):
+        lines.append(
+            f"| {label} | {r['mean']:.2f} | {r['p50']:.2f} | {r['p95']:.2f} | {r['calls_per_request']:.3f} |"
+        )
+    lines.append("")
+    lines.append(f"- chamadas ao Supabase: **{before['upstream_calls']}** -> **{after['upstream_calls']}**")
+    lines.append("")
+    return "\n".join(lines)
+
+
+def main() -> int:
+    args = parse_args()
+    before = run_scenario(local=False, args=args)
+    after = run_scenario(local=True, args=args)
+    report = render_report(args, before, after)
+    if args.report_out:
+        Path(args.report_out).write_text(report, encoding="utf-8")
+    else:
+        print(report)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""fast_match_context per call: linear re-normalizing scan (before) vs compiled matcher (after)."""
+
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.application.services.context_resolver import fast_match_context, re_split  # noqa: E402
+from app.domain.models import ContextItem  # noqa: E402
+from app.shared.text_utils import normalize  # noqa: E402
+
+VOCAB = [
+    "chocolate", "cacau", "bolo", "pão", "café", "manhã", "açaí", "suco", "uva", "preço", "horário",
+    "loja", "entrega", "pix", "cartão", "promoção", "cardápio", "reserva", "estacionamento", "vinho",
+]
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument("--sizes", default="10,100,1000", help="tamanhos da lista de contextos")
+    p.add_argument("--calls", type=int, default=300, help="chamadas por cenário")
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--report-out", default="", help="arquivo markdown de saída")
+    return p.parse_args()
+
+
+def linear_match(user_text: str, contexts: list[ContextItem]) -> str | None:
+    """Implementação anterior: normaliza e divide tudo a cada chamada."""
+    text = normalize(user_text)
+    if not text:
+        return None
+    for c in contexts:
+        name = normalize(c.name)
+        if name and name in text:
+            return c.name
+        if name:
+            for tok in name.split("_"):
+                if tok and tok in text:
+                    return c.name
+        kws = normalize(c.keywords_text or "")
+        if kws:
+            parts = [p.strip() for p in re_split(kws)]
+            for p in list(parts):
+                parts.extend(p.split())
+            for k in parts:
+                if len(k) < 3:
+                    continue
+                if k and k in text:
+                    return c.name
+    return None
+
+
+def make_contexts(n: int, rng: random.Random) -> list[ContextItem]:
+    out = []
+    for i in range(n):
+        w1, w2 = rng.sample(VOCAB, 2)
+        out.append(ContextItem(
+            name=f"produto{i:04d}",
+            media_url=f"https://cdn.example/{i}.png",
+            media_type="image",
+            keywords_text=f"{w1}{i:04d}; {w2}{i:04d}, linha{i:04d} especial",
+        ))
+    return out
+
+
+def make_texts(n: int, calls: int, rng: random.Random) -> list[str]:
+    # metade sem gatilho (pior caso: varre tudo), metade acertando um contexto aleatório
+    texts = []
+    for k in range(calls):
+        if k % 2:
+            texts.append("Olá, tudo bem? Gostaria de saber mais sobre o atendimento de vocês hoje.")
+        else:
+            texts.append(f"Pode me falar do produto{rng.randrange(n):04d} por favor?")
+    return texts
+
+
+def run(fn, contexts, texts) -> dict:
+    lat = []
+    for t in texts:
+        t0 = time.perf_counter()
+        fn(t, contexts)
+        lat.append((time.perf_counter() - t0) * 1_000_000.0)
+    lat.sort()
+    return {
+        "mean": statistics.fmean(lat),
+        "p50": lat[len(lat) // 2],
+        "p95": lat[min(len(lat) - 1, int(0.95 * (len(lat) - 1)))],
+    }
+
+
+def main() -> int:
+    args = parse_args()
+    rng = random.Random(args.seed)
+    lines = [
+        "# Benchmark de fast_match_context",
+        "",
+        f"- chamadas por cenário: **{args.calls}** (metade sem gatilho)",
+        "",
+        "| contextos | antes média µs | antes p95 µs | depois média µs | depois p95 µs | ganho |",
+        "|---|---|---|---|---|---|",
+    ]
+    for n in [int(x) for x in args.sizes.split(",") if x.strip()]:
+        contexts = make_contexts(n, rng)
+        texts = make_texts(n, args.calls, rng)
+        for t in texts:
+            if fast_match_context(t, contexts) != linear_match(t, contexts):
+                raise RuntimeError(f"resultado divergente para {t!r} com {n} contextos")
+        before = run(linear_match, contexts, texts)
+        # a primeira chamada já compilou o matcher; aqui mede o caminho quente
+        after = run(fast_match_context, contexts, texts)
+        lines.append(
+            f"| {n} | {before['mean']:.1f} | {before['p95']:.1f} | {after['mean']:.1f} | {after['p95']:.1f} "
+            f"| {before['mean'] / max(after['mean'], 1e-9):.1f}x |"
+        )
+    lines.append("")
+    report = "\n".join(lines)
+    if args.report_out:
+        Path(args.report_out).write_text(report, encoding="utf-8")
+    else:
+        print(report)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""Load comparison between the dev server (threaded=False) and the production gunicorn mode."""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import multiprocessing
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import patch
+
+import requests
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+# Valores fictícios: o benchmark não fala com nenhum upstream real.
+for _k, _v in {
+    "HEYGEN_API_KEY": "bench-key",
+    "SUPABASE_URL": "https://example.supabase.co",
+    "SUPABASE_SERVICE_ROLE": "service-role",
+    "APP_API_TOKEN": "bench-token",
+    "CORS_ORIGINS": "http://localhost:8080",
+    "APP_DEBUG": "false",
+}.items():
+    os.environ.setdefault(_k, _v)
+
+BENCH_PATH = "/__bench/upstream"
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument("--modes", nargs="+", default=["single", "threaded", "gunicorn"],
+                   choices=["single", "threaded", "gunicorn"])
+    p.add_argument("--requests", type=int, default=200, help="total de requisições por modo")
+    p.add_argument("--concurrency", type=int, default=16, help="clientes simultâneos")
+    p.add_argument("--latency-ms", type=float, default=150.0,
+                   help="latência simulada de upstream por requisição (HeyGen/OpenAI/Supabase)")
+    p.add_argument("--workers", type=int, default=1, help="workers gunicorn (padrão de gunicorn.conf.py)")
+    p.add_argument("--threads", type=int, default=8, help="threads por worker gunicorn")
+    p.add_argument("--report-out", default="", help="arquivo markdown de saída")
+    return p.parse_args()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def build_app(latency_ms: float):
+    """Real app factory plus one route that blocks like an upstream call."""
+    from app.presentation.http import server
+
+    with patch.object(server, "require_auth", lambda: None):
+        app = server.create_app()
+
+    # logs por requisição distorcem a medição (e poluem a saída)
+    logging.disable(logging.INFO)
+
+    # require_auth é resolvido no before_request em tempo de chamada; mantém o patch ativo.
+    server.require_auth = lambda: None
+
+    @app.get(BENCH_PATH)
+    def _bench_upstream():
+        time.sleep(latency_ms / 1000.0)
+        return {"ok": True, "pid": os.getpid()}
+
+    return app
+
+
+def _wait_ready(base_url: str, timeout_s: float = 30.0) -> None:
+    deadline = time.time() + timeout_s
+    while time.time() < deadline:
+        try:
+            if requests.get(base_url + BENCH_PATH, timeout=2).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"server_not_ready {base_url}")
+
+
+def _start_werkzeug(latency_ms: float, threaded: bool):
+    from werkzeug.serving import make_server
+
+    port = _free_port()
+    srv = make_server("127.0.0.1", port, build_app(latency_ms), threaded=threaded)
+    t = threading.Thread(target=srv.serve_forever, daemon=True)
+    t.start()
+
+    def stop():
+        srv.shutdown()
+        t.join(timeout=5)
+
+    return f"http://127.0.0.1:{port}", stop
+
+
+def _run_gunicorn(port: int, latency_ms: float, workers: int, threads: int) -> None:
+    from gunicorn.app.base import BaseApplication
+
+    class _BenchApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"127.0.0.1:{port}")
+            self.cfg.set("worker_class", "gthread")
+            self.cfg.set("workers", workers)
+            self.cfg.set("threads", threads)
+            self.cfg.set("preload_app", False)
+            self.cfg.set("loglevel", "warning")
+
+        def load(self):
+            return build_app(latency_ms)
+
+    _BenchApplication().run()
+
+
+def _start_gunicorn(latency_ms: float, workers: int, threads: int):
+    port = _free_port()
+    proc = multiprocessing.get_context("fork").Process(
+        target=_run_gunicorn, args=(port, latency_ms, workers, threads), daemon=False
+    )
+    proc.start()
+
+    def stop():
+        proc.terminate()
+        proc.join(timeout=15)
+
+    return f"http://127.0.0.1:{port}", stop
+
+
+def run_load(base_url: str, total: int, concurrency: int) -> dict:
+    local = threading.local()
+    latencies: list[float] = []
+    pids: set[int] = set()
+    errors = 0
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal errors
+        sess = getattr(local, "session", None)
+        if sess is None:
+            sess = local.session = requests.Session()
+        t0 = time.perf_counter()
+        try:
+            r = sess.get(base_url + BENCH_PATH, timeout=60)
+            ok = r.ok
+            pid = r.json().get("pid") if ok else None
+        except requests.RequestException:
+            ok, pid = False, None
+        dt = (time.perf_counter() - t0) * 1000.0
+        with lock:
+            if ok:
+                latencies.append(dt)
+                if pid:
+                    pids.add(pid)
+            else:
+                errors += 1
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as ex:
+        list(ex.map(one, range(total)))
+    wall = time.perf_counter() - t0
+
+    lat = sorted(latencies)
+
+    def pct(p: float) -> float:
+        if not lat:
+            return 0.0
+        return lat[min(len(lat) - 1, int(round(p * (len(lat) - 1))))]
+
+    return {
+        "total": total,
+        "ok": len(lat),
+        "errors": errors,
+        "wall_s": wall,
+        "rps": (len(lat) / wall) if wall else 0.0,
+        "p50": pct(0.50),
+        "p95": pct(0.95),
+        "p99": pct(0.99),
+        "mean": statistics.fmean(lat) if lat else 0.0,
+        "processes": len(pids),
+    }
+
+
+def render_report(args: argparse.Namespace, results: dict[str, dict]) -> str:
+    labels = {
+        "single": "dev server `threaded=False` (app.main)",
+        "threaded": "dev server `threaded=True`",
+        "gunicorn": f"gunicorn gthread {args.workers}x{args.threads}",
+    }
+    lines = [
+        "# Benchmark de modos de servidor",
+        "",
+        "- modo: `mock` (rota local simulando latência de upstream)",
+        f"- requisições por modo: **{args.requests}**",
+        f"- clientes simultâneos: **{args.concurrency}**",
+        f"- latência simulada: **{args.latency_ms:.0f} ms**",
+        "",
+        "| servidor | ok | erros | req/s | p50 ms | p95 ms | p99 ms | processos |",
+        "|---|---|---|---|---|---|---|---|",
+    ]
+    for mode, r in results.items():
+        lines.append(
+            f"| {labels.get(mode, mode)} | {r['ok']} | {r['errors']} | {r['rps']:.1f} | "
+            f"{r['p50']:.0f} | {r['p95']:.0f} | {r['p99']:.0f} | {r['processes']} |"
+        )
+    base = results.get("single")
+    if base and base["rps"]:
+        lines.append("")
+        for mode, r in results.items():
+            if mode != "single":
+                lines.append(f"- {labels.get(mode, mode)}: **{r['rps'] / base['rps']:.1f}x** o throughput do modo atual")
+    lines.append("")
+    return "\n".join(lines)
+
+
+def main() -> int:
+    args = parse_args()
+    results: dict[str, dict] = {}
+    for mode in args.modes:
+        if mode == "gunicorn":
+            try:
+                import gunicorn  # noqa: F401
+            except ImportError:
+                print("gunicorn não instalado; pulando modo gunicorn", flush=True)
+                continue
+            base_url, stop = _start_gunicorn(args.latency_ms, args.workers, args.threads)
+        else:
+            base_url, stop = _start_werkzeug(args.latency_ms, threaded=(mode == "threaded"))
+        try:
+            _wait_ready(base_url)
+            results[mode] = run_load(base_url, args.requests, args.concurrency)
+        finally:
+            stop()
+        r = results[mode]
+        print(f"{mode}: ok={r['ok']} errors={r['errors']} rps={r['rps']:.1f} p95={r['p95']:.0f}ms", flush=True)
+
+    report = render_report(args, results)
+    if args.report_out:
+        Path(args.report_out).write_text(report, encoding="utf-8")
+    else:
+        print(report)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -13,11 +13,14 @@ import datetime as dt
 import html
 import os
 import re
+import signal
 import sys
+import threading
 import time
 import unicodedata
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from dataclasses import dataclass, replace
+from functools import lru_cache
 from pathlib import Path
 
 import requests
@@ -35,7 +38,11 @@ from app.application.use_cases.generate_editorial_image import (
 )
 from app.application.services.image_prompt_builder import build_editorial_prompt
 from app.infrastructure.gemini_image_client import GeminiImageClient
+from app.infrastructure.generation_log_sink import GenerationLogSink
+from app.infrastructure.generation_result_cache import GenerationResultIndex
+from app.infrastructure.image_preprocess import prepare_reference_image
 from app.infrastructure.supabase_rest import get_json, rest_headers
+from app.shared.ttl_cache import MISSING, TTLCache
 
 
 @dataclass
@@ -63,6 +70,37 @@ def _estimated_cost_usd(job: Job) -> float:
     return float(by_kind.get(job.kind, default))
 
 
+_log_sink: GenerationLogSink | None = None
+_log_sink_lock = threading.Lock()
+
+
+def _log_flush_seconds() -> float:
+    try:
+        return max(0.1, float(os.getenv("QUIZ_WORKER_LOG_FLUSH_SECONDS", "2")))
+    except Exception:
+        return 2.0
+
+
+def _log_max_buffered() -> int:
+    try:
+        return max(100, int(os.getenv("QUIZ_WORKER_LOG_MAX_BUFFERED", "5000")))
+    except Exception:
+        return 5000
+
+
+def _generation_log_sink(settings: Settings) -> GenerationLogSink:
+    global _log_sink
+    if _log_sink is None:
+        with _log_sink_lock:
+            if _log_sink is None:
+                _log_sink = GenerationLogSink(
+                    settings,
+                    flush_interval_seconds=_log_flush_seconds(),
+                    max_buffered=_log_max_buffered(),
+                )
+    return _log_sink
+
+
 def _write_generation_log(
     settings: Settings,
     generation_id: str,
@@ -74,24 +112,12 @@ def _write_generation_log(
 ):
     """
     Best effort structured log sink for each generation job.
-    If table is missing, worker continues without failing the generation.
+    Events are buffered and bulk-inserted when the job ends (or periodically);
+    if the table is missing they go to stdout and the generation never fails.
     """
-    url = f"{settings.supabase_url}/rest/v1/generation_logs"
-    body = [
-        {
-            "generation_id": generation_id,
-            "level": level,
-            "event": event,
-            "message": message,
-            "payload_json": payload or {},
-        }
-    ]
     try:
-        requests.post(
-            url,
-            headers={**rest_headers(settings), "Content-Type": "application/json"},
-            json=body,
-            timeout=10,
+        _generation_log_sink(settings).emit(
+            generation_id, level=level, event=event, message=message, payload=payload
         )
     except Exception:
         pass
@@ -101,27 +127,25 @@ def _now_iso() -> str:
     return dt.datetime.utcnow().isoformat() + "Z"
 
 
-def _claim_job(settings: Settings, job_id: str) -> Job | None:
-    url = (
-        f"{settings.supabase_url}/rest/v1/generations?id=eq.{job_id}&status=eq.pending"
-    )
-    body = {"status": "processing", "updated_at": _now_iso(), "error_message": None}
-    r = requests.patch(
-        url,
-        headers={
-            **rest_headers(settings),
-            "Content-Type": "application/json",
-            "Prefer": "return=representation",
-        },
-        json=body,
-        timeout=20,
-    )
-    if not r.ok:
-        return None
-    rows = r.json() or []
-    if not rows:
-        return None
-    row = rows[0]
+# RPC opcional (SQL abaixo) com FOR UPDATE SKIP LOCKED; sem ela, cai no PATCH limitado.
+#
+#   create or replace function public.claim_generations(p_limit int)
+#   returns setof public.generations language sql as $$
+#     update public.generations g
+#        set status = 'processing', updated_at = now(), error_message = null
+#      where g.id in (
+#        select id from public.generations
+#         where status = 'pending'
+#         order by created_at
+#         limit p_limit
+#         for update skip locked)
+#     returning g.*;
+#   $$;
+_CLAIM_RPC = "claim_generations"
+_claim_rpc_available: bool | None = None
+
+
+def _job_from_row(row: dict) -> Job:
     return Job(
         id=str(row.get("id") or ""),
         experience_id=str(row.get("experience_id") or ""),
@@ -130,6 +154,53 @@ def _claim_job(settings: Settings, job_id: str) -> Job | None:
     )
 
 
+def _claim_jobs(settings: Settings, limit: int) -> list[Job]:
+    """
+    Claims up to ``limit`` pending generations in one round trip and returns them.
+
+    Preferred: ``rpc/claim_generations`` (SKIP LOCKED, concurrent workers never
+    wait on each other). Fallback: a single PATCH filtered by ``status=eq.pending``
+    with order/limit and ``return=representation``; Postgres re-checks the filter
+    on locked rows, so a row is never claimed by two workers.
+    """
+    global _claim_rpc_available
+    headers = {
+        **rest_headers(settings),
+        "Content-Type": "application/json",
+        "Prefer": "return=representation",
+    }
+    if _claim_rpc_available is not False:
+        r = requests.post(
+            f"{settings.supabase_url}/rest/v1/rpc/{_CLAIM_RPC}",
+            headers=headers,
+            json={"p_limit": int(limit)},
+            timeout=20,
+        )
+        if r.ok:
+            _claim_rpc_available = True
+            return [_job_from_row(row) for row in (r.json() or []) if row.get("id")]
+        if r.status_code != 404:
+            raise RuntimeError(f"claim_rpc_failed:{r.status_code}:{r.text[:160]}")
+        # função não instalada neste banco: não tenta de novo neste processo
+        _claim_rpc_available = False
+        print("[WORKER] claim_rpc_missing fallback=limited_patch", flush=True)
+
+    r = requests.patch(
+        f"{settings.supabase_url}/rest/v1/generations",
+        params={
+            "status": "eq.pending",
+            "order": "created_at.asc,id.asc",
+            "limit": str(int(limit)),
+        },
+        headers=headers,
+        json={"status": "processing", "updated_at": _now_iso(), "error_message": None},
+        timeout=20,
+    )
+    if not r.ok:
+        raise RuntimeError(f"claim_patch_failed:{r.status_code}:{r.text[:160]}")
+    return [_job_from_row(row) for row in (r.json() or []) if row.get("id")]
+
+
 def _load_credential_data(settings: Settings, credential_id: str) -> dict:
     rows = get_json(
         settings,
@@ -192,30 +263,107 @@ def _extract_generation_inputs(cred_row: dict) -> tuple[str, str]:
     return gender, hair_color
 
 
+_ARCHETYPE_SELECT = "id,name,image_prompt,text_prompt,use_photo_prompt,sort_order"
+_CREDENTIAL_SELECT = "id,data_json,photo_path"
+# credencial + chave Gemini + arquétipos da experiência numa única chamada (FKs
+# credentials.experience_id e archetypes.experience_id -> experiences)
+_CREDENTIAL_WITH_EXPERIENCE_SELECT = (
+    f"{_CREDENTIAL_SELECT},experiences(gemini_api_key,archetypes({_ARCHETYPE_SELECT}))"
+)
+
+
+def _metadata_ttl_seconds() -> float:
+    try:
+        return max(0.0, float(os.getenv("QUIZ_WORKER_METADATA_TTL_SECONDS", "60")))
+    except Exception:
+        return 60.0
+
+
+def _metadata_negative_ttl_seconds() -> float:
+    try:
+        return max(0.0, float(os.getenv("QUIZ_WORKER_METADATA_NEGATIVE_TTL_SECONDS", "15")))
+    except Exception:
+        return 15.0
+
+
+# Num evento todos os jobs são da mesma experiência: chave e arquétipos ficam em
+# memória em vez de três consultas por job. Chave ausente (None) é cacheada com o
+# TTL negativo, então esses jobs falham sem voltar ao Supabase.
+_metadata_caches_pair: tuple[TTLCache, TTLCache] | None = None
+_metadata_caches_lock = threading.Lock()
+_embedded_inputs_available = True
+
+
+def _metadata_caches() -> tuple[TTLCache, TTLCache]:
+    """(gemini key by experience, archetypes by experience); built after load_dotenv()."""
+    global _metadata_caches_pair
+    if _metadata_caches_pair is None:
+        with _metadata_caches_lock:
+            if _metadata_caches_pair is None:
+                ttl = _metadata_ttl_seconds()
+                _metadata_caches_pair = (
+                    TTLCache(
+                        maxsize=256,
+                        ttl_seconds=ttl,
+                        negative_ttl_seconds=_metadata_negative_ttl_seconds(),
+                        name="worker_gemini_key",
+                    ),
+                    TTLCache(maxsize=256, ttl_seconds=ttl, name="worker_archetypes"),
+                )
+    return _metadata_caches_pair
+
+
+def _sorted_archetypes(rows: list[dict] | None) -> list[dict]:
+    # mesma ordem do antigo order=sort_order.asc (nulos por último)
+    return sorted(
+        (r for r in rows or [] if isinstance(r, dict)),
+        key=lambda r: (r.get("sort_order") is None, r.get("sort_order") or 0),
+    )
+
+
+def _clean_gemini_key(value) -> str | None:
+    return str(value or "").strip() or None
+
+
+def _experience_archetypes(settings: Settings, experience_id: str) -> list[dict]:
+    return _metadata_caches()[1].get_or_load(
+        experience_id,
+        lambda: _sorted_archetypes(
+            get_json(
+                settings,
+                "archetypes",
+                _ARCHETYPE_SELECT,
+                {"experience_id": f"eq.{experience_id}", "order": "sort_order.asc"},
+            )
+        ),
+    )
+
+
 def _load_archetype(
     settings: Settings, experience_id: str, archetype_id: str
 ) -> dict | None:
     if not archetype_id:
         return None
-    rows = get_json(
-        settings,
-        "archetypes",
-        "id,name,image_prompt,text_prompt,use_photo_prompt",
-        {"id": f"eq.{archetype_id}", "experience_id": f"eq.{experience_id}"},
-        limit=1,
-    )
-    return rows[0] if rows else None
+    for row in _experience_archetypes(settings, experience_id):
+        if str(row.get("id") or "") == archetype_id:
+            return row
+    return None
 
 
 def _load_first_archetype(settings: Settings, experience_id: str) -> dict | None:
+    rows = _experience_archetypes(settings, experience_id)
+    return rows[0] if rows else None
+
+
+def _fetch_experience_gemini_key(settings: Settings, experience_id: str) -> str | None:
     rows = get_json(
         settings,
-        "archetypes",
-        "id,name,image_prompt,text_prompt,use_photo_prompt",
-        {"experience_id": f"eq.{experience_id}", "order": "sort_order.asc"},
+        "experiences",
+        "id,gemini_api_key",
+        {"id": f"eq.{experience_id}"},
         limit=1,
     )
-    return rows[0] if rows else None
+    return _clean_gemini_key((rows[0] or {}).get("gemini_api_key")) if rows else None
 
 
 def _resolve_experience_gemini_key(
@@ -226,23 +374,54 @@ def _resolve_experience_gemini_key(
     - Use only experiences.gemini_api_key (per experience, set in panel).
     - Do not fallback to global GEMINI_API_KEY.
     """
+    try:
+        return _metadata_caches()[0].get_or_load(
+            experience_id, lambda: _fetch_experience_gemini_key(settings, experience_id)
+        )
+    except Exception:
+        # If column/query is unavailable we keep behavior deterministic: no key resolved.
+        # Errors are not cached; the next job asks again.
+        return None
+
+
+def _load_job_inputs(settings: Settings, job: Job) -> dict:
+    """
+    Credential row for the job, warming the experience caches on the way.
+    With cold caches a single embedded query brings credential, Gemini key and
+    archetypes; with warm caches only the credential is fetched.
+    """
+    global _embedded_inputs_available
+    exp_id = job.experience_id
+    key_cache, archetypes_cache = _metadata_caches()
+    warm = (
+        key_cache.get(exp_id) is not MISSING
+        and archetypes_cache.get(exp_id) is not MISSING
+    )
+    if warm or not _embedded_inputs_available:
+        return _load_credential_data(settings, job.credential_id)
     try:
         rows = get_json(
             settings,
-            "experiences",
-            "id,gemini_api_key",
-            {"id": f"eq.{experience_id}"},
+            "credentials",
+            _CREDENTIAL_WITH_EXPERIENCE_SELECT,
+            {"id": f"eq.{job.credential_id}", "experience_id": f"eq.{exp_id}"},
             limit=1,
         )
-        exp_key = (
-            str((rows[0] or {}).get("gemini_api_key") or "").strip() if rows else ""
-        )
-        if exp_key:
-            return exp_key
-    except Exception:
-        # If column/query is unavailable we keep behavior deterministic: no key resolved.
-        pass
-    return None
+    except RuntimeError as exc:
+        if "_400:" not in str(exc):
+            raise
+        # relacionamento não exposto neste ambiente: volta às consultas separadas
+        _embedded_inputs_available = False
+        print(f"[WORKER] embedded_inputs_unavailable err={str(exc)[:200]}", flush=True)
+        return _load_credential_data(settings, job.credential_id)
+    if not rows:
+        raise RuntimeError("credential_not_found")
+    cred = dict(rows[0])
+    exp = cred.pop("experiences", None)
+    if isinstance(exp, dict):
+        key_cache.set(exp_id, _clean_gemini_key(exp.get("gemini_api_key")))
+        archetypes_cache.set(exp_id, _sorted_archetypes(exp.get("archetypes")))
+    return cred
 
 
 _VAR_TOKEN_RE = re.compile(r"\{\{\s*([a-zA-Z0-9_]+)\s*\}\}")
@@ -362,6 +541,46 @@ def _gemini_retry_base_delay_seconds() -> float:
         return 1.2
 
 
+def _result_cache_enabled() -> bool:
+    # QUIZ_GEMINI_RESULT_CACHE=false força chamada ao Gemini em todo job (bypass)
+    return os.getenv("QUIZ_GEMINI_RESULT_CACHE", "true").lower() == "true"
+
+
+_result_index_instance: GenerationResultIndex | None = None
+_result_index_lock = threading.Lock()
+
+
+def _result_index() -> GenerationResultIndex:
+    global _result_index_instance
+    if _result_index_instance is None:
+        with _result_index_lock:
+            if _result_index_instance is None:
+                try:
+                    max_entries = int(os.getenv("QUIZ_GEMINI_RESULT_CACHE_MAX_ENTRIES", "20000"))
+                except Exception:
+                    max_entries = 20000
+                _result_index_instance = GenerationResultIndex(
+                    os.getenv("QUIZ_GEMINI_RESULT_CACHE_PATH")
+                    or str(ROOT / "data" / "gemini_results.sqlite3"),
+                    max_entries=max_entries,
+                )
+    return _result_index_instance
+
+
+def _lookup_cached_result(
+    gemini: GeminiImageClient, experience_id: str, prompt: str, ref_bytes: bytes
+) -> tuple[str | None, dict | None]:
+    """(result key, cached output) for a reference-photo generation; never raises."""
+    if not _result_cache_enabled():
+        return None, None
+    try:
+        key = gemini.result_key(prompt, ref_bytes, scope=experience_id)
+        return key, _result_index().get(key)
+    except Exception as exc:
+        print(f"[WORKER] result_cache_unavailable err={str(exc)[:200]}", flush=True)
+        return None, None
+
+
 def _is_retryable_gemini_error_message(message: str) -> bool:
     text = (message or "").strip().lower()
     if not text:
@@ -411,6 +630,7 @@ def _normalize_variable_key(raw: str) -> str:
     return key
 
 
+@lru_cache(maxsize=256)
 def _normalize_template_placeholders(template: str) -> str:
     normalized = template or ""
     for pattern in _LEGACY_VAR_PATTERNS:
@@ -532,14 +752,43 @@ def _upload_output(
     return path
 
 
-def _finish_job_done(settings: Settings, job: Job, duration_ms: int, output_path: str):
+def _copy_output(
+    settings: Settings,
+    experience_id: str,
+    generation_id: str,
+    source_path: str,
+    *,
+    mime_type: str,
+) -> str:
+    # cada geração fica com o próprio objeto: apagar a original não quebra as reaproveitadas
+    bucket = settings.supabase_bucket
+    ext = _ext_from_mime(mime_type)
+    path = f"quiz/{experience_id}/generations/{generation_id}.{ext}"
+    r = requests.post(
+        f"{settings.supabase_url}/storage/v1/object/copy",
+        headers={**rest_headers(settings), "x-upsert": "true", "Content-Type": "application/json"},
+        json={"bucketId": bucket, "sourceKey": source_path, "destinationKey": path},
+        timeout=30,
+    )
+    if not r.ok:
+        raise RuntimeError(f"storage_copy_failed:{r.status_code}:{r.text[:160]}")
+    return path
+
+
+def _finish_job_done(
+    settings: Settings,
+    job: Job,
+    duration_ms: int,
+    output_path: str,
+    cost_usd: float | None = None,
+):
     url = f"{settings.supabase_url}/rest/v1/generations?id=eq.{job.id}"
     body_with_cost = {
         "status": "done",
         "duration_ms": duration_ms,
         "output_path": output_path,
         "output_url": None,
-        "cost_estimated_usd": _estimated_cost_usd(job),
+        "cost_estimated_usd": _estimated_cost_usd(job) if cost_usd is None else cost_usd,
         "cost_currency": "USD",
         "error_message": None,
         "updated_at": _now_iso(),
@@ -603,6 +852,7 @@ def _finish_job_error(settings: Settings, job: Job, duration_ms: int, err: str):
 
 def _process_job(settings: Settings, job: Job):
     t0 = time.time()
+    result_cache_hit = False
     _write_generation_log(
         settings,
         job.id,
@@ -616,8 +866,14 @@ def _process_job(settings: Settings, job: Job):
         },
     )
     try:
-        cred = _load_credential_data(settings, job.credential_id)
+        cred = _load_job_inputs(settings, job)
         gender, hair_color = _extract_generation_inputs(cred)
+        # chave ausente fica em cache negativo: o job falha sem consultar de novo
+        effective_gemini_key = _resolve_experience_gemini_key(
+            settings, job.experience_id
+        )
+        if not effective_gemini_key:
+            raise RuntimeError("missing_experience_gemini_key")
         cred_data_for_log = (
             cred.get("data_json") if isinstance(cred.get("data_json"), dict) else {}
         )
@@ -658,11 +914,6 @@ def _process_job(settings: Settings, job: Job):
         prompt_source = "archetype" if archetype_prompt else "fixed_default"
 
         # Preferred mode: Gemini generation. With photo when available; prompt-only when archetype allows it.
-        effective_gemini_key = _resolve_experience_gemini_key(
-            settings, job.experience_id
-        )
-        if not effective_gemini_key:
-            raise RuntimeError("missing_experience_gemini_key")
         use_photo_prompt = bool((archetype or {}).get("use_photo_prompt"))
         can_prompt_only = bool(
             effective_gemini_key
@@ -679,6 +930,23 @@ def _process_job(settings: Settings, job: Job):
             ref_mime = "image/jpeg"
             if photo_path:
                 ref_bytes, ref_mime = _download_reference_image(settings, photo_path)
+                # upload de até 20 MB: orienta, reduz e recomprime antes de ir em base64 no JSON
+                prepared = prepare_reference_image(
+                    ref_bytes,
+                    ref_mime,
+                    max_side=settings.reference_photo_max_side,
+                    jpeg_quality=settings.reference_photo_jpeg_quality,
+                    enabled=settings.reference_photo_preprocess,
+                )
+                ref_bytes, ref_mime = prepared.data, prepared.mime_type
+                _write_generation_log(
+                    settings,
+                    job.id,
+                    level="info",
+                    event="reference_preprocessed",
+                    message="Reference photo prepared for Gemini",
+                    payload=prepared.report(),
+                )
                 generation_mode = "reference_photo"
             else:
                 prompt_applied = archetype_prompt or build_editorial_prompt(
@@ -691,124 +959,189 @@ def _process_job(settings: Settings, job: Job):
             model_name = None
             latency_ms = None
             last_err = None
+            from_gemini = False
 
-            for attempt in range(1, max_attempts + 1):
+            # mesma foto + mesmo prompt + mesmo modelo: reaproveita a saída já gerada
+            result_key, cached = (None, None)
+            if photo_path:
                 try:
-                    if photo_path:
-                        out, status = generate_editorial_image_uc(
-                            gemini,
-                            GenerateEditorialImageInput(
-                                gender=gender,
-                                hair_color=hair_color,
-                                reference_image_bytes=ref_bytes,
-                                reference_mime_type=ref_mime,
-                                prompt_override=archetype_prompt or None,
-                            ),
-                        )
-                        if status != 200 or not out.get("ok"):
-                            raise RuntimeError(
-                                str(
-                                    out.get("error") or f"gemini_failed_status_{status}"
-                                )
-                            )
-                        generated_b64 = str(out.get("image_base64") or "")
-                        generated_mime = str(out.get("mime_type") or "image/png")
-                        prompt_applied = str(out.get("prompt_applied") or "")
-                        model_name = out.get("model")
-                        latency_ms = out.get("latency_ms")
-                        generated_bytes = (
-                            base64.b64decode(generated_b64) if generated_b64 else b""
-                        )
-                    else:
-                        t_gem = time.time()
-                        raw = gemini.generate_from_prompt(prompt_applied)
-                        latency_ms = int((time.time() - t_gem) * 1000)
-                        generated_bytes = raw.get("image_bytes") or b""
-                        generated_mime = str(raw.get("mime_type") or "image/png")
-                        model_name = raw.get("model")
-
-                    if not generated_bytes:
-                        raise RuntimeError("gemini_empty_image")
-
-                    if attempt > 1:
-                        _write_generation_log(
-                            settings,
-                            job.id,
-                            level="info",
-                            event="gemini_retry_recovered",
-                            message="Gemini succeeded after retry",
-                            payload={"attempt": attempt, "max_attempts": max_attempts},
-                        )
-                    break
-                except Exception as exc:
-                    last_err = exc
-                    err_str = str(exc)
-                    retryable = (
-                        attempt < max_attempts
-                        and _is_retryable_gemini_error_message(err_str)
+                    cache_prompt = archetype_prompt or build_editorial_prompt(
+                        gender, hair_color
                     )
-                    _write_generation_log(
-                        settings,
-                        job.id,
-                        level="warning" if retryable else "error",
-                        event="gemini_attempt_failed",
-                        message="Gemini generation attempt failed",
-                        payload={
-                            "attempt": attempt,
-                            "max_attempts": max_attempts,
-                            "retryable": retryable,
-                            "error": err_str[:1000],
-                        },
+                except ValueError:
+                    # o caso de uso devolve o erro de validação na tentativa abaixo
+                    cache_prompt = ""
+                if cache_prompt:
+                    result_key, cached = _lookup_cached_result(
+                        gemini, job.experience_id, cache_prompt, ref_bytes
                     )
-                    if not retryable:
-                        raise
-                    sleep_s = retry_base_delay * (2 ** (attempt - 1))
-                    time.sleep(sleep_s)
-
-            if last_err is not None and not generated_bytes:
-                last_err_str = str(last_err)
-                if not _is_retryable_gemini_error_message(last_err_str):
-                    raise last_err
-
-                # Graceful fallback for transient provider outages: keep user flow alive
-                # with the captured photo (if present) or SVG card output.
-                if photo_path and ref_bytes:
-                    generated_bytes = ref_bytes
-                    generated_mime = ref_mime or "image/jpeg"
-                    _write_generation_log(
+            out_path = None
+            if cached is not None:
+                try:
+                    out_path = _copy_output(
                         settings,
+                        job.experience_id,
                         job.id,
-                        level="warning",
-                        event="gemini_fallback_reference_image",
-                        message="Gemini failed after retries; using reference photo fallback",
-                        payload={
-                            "error": last_err_str[:1000],
-                            "max_attempts": max_attempts,
-                            "mime_type": generated_mime,
-                        },
+                        cached["output_path"],
+                        mime_type=cached["mime_type"],
                     )
-                else:
-                    generated_bytes = _build_svg_card(job, cred)
-                    generated_mime = "image/svg+xml"
+                except Exception as exc:
+                    # objeto de origem apagado/indisponível: esquece a entrada e gera de novo
+                    _result_index().invalidate(result_key)
                     _write_generation_log(
                         settings,
                         job.id,
                         level="warning",
-                        event="gemini_fallback_svg_on_retryable_error",
-                        message="Gemini failed after retries; using SVG fallback",
-                        payload={
-                            "error": last_err_str[:1000],
-                            "max_attempts": max_attempts,
-                        },
+                        event="gemini_result_cache_stale",
+                        message="Cached output could not be copied; generating again",
+                        payload={"output_path": cached["output_path"], "error": str(exc)[:500]},
                     )
+                    cached = None
+            if cached is not None:
+                result_cache_hit = True
+                prompt_applied = cache_prompt
+                generated_mime = cached["mime_type"]
+                model_name = cached["model"] or None
+                latency_ms = 0
+                _write_generation_log(
+                    settings,
+                    job.id,
+                    level="info",
+                    event="gemini_result_cache_hit",
+                    message="Reused output of an identical earlier generation",
+                    payload={
+                        "source_path": cached["output_path"],
+                        "output_path": out_path,
+                        "hit_rate": _result_index().stats()["hit_rate"],
+                    },
+                )
 
-            out_path = _upload_output(
-                settings,
-                job.experience_id,
-                job.id,
-                generated_bytes,
-                mime_type=generated_mime,
-            )
+            if cached is None:
+                for attempt in range(1, max_attempts + 1):
+                    try:
+                        if photo_path:
+                            out, status = generate_editorial_image_uc(
+                                gemini,
+                                GenerateEditorialImageInput(
+                                    gender=gender,
+                                    hair_color=hair_color,
+                                    reference_image_bytes=ref_bytes,
+                                    reference_mime_type=ref_mime,
+                                    prompt_override=archetype_prompt or None,
+                                ),
+                            )
+                            if status != 200 or not out.get("ok"):
+                                raise RuntimeError(
+                                    str(
+                                        out.get("error") or f"gemini_failed_status_{status}"
+                                    )
+                                )
+                            generated_b64 = str(out.get("image_base64") or "")
+                            generated_mime = str(out.get("mime_type") or "image/png")
+                            prompt_applied = str(out.get("prompt_applied") or "")
+                            model_name = out.get("model")
+                            latency_ms = out.get("latency_ms")
+                            generated_bytes = (
+                                base64.b64decode(generated_b64) if generated_b64 else b""
+                            )
+                        else:
+                            t_gem = time.time()
+                            raw = gemini.generate_from_prompt(prompt_applied)
+                            latency_ms = int((time.time() - t_gem) * 1000)
+                            generated_bytes = raw.get("image_bytes") or b""
+                            generated_mime = str(raw.get("mime_type") or "image/png")
+                            model_name = raw.get("model")
+
+                        if not generated_bytes:
+                            raise RuntimeError("gemini_empty_image")
+
+                        if attempt > 1:
+                            _write_generation_log(
+                                settings,
+                                job.id,
+                                level="info",
+                                event="gemini_retry_recovered",
+                                message="Gemini succeeded after retry",
+                                payload={"attempt": attempt, "max_attempts": max_attempts},
+                            )
+                        break
+                    except Exception as exc:
+                        last_err = exc
+                        err_str = str(exc)
+                        retryable = (
+                            attempt < max_attempts
+                            and _is_retryable_gemini_error_message(err_str)
+                        )
+                        _write_generation_log(
+                            settings,
+                            job.id,
+                            level="warning" if retryable else "error",
+                            event="gemini_attempt_failed",
+                            message="Gemini generation attempt failed",
+                            payload={
+                                "attempt": attempt,
+                                "max_attempts": max_attempts,
+                                "retryable": retryable,
+                                "error": err_str[:1000],
+                            },
+                        )
+                        if not retryable:
+                            raise
+                        sleep_s = retry_base_delay * (2 ** (attempt - 1))
+                        time.sleep(sleep_s)
+
+                from_gemini = bool(generated_bytes)
+                if last_err is not None and not generated_bytes:
+                    last_err_str = str(last_err)
+                    if not _is_retryable_gemini_error_message(last_err_str):
+                        raise last_err
+
+                    # Graceful fallback for transient provider outages: keep user flow alive
+                    # with the captured photo (if present) or SVG card output.
+                    if photo_path and ref_bytes:
+                        generated_bytes = ref_bytes
+                        generated_mime = ref_mime or "image/jpeg"
+                        _write_generation_log(
+                            settings,
+                            job.id,
+                            level="warning",
+                            event="gemini_fallback_reference_image",
+                            message="Gemini failed after retries; using reference photo fallback",
+                            payload={
+                                "error": last_err_str[:1000],
+                                "max_attempts": max_attempts,
+                                "mime_type": generated_mime,
+                            },
+                        )
+                    else:
+                        generated_bytes = _build_svg_card(job, cred)
+                        generated_mime = "image/svg+xml"
+                        _write_generation_log(
+                            settings,
+                            job.id,
+                            level="warning",
+                            event="gemini_fallback_svg_on_retryable_error",
+                            message="Gemini failed after retries; using SVG fallback",
+                            payload={
+                                "error": last_err_str[:1000],
+                                "max_attempts": max_attempts,
+                            },
+                        )
+
+            if cached is None:
+                out_path = _upload_output(
+                    settings,
+                    job.experience_id,
+                    job.id,
+                    generated_bytes,
+                    mime_type=generated_mime,
+                )
+                # só saída real do Gemini entra no índice (fallbacks não)
+                if result_key and from_gemini:
+                    try:
+                        _result_index().put(result_key, out_path, generated_mime, model_name)
+                    except Exception as exc:
+                        print(f"[WORKER] result_cache_put_failed err={str(exc)[:200]}", flush=True)
             _write_generation_log(
                 settings,
                 job.id,
@@ -827,7 +1160,9 @@ def _process_job(settings: Settings, job: Job):
                     "generation_mode": generation_mode,
                     "use_photo_prompt": use_photo_prompt,
                     "has_photo_path": bool(photo_path),
+                    "reference_bytes": len(ref_bytes),
                     "gemini_key_source": "experience",
+                    "result_cache": "hit" if cached is not None else ("miss" if result_key else "off"),
                 },
             )
         else:
@@ -863,7 +1198,9 @@ def _process_job(settings: Settings, job: Job):
             payload={"output_path": out_path},
         )
         dur = int((time.time() - t0) * 1000)
-        _finish_job_done(settings, job, dur, out_path)
+        # reaproveitar uma saída não gera chamada paga ao Gemini
+        cost_usd = 0.0 if result_cache_hit else _estimated_cost_usd(job)
+        _finish_job_done(settings, job, dur, out_path, cost_usd)
         _write_generation_log(
             settings,
             job.id,
@@ -872,7 +1209,7 @@ def _process_job(settings: Settings, job: Job):
             message="Generation job completed",
             payload={
                 "duration_ms": dur,
-                "cost_estimated_usd": _estimated_cost_usd(job),
+                "cost_estimated_usd": cost_usd,
                 "cost_currency": "USD",
             },
         )
@@ -896,24 +1233,105 @@ def _process_job(settings: Settings, job: Job):
         print(f"[WORKER] error generation={job.id} duration_ms={dur} err={exc}")
 
 
-def _fetch_pending(settings: Settings, limit: int) -> list[str]:
-    rows = get_json(
-        settings,
-        "generations",
-        "id",
-        {"status": "eq.pending", "order": "created_at.asc"},
-        limit=limit,
-    )
-    return [str(r.get("id")) for r in rows if r.get("id")]
+def _run_pipeline(
+    settings: Settings,
+    *,
+    max_workers: int,
+    batch_size: int,
+    poll_seconds: float,
+    net_retry_base: float,
+    net_retry_max: float,
+    once: bool,
+    stop: threading.Event,
+) -> int:
+    """Keep up to ``max_workers`` jobs in flight on one persistent pool.
+
+    A slot freed by any job is refilled on the next claim, sized to the free
+    capacity (capped by ``batch_size``), so a slow Gemini call only holds its
+    own slot. Nothing is claimed beyond the free slots: claimed rows never
+    wait in a local queue where a shutdown could strand them in
+    ``processing``. When ``stop`` is set, claiming stops and the in-flight
+    jobs are finished before returning.
+    """
+    in_flight: set[Future] = set()
+    slot_freed = threading.Event()
+    net_error_count = 0
+    exit_code = 0
+
+    def _job_finished(fut: Future) -> None:
+        exc = fut.exception()
+        if exc is not None:
+            print(f"[WORKER] job_crashed err={exc}", flush=True)
+        slot_freed.set()
+
+    pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="quiz-gen")
+    try:
+        while not stop.is_set():
+            in_flight = {f for f in in_flight if not f.done()}
+            free = max_workers - len(in_flight)
+            if free <= 0:
+                # pool cheio: acorda assim que qualquer job terminar
+                slot_freed.wait(poll_seconds)
+                slot_freed.clear()
+                continue
+
+            try:
+                claimed = _claim_jobs(settings, min(batch_size, free))
+                net_error_count = 0
+            except (requests.exceptions.RequestException, RuntimeError) as exc:
+                net_error_count += 1
+                sleep_s = min(
+                    net_retry_max, net_retry_base * (2 ** max(0, net_error_count - 1))
+                )
+                print(
+                    f"[WORKER] network_claim_error attempt={net_error_count} "
+                    f"sleep_s={sleep_s:.1f} err={exc}",
+                    flush=True,
+                )
+                if once:
+                    exit_code = 1
+                    break
+                stop.wait(sleep_s)
+                continue
+
+            for job in claimed:
+                _write_generation_log(
+                    settings,
+                    job.id,
+                    level="info",
+                    event="job_claimed",
+                    message="Job claimed from pending queue",
+                    payload={"kind": job.kind, "in_flight": len(in_flight) + 1},
+                )
+                fut = pool.submit(_process_job, settings, job)
+                fut.add_done_callback(_job_finished)
+                in_flight.add(fut)
+
+            if once:
+                break
+            if not claimed:
+                # fila vazia: espera o poll, mas SIGTERM interrompe na hora
+                stop.wait(poll_seconds)
+    finally:
+        pending = {f for f in in_flight if not f.done()}
+        if pending:
+            print(f"[WORKER] draining in_flight={len(pending)}", flush=True)
+            wait(pending)
+        pool.shutdown(wait=True)
+        if _result_index_instance is not None:
+            print(f"[WORKER] result_cache {_result_index_instance.stats()}", flush=True)
+        if _log_sink is not None:
+            _log_sink.close()
+    return exit_code
 
 
 def main() -> int:
     load_dotenv()
     parser = argparse.ArgumentParser(description="Run quiz generation worker")
     parser.add_argument("--max-workers", type=int, default=5, help="Concurrent jobs")
-    parser.add_argument("--batch-size", type=int, default=20, help="Pending fetch size")
+    parser.add_argument("--batch-size", type=int, default=20, help="Max jobs claimed per round trip")
     parser.add_argument(
-        "--once", action="store_true", help="Process one batch and exit"
+        "--once", action="store_true", help="Claim one batch, finish it and exit"
     )
     parser.add_argument(
         "--poll-seconds",
@@ -925,70 +1343,37 @@ def main() -> int:
         "--network-retry-base-seconds",
         type=float,
         default=2.0,
-        help="Base backoff when pending fetch fails due to network/DNS",
+        help="Base backoff when the pending claim fails due to network/DNS",
     )
     parser.add_argument(
         "--network-retry-max-seconds",
         type=float,
         default=60.0,
-        help="Max backoff when pending fetch fails due to network/DNS",
+        help="Max backoff when the pending claim fails due to network/DNS",
     )
     args = parser.parse_args()
 
     settings = Settings.load()
-    max_workers = max(1, int(args.max_workers))
-    batch_size = max(1, int(args.batch_size))
     net_retry_base = max(0.1, float(args.network_retry_base_seconds))
-    net_retry_max = max(net_retry_base, float(args.network_retry_max_seconds))
-    net_error_count = 0
+    stop = threading.Event()
 
-    while True:
-        try:
-            pending_ids = _fetch_pending(settings, batch_size)
-            net_error_count = 0
-        except requests.exceptions.RequestException as exc:
-            net_error_count += 1
-            sleep_s = min(
-                net_retry_max, net_retry_base * (2 ** max(0, net_error_count - 1))
-            )
-            print(
-                f"[WORKER] network_fetch_pending_error attempt={net_error_count} "
-                f"sleep_s={sleep_s:.1f} err={exc}",
-                flush=True,
-            )
-            if args.once:
-                return 1
-            time.sleep(sleep_s)
-            continue
-        if not pending_ids:
-            if args.once:
-                break
-            time.sleep(max(0.1, args.poll_seconds))
-            continue
-
-        claimed: list[Job] = []
-        for pid in pending_ids:
-            job = _claim_job(settings, pid)
-            if job:
-                _write_generation_log(
-                    settings,
-                    job.id,
-                    level="info",
-                    event="job_claimed",
-                    message="Job claimed from pending queue",
-                    payload={"kind": job.kind},
-                )
-                claimed.append(job)
+    def _request_stop(signum, _frame):
+        print(f"[WORKER] stop_requested signal={signum} draining", flush=True)
+        stop.set()
 
-        if claimed:
-            with ThreadPoolExecutor(max_workers=max_workers) as pool:
-                for job in claimed:
-                    pool.submit(_process_job, settings, job)
+    signal.signal(signal.SIGTERM, _request_stop)
+    signal.signal(signal.SIGINT, _request_stop)
 
-        if args.once:
-            break
-
-    return 0
+    return _run_pipeline(
+        settings,
+        max_workers=max(1, int(args.max_workers)),
+        batch_size=max(1, int(args.batch_size)),
+        poll_seconds=max(0.1, float(args.poll_seconds)),
+        net_retry_base=net_retry_base,
+        net_retry_max=max(net_retry_base, float(args.network_retry_max_seconds)),
+        once=args.once,
+        stop=stop,
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,29 @@
+import importlib.util
+import sys
+from pathlib import Path
+
+WORKER_PATH = Path(__file__).resolve().parents[1] / "scripts" / "quiz_generation_worker.py"
+
+
+def load_worker(test):
+    """A fresh ``scripts/quiz_generation_worker.py`` for ``test``.
+
+    Module-level state (claim RPC probe, caches, result index) starts clean
+    in every test; the previous ``sys.modules`` entry is restored afterwards.
+    """
+    name = "quiz_generation_worker"
+    spec = importlib.util.spec_from_file_location(name, WORKER_PATH)
+    mod = importlib.util.module_from_spec(spec)
+    previous = sys.modules.get(name)
+    # dataclasses resolvem anotações via sys.modules
+    sys.modules[name] = mod
+    test.addCleanup(_restore, name, previous)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def _restore(name, previous):
+    if previous is None:
+        sys.modules.pop(name, None)
+    else:
+        sys.modules[name] = previous
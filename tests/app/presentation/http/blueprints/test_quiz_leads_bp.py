@@ -1,4 +1,5 @@
 import os
+import tempfile
 import unittest
 from unittest.mock import Mock, patch
 
@@ -13,6 +14,16 @@ class QuizLeadsBlueprintTests(unittest.TestCase):
         os.environ.setdefault("APP_API_TOKEN", "test-token")
         os.environ.setdefault("CORS_ORIGINS", "http://localhost:8080")
         os.environ.setdefault("APP_DEBUG", "false")
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        # stores em disco num diretório temporário: o teste não cria nem drena os arquivos de data/
+        env = patch.dict(os.environ, {
+            "TRAINING_SNIPPETS_PATH": os.path.join(tmp.name, "training_snippets.sqlite3"),
+            "WRITE_BEHIND_SPOOL_PATH": os.path.join(tmp.name, "write_spool.sqlite3"),
+            "USAGE_ROLLUP_PATH": os.path.join(tmp.name, "usage_rollup.sqlite3"),
+        })
+        env.start()
+        self.addCleanup(env.stop)
         self.app = create_app()
         self.client = self.app.test_client()
 
@@ -92,7 +103,7 @@ class QuizLeadsBlueprintTests(unittest.TestCase):
         self.assertEqual(resp.get_json()["error"], "missing_required_field:email")
 
     @patch("app.presentation.http.blueprints.quiz_bp.get_json")
-    @patch("app.presentation.http.blueprints.quiz_bp.requests.post")
+    @patch("app.presentation.http.blueprints.quiz_bp.HttpClient.post")
     def test_public_lead_create_success_even_when_lead_insert_fails(
         self, post_req, get_json
     ):
@@ -141,7 +152,7 @@ class QuizLeadsBlueprintTests(unittest.TestCase):
         self.assertTrue(payload["unlock"])
 
     @patch("app.presentation.http.blueprints.quiz_bp.get_json")
-    @patch("app.presentation.http.blueprints.quiz_bp.requests.post")
+    @patch("app.presentation.http.blueprints.quiz_bp.HttpClient.post")
     def test_public_lead_create_without_credential(self, post_req, get_json):
         get_json.side_effect = [
             [
@@ -185,7 +196,8 @@ class QuizLeadsBlueprintTests(unittest.TestCase):
         self.assertTrue(payload["lead_inserted"])
 
     @patch("app.presentation.http.blueprints.quiz_bp.get_json")
-    def test_public_experience_metrics_success(self, get_json):
+    @patch("app.presentation.http.blueprints.quiz_bp.count_rows")
+    def test_public_experience_metrics_success(self, count_rows, get_json):
         get_json.side_effect = [
             [
                 {
@@ -195,9 +207,8 @@ class QuizLeadsBlueprintTests(unittest.TestCase):
                     "config_json": {},
                 }
             ],
-            [{"id": "l1"}, {"id": "l2"}],
-            [{"id": "g1"}],
         ]
+        count_rows.side_effect = lambda settings, table, params: {"leads": 2, "generations": 1}[table]
         resp = self.client.get("/public/experience/minha-exp/metrics")
         payload = resp.get_json()
 
@@ -208,7 +219,7 @@ class QuizLeadsBlueprintTests(unittest.TestCase):
         self.assertEqual(payload["dropped"], 1)
 
     @patch("app.presentation.http.blueprints.quiz_bp.get_json")
-    @patch("app.presentation.http.blueprints.quiz_bp.requests.patch")
+    @patch("app.presentation.http.blueprints.quiz_bp.HttpClient.patch")
     def test_complete_public_lead_success(self, patch_req, get_json):
         get_json.return_value = [
             {"id": "exp-1", "type": "quiz", "status": "published", "config_json": {}}
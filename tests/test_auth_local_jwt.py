@@ -0,0 +1,113 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+from app.presentation.http.server import create_app
+
+SECRET = "test-jwt-secret"
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def make_token(sub="user-1", exp_delta=3600, secret=SECRET, **extra) -> str:
+    header = _b64(json.dumps({"alg": "HS256", "typ": "JWT"}).encode())
+    claims = {
+        "sub": sub,
+        "aud": "authenticated",
+        "role": "authenticated",
+        "exp": int(time.time()) + exp_delta,
+        "iss": os.environ["SUPABASE_URL"].rstrip("/") + "/auth/v1",
+        **extra,
+    }
+    payload = _b64(json.dumps(claims).encode())
+    sig = hmac.new(secret.encode(), f"{header}.{payload}".encode(), hashlib.sha256).digest()
+    return f"{header}.{payload}.{_b64(sig)}"
+
+
+def _resp(status=200, payload=None):
+    r = Mock()
+    r.status_code = status
+    r.ok = status < 400
+    r.json.return_value = payload
+    return r
+
+
+class LocalJwtAuthTests(unittest.TestCase):
+    def setUp(self):
+        os.environ.setdefault("HEYGEN_API_KEY", "env-key")
+        os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+        os.environ.setdefault("SUPABASE_SERVICE_ROLE", "service-role")
+        os.environ.setdefault("APP_API_TOKEN", "test-token")
+        os.environ.setdefault("CORS_ORIGINS", "http://localhost:8080")
+        os.environ.setdefault("APP_DEBUG", "false")
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        # stores em disco num diretório temporário: o teste não cria nem drena os arquivos de data/
+        env = patch.dict(os.environ, {
+            "TRAINING_SNIPPETS_PATH": os.path.join(tmp.name, "training_snippets.sqlite3"),
+            "WRITE_BEHIND_SPOOL_PATH": os.path.join(tmp.name, "write_spool.sqlite3"),
+            "USAGE_ROLLUP_PATH": os.path.join(tmp.name, "usage_rollup.sqlite3"),
+        })
+        env.start()
+        self.addCleanup(env.stop)
+        os.environ["SUPABASE_JWT_SECRET"] = SECRET
+        self.app = create_app()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        os.environ.pop("SUPABASE_JWT_SECRET", None)
+
+    def _get(self, token):
+        return self.client.get("/health", headers={"Authorization": f"Bearer {token}"})
+
+    @patch("app.presentation.http.auth.HttpClient.get")
+    def test_valid_token_skips_auth_user_and_caches_client_mapping(self, http_get):
+        http_get.return_value = _resp(200, [{"id": "client-1", "user_id": "user-1"}])
+
+        self.assertEqual(self._get(make_token()).status_code, 200)
+        self.assertEqual(self._get(make_token()).status_code, 200)
+
+        self.assertEqual(http_get.call_count, 1)
+        self.assertIn("/rest/v1/admin_clients", http_get.call_args.args[0])
+
+    @patch("app.presentation.http.auth.HttpClient.get")
+    def test_missing_client_mapping_is_cached_as_negative(self, http_get):
+        http_get.return_value = _resp(200, [])
+
+        self.assertEqual(self._get(make_token(sub="orphan")).status_code, 403)
+        self.assertEqual(self._get(make_token(sub="orphan")).status_code, 403)
+        self.assertEqual(http_get.call_count, 1)
+
+    @patch("app.presentation.http.auth.HttpClient.get")
+    def test_expired_or_forged_tokens_are_rejected_without_io(self, http_get):
+        self.assertEqual(self._get(make_token(exp_delta=-3600)).status_code, 401)
+        self.assertEqual(self._get(make_token(secret="other-secret")).status_code, 401)
+        self.assertEqual(self._get(make_token(role="anon")).status_code, 401)
+        self.assertEqual(self._get("not-a-jwt").status_code, 401)
+        http_get.assert_not_called()
+
+    @patch("app.presentation.http.auth.HttpClient.get")
+    def test_falls_back_to_remote_when_secret_is_not_configured(self, http_get):
+        os.environ.pop("SUPABASE_JWT_SECRET", None)
+        app = create_app()
+        http_get.side_effect = [
+            _resp(200, {"id": "user-1"}),
+            _resp(200, [{"id": "client-1", "user_id": "user-1"}]),
+        ]
+
+        resp = app.test_client().get("/health", headers={"Authorization": f"Bearer {make_token()}"})
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("/auth/v1/user", http_get.call_args_list[0].args[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+from app.presentation.http import auth
+from app.presentation.http.auth import _authenticate
+from app.presentation.http.server import create_app
+
+
+def _resp(status=200, payload=None):
+    r = Mock()
+    r.status_code = status
+    r.ok = status < 400
+    r.json.return_value = payload
+    return r
+
+
+class PublicAvatarAuthCacheTests(unittest.TestCase):
+    def setUp(self):
+        os.environ.setdefault("HEYGEN_API_KEY", "env-key")
+        os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+        os.environ.setdefault("SUPABASE_SERVICE_ROLE", "service-role")
+        os.environ.setdefault("APP_API_TOKEN", "test-token")
+        os.environ.setdefault("CORS_ORIGINS", "http://localhost:8080")
+        os.environ.setdefault("APP_DEBUG", "false")
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        # stores em disco num diretório temporário: o teste não cria nem drena os arquivos de data/
+        env = patch.dict(os.environ, {
+            "TRAINING_SNIPPETS_PATH": os.path.join(tmp.name, "training_snippets.sqlite3"),
+            "WRITE_BEHIND_SPOOL_PATH": os.path.join(tmp.name, "write_spool.sqlite3"),
+            "USAGE_ROLLUP_PATH": os.path.join(tmp.name, "usage_rollup.sqlite3"),
+        })
+        env.start()
+        self.addCleanup(env.stop)
+        self.app = create_app()
+        auth._embed_unsupported_until = 0.0
+        self.addCleanup(setattr, auth, "_embed_unsupported_until", 0.0)
+
+    def _auth(self, avatar_id="avatar-1", path="/say"):
+        with self.app.test_request_context(path, headers={"X-Public-Avatar-Id": avatar_id}):
+            return _authenticate()
+
+    @patch("app.presentation.http.auth.HttpClient.get")
+    def test_embedded_query_resolves_in_one_call_and_is_cached(self, http_get):
+        http_get.return_value = _resp(200, [{"id": "avatar-1", "user_id": "u1", "admin_clients": [{"id": "client-1"}]}])
+
+        self.assertEqual(self._auth(), ("public", "client-1"))
+        self.assertEqual(self._auth(path="/end"), ("public", "client-1"))
+
+        self.assertEqual(http_get.call_count, 1)
+        self.assertIn("admin_clients(id)", http_get.call_args.kwargs["params"]["select"])
+
+    @patch("app.presentation.http.auth.HttpClient.get")
+    def test_falls_back_to_two_calls_when_embedding_is_not_available(self, http_get):
+        http_get.side_effect = [
+            _resp(400, {"code": "PGRST200"}),
+            _resp(200, [{"id": "avatar-1", "user_id": "u1"}]),
+            _resp(200, [{"id": "client-1", "user_id": "u1"}]),
+            _resp(200, [{"id": "avatar-2", "user_id": "u1"}]),
+        ]
+
+        self.assertEqual(self._auth("avatar-1"), ("public", "client-1"))
+        # embed não é tentado de novo; user_id -> client_id já está em cache
+        self.assertEqual(self._auth("avatar-2"), ("public", "client-1"))
+        self.assertEqual(http_get.call_count, 4)
+
+    @patch("app.presentation.http.auth.HttpClient.get")
+    def test_unknown_avatar_is_cached_as_negative_and_can_be_invalidated(self, http_get):
+        http_get.return_value = _resp(200, [])
+
+        for _ in range(3):
+            with self.assertRaises(Exception):
+                self._auth("ghost")
+        self.assertEqual(http_get.call_count, 1)
+
+        resp = self.app.test_client().post(
+            "/cache/invalidate", json={"cache": "avatar_clients", "key": "ghost"},
+            headers={"Authorization": "Bearer test-token"},
+        )
+        self.assertEqual(resp.status_code, 200)
+        with self.assertRaises(Exception):
+            self._auth("ghost")
+        self.assertEqual(http_get.call_count, 2)
+
+    def test_cache_invalidate_requires_the_app_token(self):
+        client = self.app.test_client()
+        for headers in ({}, {"Authorization": "Bearer some-client-jwt"}, {"X-Public-Avatar-Id": "avatar-1"}):
+            resp = client.post("/cache/invalidate", json={"cache": "avatar_clients"}, headers=headers)
+            self.assertEqual(resp.status_code, 403)
+        # mesmo com o before_request desligado, o endpoint confere o token
+        with patch("app.presentation.http.server.require_auth", lambda: None):
+            resp = client.post("/cache/invalidate", json={"cache": "avatar_clients"},
+                               headers={"Authorization": "Bearer some-client-jwt"})
+        self.assertEqual(resp.status_code, 403)
+
+    @patch("app.presentation.http.auth.HttpClient.get")
+    def test_transport_errors_are_not_cached(self, http_get):
+        http_get.side_effect = [
+            _resp(503, None),
+            _resp(200, [{"id": "avatar-1", "user_id": "u1", "admin_clients": {"id": "client-1"}}]),
+        ]
+
+        with self.assertRaises(Exception):
+            self._auth()
+        self.assertEqual(self._auth(), ("public", "client-1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,169 @@
+import base64
+import os
+import tempfile
+import time
+import unittest
+from dataclasses import replace
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+from app.application.use_cases.upload_training_doc import invalidate_avatar_context
+from app.core.container import Container
+from app.core.settings import Settings
+from app.infrastructure.avatar_credentials_index import AvatarCredentialsIndex
+from app.infrastructure.write_behind import SupabaseWriteQueue
+
+AVATAR_UUID = "11111111-2222-3333-4444-555555555555"
+
+
+def _b64(val: str) -> str:
+    return base64.b64encode(val.encode()).decode()
+
+
+def _row(avatar_id=AVATAR_UUID, external="Ann_Doctor_Sitting_public", context=None):
+    return {
+        "api_key": _b64("sk_V2_hgu_key-1"),
+        "avatar_id": avatar_id,
+        "avatar_external_id": _b64(external),
+        "voice_id": None,
+        "context_id": _b64(context) if context else None,
+    }
+
+
+def _resp(payload):
+    r = Mock()
+    r.ok = True
+    r.status_code = 200
+    r.json.return_value = payload
+    return r
+
+
+class AvatarCredentialsIndexTests(unittest.TestCase):
+    def setUp(self):
+        os.environ.setdefault("HEYGEN_API_KEY", "env-key")
+        os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+        os.environ.setdefault("SUPABASE_SERVICE_ROLE", "service-role")
+        os.environ.setdefault("APP_API_TOKEN", "test-token")
+        self.settings = Settings.load()
+        self.http = Mock()
+
+    def _index(self, ttl=60.0):
+        return AvatarCredentialsIndex(replace(self.settings, avatar_credentials_ttl_seconds=ttl), self.http)
+
+    def test_lookups_by_id_and_external_id_share_one_load(self):
+        self.http.get.return_value = _resp([_row()])
+        index = self._index()
+
+        by_id = index.get(AVATAR_UUID)
+        by_external = index.get("Ann_Doctor_Sitting_public")
+
+        self.assertEqual(by_id["api_key"], "sk_V2_hgu_key-1")
+        self.assertIs(by_id, by_external)
+        self.assertEqual(self.http.get.call_count, 1)
+
+    def test_unknown_avatar_is_fetched_once_and_miss_is_remembered(self):
+        self.http.get.side_effect = [_resp([_row()]), _resp([])]
+        index = self._index()
+
+        self.assertIsNone(index.get("99999999-2222-3333-4444-555555555555"))
+        self.assertIsNone(index.get("99999999-2222-3333-4444-555555555555"))
+
+        self.assertEqual(self.http.get.call_count, 2)
+        self.assertIn(
+            "avatar_id.eq.99999999-2222-3333-4444-555555555555", self.http.get.call_args.kwargs["params"]["or"]
+        )
+
+    def test_invalidate_refetches_only_that_avatar(self):
+        self.http.get.side_effect = [_resp([_row(context="ctx-old")]), _resp([_row(context="ctx-new")])]
+        index = self._index()
+        self.assertEqual(index.get(AVATAR_UUID)["context_id"], "ctx-old")
+
+        index.invalidate(AVATAR_UUID)
+
+        self.assertEqual(index.get("Ann_Doctor_Sitting_public")["context_id"], "ctx-new")
+        self.assertEqual(index.get(AVATAR_UUID)["context_id"], "ctx-new")
+        self.assertEqual(self.http.get.call_count, 2)
+
+    def test_local_context_id_survives_reload_until_the_write_is_flushed(self):
+        self.http.get.side_effect = [_resp([_row()]), _resp([_row()]), _resp([_row(context="ctx-new")])]
+        index = self._index()
+        self.assertIsNone(index.get(AVATAR_UUID)["context_id"])
+
+        index.set_context_id(AVATAR_UUID, "ctx-new")
+        self.assertEqual(index.get("Ann_Doctor_Sitting_public")["context_id"], "ctx-new")
+        # recarga antes do PATCH chegar ao Supabase ainda traz context_id nulo
+        index.invalidate(AVATAR_UUID)
+        self.assertEqual(index.get(AVATAR_UUID)["context_id"], "ctx-new")
+
+        index.context_flushed(AVATAR_UUID)
+        self.assertEqual(index.get(AVATAR_UUID)["context_id"], "ctx-new")
+        self.assertNotIn(AVATAR_UUID, index._pending_context)
+
+    def test_training_reset_is_queued_after_a_pending_context_write(self):
+        self.http.get.side_effect = [_resp([_row()]), _resp([_row(context="ctx-new")]), _resp([_row()])]
+        self.http.patch.return_value = Mock(ok=True, status_code=204)
+        index = self._index()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        with patch.object(SupabaseWriteQueue, "_ensure_thread"):
+            writes = SupabaseWriteQueue(self.settings, os.path.join(tmp.name, "spool.sqlite3"), self.http)
+        writes._ensure_thread = lambda: None
+        writes.on_flushed(lambda ops: Container._on_writes_flushed(SimpleNamespace(credentials=index), ops))
+        index.get(AVATAR_UUID)
+
+        # /new criou um contexto e enfileirou o PATCH; logo depois chega um documento de treino
+        index.set_context_id(AVATAR_UUID, "ctx-new")
+        writes.patch("avatar_credentials", {"avatar_id": f"eq.{AVATAR_UUID}"}, {"context_id": _b64("ctx-new")},
+                     meta={"context_id": "ctx-new"})
+        invalidate_avatar_context(self.settings, AVATAR_UUID, index, writes)
+        index.invalidate(AVATAR_UUID)
+        self.assertIsNone(index.get(AVATAR_UUID)["context_id"])
+
+        self.assertTrue(writes.flush())
+        sent = [c.kwargs["json"]["context_id"] for c in self.http.patch.call_args_list]
+        self.assertEqual(sent, [_b64("ctx-new"), None])
+        self.assertIsNone(index.get(AVATAR_UUID)["context_id"])
+        self.assertNotIn(AVATAR_UUID, index._pending_context)
+        self.assertEqual(self.http.get.call_count, 3)
+
+    def test_filter_injection_is_rejected_and_rows_must_match_exactly(self):
+        other = _row(avatar_id="99999999-2222-3333-4444-555555555555", external="Other_Tenant")
+        self.http.get.side_effect = [_resp([_row()]), _resp([other])]
+        index = self._index()
+
+        self.assertIsNone(index.get('zz",avatar_external_id.neq."zz'))
+        self.assertEqual(self.http.get.call_count, 1)
+        # PostgREST devolveu a linha de outro avatar: descartada
+        self.assertIsNone(index.get("Someone_Else"))
+
+    def test_external_uuid_survives_invalidate(self):
+        external = "aaaaaaaa-bbbb-cccc-dddd-eeeeeeeeeeee"
+        self.http.get.side_effect = [
+            _resp([_row(external=external, context="ctx-old")]),
+            _resp([_row(external=external, context="ctx-new")]),
+        ]
+        index = self._index()
+        self.assertEqual(index.get(external)["context_id"], "ctx-old")
+
+        index.invalidate(external)
+
+        self.assertEqual(index.get(external)["context_id"], "ctx-new")
+        self.assertIn(f"avatar_external_id.eq.\"{external}\"", self.http.get.call_args.kwargs["params"]["or"])
+        self.assertEqual(index.get(AVATAR_UUID)["context_id"], "ctx-new")
+
+    def test_expired_snapshot_is_served_while_refreshing_in_background(self):
+        self.http.get.side_effect = [_resp([_row(context="ctx-1")]), _resp([_row(context="ctx-2")])]
+        index = self._index(ttl=0.01)
+        self.assertEqual(index.get(AVATAR_UUID)["context_id"], "ctx-1")
+        time.sleep(0.02)
+
+        self.assertIn(index.get(AVATAR_UUID)["context_id"], {"ctx-1", "ctx-2"})
+        deadline = time.time() + 2
+        while self.http.get.call_count < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.05)
+        self.assertEqual(index.rows()[0]["context_id"], "ctx-2")
+
+
+if __name__ == "__main__":
+    unittest.main()
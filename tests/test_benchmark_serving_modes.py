@@ -0,0 +1,48 @@
+import os
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+
+
+class BenchmarkServingModesTests(unittest.TestCase):
+    def test_compares_single_threaded_and_threaded_servers(self):
+        root = Path(__file__).resolve().parents[1]
+        script = root / "scripts" / "benchmark_serving_modes.py"
+
+        with tempfile.TemporaryDirectory() as tmp:
+            report = Path(tmp) / "serving_report.md"
+            cmd = [
+                "python3",
+                str(script),
+                "--modes",
+                "single",
+                "threaded",
+                "--requests",
+                "16",
+                "--concurrency",
+                "4",
+                "--latency-ms",
+                "20",
+                "--report-out",
+                str(report),
+            ]
+            # stores em disco no diretório temporário: o benchmark não cria nem drena os arquivos de data/
+            env = {
+                **os.environ,
+                "TRAINING_SNIPPETS_PATH": str(Path(tmp) / "training_snippets.sqlite3"),
+                "WRITE_BEHIND_SPOOL_PATH": str(Path(tmp) / "write_spool.sqlite3"),
+                "USAGE_ROLLUP_PATH": str(Path(tmp) / "usage_rollup.sqlite3"),
+            }
+            proc = subprocess.run(cmd, cwd=root, env=env, capture_output=True, text=True)
+            self.assertEqual(proc.returncode, 0, msg=proc.stderr or proc.stdout)
+            self.assertTrue(report.exists())
+
+            content = report.read_text(encoding="utf-8")
+            self.assertIn("modo: `mock`", content)
+            self.assertIn("dev server `threaded=False` (app.main) | 16 | 0 |", content)
+            self.assertIn("dev server `threaded=True` | 16 | 0 |", content)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import random
+import unittest
+
+from app.application.services.context_resolver import (
+    ContextMatcher,
+    compile_context_matcher,
+    fast_match_context,
+    re_split,
+)
+from app.domain.models import ContextItem
+from app.shared.text_utils import normalize
+
+
+def _linear_match(user_text, contexts):
+    """Original per-call scan, kept here as the reference semantics."""
+    text = normalize(user_text)
+    if not text:
+        return None
+    for c in contexts:
+        name = normalize(c.name)
+        if name and name in text:
+            return c.name
+        if name:
+            for tok in name.split("_"):
+                if tok and tok in text:
+                    return c.name
+        kws = normalize(c.keywords_text or "")
+        if kws:
+            parts = [p.strip() for p in re_split(kws)]
+            for p in list(parts):
+                parts.extend(p.split())
+            for k in parts:
+                if len(k) < 3:
+                    continue
+                if k and k in text:
+                    return c.name
+    return None
+
+
+def _ctx(name, kws=""):
+    return ContextItem(name=name, media_url="https://cdn/x.png", media_type="image", keywords_text=kws)
+
+
+class ContextMatcherTests(unittest.TestCase):
+    def test_first_context_in_list_order_wins(self):
+        contexts = [_ctx("sobremesa", "bolo; torta"), _ctx("chocolate", "cacau, bolo de chocolate")]
+        self.assertEqual(fast_match_context("Quero um BOLO de chocolate", contexts), "sobremesa")
+        self.assertEqual(fast_match_context("amo cacau", contexts), "chocolate")
+
+    def test_name_tokens_accents_and_short_keywords(self):
+        contexts = [_ctx("cafe_da_manha"), _ctx("pao", "pé; pão francês")]
+        self.assertEqual(fast_match_context("Um CAFÉ por favor", contexts), "cafe_da_manha")
+        # keywords shorter than 3 chars are ignored
+        self.assertIsNone(fast_match_context("pe", [_ctx("loja", "pé")]))
+        self.assertEqual(fast_match_context("pão quentinho", [_ctx("padaria", "pão francês")]), "padaria")
+
+    def test_empty_text_or_contexts(self):
+        self.assertIsNone(fast_match_context("", [_ctx("a")]))
+        self.assertIsNone(fast_match_context("qualquer", []))
+
+    def test_matches_linear_scan_on_random_lists(self):
+        rng = random.Random(7)
+        vocab = ["chocolate", "cacau", "bolo", "pão", "café", "manhã", "açaí", "suco", "uva", "ok", "fala", "sobre",
+                 "preço", "horário", "loja", "entrega", "pix", "cartão", "ab", "x"]
+        for _ in range(200):
+            contexts = []
+            for i in range(rng.randint(1, 30)):
+                name = "_".join(rng.sample(vocab, rng.randint(1, 2))) + str(i if rng.random() < 0.5 else "")
+                kws = rng.choice([";", ",", "|", " "]).join(rng.sample(vocab, rng.randint(0, 4)))
+                contexts.append(_ctx(name, kws))
+            text = " ".join(rng.sample(vocab, rng.randint(1, 5))).upper()
+            self.assertEqual(fast_match_context(text, contexts), _linear_match(text, contexts), (text, contexts))
+
+    def test_compiled_matcher_is_reused_for_equal_lists(self):
+        a = [_ctx("chocolate", "cacau")]
+        b = [_ctx("chocolate", "cacau")]
+        self.assertIs(compile_context_matcher(a), compile_context_matcher(b))
+        self.assertIsInstance(compile_context_matcher(a), ContextMatcher)
+
+
+if __name__ == "__main__":
+    unittest.main()
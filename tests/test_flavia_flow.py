@@ -1,4 +1,5 @@
 import os
+import tempfile
 import unittest
 from unittest.mock import patch
 
@@ -13,6 +14,16 @@ class FlaviaFlowTests(unittest.TestCase):
         os.environ.setdefault("APP_API_TOKEN", "test-token")
         os.environ.setdefault("CORS_ORIGINS", "http://localhost:8080")
         os.environ.setdefault("APP_DEBUG", "false")
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        # stores em disco num diretório temporário: o teste não cria nem drena os arquivos de data/
+        env = patch.dict(os.environ, {
+            "TRAINING_SNIPPETS_PATH": os.path.join(tmp.name, "training_snippets.sqlite3"),
+            "WRITE_BEHIND_SPOOL_PATH": os.path.join(tmp.name, "write_spool.sqlite3"),
+            "USAGE_ROLLUP_PATH": os.path.join(tmp.name, "usage_rollup.sqlite3"),
+        })
+        env.start()
+        self.addCleanup(env.stop)
         self.app = create_app()
         self.client = self.app.test_client()
 
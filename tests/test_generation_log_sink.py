@@ -0,0 +1,79 @@
+import io
+import os
+import unittest
+from contextlib import redirect_stdout
+from unittest.mock import Mock, patch
+
+from app.core.settings import Settings
+from app.infrastructure.generation_log_sink import GenerationLogSink
+
+
+def _resp(status: int):
+    r = Mock()
+    r.status_code = status
+    return r
+
+
+class GenerationLogSinkTests(unittest.TestCase):
+    def setUp(self):
+        os.environ.setdefault("HEYGEN_API_KEY", "env-key")
+        os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+        os.environ.setdefault("SUPABASE_SERVICE_ROLE", "service-role")
+        os.environ.setdefault("APP_API_TOKEN", "test-token")
+        self.http = Mock()
+        self.http.post.return_value = _resp(201)
+        self.sink = GenerationLogSink(Settings.load(), http=self.http, flush_interval_seconds=60, max_buffered=300)
+        self.addCleanup(self.sink.close)
+
+    def _job(self, gen_id: str, terminal: str = "job_done"):
+        for event in ("job_claimed", "job_started", "credential_loaded", "gemini_generated", "output_uploaded", terminal):
+            self.sink.emit(gen_id, level="info", event=event, message=event, payload={"n": 1})
+
+    def test_job_events_go_in_one_insert(self):
+        self._job("gen-1")
+        self.sink.flush()
+
+        self.http.post.assert_called_once()
+        rows = self.http.post.call_args.kwargs["json"]
+        self.assertEqual([r["event"] for r in rows][-1], "job_done")
+        self.assertEqual(len(rows), 6)
+        self.assertTrue(self.http.post.call_args.args[0].endswith("/rest/v1/generation_logs"))
+
+    def test_terminal_event_wakes_the_flusher(self):
+        self._job("gen-1", terminal="job_error")
+        self.sink._wake.wait(1)
+        for _ in range(100):
+            if self.sink.buffered() == 0:
+                break
+            self.sink._stop.wait(0.01)
+        self.assertEqual(self.sink.stats()["sent"], 6)
+
+    def test_missing_table_falls_back_to_stdout(self):
+        self.http.post.return_value = _resp(404)
+        out = io.StringIO()
+        with redirect_stdout(out):
+            self._job("gen-1")
+            self.sink.flush()
+            self._job("gen-2")
+        self.assertEqual(self.http.post.call_count, 1)
+        self.assertEqual(out.getvalue().count("[GENLOG]"), 12)
+        self.assertEqual(self.sink.buffered(), 0)
+
+    def test_buffer_is_capped_while_supabase_is_down(self):
+        self.http.post.side_effect = ConnectionError("down")
+        out = io.StringIO()
+        # sem a thread de flush: as contagens abaixo ficam determinísticas
+        with redirect_stdout(out), patch.object(self.sink, "_ensure_thread"):
+            for i in range(100):
+                self._job(f"gen-{i}")
+            self.sink.flush()
+            buffered = self.sink.buffered()
+            self.assertLessEqual(buffered, 300)
+            # nada se perde: o que não cabe no buffer sai no stdout
+            self.assertEqual(out.getvalue().count("[GENLOG]") + buffered, 600)
+            self.sink.close()
+        self.assertEqual(out.getvalue().count("[GENLOG]"), 600)
+
+
+if __name__ == "__main__":
+    unittest.main()
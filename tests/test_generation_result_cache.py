@@ -0,0 +1,126 @@
+import os
+import tempfile
+import unittest
+from dataclasses import replace
+from unittest.mock import patch
+
+from app.core.settings import Settings
+from app.infrastructure.gemini_image_client import GeminiImageClient
+from app.infrastructure.generation_result_cache import GenerationResultIndex
+from tests._worker import load_worker
+
+
+def _env():
+    os.environ.setdefault("HEYGEN_API_KEY", "env-key")
+    os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+    os.environ.setdefault("SUPABASE_SERVICE_ROLE", "service-role")
+    os.environ.setdefault("APP_API_TOKEN", "test-token")
+
+
+class GenerationResultIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.index = GenerationResultIndex(os.path.join(self.tmp.name, "results.sqlite3"), max_entries=3)
+
+    def test_hit_miss_and_hit_rate(self):
+        self.assertIsNone(self.index.get("k1"))
+        self.index.put("k1", "exp/gen-1.png", "image/png", "gemini-2.5-flash-image")
+        self.assertEqual(self.index.get("k1")["output_path"], "exp/gen-1.png")
+        stats = self.index.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["hit_rate"]), (1, 1, 0.5))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        for i in range(3):
+            self.index.put(f"k{i}", f"p{i}", "image/png")
+        self.index.get("k0")
+        self.index.put("k3", "p3", "image/png")
+
+        self.assertEqual(self.index.stats()["entries"], 3)
+        self.assertIsNotNone(self.index.get("k0"))
+        self.assertIsNone(self.index.get("k1"))
+
+
+class ResultKeyTests(unittest.TestCase):
+    def test_key_depends_on_model_prompt_and_bytes(self):
+        _env()
+        settings = replace(Settings.load(), gemini_api_key="k", gemini_image_model="model-a")
+        client = GeminiImageClient(settings)
+        base = client.result_key("prompt", b"photo")
+
+        self.assertEqual(base, client.result_key("prompt", b"photo"))
+        self.assertNotEqual(base, client.result_key("prompt", b"photo2"))
+        self.assertNotEqual(base, client.result_key("prompt ", b"photo"))
+        self.assertNotEqual(base, GeminiImageClient(replace(settings, gemini_image_model="model-b")).result_key("prompt", b"photo"))
+        self.assertNotEqual(client.result_key("ab", b"c"), client.result_key("a", b"bc"))
+        self.assertNotEqual(client.result_key("prompt", b"photo", scope="exp-1"), client.result_key("prompt", b"photo", scope="exp-2"))
+
+
+class WorkerResultCacheTests(unittest.TestCase):
+    def setUp(self):
+        _env()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        env = patch.dict(os.environ, {"QUIZ_GEMINI_RESULT_CACHE_PATH": os.path.join(self.tmp.name, "r.sqlite3")})
+        env.start()
+        self.addCleanup(env.stop)
+        self.settings = Settings.load()
+        self.worker = load_worker(self)
+
+        def fake_get_json(settings, table, select, params, limit=None):
+            cred = {"id": params["id"][3:], "data_json": {}, "photo_path": "exp-1/photo.jpg",
+                    "experiences": {"gemini_api_key": "exp-key", "archetypes": [{"id": "a1", "image_prompt": "portrait"}]}}
+            return [cred]
+
+        uploads = iter(f"exp-1/out-{i}.png" for i in range(10))
+        self.patches = {
+            "get_json": patch.object(self.worker, "get_json", side_effect=fake_get_json),
+            "download": patch.object(self.worker, "_download_reference_image", return_value=(b"same-photo", "image/jpeg")),
+            "gemini": patch.object(self.worker, "generate_editorial_image_uc", return_value=(
+                {"ok": True, "image_base64": "aW1n", "mime_type": "image/png", "model": "m", "latency_ms": 5,
+                 "prompt_applied": "portrait"}, 200)),
+            "upload": patch.object(self.worker, "_upload_output", side_effect=lambda *a, **k: next(uploads)),
+            "copy": patch.object(self.worker, "_copy_output", side_effect=lambda s, e, g, src, **k: f"exp-1/{g}.png"),
+            "done": patch.object(self.worker, "_finish_job_done"),
+            "log": patch.object(self.worker, "_write_generation_log"),
+        }
+        self.mocks = {name: p.start() for name, p in self.patches.items()}
+        for p in self.patches.values():
+            self.addCleanup(p.stop)
+
+    def _run_jobs(self, n: int):
+        for i in range(n):
+            self.worker._process_job(self.settings, self.worker.Job(f"gen-{i}", "exp-1", f"cred-{i}", "quiz_result"))
+
+    def test_identical_resubmission_reuses_stored_output(self):
+        self._run_jobs(3)
+
+        self.assertEqual(self.mocks["gemini"].call_count, 1)
+        self.assertEqual(self.mocks["upload"].call_count, 1)
+        paths = [c.args[3] for c in self.mocks["done"].call_args_list]
+        self.assertEqual(paths, ["exp-1/out-0.png", "exp-1/gen-1.png", "exp-1/gen-2.png"])
+        self.assertEqual([c.args[3] for c in self.mocks["copy"].call_args_list], ["exp-1/out-0.png"] * 2)
+        costs = [c.args[4] for c in self.mocks["done"].call_args_list]
+        self.assertEqual(costs[1:], [0.0, 0.0])
+        self.assertAlmostEqual(self.worker._result_index().stats()["hit_rate"], 2 / 3, places=3)
+
+    def test_missing_source_object_is_forgotten_and_regenerated(self):
+        self._run_jobs(1)
+        self.mocks["copy"].side_effect = RuntimeError("storage_copy_failed:404:not_found")
+        self._run_jobs(1)
+
+        self.assertEqual(self.mocks["gemini"].call_count, 2)
+        self.assertEqual(self.mocks["upload"].call_count, 2)
+        self.assertEqual(self.worker._result_index().stats()["entries"], 1)
+        events = [c.kwargs["event"] for c in self.mocks["log"].call_args_list]
+        self.assertIn("gemini_result_cache_stale", events)
+
+    def test_bypass_flag_always_calls_upstream(self):
+        with patch.dict(os.environ, {"QUIZ_GEMINI_RESULT_CACHE": "false"}):
+            self._run_jobs(2)
+        self.assertEqual(self.mocks["gemini"].call_count, 2)
+        self.assertEqual(self.mocks["upload"].call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
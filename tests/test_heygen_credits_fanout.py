@@ -0,0 +1,96 @@
+import contextlib
+import os
+import threading
+import time
+import unittest
+from dataclasses import replace
+from types import SimpleNamespace
+from unittest.mock import MagicMock, Mock, patch
+
+from app.core.settings import Settings
+from app.presentation.http.blueprints import session_bp
+from app.shared.ttl_cache import TTLCache
+
+QUOTA_URL = "https://api.heygen.com/v2/get_remaining_quota"
+FALLBACK_URL = "https://api.heygen.com/v2/user/remaining_quota"
+
+
+def _resp(status: int, body: dict | None = None):
+    r = Mock()
+    r.status_code = status
+    r.ok = status < 400
+    r.text = "{}" if body is not None else ""
+    r.json.return_value = body or {}
+    return r
+
+
+class HeygenCreditsFanoutTests(unittest.TestCase):
+    def setUp(self):
+        os.environ.setdefault("HEYGEN_API_KEY", "env-key")
+        os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+        os.environ.setdefault("SUPABASE_SERVICE_ROLE", "service-role")
+        os.environ.setdefault("APP_API_TOKEN", "test-token")
+        self.calls = []
+        self.delays = {}
+        self.lock = threading.Lock()
+        self.c = SimpleNamespace(
+            settings=replace(Settings.load(), credits_deadline_seconds=0.5),
+            http=Mock(get=self._get),
+            quota_cache=TTLCache(ttl_seconds=60, stale_ttl_seconds=300, name="heygen_quota"),
+        )
+        app = MagicMock()
+        app.app_context.side_effect = contextlib.nullcontext
+        p = patch.object(session_bp, "current_app", MagicMock(_get_current_object=lambda: app))
+        p.start()
+        self.addCleanup(p.stop)
+
+    def _get(self, url, headers=None, params=None, timeout=None):
+        key = headers["X-Api-Key"]
+        with self.lock:
+            self.calls.append((url, key))
+        time.sleep(self.delays.get(key, 0.0))
+        if key == "revoked":
+            return _resp(401, {})
+        if key == "legacy" and url == QUOTA_URL:
+            return _resp(404, {})
+        if "streaming.list" in url:
+            return _resp(200, {"data": {"data": [{"avatar_id": f"av-{key}", "duration": 120}]}})
+        return _resp(200, {"data": {"remaining_quota": 600}})
+
+    def _quotas(self, keys):
+        return session_bp._fetch_heygen_quotas(self.c, keys, time.monotonic() + self.c.settings.credits_deadline_seconds)
+
+    def test_keys_are_fetched_concurrently(self):
+        self.delays = {"k1": 0.2, "k2": 0.2, "k3": 0.2}
+        t0 = time.monotonic()
+        out = self._quotas(["k1", "k2", "k3"])
+        self.assertLess(time.monotonic() - t0, 0.45)
+        self.assertEqual([q["remaining"] for q in out], [600.0, 600.0, 600.0])
+
+    def test_fallback_and_unauthorized(self):
+        out = self._quotas(["legacy", "revoked"])
+        self.assertEqual(out[0], {"status": "ok", "remaining": 600.0})
+        self.assertEqual(out[1]["status"], "unauthorized")
+        self.assertIn((FALLBACK_URL, "legacy"), self.calls)
+
+    def test_slow_key_misses_the_deadline_without_blocking_the_others(self):
+        self.delays = {"slow": 1.0}
+        t0 = time.monotonic()
+        out = self._quotas(["fast", "slow"])
+        self.assertLess(time.monotonic() - t0, 0.8)
+        self.assertEqual(out[0]["remaining"], 600.0)
+        self.assertIsNone(out[1])
+
+    def test_quota_is_cached_per_key_hash(self):
+        self._quotas(["k1"])
+        self._quotas(["k1"])
+        self.assertEqual(len(self.calls), 1)
+        self.assertNotIn("k1", list(self.c.quota_cache._data))
+
+    def test_sessions_are_listed_for_every_key(self):
+        sessions = session_bp._fetch_heygen_sessions(self.c, ["k1", "k2"], time.monotonic() + 0.5)
+        self.assertEqual(sorted(s["avatar_id"] for s in sessions), ["av-k1", "av-k2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import os
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.core.settings import Settings
+from app.infrastructure.http_client import HttpClient
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b'{"ok": true}'
+        self.server.seen_cookies.append(self.headers.get("Cookie"))
+        self.send_response(500 if self.path == "/fail" else 200)
+        if self.path == "/cookie":
+            self.send_header("Set-Cookie", "sid=client-a; Path=/")
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class HttpClientTests(unittest.TestCase):
+    def setUp(self):
+        os.environ.setdefault("HEYGEN_API_KEY", "env-key")
+        os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+        os.environ.setdefault("SUPABASE_SERVICE_ROLE", "service-role")
+        os.environ.setdefault("APP_API_TOKEN", "test-token")
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.server.seen_cookies = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.http = HttpClient(Settings.load())
+
+    def tearDown(self):
+        self.http.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_reuses_keep_alive_connection_and_records_metrics(self):
+        for _ in range(5):
+            self.assertTrue(self.http.get(self.base + "/ok").ok)
+        self.http.get(self.base + "/fail")
+
+        snap = self.http.metrics_snapshot()["upstreams"]["default"]
+        self.assertEqual(snap["calls"], 6)
+        self.assertEqual(snap["status_5xx"], 1)
+        self.assertEqual(snap["new_connections"], 1)
+        self.assertGreater(snap["latency_ms_max"], 0)
+
+    def test_routes_known_hosts_to_upstreams(self):
+        self.assertEqual(self.http.upstream_for("https://example.supabase.co/rest/v1/avatars"), "supabase")
+        self.assertEqual(self.http.upstream_for("https://api.heygen.com/v1/streaming.new"), "heygen")
+        self.assertEqual(self.http.upstream_for("https://api.liveavatar.com/v1/sessions/start"), "liveavatar")
+        self.assertEqual(self.http.upstream_for("https://api.openai.com/v1/chat/completions"), "openai")
+        self.assertEqual(
+            self.http.upstream_for("https://generativelanguage.googleapis.com/v1beta/models/x"), "gemini"
+        )
+        self.assertEqual(self.http.upstream_for(self.base), "default")
+
+    def test_cookies_from_upstream_are_not_replayed(self):
+        self.http.get(self.base + "/cookie")
+        self.http.get(self.base + "/ok")
+
+        self.assertEqual(self.server.seen_cookies, [None, None])
+        self.assertEqual(len(self.http._session("default").cookies), 0)
+
+    def test_connection_errors_count_as_errors(self):
+        with self.assertRaises(Exception):
+            self.http.get("http://127.0.0.1:1/unreachable", timeout=1)
+        snap = self.http.metrics_snapshot()["upstreams"]["default"]
+        self.assertEqual(snap["errors"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,6 @@
 import io
 import os
+import tempfile
 import unittest
 import base64
 from unittest.mock import patch
@@ -15,6 +16,16 @@ class ImageGenerateEndpointTests(unittest.TestCase):
         os.environ.setdefault("APP_API_TOKEN", "test-token")
         os.environ.setdefault("CORS_ORIGINS", "http://localhost:8080")
         os.environ.setdefault("APP_DEBUG", "false")
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        # stores em disco num diretório temporário: o teste não cria nem drena os arquivos de data/
+        env = patch.dict(os.environ, {
+            "TRAINING_SNIPPETS_PATH": os.path.join(tmp.name, "training_snippets.sqlite3"),
+            "WRITE_BEHIND_SPOOL_PATH": os.path.join(tmp.name, "write_spool.sqlite3"),
+            "USAGE_ROLLUP_PATH": os.path.join(tmp.name, "usage_rollup.sqlite3"),
+        })
+        env.start()
+        self.addCleanup(env.stop)
         os.environ["UPLOAD_MAX_MB"] = "1"
         self.auth_patcher = patch("app.presentation.http.server.require_auth", lambda: None)
         self.auth_patcher.start()
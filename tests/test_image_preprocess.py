@@ -0,0 +1,60 @@
+import io
+import unittest
+
+from app.infrastructure.image_preprocess import prepare_reference_image
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover - Pillow vem do requirements
+    Image = None
+
+
+def _jpeg(size, orientation=1, quality=95) -> bytes:
+    # gradiente: comprime como foto, não como cor sólida
+    img = Image.linear_gradient("L").resize(size).convert("RGB")
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=quality, exif=exif.tobytes())
+    return out.getvalue()
+
+
+@unittest.skipUnless(Image is not None, "Pillow não instalado")
+class PrepareReferenceImageTests(unittest.TestCase):
+    def test_large_rotated_photo_is_oriented_and_downsized(self):
+        data = _jpeg((4000, 3000), orientation=6)
+        prepared = prepare_reference_image(data, "image/jpeg", max_side=1024)
+
+        self.assertEqual(prepared.outcome, "resized")
+        self.assertEqual((prepared.width, prepared.height), (768, 1024))
+        self.assertLess(prepared.final_bytes, prepared.original_bytes)
+        with Image.open(io.BytesIO(prepared.data)) as out:
+            self.assertEqual(out.size, (768, 1024))
+            self.assertEqual(out.getexif().get(0x0112, 1), 1)
+        report = prepared.report()
+        self.assertEqual(report["saved_bytes"], len(data) - len(prepared.data))
+        self.assertGreater(report["saved_request_bytes"], report["saved_bytes"])
+
+    def test_small_upright_jpeg_is_kept(self):
+        data = _jpeg((400, 300), quality=60)
+        prepared = prepare_reference_image(data, "image/jpeg", max_side=1024, jpeg_quality=95)
+        self.assertEqual(prepared.outcome, "kept_original")
+        self.assertIs(prepared.data, data)
+
+    def test_transparent_png_becomes_jpeg(self):
+        img = Image.new("RGBA", (2048, 1024), (255, 0, 0, 0))
+        out = io.BytesIO()
+        img.save(out, format="PNG")
+        prepared = prepare_reference_image(out.getvalue(), "image/png", max_side=512)
+        self.assertEqual(prepared.mime_type, "image/jpeg")
+        self.assertEqual((prepared.width, prepared.height), (512, 256))
+
+    def test_undecodable_or_disabled_passes_through(self):
+        self.assertEqual(prepare_reference_image(b"not an image", "image/jpeg").outcome, "decode_failed")
+        data = _jpeg((3000, 2000))
+        prepared = prepare_reference_image(data, "image/jpeg", enabled=False)
+        self.assertEqual((prepared.outcome, prepared.data), ("disabled", data))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from app.presentation.http.server import create_app
+from app.shared.shared_version import SharedVersion
+
+EXP = {"id": "exp-1", "type": "quiz", "status": "active", "config_json": {"title": "Quiz Evento"}}
+ACTIVE = {"quiz-evento"}
+VARS = [{"variable_key": "email", "label": "E-mail", "field_type": "email", "required": True, "options": []}]
+
+
+def _fake_get_json(settings, table, select, params, limit=None):
+    if table == "experiences":
+        return [EXP] if params.get("slug", "").removeprefix("eq.") in ACTIVE else []
+    if table == "experience_variables":
+        return VARS
+    return []
+
+
+class SharedVersionTests(unittest.TestCase):
+    def test_bump_is_seen_once_by_other_instances(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "v")
+            a, b = SharedVersion(path), SharedVersion(path)
+            self.assertFalse(b.changed())
+            a.bump()
+            self.assertTrue(b.changed())
+            self.assertFalse(b.changed())
+
+
+class _QuizConfigAppCase(unittest.TestCase):
+    env: dict = {}
+
+    def setUp(self):
+        os.environ.setdefault("HEYGEN_API_KEY", "env-key")
+        os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+        os.environ.setdefault("SUPABASE_SERVICE_ROLE", "service-role")
+        os.environ.setdefault("APP_API_TOKEN", "test-token")
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        # versão e stores em disco num diretório temporário: o teste não mexe nos arquivos reais de data/
+        env = patch.dict(os.environ, {"QUIZ_CONFIG_VERSION_PATH": os.path.join(tmp.name, "quiz_config.version"),
+                                      "TRAINING_SNIPPETS_PATH": os.path.join(tmp.name, "training_snippets.sqlite3"),
+                                      "WRITE_BEHIND_SPOOL_PATH": os.path.join(tmp.name, "write_spool.sqlite3"),
+                                      "USAGE_ROLLUP_PATH": os.path.join(tmp.name, "usage_rollup.sqlite3"),
+                                      **self.env})
+        env.start()
+        self.addCleanup(env.stop)
+        ACTIVE.clear()
+        ACTIVE.add("quiz-evento")
+        self.app = create_app()
+        self.client = self.app.test_client()
+        p = patch("app.presentation.http.blueprints.quiz_bp.get_json", side_effect=_fake_get_json)
+        self.get_json = p.start()
+        self.addCleanup(p.stop)
+
+    def _tables(self):
+        return [call.args[1] for call in self.get_json.call_args_list]
+
+
+class QuizConfigCacheTests(_QuizConfigAppCase):
+    def test_experience_and_variables_are_served_from_memory(self):
+        for _ in range(5):
+            self.assertEqual(self.client.get("/public/experience/quiz-evento").status_code, 200)
+            resp = self.client.get("/public/experience/quiz-evento/lead-config")
+            self.assertEqual(resp.get_json()["lead_capture"]["fields"][0]["key"], "email")
+        self.assertEqual(self._tables(), ["experiences", "experience_variables"])
+
+    def test_unknown_slug_is_cached_as_negative(self):
+        for _ in range(3):
+            self.assertEqual(self.client.get("/public/experience/nope").status_code, 404)
+        self.assertEqual(self._tables(), ["experiences"])
+
+    def test_invalidate_reloads_config(self):
+        self.client.get("/public/experience/quiz-evento/lead-config")
+        with self.app.app_context():
+            self.app.container.quiz_config_version.bump()
+        self.client.get("/public/experience/quiz-evento/lead-config")
+        self.assertEqual(self._tables(), ["experiences", "experience_variables"] * 2)
+
+    def test_invalidate_endpoint_requires_the_app_token(self):
+        for headers in ({}, {"Authorization": "Bearer some-client-jwt"}):
+            resp = self.client.post("/quiz/config/invalidate", headers=headers)
+            self.assertEqual(resp.status_code, 403)
+        with patch("app.presentation.http.server.require_auth", lambda: None):
+            resp = self.client.post("/quiz/config/invalidate", headers={"Authorization": "Bearer some-client-jwt"})
+        self.assertEqual(resp.status_code, 403)
+
+        self.client.get("/public/experience/quiz-evento/lead-config")
+        resp = self.client.post("/quiz/config/invalidate", headers={"Authorization": "Bearer test-token"})
+        self.assertEqual(resp.status_code, 200)
+        self.client.get("/public/experience/quiz-evento/lead-config")
+        self.assertEqual(self._tables(), ["experiences", "experience_variables"] * 2)
+
+
+class QuizConfigStaleWriteTests(_QuizConfigAppCase):
+    env = {"QUIZ_CONFIG_CACHE_TTL_SECONDS": "0.05", "QUIZ_CONFIG_CACHE_STALE_SECONDS": "60"}
+
+    def test_deactivated_experience_stops_accepting_leads_after_the_ttl(self):
+        self.assertEqual(self.client.get("/public/experience/quiz-evento").status_code, 200)
+        ACTIVE.clear()
+        time.sleep(0.06)
+
+        resp = self.client.post("/public/experience/quiz-evento/leads", json={"data": {"email": "a@b.co"}})
+        self.assertEqual(resp.status_code, 404)
+        self.assertEqual(resp.get_json()["error"], "experience_not_found_or_inactive")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+from app.core.settings import Settings
+from app.infrastructure import supabase_rest
+from app.presentation.http.server import create_app
+
+
+def _head(status: int, content_range: str):
+    r = Mock()
+    r.status_code = status
+    r.ok = status < 400
+    r.headers = {"content-range": content_range}
+    return r
+
+
+class CountRowsTests(unittest.TestCase):
+    def setUp(self):
+        os.environ.setdefault("HEYGEN_API_KEY", "env-key")
+        os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+        os.environ.setdefault("SUPABASE_SERVICE_ROLE", "service-role")
+        os.environ.setdefault("APP_API_TOKEN", "test-token")
+        self.settings = Settings.load()
+        self.http = Mock()
+        p = patch.object(supabase_rest, "shared_http", return_value=self.http)
+        p.start()
+        self.addCleanup(p.stop)
+
+    def test_reads_total_from_content_range_with_head(self):
+        self.http.head.return_value = _head(206, "0-0/5000")
+        self.assertEqual(supabase_rest.count_rows(self.settings, "leads", {"experience_id": "eq.exp-1"}), 5000)
+        kwargs = self.http.head.call_args.kwargs
+        self.assertEqual(kwargs["headers"]["Prefer"], "count=exact")
+        self.assertEqual(kwargs["params"]["experience_id"], "eq.exp-1")
+
+    def test_empty_table(self):
+        self.http.head.return_value = _head(200, "*/0")
+        self.assertEqual(supabase_rest.count_rows(self.settings, "leads", {}), 0)
+
+    def test_error_raises(self):
+        self.http.head.return_value = _head(500, "")
+        with self.assertRaises(RuntimeError):
+            supabase_rest.count_rows(self.settings, "leads", {})
+
+
+class QuizCountCacheTests(unittest.TestCase):
+    def setUp(self):
+        os.environ.setdefault("HEYGEN_API_KEY", "env-key")
+        os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+        os.environ.setdefault("SUPABASE_SERVICE_ROLE", "service-role")
+        os.environ.setdefault("APP_API_TOKEN", "test-token")
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        # stores em disco num diretório temporário: o teste não cria nem drena os arquivos de data/
+        env = patch.dict(os.environ, {
+            "TRAINING_SNIPPETS_PATH": os.path.join(tmp.name, "training_snippets.sqlite3"),
+            "WRITE_BEHIND_SPOOL_PATH": os.path.join(tmp.name, "write_spool.sqlite3"),
+            "USAGE_ROLLUP_PATH": os.path.join(tmp.name, "usage_rollup.sqlite3"),
+        })
+        env.start()
+        self.addCleanup(env.stop)
+        self.app = create_app()
+        self.client = self.app.test_client()
+
+    @patch("app.presentation.http.blueprints.quiz_bp.count_rows")
+    @patch("app.presentation.http.blueprints.quiz_bp.get_json")
+    def test_metrics_counts_are_cached(self, get_json, count_rows):
+        get_json.return_value = [{"id": "exp-1", "type": "quiz", "status": "active", "config_json": {}}]
+        count_rows.side_effect = lambda settings, table, params: {"leads": 5000, "generations": 4000}[table]
+
+        for _ in range(3):
+            payload = self.client.get("/public/experience/quiz-evento/metrics").get_json()
+        self.assertEqual(payload["started"], 5000)
+        self.assertEqual(payload["done_generations"], 4000)
+        self.assertEqual(count_rows.call_count, 2)
+
+    @patch("app.presentation.http.blueprints.quiz_bp.count_rows", return_value=10)
+    def test_limit_far_away_uses_cache_and_near_limit_rechecks(self, count_rows):
+        from app.presentation.http.blueprints import quiz_bp
+
+        with self.app.app_context():
+            self.assertFalse(quiz_bp._generation_limit_reached("exp-1", 1000))
+            self.assertFalse(quiz_bp._generation_limit_reached("exp-1", 1000))
+            self.assertEqual(count_rows.call_count, 1)
+
+            count_rows.return_value = 12
+            self.assertTrue(quiz_bp._generation_limit_reached("exp-1", 12))
+            self.assertEqual(count_rows.call_count, 2)
+
+    def test_lead_insert_bumps_cached_count(self):
+        c = self.app.container
+        c.quiz_counts.set(("leads", "exp-1"), 41)
+        self.assertTrue(c.quiz_counts.incr(("leads", "exp-1")))
+        self.assertEqual(c.quiz_counts.get(("leads", "exp-1")), 42)
+        self.assertFalse(c.quiz_counts.incr(("leads", "exp-2")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,5 @@
 import os
+import tempfile
 import unittest
 from unittest.mock import patch, Mock
 import os
@@ -14,6 +15,16 @@ class QuizPhase1EndpointTests(unittest.TestCase):
         os.environ.setdefault("APP_API_TOKEN", "test-token")
         os.environ.setdefault("CORS_ORIGINS", "http://localhost:8080")
         os.environ.setdefault("APP_DEBUG", "false")
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        # stores em disco num diretório temporário: o teste não cria nem drena os arquivos de data/
+        env = patch.dict(os.environ, {
+            "TRAINING_SNIPPETS_PATH": os.path.join(tmp.name, "training_snippets.sqlite3"),
+            "WRITE_BEHIND_SPOOL_PATH": os.path.join(tmp.name, "write_spool.sqlite3"),
+            "USAGE_ROLLUP_PATH": os.path.join(tmp.name, "usage_rollup.sqlite3"),
+        })
+        env.start()
+        self.addCleanup(env.stop)
         self.app = create_app()
         self.client = self.app.test_client()
 
@@ -43,7 +54,7 @@ class QuizPhase1EndpointTests(unittest.TestCase):
         self.assertFalse(payload["ok"])
         self.assertEqual(payload["error"], "experience_not_found_or_inactive")
 
-    @patch("app.presentation.http.blueprints.quiz_bp.requests.post")
+    @patch("app.presentation.http.blueprints.quiz_bp.HttpClient.post")
     @patch("app.presentation.http.blueprints.quiz_bp.get_json")
     def test_create_credential_success(self, get_json, post):
         get_json.return_value = [{"id": "exp-1", "status": "active"}]
@@ -109,7 +120,7 @@ class QuizPhase1EndpointTests(unittest.TestCase):
         self.assertFalse(payload["ok"])
         self.assertEqual(payload["error"], "experience_not_found_or_inactive")
 
-    @patch("app.presentation.http.blueprints.quiz_bp.requests.post")
+    @patch("app.presentation.http.blueprints.quiz_bp.HttpClient.post")
     @patch("app.presentation.http.blueprints.quiz_bp.get_json")
     def test_signed_url_success(self, get_json, post):
         get_json.return_value = [{"id": "exp-1", "status": "active"}]
@@ -162,8 +173,8 @@ class QuizPhase1EndpointTests(unittest.TestCase):
         self.assertFalse(payload["ok"])
         self.assertEqual(payload["error"], "file_too_large")
 
-    @patch("app.presentation.http.blueprints.quiz_bp.requests.patch")
-    @patch("app.presentation.http.blueprints.quiz_bp.requests.post")
+    @patch("app.presentation.http.blueprints.quiz_bp.HttpClient.patch")
+    @patch("app.presentation.http.blueprints.quiz_bp.HttpClient.post")
     @patch("app.presentation.http.blueprints.quiz_bp.get_json")
     def test_confirm_upload_success(self, get_json, post, patch_req):
         # first call checks experience active, second checks credential isolation
@@ -191,11 +202,12 @@ class QuizPhase1EndpointTests(unittest.TestCase):
         self.assertEqual(resp.status_code, 200)
         self.assertTrue(payload["ok"])
 
-    @patch("app.presentation.http.blueprints.quiz_bp.requests.patch")
-    @patch("app.presentation.http.blueprints.quiz_bp.requests.post")
+    @patch("app.presentation.http.blueprints.quiz_bp.count_rows", return_value=0)
+    @patch("app.presentation.http.blueprints.quiz_bp.HttpClient.patch")
+    @patch("app.presentation.http.blueprints.quiz_bp.HttpClient.post")
     @patch("app.presentation.http.blueprints.quiz_bp.get_json")
     def test_confirm_upload_eager_generation_returns_generation_id(
-        self, get_json, post, patch_req
+        self, get_json, post, patch_req, count_rows
     ):
         prev = os.environ.get("QUIZ_EAGER_GENERATION_ON_UPLOAD")
         os.environ["QUIZ_EAGER_GENERATION_ON_UPLOAD"] = "true"
@@ -213,7 +225,6 @@ class QuizPhase1EndpointTests(unittest.TestCase):
                         "max_generations": 100,
                     }
                 ],  # eager exp load
-                [],  # done generation count
                 [],  # reusable generation lookup
             ]
             up_resp = Mock()
@@ -265,10 +276,11 @@ class QuizPhase1EndpointTests(unittest.TestCase):
         self.assertFalse(payload["ok"])
         self.assertEqual(payload["error"], "invalid_storage_path_scope")
 
-    @patch("app.presentation.http.blueprints.quiz_bp.requests.post")
+    @patch("app.presentation.http.blueprints.quiz_bp.count_rows", return_value=0)
+    @patch("app.presentation.http.blueprints.quiz_bp.HttpClient.post")
     @patch("app.presentation.http.blueprints.quiz_bp.get_json")
-    def test_create_generation_success(self, get_json, post):
-        # experience lookup, credential lookup, done-count lookup
+    def test_create_generation_success(self, get_json, post, count_rows):
+        # experience lookup, credential lookup, reusable lookup (done-count via count_rows)
         get_json.side_effect = [
             [
                 {
@@ -280,7 +292,6 @@ class QuizPhase1EndpointTests(unittest.TestCase):
             ],
             [{"id": "cred-1", "experience_id": "exp-1"}],
             [],
-            [],
         ]
         post_resp = Mock()
         post_resp.ok = True
@@ -297,10 +308,11 @@ class QuizPhase1EndpointTests(unittest.TestCase):
         self.assertEqual(payload["generation_id"], "gen-1")
         self.assertFalse(payload["reused"])
 
-    @patch("app.presentation.http.blueprints.quiz_bp.requests.post")
+    @patch("app.presentation.http.blueprints.quiz_bp.count_rows", return_value=0)
+    @patch("app.presentation.http.blueprints.quiz_bp.HttpClient.post")
     @patch("app.presentation.http.blueprints.quiz_bp.get_json")
-    def test_create_generation_reuses_existing(self, get_json, post):
-        # experience lookup, credential lookup, done-count lookup, reusable lookup
+    def test_create_generation_reuses_existing(self, get_json, post, count_rows):
+        # experience lookup, credential lookup, reusable lookup (done-count via count_rows)
         get_json.side_effect = [
             [
                 {
@@ -311,7 +323,6 @@ class QuizPhase1EndpointTests(unittest.TestCase):
                 }
             ],
             [{"id": "cred-1", "experience_id": "exp-1"}],
-            [],
             [
                 {
                     "id": "gen-existing",
@@ -334,13 +345,13 @@ class QuizPhase1EndpointTests(unittest.TestCase):
         self.assertTrue(payload["reused"])
         post.assert_not_called()
 
+    @patch("app.presentation.http.blueprints.quiz_bp.count_rows", return_value=1)
     @patch("app.presentation.http.blueprints.quiz_bp.get_json")
-    def test_create_generation_limit_exceeded(self, get_json):
-        # experience lookup, credential lookup, done-count lookup (>= max)
+    def test_create_generation_limit_exceeded(self, get_json, count_rows):
+        # experience lookup, credential lookup; done-count (>= max) via count_rows
         get_json.side_effect = [
             [{"id": "exp-1", "type": "quiz", "status": "active", "max_generations": 1}],
             [{"id": "cred-1", "experience_id": "exp-1"}],
-            [{"id": "done-1"}],
         ]
         resp = self.client.post(
             "/generations",
@@ -369,7 +380,7 @@ class QuizPhase1EndpointTests(unittest.TestCase):
         self.assertEqual(payload["status"], "done")
         self.assertEqual(payload["output_url"], "https://example.com/out.png")
 
-    @patch("app.presentation.http.blueprints.quiz_bp.requests.post")
+    @patch("app.presentation.http.blueprints.quiz_bp.HttpClient.post")
     @patch("app.presentation.http.blueprints.quiz_bp.get_json")
     def test_get_generation_status_builds_signed_output_url(self, get_json, post_req):
         get_json.return_value = [
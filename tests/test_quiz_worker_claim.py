@@ -0,0 +1,143 @@
+import os
+import threading
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+from app.core.settings import Settings
+from tests._worker import load_worker
+
+
+def _resp(status: int, rows=None):
+    r = Mock()
+    r.status_code = status
+    r.ok = status < 400
+    r.text = ""
+    r.json.return_value = rows or []
+    return r
+
+
+ROWS = [
+    {"id": f"gen-{i}", "experience_id": "exp-1", "credential_id": f"cred-{i}", "kind": "quiz_result", "status": "processing"}
+    for i in range(20)
+]
+
+
+class QuizWorkerClaimTests(unittest.TestCase):
+    def setUp(self):
+        os.environ.setdefault("HEYGEN_API_KEY", "env-key")
+        os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+        os.environ.setdefault("SUPABASE_SERVICE_ROLE", "service-role")
+        os.environ.setdefault("APP_API_TOKEN", "test-token")
+        self.settings = Settings.load()
+        self.worker = load_worker(self)
+
+    def test_rpc_claims_whole_batch_in_one_call(self):
+        with patch.object(self.worker.requests, "post", create=True, return_value=_resp(200, ROWS)) as post, \
+                patch.object(self.worker.requests, "patch", create=True) as patch_req:
+            jobs = self.worker._claim_jobs(self.settings, 20)
+
+        self.assertEqual(len(jobs), 20)
+        self.assertEqual(jobs[3].credential_id, "cred-3")
+        post.assert_called_once()
+        self.assertTrue(post.call_args.args[0].endswith("/rest/v1/rpc/claim_generations"))
+        self.assertEqual(post.call_args.kwargs["json"], {"p_limit": 20})
+        patch_req.assert_not_called()
+
+    def test_missing_rpc_falls_back_to_one_limited_patch(self):
+        with patch.object(self.worker.requests, "post", create=True, return_value=_resp(404)) as post, \
+                patch.object(self.worker.requests, "patch", create=True, return_value=_resp(200, ROWS[:5])) as patch_req:
+            first = self.worker._claim_jobs(self.settings, 5)
+            second = self.worker._claim_jobs(self.settings, 5)
+
+        self.assertEqual([j.id for j in first], [f"gen-{i}" for i in range(5)])
+        self.assertEqual(len(second), 5)
+        # a RPC ausente é lembrada: só a primeira rodada tenta
+        post.assert_called_once()
+        self.assertEqual(patch_req.call_count, 2)
+        kwargs = patch_req.call_args.kwargs
+        self.assertEqual(kwargs["params"]["status"], "eq.pending")
+        self.assertEqual(kwargs["params"]["limit"], "5")
+        self.assertEqual(kwargs["headers"]["Prefer"], "return=representation")
+        self.assertEqual(kwargs["json"]["status"], "processing")
+
+    def test_claim_failure_raises(self):
+        with patch.object(self.worker.requests, "post", create=True, return_value=_resp(500)):
+            with self.assertRaises(RuntimeError):
+                self.worker._claim_jobs(self.settings, 5)
+
+
+class QuizWorkerPipelineTests(unittest.TestCase):
+    def setUp(self):
+        os.environ.setdefault("HEYGEN_API_KEY", "env-key")
+        os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+        os.environ.setdefault("SUPABASE_SERVICE_ROLE", "service-role")
+        os.environ.setdefault("APP_API_TOKEN", "test-token")
+        self.settings = Settings.load()
+        self.worker = load_worker(self)
+        self.stop = threading.Event()
+        self.queue = [self.worker.Job(f"gen-{i}", "exp-1", f"cred-{i}", "quiz_result") for i in range(24)]
+        self.limits = []
+        self.running = 0
+        self.peak = 0
+        self.done = []
+        self.lock = threading.Lock()
+        p = patch.object(self.worker, "_write_generation_log")
+        p.start()
+        self.addCleanup(p.stop)
+
+    def _claim(self, settings, limit):
+        self.limits.append(limit)
+        batch, self.queue = self.queue[:limit], self.queue[limit:]
+        if not batch and self.running == 0:
+            self.stop.set()
+        return batch
+
+    def _process(self, settings, job):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        # um job lento a cada quatro
+        time.sleep(0.4 if int(job.id.split("-")[1]) % 4 == 0 else 0.05)
+        with self.lock:
+            self.running -= 1
+            self.done.append(job.id)
+
+    def _run(self, **kw):
+        opts = dict(max_workers=4, batch_size=20, poll_seconds=0.05, net_retry_base=0.1,
+                    net_retry_max=0.1, once=False, stop=self.stop)
+        opts.update(kw)
+        with patch.object(self.worker, "_claim_jobs", side_effect=self._claim), \
+                patch.object(self.worker, "_process_job", side_effect=self._process):
+            return self.worker._run_pipeline(self.settings, **opts)
+
+    def test_freed_slots_are_refilled_without_waiting_for_slow_jobs(self):
+        started = time.monotonic()
+        self.assertEqual(self._run(), 0)
+        elapsed = time.monotonic() - started
+
+        self.assertEqual(len(self.done), 24)
+        self.assertLessEqual(self.peak, 4)
+        self.assertLessEqual(max(self.limits), 4)
+        # 6 lentos * 0.4 + 18 * 0.05 = 3.3 s de trabalho / 4 slots ~ 0.83 s;
+        # lotes fechados levariam 6 * 0.4 = 2.4 s
+        self.assertLess(elapsed, 1.6)
+
+    def test_stop_drains_in_flight_jobs_and_stops_claiming(self):
+        threading.Timer(0.1, self.stop.set).start()
+        self._run(max_workers=2)
+
+        claimed = 24 - len(self.queue)
+        self.assertGreater(claimed, 0)
+        self.assertLess(claimed, 24)
+        self.assertEqual(len(self.done), claimed)
+        self.assertEqual(self.running, 0)
+
+    def test_once_claims_a_single_batch(self):
+        self._run(once=True)
+        self.assertEqual(self.limits, [4])
+        self.assertEqual(len(self.done), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
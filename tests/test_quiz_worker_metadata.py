@@ -0,0 +1,94 @@
+import os
+import unittest
+from unittest.mock import patch
+
+from app.core.settings import Settings
+from tests._worker import load_worker
+
+
+ARCHETYPES = [
+    {"id": "arc-2", "name": "Visionário", "image_prompt": "portrait {{genero}}", "use_photo_prompt": True, "sort_order": 2},
+    {"id": "arc-1", "name": "Executor", "image_prompt": "office {{genero}}", "use_photo_prompt": True, "sort_order": 1},
+]
+
+
+class QuizWorkerMetadataCacheTests(unittest.TestCase):
+    def setUp(self):
+        os.environ.setdefault("HEYGEN_API_KEY", "env-key")
+        os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+        os.environ.setdefault("SUPABASE_SERVICE_ROLE", "service-role")
+        os.environ.setdefault("APP_API_TOKEN", "test-token")
+        self.settings = Settings.load()
+        self.worker = load_worker(self)
+        self.gemini_key = "exp-gemini-key"
+        self.embed_supported = True
+        self.calls = []
+        p = patch.object(self.worker, "get_json", side_effect=self._get_json)
+        p.start()
+        self.addCleanup(p.stop)
+
+    def _get_json(self, settings, table, select, params, limit=None):
+        self.calls.append((table, "experiences(" in select))
+        if table == "credentials":
+            cred = {"id": params["id"][3:], "data_json": {"winner_archetype_id": "arc-2"}, "photo_path": "p.jpg"}
+            if "experiences(" in select:
+                if not self.embed_supported:
+                    raise RuntimeError("supabase_credentials_400: Could not find a relationship")
+                cred["experiences"] = {"gemini_api_key": self.gemini_key, "archetypes": ARCHETYPES}
+            return [cred]
+        if table == "experiences":
+            return [{"id": "exp-1", "gemini_api_key": self.gemini_key}]
+        if table == "archetypes":
+            return ARCHETYPES
+        return []
+
+    def _job(self, i: int):
+        return self.worker.Job(f"gen-{i}", "exp-1", f"cred-{i}", "quiz_result")
+
+    def _resolve(self, job):
+        cred = self.worker._load_job_inputs(self.settings, job)
+        key = self.worker._resolve_experience_gemini_key(self.settings, job.experience_id)
+        winner = self.worker._load_archetype(self.settings, job.experience_id, "arc-2")
+        first = self.worker._load_first_archetype(self.settings, job.experience_id)
+        return cred, key, winner, first
+
+    def test_one_embedded_query_then_only_credentials(self):
+        for i in range(10):
+            cred, key, winner, first = self._resolve(self._job(i))
+            self.assertEqual(cred["id"], f"cred-{i}")
+            self.assertNotIn("experiences", cred)
+            self.assertEqual(key, "exp-gemini-key")
+            self.assertEqual(winner["name"], "Visionário")
+            self.assertEqual(first["id"], "arc-1")
+
+        self.assertEqual(self.calls, [("credentials", True)] + [("credentials", False)] * 9)
+
+    def test_missing_key_is_cached_and_jobs_fail_fast(self):
+        self.gemini_key = None
+        with patch.object(self.worker, "_finish_job_error") as finish_error, \
+                patch.object(self.worker, "_download_reference_image") as download, \
+                patch.object(self.worker, "_write_generation_log"):
+            for i in range(3):
+                self.worker._process_job(self.settings, self._job(i))
+
+        self.assertEqual(finish_error.call_count, 3)
+        self.assertEqual(finish_error.call_args.args[3], "missing_experience_gemini_key")
+        download.assert_not_called()
+        self.assertEqual(self.calls, [("credentials", True), ("credentials", False), ("credentials", False)])
+
+    def test_without_embedding_falls_back_to_cached_separate_queries(self):
+        self.embed_supported = False
+        for i in range(3):
+            _, key, winner, _ = self._resolve(self._job(i))
+            self.assertEqual(key, "exp-gemini-key")
+            self.assertEqual(winner["id"], "arc-2")
+
+        tables = [t for t, _ in self.calls]
+        self.assertEqual(tables.count("experiences"), 1)
+        self.assertEqual(tables.count("archetypes"), 1)
+        # a tentativa com embed só acontece uma vez
+        self.assertEqual(sum(1 for _, embedded in self.calls if embedded), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
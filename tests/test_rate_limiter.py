@@ -0,0 +1,96 @@
+import os
+import threading
+import time
+import unittest
+from dataclasses import replace
+from unittest.mock import Mock
+
+from app.core.settings import Settings
+from app.infrastructure import rate_limiter
+from app.infrastructure.gemini_image_client import GeminiImageClient
+from app.infrastructure.rate_limiter import AdaptiveRateLimiter, gemini_limiter
+
+_IMAGE_BODY = {"candidates": [{"content": {"parts": [{"inlineData": {"data": "aW1n", "mimeType": "image/png"}}]}}]}
+
+
+def _resp(status: int, headers=None):
+    r = Mock()
+    r.status_code = status
+    r.ok = status < 400
+    r.headers = headers or {}
+    r.text = ""
+    r.json.return_value = _IMAGE_BODY
+    return r
+
+
+class AdaptiveRateLimiterTests(unittest.TestCase):
+    def test_burst_of_429s_counts_as_one_decrease(self):
+        limiter = AdaptiveRateLimiter(initial_rps=4, min_rps=0.1, burst=1)
+        for _ in range(5):
+            limiter.on_throttle(retry_after_seconds=0.01)
+        self.assertEqual(limiter.rate, 2)
+        self.assertEqual(limiter.stats()["throttles"], 5)
+
+        limiter.on_success(latency_ms=100)
+        self.assertAlmostEqual(limiter.rate, 2.05)
+
+    def test_slow_responses_reduce_the_rate(self):
+        limiter = AdaptiveRateLimiter(initial_rps=5, latency_target_ms=1000, latency_decrease_factor=0.8)
+        limiter.on_success(latency_ms=5000)
+        self.assertAlmostEqual(limiter.rate, 4)
+
+    def test_threads_share_one_rate(self):
+        limiter = AdaptiveRateLimiter(initial_rps=20, max_rps=20, burst=1, increase_rps=0)
+        started = time.monotonic()
+        threads = [threading.Thread(target=lambda: [limiter.acquire() for _ in range(3)]) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        # 12 tokens a 20/s com 1 de burst: ~0.55 s, não 3 * 0.05 por thread
+        self.assertGreaterEqual(time.monotonic() - started, 0.5)
+
+    def test_acquire_times_out_while_paused(self):
+        limiter = AdaptiveRateLimiter(initial_rps=10)
+        limiter.on_throttle(retry_after_seconds=5)
+        self.assertFalse(limiter.acquire(timeout=0.05))
+        self.assertEqual(limiter.stats()["timeouts"], 1)
+
+
+class GeminiClientRateLimitTests(unittest.TestCase):
+    def setUp(self):
+        os.environ.setdefault("HEYGEN_API_KEY", "env-key")
+        os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+        os.environ.setdefault("SUPABASE_SERVICE_ROLE", "service-role")
+        os.environ.setdefault("APP_API_TOKEN", "test-token")
+        self.settings = replace(Settings.load(), gemini_api_key="key-a", gemini_rate_initial_rps=50, gemini_rate_burst=1)
+        rate_limiter._limiters.clear()
+        self.addCleanup(rate_limiter._limiters.clear)
+        self.http = Mock()
+
+    def test_429_waits_in_the_shared_queue_instead_of_failing(self):
+        self.http.post.side_effect = [_resp(429, {"Retry-After": "0.05"}), _resp(429), _resp(200)]
+        out = GeminiImageClient(self.settings, self.http).generate_from_prompt("retrato")
+
+        self.assertEqual(out["image_bytes"], b"img")
+        self.assertEqual(self.http.post.call_count, 3)
+        stats = gemini_limiter(self.settings, "key-a").stats()
+        self.assertEqual(stats["throttles"], 2)
+        self.assertLess(stats["rate_rps"], 50)
+
+    def test_gives_up_after_max_wait_with_a_retryable_error(self):
+        settings = replace(self.settings, gemini_rate_max_wait_seconds=0.1)
+        self.http.post.return_value = _resp(429, {"Retry-After": "1"})
+        with self.assertRaises(RuntimeError) as ctx:
+            GeminiImageClient(settings, self.http).generate_from_prompt("retrato")
+        self.assertIn("gemini_http_429", str(ctx.exception))
+
+    def test_limiter_is_per_key_and_shared_across_clients(self):
+        a1 = gemini_limiter(self.settings, "key-a")
+        self.assertIs(a1, gemini_limiter(replace(self.settings, gemini_rate_initial_rps=1), "key-a"))
+        self.assertIsNot(a1, gemini_limiter(self.settings, "key-b"))
+        self.assertEqual(len(rate_limiter.limiter_stats()), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
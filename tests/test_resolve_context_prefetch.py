@@ -0,0 +1,66 @@
+import unittest
+
+from app.application.use_cases.resolve_context import execute, match, prefetch, ResolveInput
+from app.domain.models import ContextItem
+
+
+class _Repo:
+    def __init__(self, avatar_uuid="uuid-1", contexts=None):
+        self.avatar_uuid = avatar_uuid
+        self.contexts = contexts or []
+        self.calls = []
+
+    def resolve_avatar_uuid(self, avatar_identifier):
+        self.calls.append(("resolve", avatar_identifier))
+        return self.avatar_uuid
+
+    def resolve_avatar_uuid_for_client(self, avatar_identifier, client_id):
+        self.calls.append(("resolve_for_client", avatar_identifier, client_id))
+        return self.avatar_uuid
+
+    def list_contexts_by_avatar(self, avatar_uuid):
+        self.calls.append(("list", avatar_uuid))
+        return self.contexts
+
+
+CHOCOLATE = ContextItem(name="chocolate", media_url="https://cdn/choco.png", media_type="image", keywords_text="cacau")
+
+
+class ResolveContextPrefetchTests(unittest.TestCase):
+    def test_prefetch_uses_client_scoped_lookup(self):
+        repo = _Repo(contexts=[CHOCOLATE])
+        pre = prefetch(repo, "avatar-1", "client-1")
+
+        self.assertEqual(pre.avatar_uuid, "uuid-1")
+        self.assertEqual(pre.contexts, [CHOCOLATE])
+        self.assertEqual(repo.calls, [("resolve_for_client", "avatar-1", "client-1"), ("list", "uuid-1")])
+
+    def test_match_does_no_io(self):
+        repo = _Repo(contexts=[CHOCOLATE])
+        pre = prefetch(repo, "avatar-1")
+        repo.calls.clear()
+
+        out = match(pre, "Adoro cacau em pó")
+
+        self.assertEqual(repo.calls, [])
+        self.assertEqual(out["match"], "chocolate")
+        self.assertEqual(out["method"], "fast")
+        self.assertEqual(out["media"]["url"], "https://cdn/choco.png")
+
+    def test_unknown_avatar_skips_context_listing(self):
+        repo = _Repo(avatar_uuid=None)
+        pre = prefetch(repo, "ghost")
+
+        self.assertEqual(repo.calls, [("resolve", "ghost")])
+        self.assertEqual(match(pre, "qualquer coisa")["method"], "none")
+
+    def test_execute_keeps_single_call_contract(self):
+        out = execute(None, _Repo(contexts=[CHOCOLATE]), ResolveInput(avatar_identifier="a", text="sem gatilho"))
+
+        self.assertEqual(out["match"], "none")
+        self.assertIn("latency_ms", out)
+        self.assertIn("list_contexts_ms", out)
+
+
+if __name__ == "__main__":
+    unittest.main()
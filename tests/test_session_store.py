@@ -0,0 +1,337 @@
+import os
+import socket
+import socketserver
+import tempfile
+import threading
+import time
+import unittest
+from dataclasses import replace
+from unittest.mock import patch
+
+from app.core.settings import Settings
+from app.domain.models import BudgetLedger, ContextItem, LiveSession, TrainingDoc
+from app.infrastructure import session_store
+from app.infrastructure.session_store import (
+    MemorySessionStore,
+    RedisSessionStore,
+    SqliteSessionStore,
+    build_session_store,
+    decode_session,
+    encode_session,
+)
+
+
+class _RespStandIn(socketserver.ThreadingTCPServer):
+    """Local Redis-protocol stand-in: GET/SET EX/DEL and WATCH/MULTI/EXEC."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _RespHandler)
+        self.data: dict[bytes, bytes] = {}
+        self.versions: dict[bytes, int] = {}
+        self.expiry: dict[bytes, int] = {}
+        self.lock = threading.Lock()
+        self.aborted_execs = 0
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address
+        return f"redis://{host}:{port}/0"
+
+
+class _RespHandler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        # como o Redis: sem Nagle, respostas de pipeline não esperam ACK
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        count = int(line[1:-2])
+        args = []
+        for _ in range(count):
+            size = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(size + 2)[:-2])
+        return args
+
+    def _bulk(self, value):
+        if value is None:
+            return b"$-1\r\n"
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+
+    def _apply(self, srv, args):
+        cmd = args[0].upper()
+        if cmd == b"GET":
+            return self._bulk(srv.data.get(args[1]))
+        if cmd == b"SET":
+            srv.data[args[1]] = args[2]
+            srv.versions[args[1]] = srv.versions.get(args[1], 0) + 1
+            if len(args) >= 5 and args[3].upper() == b"EX":
+                srv.expiry[args[1]] = int(args[4])
+            return b"+OK\r\n"
+        if cmd == b"DEL":
+            srv.versions[args[1]] = srv.versions.get(args[1], 0) + 1
+            return b":%d\r\n" % (1 if srv.data.pop(args[1], None) is not None else 0)
+        if cmd in (b"PING", b"AUTH", b"SELECT"):
+            return b"+OK\r\n"
+        return b"-ERR unknown command\r\n"
+
+    def handle(self):
+        srv = self.server
+        watched: dict[bytes, int] = {}
+        queued = None
+        while True:
+            args = self._read_command()
+            if args is None:
+                return
+            cmd = args[0].upper()
+            with srv.lock:
+                if cmd == b"WATCH":
+                    watched[args[1]] = srv.versions.get(args[1], 0)
+                    out = b"+OK\r\n"
+                elif cmd == b"UNWATCH":
+                    watched.clear()
+                    out = b"+OK\r\n"
+                elif cmd == b"MULTI":
+                    queued = []
+                    out = b"+OK\r\n"
+                elif cmd == b"EXEC":
+                    if any(srv.versions.get(k, 0) != v for k, v in watched.items()):
+                        srv.aborted_execs += 1
+                        out = b"*-1\r\n"
+                    else:
+                        replies = [self._apply(srv, q) for q in queued or []]
+                        out = b"*%d\r\n" % len(replies) + b"".join(replies)
+                    watched.clear()
+                    queued = None
+                elif queued is not None:
+                    queued.append(args)
+                    out = b"+QUEUED\r\n"
+                else:
+                    out = self._apply(srv, args)
+            self.wfile.write(out)
+            self.wfile.flush()
+
+
+def _session(**kw) -> LiveSession:
+    base = dict(session_id="sess-1", url="wss://livekit", token="tok", avatar_id="av-1", ends_at_epoch=100)
+    base.update(kw)
+    return LiveSession(**base)
+
+
+class _SharedStoreContract:
+    """Behaviour every shared backend must have (two instances = two workers)."""
+
+    def make_store(self):
+        raise NotImplementedError
+
+    def test_write_in_one_worker_is_visible_in_another(self):
+        a, b = self.make_store(), self.make_store()
+        a.set_session("client-1", _session())
+        a.set_budget("client-1", BudgetLedger(total_credits_spent=10, sessions=[{"session_id": "sess-1"}]))
+
+        got = b.get_session("client-1")
+        self.assertEqual(got.session_id, "sess-1")
+        self.assertEqual(got.ends_at_epoch, 100)
+        self.assertEqual(b.get_budget("client-1").total_credits_spent, 10)
+        self.assertIsNone(b.get_session("client-2").session_id)
+
+    def test_get_returns_a_copy(self):
+        store = self.make_store()
+        store.set_session("client-1", _session())
+        store.get_session("client-1").ends_at_epoch = 999
+        self.assertEqual(store.get_session("client-1").ends_at_epoch, 100)
+
+    def test_concurrent_updates_are_not_lost(self):
+        stores = [self.make_store() for _ in range(2)]
+        stores[0].set_session("client-1", _session(ends_at_epoch=0))
+
+        def bump(s):
+            s.ends_at_epoch += 1
+
+        def worker(store):
+            for _ in range(25):
+                store.update_session("client-1", bump)
+
+        threads = [threading.Thread(target=worker, args=(stores[i % 2],)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(stores[1].get_session("client-1").ends_at_epoch, 200)
+
+    def test_api_key_is_not_persisted(self):
+        a, b = self.make_store(), self.make_store()
+        a.set_session("client-1", _session(api_key="sk_secret"))
+        a.update_session("client-1", lambda s: setattr(s, "api_key", "sk_secret"))
+
+        self.assertIsNone(b.get_session("client-1").api_key)
+        self.assertNotIn(b"sk_secret", encode_session(_session(api_key="sk_secret")))
+
+    def test_concurrent_budget_debits_are_not_lost(self):
+        stores = [self.make_store() for _ in range(2)]
+
+        def debit(b):
+            b.total_credits_spent += b.credits_per_session
+            b.sessions.append({"session_id": "s"})
+
+        threads = [threading.Thread(target=lambda st=st: [st.update_budget("client-1", debit) for _ in range(10)])
+                   for st in stores * 2]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        budget = stores[0].get_budget("client-1")
+        self.assertEqual(budget.total_credits_spent, 400)
+        self.assertEqual(len(budget.sessions), 40)
+
+
+class SqliteSessionStoreTests(_SharedStoreContract, unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "nested", "sessions.sqlite3")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_store(self):
+        return SqliteSessionStore(self.path, ttl_seconds=60)
+
+    def test_expired_rows_are_ignored(self):
+        store = self.make_store()
+        store.set_session("client-1", _session())
+        with patch("app.infrastructure.session_store.time.time", return_value=time.time() + 120):
+            self.assertIsNone(store.get_session("client-1").session_id)
+
+
+class RedisSessionStoreTests(_SharedStoreContract, unittest.TestCase):
+    def setUp(self):
+        self.server = _RespStandIn()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def make_store(self):
+        return RedisSessionStore(self.server.url, ttl_seconds=90)
+
+    def test_keys_are_prefixed_and_expire(self):
+        self.make_store().set_session("client-1", _session())
+        self.assertIn(b"euvatar:session:client-1", self.server.data)
+        self.assertEqual(self.server.expiry[b"euvatar:session:client-1"], 90)
+
+    def test_update_retries_when_key_changes_after_watch(self):
+        store, other = self.make_store(), self.make_store()
+        store.set_session("client-1", _session(ends_at_epoch=0))
+        calls = []
+
+        def extend(s):
+            calls.append(1)
+            if len(calls) == 1:
+                other.set_session("client-1", _session(session_id="sess-2", ends_at_epoch=0))
+            s.ends_at_epoch = 500
+
+        out = store.update_session("client-1", extend)
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(self.server.aborted_execs, 1)
+        self.assertEqual(out.session_id, "sess-2")
+        self.assertEqual(other.get_session("client-1").ends_at_epoch, 500)
+
+    def test_reconnects_after_connection_drop(self):
+        store = self.make_store()
+        store.set_session("client-1", _session())
+        store._local.conn._sock.close()
+        self.assertEqual(store.get_session("client-1").session_id, "sess-1")
+
+
+class SessionCodecTests(unittest.TestCase):
+    def test_defaults_are_omitted_and_training_is_restored(self):
+        session = _session(
+            training_contexts=[ContextItem(name="Menu", media_url="https://x/m.png", media_type="image", keywords_text="menu")],
+            training_docs=[TrainingDoc(id="d1", name="faq", url="https://x/faq.pdf", created_at="2024-01-01T00:00:00Z")],
+            training_summary="Contextos: Menu",
+        )
+
+        raw = encode_session(session)
+        self.assertNotIn(b"pt-BR", raw)
+        self.assertNotIn(b" ", raw.replace(b"Contextos: Menu", b""))
+        self.assertEqual(decode_session(raw), session)
+        self.assertEqual(encode_session(LiveSession()), b"{}")
+
+    def test_backend_missing_a_hook_fails_at_construction(self):
+        class Incomplete(session_store._SerializedSessionStore):
+            def _get(self, key):
+                return None
+
+        with self.assertRaises(TypeError):
+            Incomplete(60)
+
+
+class SessionStoreWiringTests(unittest.TestCase):
+    def setUp(self):
+        os.environ.setdefault("HEYGEN_API_KEY", "env-key")
+        os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+        os.environ.setdefault("SUPABASE_SERVICE_ROLE", "service-role")
+        os.environ.setdefault("APP_API_TOKEN", "test-token")
+        os.environ.setdefault("CORS_ORIGINS", "http://localhost:8080")
+        os.environ.setdefault("APP_DEBUG", "false")
+        self.tmp = tempfile.TemporaryDirectory()
+        # stores em disco num diretório temporário: o teste não cria nem drena os arquivos de data/
+        env = patch.dict(os.environ, {
+            "TRAINING_SNIPPETS_PATH": os.path.join(self.tmp.name, "training_snippets.sqlite3"),
+            "WRITE_BEHIND_SPOOL_PATH": os.path.join(self.tmp.name, "write_spool.sqlite3"),
+            "USAGE_ROLLUP_PATH": os.path.join(self.tmp.name, "usage_rollup.sqlite3"),
+        })
+        env.start()
+        self.addCleanup(env.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_factory_selects_backend(self):
+        settings = Settings.load()
+        self.assertIsInstance(build_session_store(settings), MemorySessionStore)
+        sqlite_settings = replace(settings, session_store="sqlite", session_store_path=os.path.join(self.tmp.name, "s.db"))
+        self.assertIsInstance(build_session_store(sqlite_settings), SqliteSessionStore)
+        with self.assertRaises(ValueError):
+            build_session_store(replace(settings, session_store="redis", session_store_url=""))
+
+    def test_say_in_another_worker_sees_expired_session(self):
+        env = {"SESSION_STORE": "sqlite", "SESSION_STORE_PATH": os.path.join(self.tmp.name, "s.db")}
+        with patch.dict(os.environ, env), patch("app.presentation.http.server.require_auth", lambda: None):
+            from app.presentation.http.server import create_app
+
+            worker_a, worker_b = create_app(), create_app()
+            worker_a.container.set_session("default", _session(ends_at_epoch=int(time.time()) - 5))
+
+            r = worker_b.test_client().post("/say", json={"text": "oi"})
+
+        self.assertEqual(r.status_code, 410)
+        self.assertEqual(r.get_json()["error"], "session_expired")
+
+    def test_resume_keeps_a_concurrent_keepalive_extension(self):
+        from app.presentation.http.blueprints.session_bp import _install_session
+
+        store = MemorySessionStore()
+        store.set_session("client-1", _session(ends_at_epoch=500, training_ready=True, training_summary="Docs: faq"))
+        # /resume montou a sessão com o ends_at lido antes do /keepalive estender
+        store.update_session("client-1", _install_session(_session(token="tok-2", ends_at_epoch=300)))
+
+        got = store.get_session("client-1")
+        self.assertEqual((got.token, got.ends_at_epoch, got.training_summary), ("tok-2", 500, "Docs: faq"))
+
+        store.update_session("client-1", _install_session(_session(session_id="sess-2", ends_at_epoch=300)))
+        got = store.get_session("client-1")
+        self.assertEqual((got.session_id, got.ends_at_epoch, got.training_ready), ("sess-2", 300, False))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,186 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+from dataclasses import replace
+from unittest.mock import patch
+
+from app.infrastructure.stt_stream import IncrementalSTTStream
+from app.presentation.http.server import create_app
+
+_WEBM_HEADER = b"\x1a\x45\xdf\xa3" + b"h" * 60
+_CLUSTER = b"\x1f\x43\xb6\x75"
+
+
+def _cluster(n: int) -> bytes:
+    return _CLUSTER + b"c" * (n - len(_CLUSTER))
+
+
+class _FakeTranscriber:
+    """Returns the number of bytes it was given, optionally blocking until released."""
+
+    def __init__(self, block=False):
+        self.calls = []
+        self.release = threading.Event()
+        if not block:
+            self.release.set()
+
+    def __call__(self, filename, stream, mimetype):
+        data = stream.read()
+        self.calls.append(len(data))
+        self.release.wait(5)
+        return f"{len(data)} bytes"
+
+
+class IncrementalSTTStreamTests(unittest.TestCase):
+    def _stream(self, fn, interval=0.0):
+        return IncrementalSTTStream(fn, "audio.webm", "audio/webm", partial_interval_seconds=interval, min_partial_bytes=4)
+
+    def test_partials_cover_the_audio_received_so_far(self):
+        fn = _FakeTranscriber()
+        s = self._stream(fn)
+        s.feed(b"aaaa")
+        s._inflight.result(5)
+        self.assertEqual(s.partial(), "4 bytes")
+
+        s.feed(b"bbbb")
+        s._inflight.result(5)
+        self.assertEqual(s.partial(), "8 bytes")
+
+    def test_finish_reuses_partial_when_no_new_audio_arrived(self):
+        fn = _FakeTranscriber()
+        s = self._stream(fn)
+        s.feed(b"aaaa")
+        s._inflight.result(5)
+
+        self.assertEqual(s.finish(), "4 bytes")
+        self.assertEqual(fn.calls, [4])
+
+    def test_finish_transcribes_full_buffer_when_partial_is_stale(self):
+        fn = _FakeTranscriber()
+        s = self._stream(fn, interval=60)
+        s.feed(b"aaaa")
+        s._inflight.result(5)
+        s.feed(b"bb")  # throttled: no new partial
+
+        self.assertEqual(s.finish(), "6 bytes")
+        self.assertEqual(fn.calls, [4, 6])
+
+    def test_only_one_partial_in_flight(self):
+        fn = _FakeTranscriber(block=True)
+        s = self._stream(fn)
+        s.feed(b"aaaa")
+        s.feed(b"bbbb")
+        s.feed(b"cccc")
+        fn.release.set()
+        s._inflight.result(5)
+
+        self.assertEqual(fn.calls, [4])
+        self.assertEqual(s.finish(), "12 bytes")
+
+    def test_webm_segments_are_committed_and_not_resent(self):
+        fn = _FakeTranscriber()
+        s = IncrementalSTTStream(fn, "audio.webm", "audio/webm", partial_interval_seconds=0.0,
+                                 min_partial_bytes=4, segment_bytes=200)
+        s.feed(_WEBM_HEADER + _cluster(100))
+        s._inflight.result(5)
+        s.feed(_cluster(100))
+        s._inflight.result(5)
+        s.feed(_cluster(100))
+        s._inflight.result(5)
+
+        # cada segmento é fechado com o texto da parcial que já o cobria; só cabeçalho + audio novo é enviado
+        self.assertEqual(s.stats()["segments"], 2)
+        self.assertEqual(fn.calls, [164, 64 + 100, 64 + 100])
+        self.assertEqual(s.partial(), "164 bytes 164 bytes 164 bytes")
+        s.feed(b"tail")
+        self.assertEqual(s.finish(), "164 bytes 164 bytes 168 bytes")
+        self.assertEqual(fn.calls[-1], 64 + 104)
+
+    def test_unknown_container_falls_back_to_whole_buffer(self):
+        fn = _FakeTranscriber()
+        s = IncrementalSTTStream(fn, "audio.wav", "audio/wav", partial_interval_seconds=0.0,
+                                 min_partial_bytes=4, segment_bytes=8)
+        s.feed(b"a" * 10)
+        s._inflight.result(5)
+        s.feed(b"b" * 10)
+        s._inflight.result(5)
+        self.assertEqual(fn.calls, [10, 20])
+        self.assertEqual(s.stats()["segments"], 0)
+
+    def test_feed_after_finish_is_rejected(self):
+        s = self._stream(_FakeTranscriber())
+        self.assertEqual(s.finish(), "")
+        with self.assertRaises(RuntimeError):
+            s.feed(b"late")
+
+
+class _FakeSTT:
+    def __init__(self, fn):
+        self.fn = fn
+
+    def open_stream(self, filename, mimetype):
+        return IncrementalSTTStream(self.fn, filename, mimetype, partial_interval_seconds=0.0, min_partial_bytes=4)
+
+
+class STTStreamEndpointTests(unittest.TestCase):
+    def setUp(self):
+        os.environ.setdefault("HEYGEN_API_KEY", "env-key")
+        os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+        os.environ.setdefault("SUPABASE_SERVICE_ROLE", "service-role")
+        os.environ.setdefault("APP_API_TOKEN", "test-token")
+        os.environ.setdefault("CORS_ORIGINS", "http://localhost:8080")
+        os.environ.setdefault("APP_DEBUG", "false")
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        # stores em disco num diretório temporário: o teste não cria nem drena os arquivos de data/
+        env = patch.dict(os.environ, {
+            "TRAINING_SNIPPETS_PATH": os.path.join(tmp.name, "training_snippets.sqlite3"),
+            "WRITE_BEHIND_SPOOL_PATH": os.path.join(tmp.name, "write_spool.sqlite3"),
+            "USAGE_ROLLUP_PATH": os.path.join(tmp.name, "usage_rollup.sqlite3"),
+        })
+        env.start()
+        self.addCleanup(env.stop)
+        auth = patch("app.presentation.http.server.require_auth", lambda: None)
+        auth.start()
+        self.addCleanup(auth.stop)
+        llm = patch("app.presentation.http.blueprints.stt_bp._generate_response_text", return_value="Olá!")
+        llm.start()
+        self.addCleanup(llm.stop)
+        self.app = create_app()
+        self.fn = _FakeTranscriber()
+        self.app.container.stt = _FakeSTT(self.fn)
+        self.client = self.app.test_client()
+
+    def _events(self, resp):
+        return [json.loads(line) for line in resp.get_data(as_text=True).splitlines() if line.strip()]
+
+    def test_streams_ndjson_and_ends_with_final_turn(self):
+        resp = self.client.post(
+            "/stt/stream", data=b"x" * 3000, content_type="audio/webm", headers={"Authorization": "Bearer test-token"}
+        )
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.mimetype, "application/x-ndjson")
+        events = self._events(resp)
+        final = events[-1]
+        self.assertEqual(final["type"], "final")
+        self.assertTrue(final["ok"])
+        self.assertEqual(final["text"], "3000 bytes")
+        self.assertEqual(final["response_text"], "Olá!")
+        self.assertIn("stt_finalize_ms", final["timings"])
+        self.assertTrue(all(e["type"] == "partial" for e in events[:-1]))
+
+    def test_body_over_limit_is_rejected(self):
+        self.app.container.settings = replace(self.app.container.settings, stt_stream_max_bytes=100)
+        resp = self.client.post(
+            "/stt/stream", data=b"x" * 200, content_type="audio/webm", headers={"Authorization": "Bearer test-token"}
+        )
+        self.assertEqual(resp.status_code, 413)
+        self.assertEqual(resp.get_json()["error"], "audio_too_large")
+        self.assertEqual(self.fn.calls, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from dataclasses import replace
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+from app.core.settings import Settings
+from app.domain.models import TrainingDoc
+from app.infrastructure.training_snippets import TrainingSnippetStore
+from app.presentation.http.blueprints.session_bp import _build_training_details, _extract_doc_snippet, _fetch_doc_snippets
+
+
+def _resp(body: bytes, delay: float = 0.0, chunks: int = 1):
+    r = Mock()
+    r.ok = True
+    r.status_code = 200
+    r.headers = {"content-type": "text/plain", "content-length": str(len(body))}
+    step = max(1, len(body) // chunks)
+
+    def iter_content(_size):
+        for i in range(0, len(body), step):
+            time.sleep(delay / chunks)
+            yield body[i:i + step]
+
+    r.iter_content.side_effect = iter_content
+    return r
+
+
+class TrainingDocFetchTests(unittest.TestCase):
+    def setUp(self):
+        os.environ.setdefault("HEYGEN_API_KEY", "env-key")
+        os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+        os.environ.setdefault("SUPABASE_SERVICE_ROLE", "service-role")
+        os.environ.setdefault("APP_API_TOKEN", "test-token")
+        self.tmp = tempfile.TemporaryDirectory()
+        settings = replace(
+            Settings.load(),
+            doc_fetch_allow_hosts=["docs.example"],
+            training_docs_deadline_seconds=0.5,
+        )
+        self.bodies = {}
+        http = Mock()
+        http.get.side_effect = lambda url, **kw: self.bodies[url]()
+        self.c = SimpleNamespace(
+            settings=settings,
+            http=http,
+            snippets=TrainingSnippetStore(os.path.join(self.tmp.name, "s.sqlite3")),
+        )
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _doc(self, name):
+        return TrainingDoc(id=name, name=name, url=f"https://docs.example/{name}.txt")
+
+    def test_docs_are_fetched_concurrently(self):
+        docs = [self._doc(n) for n in ("a", "b", "c")]
+        for d in docs:
+            self.bodies[d.url] = lambda n=d.name: _resp(n.encode() * 3, delay=0.3)
+
+        t0 = time.monotonic()
+        out = _fetch_doc_snippets(self.c, docs)
+
+        self.assertEqual(out, ["aaa", "bbb", "ccc"])
+        self.assertLess(time.monotonic() - t0, 0.6)
+
+    def test_stragglers_are_dropped_at_the_deadline(self):
+        fast, slow = self._doc("fast"), self._doc("slow")
+        self.bodies[fast.url] = lambda: _resp(b"ok")
+        self.bodies[slow.url] = lambda: _resp(b"x" * 100, delay=3.0, chunks=30)
+
+        t0 = time.monotonic()
+        summary, snippets = _build_training_details(self.c, [], [fast, slow])
+
+        self.assertLess(time.monotonic() - t0, 1.0)
+        self.assertEqual(snippets, ["fast: ok"])
+        self.assertIn("Conteúdo docs: fast: ok", summary)
+        # o straggler não deixa snippet parcial no store
+        self.assertIsNone(self.c.snippets.get(slow.url))
+
+    def test_cached_snippet_skips_http(self):
+        doc = self._doc("menu")
+        self.c.snippets.put(doc.url, "cardápio", "hash")
+
+        self.assertEqual(_fetch_doc_snippets(self.c, [doc]), ["cardápio"])
+        self.c.http.get.assert_not_called()
+
+    def test_streamed_response_is_closed_on_every_path(self):
+        url = self._doc("menu").url
+        not_modified, failed, too_big, ok = _resp(b""), _resp(b""), _resp(b"x" * 10), _resp(b"ok")
+        not_modified.status_code = 304
+        failed.ok, failed.status_code = False, 500
+        too_big.headers["content-length"] = str(10 * 1024 * 1024)
+
+        # entrada sempre vencida: toda chamada faz o GET condicional
+        self.c.snippets = TrainingSnippetStore(os.path.join(self.tmp.name, "stale.sqlite3"), revalidate_seconds=0)
+        self.c.snippets.put(url, "cardápio", "hash", etag='"v1"')
+        for r in (not_modified, failed, too_big, ok):
+            self.bodies[url] = lambda r=r: r
+            _extract_doc_snippet(self.c, url)
+            r.close.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from app.infrastructure.training_snippets import TrainingSnippetStore, content_hash, extract_snippet
+
+URL = "https://example.supabase.co/storage/v1/object/public/avatar-media/a/training-docs/menu.txt"
+
+
+class TrainingSnippetStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "snippets.sqlite3")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_put_from_bytes_is_read_back_by_another_instance(self):
+        TrainingSnippetStore(self.path).put_from_bytes(URL, "Cardápio do dia".encode(), "text/plain")
+
+        entry = TrainingSnippetStore(self.path).get(URL)
+        self.assertEqual(entry.snippet, "Cardápio do dia")
+        self.assertEqual(entry.content_hash, content_hash("Cardápio do dia".encode()))
+
+    def test_freshness_window_and_touch(self):
+        store = TrainingSnippetStore(self.path, revalidate_seconds=0.05)
+        store.put(URL, "x", "h1", etag='"v1"')
+        self.assertTrue(store.is_fresh(store.get(URL)))
+        time.sleep(0.06)
+        self.assertFalse(store.is_fresh(store.get(URL)))
+        store.touch(URL)
+        entry = store.get(URL)
+        self.assertTrue(store.is_fresh(entry))
+        self.assertEqual(entry.etag, '"v1"')
+
+    def test_reupload_overwrites_and_delete_invalidates(self):
+        store = TrainingSnippetStore(self.path)
+        store.put_from_bytes(URL, b"v1", "text/plain")
+        store.put_from_bytes(URL, b"v2", "text/plain")
+        self.assertEqual(store.get(URL).snippet, "v2")
+
+        store.invalidate(URL)
+        self.assertIsNone(store.get(URL))
+
+    def test_extract_snippet_types_and_truncation(self):
+        self.assertEqual(extract_snippet(json.dumps({"a": 1}).encode(), "application/json"), '{"a": 1}')
+        self.assertEqual(extract_snippet(b"abcdef", "text/plain", max_chars=3), "abc...")
+        self.assertEqual(extract_snippet(b"\x00", "application/octet-stream"), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
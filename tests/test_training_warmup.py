@@ -0,0 +1,99 @@
+import contextlib
+import os
+import threading
+import unittest
+from dataclasses import replace
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from app.core.settings import Settings
+from app.domain.models import ContextItem, LiveSession
+from app.infrastructure.session_store import MemorySessionStore
+from app.presentation.http.blueprints import session_bp
+
+
+class _Container(SimpleNamespace):
+    def get_session(self, client_id):
+        return self.session_store.get_session(client_id)
+
+    def set_session(self, client_id, session):
+        self.session_store.set_session(client_id, session)
+
+    def update_session(self, client_id, fn):
+        return self.session_store.update_session(client_id, fn)
+
+
+CTX = ContextItem(name="chocolate", media_url="https://cdn/c.png", media_type="image", keywords_text="cacau")
+
+
+class TrainingWarmupTests(unittest.TestCase):
+    def setUp(self):
+        os.environ.setdefault("HEYGEN_API_KEY", "env-key")
+        os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+        os.environ.setdefault("SUPABASE_SERVICE_ROLE", "service-role")
+        os.environ.setdefault("APP_API_TOKEN", "test-token")
+        self.c = _Container(
+            settings=replace(Settings.load(), training_warmup_wait_seconds=0.2),
+            session_store=MemorySessionStore(),
+            ctx_repo=MagicMock(),
+        )
+        self.c.set_session("client-1", LiveSession(session_id="s1", avatar_id="avatar-1"))
+        self.release = threading.Event()
+        self.loads = []
+
+        def fake_load(container, avatar_id):
+            self.loads.append(avatar_id)
+            self.release.wait(5)
+            return [CTX], [], "Contextos: chocolate"
+
+        app = MagicMock()
+        app.app_context.side_effect = contextlib.nullcontext
+        patches = [
+            patch.object(session_bp, "_load_training_cache", side_effect=fake_load),
+            patch.object(session_bp, "current_app", MagicMock(_get_current_object=lambda: app)),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_warmup_attaches_training_to_the_session(self):
+        fut = session_bp._start_training_warmup(self.c, "client-1", "s1", "avatar-1")
+        self.release.set()
+        fut.result(5)
+
+        s = self.c.get_session("client-1")
+        self.assertTrue(s.training_ready)
+        self.assertEqual(s.training_summary, "Contextos: chocolate")
+        self.assertEqual(s.training_contexts, [CTX])
+        self.assertNotIn("s1", session_bp._training_warmups)
+
+    def test_say_proceeds_without_training_when_warmup_is_slow(self):
+        fut = session_bp._start_training_warmup(self.c, "client-1", "s1", "avatar-1")
+        session = self.c.get_session("client-1")
+
+        self.assertEqual(session_bp._await_training(self.c, "client-1", session, "avatar-1"), "")
+        self.release.set()
+        fut.result(5)
+        self.assertEqual(session_bp._await_training(self.c, "client-1", session, "avatar-1"), "Contextos: chocolate")
+        self.assertEqual(self.loads, ["avatar-1"])
+
+    def test_say_waits_for_a_warmup_that_finishes_in_time(self):
+        session_bp._start_training_warmup(self.c, "client-1", "s1", "avatar-1")
+        threading.Timer(0.05, self.release.set).start()
+
+        session = self.c.get_session("client-1")
+        self.assertEqual(session_bp._await_training(self.c, "client-1", session, "avatar-1"), "Contextos: chocolate")
+
+    def test_warmup_does_not_touch_a_replaced_session(self):
+        fut = session_bp._start_training_warmup(self.c, "client-1", "s1", "avatar-1")
+        self.c.set_session("client-1", LiveSession(session_id="s2", avatar_id="avatar-1"))
+        self.release.set()
+        fut.result(5)
+
+        s = self.c.get_session("client-1")
+        self.assertEqual(s.session_id, "s2")
+        self.assertFalse(s.training_ready)
+
+
+if __name__ == "__main__":
+    unittest.main()
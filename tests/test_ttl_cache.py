@@ -0,0 +1,95 @@
+import threading
+import time
+import unittest
+
+from app.shared.ttl_cache import MISSING, TTLCache
+
+
+class TTLCacheTests(unittest.TestCase):
+    def test_lru_eviction_is_counted(self):
+        cache = TTLCache(maxsize=2, ttl_seconds=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        self.assertIs(cache.get("b"), MISSING)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_get_or_load_loads_once_and_counts_hits(self):
+        cache = TTLCache(ttl_seconds=60)
+        calls = []
+
+        def loader():
+            calls.append(1)
+            return "v"
+
+        self.assertEqual(cache.get_or_load("k", loader), "v")
+        self.assertEqual(cache.get_or_load("k", loader), "v")
+        stats = cache.stats()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_stale_value_is_served_while_refreshing_in_background(self):
+        cache = TTLCache(ttl_seconds=0.05, stale_ttl_seconds=60)
+        cache.set("k", "old")
+        time.sleep(0.06)
+        refreshed = threading.Event()
+
+        def loader():
+            refreshed.set()
+            return "new"
+
+        self.assertEqual(cache.get_or_load("k", loader), "old")
+        self.assertTrue(refreshed.wait(2))
+        for _ in range(50):
+            if cache.get("k") == "new":
+                break
+            time.sleep(0.01)
+        self.assertEqual(cache.get("k"), "new")
+        self.assertEqual(cache.stats()["stale_hits"], 1)
+
+    def test_stale_value_survives_upstream_failure(self):
+        cache = TTLCache(ttl_seconds=0.05, stale_ttl_seconds=60)
+        cache.set("k", "old")
+        time.sleep(0.06)
+
+        def boom():
+            raise RuntimeError("supabase down")
+
+        self.assertEqual(cache.get_or_load("k", boom), "old")
+        for _ in range(50):
+            if cache.stats()["refresh_errors"]:
+                break
+            time.sleep(0.01)
+        self.assertEqual(cache.get_or_load("k", boom), "old")
+        self.assertGreaterEqual(cache.stats()["refresh_errors"], 1)
+
+    def test_cold_miss_propagates_loader_error(self):
+        cache = TTLCache(ttl_seconds=60)
+        with self.assertRaises(RuntimeError):
+            cache.get_or_load("k", lambda: (_ for _ in ()).throw(RuntimeError("down")))
+        self.assertEqual(cache.stats()["load_errors"], 1)
+
+    def test_expired_entries_are_swept_on_write(self):
+        cache = TTLCache(maxsize=100, ttl_seconds=0.05)
+        for i in range(10):
+            cache.set(i, i)
+        time.sleep(0.06)
+        cache._next_sweep = 0
+        cache.set("fresh", 1)
+
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.stats()["expirations"], 10)
+
+    def test_negative_ttl_zero_does_not_cache_none(self):
+        cache = TTLCache(ttl_seconds=60, negative_ttl_seconds=0)
+        calls = []
+        cache.get_or_load("k", lambda: calls.append(1))
+        cache.get_or_load("k", lambda: calls.append(1))
+        self.assertEqual(len(calls), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
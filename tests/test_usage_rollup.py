@@ -0,0 +1,151 @@
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from app.core.settings import Settings
+from app.infrastructure import usage_rollup
+from app.infrastructure.usage_rollup import AvatarUsageRollup, aggregate_sessions
+from app.infrastructure.write_behind import PendingWrite
+
+
+def _iso(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).isoformat()
+
+
+class AggregateSessionsTests(unittest.TestCase):
+    def test_matches_row_by_row_sum(self):
+        rng = random.Random(7)
+        rows = [
+            {"avatar_id": f"a{rng.randrange(5)}", "session_id": f"s{i}", "duration_seconds": rng.choice([0, None, 30, 61.5, 600])}
+            for i in range(3000)
+        ]
+        closed, _ = aggregate_sessions(rows)
+
+        expected = {}
+        for r in rows:
+            d = float(r["duration_seconds"] or 0)
+            if d > 0:
+                sec, n = expected.get(r["avatar_id"], (0.0, 0))
+                expected[r["avatar_id"]] = (sec + d, n + 1)
+        self.assertEqual(set(closed), set(expected))
+        for a, (sec, n) in expected.items():
+            self.assertAlmostEqual(closed[a][0], sec)
+            self.assertEqual(closed[a][1], n)
+
+    def test_open_sessions_are_returned_separately(self):
+        now = time.time()
+        rows = [
+            {"avatar_id": "a1", "session_id": "open", "duration_seconds": None, "started_at": _iso(now - 60), "ended_at": None},
+            {"avatar_id": "a1", "session_id": "zero", "duration_seconds": 0, "started_at": _iso(now - 60), "ended_at": _iso(now)},
+        ]
+        closed, open_rows = aggregate_sessions(rows)
+        self.assertEqual(closed, {})
+        self.assertEqual([(s, a) for s, a, _ in open_rows], [("open", "a1")])
+
+
+class AvatarUsageRollupTests(unittest.TestCase):
+    def setUp(self):
+        os.environ.setdefault("HEYGEN_API_KEY", "env-key")
+        os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+        os.environ.setdefault("SUPABASE_SERVICE_ROLE", "service-role")
+        os.environ.setdefault("APP_API_TOKEN", "test-token")
+        self.tmp = tempfile.TemporaryDirectory()
+        self.rows = {}
+        self.pages = []
+
+        def fake_get_json(settings, table, select, params, limit=None):
+            self.pages.append(params["offset"])
+            wanted = params["avatar_id"][len("in.("):-1].split(",")
+            data = [r for r in self.rows.values() if r["avatar_id"] in wanted]
+            start = int(params["offset"])
+            return data[start:start + limit]
+
+        p = patch.object(usage_rollup, "get_json", side_effect=fake_get_json)
+        p.start()
+        self.addCleanup(p.stop)
+        self.rollup = AvatarUsageRollup(Settings.load(), os.path.join(self.tmp.name, "usage.sqlite3"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_first_read_reconciles_every_row_past_one_page(self):
+        for i in range(2500):
+            self.rows[f"s{i}"] = {"avatar_id": "a1", "session_id": f"s{i}", "duration_seconds": 60}
+
+        self.assertEqual(self.rollup.usage(["a1"]), {"a1": (150000.0, 2500)})
+        self.assertEqual(self.pages, ["0", "1000", "2000"])
+
+        # segunda leitura não volta ao Supabase
+        self.rollup.usage(["a1"])
+        self.assertEqual(len(self.pages), 3)
+
+    def test_flushed_start_and_end_update_the_rollup_once(self):
+        self.rollup.usage(["a1"])
+        started = time.time() - 30
+        start = PendingWrite("POST", "avatar_sessions", {"avatar_id": "a1", "session_id": "s1", "started_at": _iso(started)})
+        end = PendingWrite("PATCH", "avatar_sessions", {"ended_at": _iso(started + 90), "duration_seconds": 90},
+                           params={"session_id": "eq.s1"})
+
+        self.rollup.on_writes_flushed([start])
+        seconds, count = self.rollup.usage(["a1"])["a1"]
+        self.assertEqual(count, 1)
+        self.assertAlmostEqual(seconds, 30, delta=2)
+
+        self.rollup.on_writes_flushed([end])
+        self.rollup.on_writes_flushed([end])
+        self.assertEqual(self.rollup.usage(["a1"]), {"a1": (90.0, 1)})
+
+    def test_open_session_time_is_capped(self):
+        self.rollup.usage(["a1"])
+        self.rollup.record_start("s1", "a1", time.time() - 3600)
+        self.assertEqual(self.rollup.usage(["a1"])["a1"], (float(usage_rollup.OPEN_SESSION_MAX_SECONDS), 1))
+
+    def test_reconcile_replaces_incremental_totals(self):
+        self.rollup.usage(["a1"])
+        self.rollup.record_start("s1", "a1", time.time())
+        self.rollup.record_end("s1", 100)
+        self.rows["s1"] = {"avatar_id": "a1", "session_id": "s1", "duration_seconds": 120}
+
+        self.rollup.reconcile(["a1"])
+        self.assertEqual(self.rollup.usage(["a1"]), {"a1": (120.0, 1)})
+
+    def test_end_recorded_during_reconcile_is_kept(self):
+        self.rollup.usage(["a1"])
+        self.rollup.record_start("s1", "a1", time.time())
+        self.rows["s1"] = {"avatar_id": "a1", "session_id": "s1", "started_at": _iso(time.time())}
+        fetch = usage_rollup.get_json.side_effect
+
+        def end_while_loading(*args, **kwargs):
+            page = fetch(*args, **kwargs)
+            # a leitura já viu s1 aberta; o fim chega antes do commit da reconciliação
+            self.rollup.record_end("s1", 100)
+            return page
+
+        with patch.object(usage_rollup, "get_json", side_effect=end_while_loading):
+            self.assertEqual(self.rollup.reconcile(["a1", "a2"]), ["a2"])
+        self.assertEqual(self.rollup.usage(["a1"]), {"a1": (100.0, 1)})
+
+    def test_existing_database_gains_changed_at(self):
+        path = os.path.join(self.tmp.name, "old.sqlite3")
+        conn = sqlite3.connect(path)
+        conn.execute(
+            "CREATE TABLE avatar_usage (avatar_id TEXT PRIMARY KEY, seconds REAL NOT NULL DEFAULT 0,"
+            " sessions INTEGER NOT NULL DEFAULT 0, reconciled_at REAL NOT NULL DEFAULT 0)"
+        )
+        conn.execute("INSERT INTO avatar_usage VALUES ('a1', 50, 1, ?)", (time.time(),))
+        conn.commit()
+        conn.close()
+
+        rollup = AvatarUsageRollup(Settings.load(), path)
+        rollup.record_start("s1", "a1", time.time())
+        rollup.record_end("s1", 10)
+        self.assertEqual(rollup.usage(["a1"]), {"a1": (60.0, 2)})
+
+
+if __name__ == "__main__":
+    unittest.main()
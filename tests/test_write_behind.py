@@ -0,0 +1,188 @@
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+from app.core.settings import Settings
+from app.infrastructure.write_behind import SupabaseWriteQueue
+
+
+def _resp(status: int = 201):
+    r = Mock()
+    r.status_code = status
+    r.ok = status < 400
+    r.text = ""
+    return r
+
+
+class SupabaseWriteQueueTests(unittest.TestCase):
+    def setUp(self):
+        os.environ.setdefault("HEYGEN_API_KEY", "env-key")
+        os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+        os.environ.setdefault("SUPABASE_SERVICE_ROLE", "service-role")
+        os.environ.setdefault("APP_API_TOKEN", "test-token")
+        self.settings = Settings.load()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "spool.sqlite3")
+        self.http = Mock()
+        self.http.post.return_value = _resp(201)
+        self.http.patch.return_value = _resp(204)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _queue(self, **kw):
+        # sem thread de flush: os testes chamam flush() explicitamente
+        with patch.object(SupabaseWriteQueue, "_ensure_thread"):
+            q = SupabaseWriteQueue(self.settings, self.path, self.http, backoff_base_seconds=0, **kw)
+        q._ensure_thread = lambda: None
+        return q
+
+    def test_enqueue_does_no_io_and_flush_batches_consecutive_upserts(self):
+        q = self._queue()
+        for i in range(3):
+            q.post("avatar_sessions", {"session_id": f"s{i}", "avatar_id": "a"},
+                   params={"on_conflict": "session_id"}, prefer="resolution=merge-duplicates")
+        q.patch("avatar_sessions", {"session_id": "eq.s0"}, {"ended_at": "t", "duration_seconds": 3})
+        self.http.post.assert_not_called()
+        self.assertEqual(q.pending(), 4)
+
+        self.assertTrue(q.flush())
+
+        self.assertEqual(self.http.post.call_count, 1)
+        kwargs = self.http.post.call_args.kwargs
+        self.assertEqual([row["session_id"] for row in kwargs["json"]], ["s0", "s1", "s2"])
+        self.assertEqual(kwargs["headers"]["Prefer"], "resolution=merge-duplicates")
+        self.assertEqual(kwargs["params"], {"on_conflict": "session_id"})
+        self.http.patch.assert_called_once()
+        self.assertEqual(q.stats()["sent"], 4)
+
+    def test_transient_failure_keeps_order_and_retries(self):
+        q = self._queue()
+        self.http.post.side_effect = [_resp(503), _resp(201)]
+        q.post("avatar_sessions", {"session_id": "s1"})
+        q.patch("avatar_sessions", {"session_id": "eq.s1"}, {"ended_at": "t"})
+
+        self.assertFalse(q.flush())
+        # o PATCH não pode passar na frente do upsert que falhou
+        self.http.patch.assert_not_called()
+        self.assertEqual(q.pending(), 2)
+
+        self.assertTrue(q.flush())
+        self.assertEqual(self.http.post.call_count, 2)
+        self.http.patch.assert_called_once()
+        self.assertEqual(q.stats()["retries"], 1)
+
+    def test_network_error_is_retried_and_gives_up_after_max_attempts(self):
+        q = self._queue(max_attempts=2)
+        self.http.post.side_effect = ConnectionError("down")
+        q.post("avatar_sessions", {"session_id": "s1"})
+
+        q.flush()
+        self.assertEqual(q.pending(), 1)
+        q.flush()
+        self.assertEqual(q.pending(), 0)
+        self.assertEqual(q.stats()["dropped"], 1)
+
+    def test_client_error_is_dropped_without_blocking_the_queue(self):
+        q = self._queue()
+        self.http.post.return_value = _resp(400)
+        q.post("avatar_sessions", {"session_id": "s1"})
+        q.patch("avatar_sessions", {"session_id": "eq.s1"}, {"ended_at": "t"})
+
+        self.assertTrue(q.flush())
+        self.http.patch.assert_called_once()
+        self.assertEqual(q.stats()["dropped"], 1)
+
+    def test_failed_batch_counts_attempts_for_every_row_and_is_split_at_the_limit(self):
+        q = self._queue(max_attempts=2)
+        # o lote falha por causa de uma linha só
+        self.http.post.side_effect = lambda url, json, **kw: _resp(
+            500 if isinstance(json, list) or json["session_id"] == "bad" else 201
+        )
+        for sid in ("s0", "bad", "s2"):
+            q.post("avatar_sessions", {"session_id": sid}, params={"on_conflict": "session_id"})
+
+        self.assertFalse(q.flush())
+        attempts = q._conn().execute("SELECT attempts FROM write_spool ORDER BY seq").fetchall()
+        self.assertEqual(attempts, [(1,), (1,), (1,)])
+
+        for _ in range(4):
+            if q.flush():
+                break
+        sent = [c.kwargs["json"] for c in self.http.post.call_args_list if c.kwargs["json"] != {"session_id": "bad"}]
+        self.assertEqual(sent[-2:], [{"session_id": "s0"}, {"session_id": "s2"}])
+        stats = q.stats()
+        self.assertEqual((stats["sent"], stats["dropped"], stats["split"], stats["pending"]), (2, 1, 1, 0))
+
+    def test_rejected_batch_is_retried_row_by_row(self):
+        q = self._queue()
+        self.http.post.side_effect = lambda url, json, **kw: _resp(
+            409 if isinstance(json, list) or json["session_id"] == "bad" else 201
+        )
+        for sid in ("s0", "bad", "s2"):
+            q.post("avatar_sessions", {"session_id": sid})
+        q.patch("avatar_sessions", {"session_id": "eq.s2"}, {"ended_at": "t"})
+
+        self.assertTrue(q.flush())
+        self.http.patch.assert_called_once()
+        stats = q.stats()
+        self.assertEqual((stats["sent"], stats["dropped"], stats["split"]), (3, 1, 1))
+
+    def test_spool_survives_restart(self):
+        self._queue().post("avatar_sessions", {"session_id": "s1"})
+        self.http.post.assert_not_called()
+
+        q2 = self._queue()
+        self.assertEqual(q2.pending(), 1)
+        self.assertTrue(q2.flush())
+        self.assertEqual(self.http.post.call_args.kwargs["json"], {"session_id": "s1"})
+
+    def test_spool_from_before_the_solo_column_is_migrated(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute(
+            "CREATE TABLE write_spool (seq INTEGER PRIMARY KEY AUTOINCREMENT, op TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0, next_at REAL NOT NULL DEFAULT 0,"
+            " owner TEXT NOT NULL DEFAULT '', lease_until REAL NOT NULL DEFAULT 0)"
+        )
+        conn.execute("INSERT INTO write_spool (op) VALUES (?)",
+                     ('{"method":"POST","table":"avatar_sessions","body":{"session_id":"s1"}}',))
+        conn.commit()
+        conn.close()
+
+        self.assertTrue(self._queue().flush())
+        self.assertEqual(self.http.post.call_args.kwargs["json"], {"session_id": "s1"})
+
+    def test_leftover_spool_starts_the_flusher_at_startup(self):
+        self._queue().post("avatar_sessions", {"session_id": "s1"})
+
+        q2 = SupabaseWriteQueue(self.settings, self.path, self.http, backoff_base_seconds=0)
+        try:
+            deadline = time.monotonic() + 2
+            while q2.pending() and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(q2.pending(), 0)
+            self.http.post.assert_called_once()
+        finally:
+            q2.close()
+
+    def test_listeners_receive_confirmed_writes(self):
+        q = self._queue()
+        seen = []
+        q.on_flushed(lambda ops: seen.extend((op.table, op.params) for op in ops))
+        q.patch("avatar_credentials", {"avatar_id": "eq.a1"}, {"context_id": "Y3R4"})
+
+        q.flush()
+        self.assertEqual(seen, [("avatar_credentials", {"avatar_id": "eq.a1"})])
+
+    def test_disabled_mode_sends_inline(self):
+        q = self._queue(enabled=False)
+        q.post("avatar_sessions", {"session_id": "s1"})
+        self.http.post.assert_called_once()
+        self.assertEqual(q.pending(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()